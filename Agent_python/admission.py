@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PriorityClass:
+    """一个优先级类别的配置"""
+    name: str
+    priority: int  # 数值越小优先级越高
+    queue_limit: int  # 排队请求数上限，超出时立即拒绝
+    deadline: float  # 默认截止时间（秒，从请求到达算起）
+    degraded_message: str  # 被拒绝时立即返回的降级回复
+    max_share: float = 1.0  # 该类别最多同时占用的容量比例，其余槽位留给其他类别
+
+
+# 默认类别：交互式的教学/检验轮次优先于报告与学习计划；
+# 报告与学习计划最多占用3/4的执行槽位，其余槽位始终留给交互式请求
+DEFAULT_CLASSES = (
+    PriorityClass("interactive", 0, 64, 30.0, "当前使用人数较多，老师正在忙，请稍后再问一次。"),
+    PriorityClass("background", 1, 16, 120.0, "当前报告和学习计划的生成任务较多，请稍后再试。", 0.75),
+)
+# Agent到优先级类别的映射（未列出的Agent按 interactive 处理）
+AGENT_PRIORITY = {
+    "teaching": "interactive",
+    "testing": "interactive",
+    "secretary": "background",
+    "parent": "background",
+}
+# 拒绝原因对应的统计项
+_REJECT_METRICS = {"queue_full": "rejected_queue_full", "deadline": "rejected_deadline", "expired": "expired_in_queue"}
+
+
+@dataclass
+class AdmissionOutcome:
+    """经过准入控制的请求的处理结果"""
+    response: str
+    priority: str  # 优先级类别名称
+    agent: str = ""
+    degraded: bool = False  # 为True时 response 为降级回复
+    reason: str = ""  # 降级原因：queue_full / deadline / expired
+    waited: float = 0.0  # 排队等待时间（秒）
+    retry_after: float = 0.0  # 建议的重试间隔（秒）
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳（队列已满或无法在截止时间前开始执行）"""
+
+    def __init__(self, reason: str, priority_class: PriorityClass, retry_after: float):
+        super().__init__(f"{priority_class.name}: {reason}")
+        self.reason = reason  # queue_full / deadline / expired
+        self.priority_class = priority_class
+        self.retry_after = retry_after
+
+    @property
+    def degraded_message(self) -> str:
+        return self.priority_class.degraded_message
+
+
+class AdmissionController:
+    """
+    请求准入控制：
+    - capacity 限制同时执行的请求数（即同时占用的 LLM 调用配额）
+    - 执行槽位空出时总是交给优先级最高类别中最早到达的请求（类别内先进先出）
+    - 每个类别同时执行的请求数不超过 capacity × max_share，低优先级请求占满其份额后不再占用剩余槽位
+    - 每个类别的排队数有上限，超出时立即拒绝
+    - 按平均执行时间估计排队等待时间，预计无法在截止时间前开始执行的请求立即拒绝，
+      排队中超过截止时间的请求也会被移出，调用方据此立即返回降级回复
+    - 各类别的排队深度、接纳/拒绝次数及等待时间可通过 get_stats() / render_prometheus() 导出
+    """
+
+    _shared: Optional["AdmissionController"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, capacity: int = 16, classes: Any = DEFAULT_CLASSES):
+        """
+        初始化准入控制
+
+        Args:
+            capacity: 同时执行的请求数上限
+            classes: PriorityClass 列表
+        """
+        self.capacity = max(1, capacity)
+        self.classes: Dict[str, PriorityClass] = {c.name: c for c in sorted(classes, key=lambda c: c.priority)}
+        self._cond = threading.Condition()
+        self._active = 0
+        # 各类别同时执行数上限（至少为1）及当前执行数
+        self.limits: Dict[str, int] = {name: max(1, min(self.capacity, int(self.capacity * c.max_share)))
+                                       for name, c in self.classes.items()}
+        self._class_active: Dict[str, int] = {name: 0 for name in self.classes}
+        self._queues: Dict[str, Deque[object]] = {name: deque() for name in self.classes}
+        self._service_ewma: Optional[float] = None  # 平均执行时间（秒，指数滑动平均）
+        self.metrics: Dict[str, Dict[str, float]] = {
+            name: {
+                "admitted": 0,
+                "rejected_queue_full": 0,
+                "rejected_deadline": 0,
+                "expired_in_queue": 0,
+                "wait_seconds_total": 0.0,
+                "wait_seconds_max": 0.0,
+            } for name in self.classes
+        }
+
+    @classmethod
+    def shared(cls) -> "AdmissionController":
+        """
+        进程内共享的准入控制（LLM 配额按进程计算），容量由 AGENT_MAX_CONCURRENCY 环境变量设置
+
+        Returns:
+            AdmissionController: 共享实例
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(capacity=int(os.getenv("AGENT_MAX_CONCURRENCY", "16")))
+            return cls._shared
+
+    def class_for(self, agent: str) -> PriorityClass:
+        """获取处理请求的Agent对应的优先级类别"""
+        name = AGENT_PRIORITY.get(agent, "interactive")
+        return self.classes.get(name) or next(iter(self.classes.values()))
+
+    def _can_run(self, class_name: str) -> bool:
+        """类别的请求现在能否占用执行槽位（总容量与类别上限都未占满）"""
+        return self._active < self.capacity and self._class_active[class_name] < self.limits[class_name]
+
+    def _head(self) -> Optional[object]:
+        """下一个应获得执行槽位的排队请求（跳过已占满类别上限的类别）"""
+        for name, queue in self._queues.items():
+            if queue and self._class_active[name] < self.limits[name]:
+                return queue[0]
+        return None
+
+    def _expected_wait(self, priority_class: PriorityClass) -> float:
+        """估计新到达的请求需要排队的时间（排在它前面的请求数 × 平均执行时间 / 该类别可用的槽位数）"""
+        if self._service_ewma is None:
+            return 0.0
+        ahead = sum(len(self._queues[c.name]) for c in self.classes.values() if c.priority <= priority_class.priority)
+        return (ahead + 1) * self._service_ewma / self.limits[priority_class.name]
+
+    def _reject(self, reason: str, priority_class: PriorityClass) -> AdmissionRejected:
+        self.metrics[priority_class.name][_REJECT_METRICS[reason]] += 1
+        retry_after = max(1.0, self._expected_wait(priority_class))
+        logger.warning(f"拒绝 {priority_class.name} 请求（{reason}），活跃 {self._active}/{self.capacity}，"
+                       f"排队 {len(self._queues[priority_class.name])}")
+        return AdmissionRejected(reason, priority_class, retry_after)
+
+    def acquire(self, class_name: str, deadline: Optional[float] = None) -> float:
+        """
+        等待执行槽位
+
+        Args:
+            class_name: 优先级类别名称
+            deadline: 截止时间（秒，从现在算起），不超过类别的默认截止时间
+
+        Returns:
+            float: 排队等待的时间（秒）
+
+        Raises:
+            AdmissionRejected: 队列已满、预计无法在截止时间前开始执行，或排队超过截止时间
+        """
+        priority_class = self.classes[class_name]
+        arrived = time.monotonic()
+        deadline_at = arrived + (priority_class.deadline if deadline is None else min(deadline, priority_class.deadline))
+        with self._cond:
+            queue = self._queues[class_name]
+            if self._can_run(class_name) and self._head() is None:
+                self._active += 1
+                self._class_active[class_name] += 1
+                self._record_admitted(class_name, 0.0)
+                return 0.0
+            if len(queue) >= priority_class.queue_limit:
+                raise self._reject("queue_full", priority_class)
+            if arrived + self._expected_wait(priority_class) > deadline_at:
+                raise self._reject("deadline", priority_class)
+            ticket = object()
+            queue.append(ticket)
+            try:
+                while not (self._can_run(class_name) and self._head() is ticket):
+                    remaining = deadline_at - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject("expired", priority_class)
+                    self._cond.wait(remaining)
+            except BaseException:
+                queue.remove(ticket)
+                # 队首离开后下一个请求可能可以执行了
+                self._cond.notify_all()
+                raise
+            queue.popleft()
+            self._active += 1
+            self._class_active[class_name] += 1
+            waited = time.monotonic() - arrived
+            self._record_admitted(class_name, waited)
+            self._cond.notify_all()
+            return waited
+
+    def release(self, class_name: str, service_seconds: Optional[float] = None) -> None:
+        """
+        释放执行槽位
+
+        Args:
+            class_name: 占用槽位的请求的优先级类别名称
+            service_seconds: 本次执行耗时（秒），用于估计排队时间
+        """
+        with self._cond:
+            self._active -= 1
+            self._class_active[class_name] -= 1
+            if service_seconds is not None:
+                self._service_ewma = service_seconds if self._service_ewma is None else \
+                    0.8 * self._service_ewma + 0.2 * service_seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, class_name: str, deadline: Optional[float] = None) -> Iterator[float]:
+        """
+        在执行槽位内运行（with 语句）
+
+        Args:
+            class_name: 优先级类别名称
+            deadline: 截止时间（秒，从现在算起）
+
+        Yields:
+            float: 排队等待的时间（秒）
+        """
+        waited = self.acquire(class_name, deadline)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(class_name, time.monotonic() - started)
+
+    def _record_admitted(self, class_name: str, waited: float) -> None:
+        metrics = self.metrics[class_name]
+        metrics["admitted"] += 1
+        metrics["wait_seconds_total"] += waited
+        metrics["wait_seconds_max"] = max(metrics["wait_seconds_max"], waited)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取准入统计
+
+        Returns:
+            Dict[str, Any]: 容量、活跃数、平均执行时间及各类别的排队深度与计数
+        """
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "active": self._active,
+                "service_seconds_ewma": self._service_ewma,
+                "classes": {name: dict(self.metrics[name], queued=len(self._queues[name]),
+                                       active=self._class_active[name], active_limit=self.limits[name],
+                                       queue_limit=self.classes[name].queue_limit)
+                            for name in self.classes},
+            }
+
+    def render_prometheus(self, prefix: str = "agent_admission") -> str:
+        """
+        以 Prometheus 文本格式导出统计
+
+        Args:
+            prefix: 指标名前缀
+
+        Returns:
+            str: 指标文本
+        """
+        stats = self.get_stats()
+        lines = [f"{prefix}_capacity {stats['capacity']}", f"{prefix}_active {stats['active']}"]
+        if stats["service_seconds_ewma"] is not None:
+            lines.append(f"{prefix}_service_seconds_ewma {stats['service_seconds_ewma']:.6f}")
+        for name, metrics in stats["classes"].items():
+            for key, value in metrics.items():
+                lines.append(f'{prefix}_{key}{{class="{name}"}} {value:g}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from user_session import session_memory
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TRUNCATED_MARK = "…(已截断)"
+
+
+@dataclass
+class DelegationResult:
+    """一个子请求的执行结果"""
+    agent: str
+    request: str
+    status: str  # ok / timeout / error
+    content: str
+    seconds: float
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """
+    将文本截断到不超过 limit 个字符（截断时附加标记）
+
+    Args:
+        text: 文本
+        limit: 最大字符数
+
+    Returns:
+        str: 截断后的文本
+    """
+    if len(text) <= limit:
+        return text
+    if limit <= len(TRUNCATED_MARK):
+        return text[:max(0, limit)]
+    return text[:limit - len(TRUNCATED_MARK)] + TRUNCATED_MARK
+
+
+def default_workers(fanout: int) -> int:
+    """
+    分派线程池的默认大小：AGENT_DELEGATE_WORKERS 环境变量，未设置时为准入控制容量 × 每个请求最多分派的子请求数，
+    使所有同时执行的请求都能立即开始各自的子请求
+
+    Args:
+        fanout: 每个请求最多分派的子请求数
+
+    Returns:
+        int: 线程数
+    """
+    configured = os.getenv("AGENT_DELEGATE_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    # 动态导入准入控制模块，容量在进程内共享
+    from admission import AdmissionController
+    return AdmissionController.shared().capacity * max(1, fanout)
+
+
+def run_nested(agent: Any, request: str, own_count: int = 6, cancelled: Optional[threading.Event] = None) -> str:
+    """
+    以嵌套方式调用子Agent：子Agent在临时记忆库（ScratchMemory）中运行，
+    种子为当前记忆库中该Agent最近 own_count 条记录及最近 shared_context_size 条共享记录；
+    运行过程中的中间记录随临时记忆库丢弃，只返回最终回复，由调用方作为工具结果写回一次
+
+    Args:
+        agent: 子Agent（base_agent 实例）
+        request: 请求内容
+        own_count: 种子中该Agent自身记录的数量
+        cancelled: 取消标记，设置后子Agent不再发起后续的模型调用
+
+    Returns:
+        str: 子Agent的最终回复
+    """
+    # 动态导入utils模块以避免循环依赖
+    from utils import ScratchMemory
+    scratch = ScratchMemory(agent.memory, agent.name, own_count, agent.shared_context_size, cancelled=cancelled)
+    with session_memory(scratch):
+        return agent.run_once(request)
+
+
+class AgentDelegator:
+    """
+    将多个子请求并发分派给不同的Agent：
+    - 子请求在共享线程池中执行，并复制调用方的 contextvars 上下文，因此沿用当前用户会话；
+      每个子Agent在各自的临时记忆库中运行（见 run_nested），互不干扰，也不会写入会话记忆库
+    - 线程池大小默认由准入控制容量推算（见 default_workers），也可以显式指定
+    - 每个子请求有独立的超时，从子请求开始执行时算起（在线程池中排队超过超时的直接放弃），
+      整体耗时约为最慢子请求的耗时（而不是各子请求耗时之和）；
+      超时的子请求会收到取消标记，不再发起后续的模型调用，正在进行的模型调用无法中断，但结果不再等待
+    - 各子请求的结果合并为一段总长度有上限的文本，供调用方Agent作为工具结果使用
+    """
+
+    def __init__(self, agents: Dict[str, Any], allowed: Optional[Iterable[str]] = None, max_workers: Optional[int] = None,
+                 timeout: float = 60.0, max_result_chars: int = 4000, nested_context_size: int = 6):
+        """
+        初始化分派器
+
+        Args:
+            agents: Agent名称到 base_agent 实例的映射
+            allowed: 允许分派的Agent名称，为None时允许 agents 中的全部Agent
+            max_workers: 线程池大小（同时执行的子请求数上限），为None时见 default_workers
+            timeout: 每个子请求的默认超时（秒）
+            max_result_chars: 合并结果的最大字符数
+            nested_context_size: 子Agent临时记忆库中复制的自身历史记录数量
+        """
+        self.agents = agents
+        self.allowed = set(allowed) if allowed is not None else None
+        self.timeout = timeout
+        self.max_result_chars = max_result_chars
+        self.nested_context_size = nested_context_size
+        if max_workers is None:
+            max_workers = default_workers(len(self.allowed) if self.allowed is not None else len(agents))
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="delegate")
+
+    def _run_one(self, agent_name: str, request: str, started: List[float], cancelled: threading.Event) -> str:
+        # 记录开始执行的时间，超时从此时算起；排队期间已被放弃的不再执行
+        started.append(time.monotonic())
+        if cancelled.is_set():
+            raise RuntimeError("子请求已取消")
+        return run_nested(self.agents[agent_name], request, self.nested_context_size, cancelled)
+
+    def _wait(self, future: Any, submitted: float, started: List[float], timeout: float) -> Any:
+        """
+        等待子请求完成：开始执行前最多排队 timeout 秒，开始执行后再等待 timeout 秒
+
+        Raises:
+            FutureTimeoutError: 排队或执行超时
+        """
+        while True:
+            deadline = (started[0] if started else submitted) + timeout
+            try:
+                return future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                # 等待期间开始执行的子请求按开始时间重新计算截止时间
+                if not started and future.cancel():
+                    raise
+                if started and started[0] + timeout <= time.monotonic():
+                    raise
+
+    def run(self, tasks: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[DelegationResult]:
+        """
+        并发执行子请求
+
+        Args:
+            tasks: 子请求列表，每项为 {"agent": Agent名称, "request": 请求内容}
+            timeout: 每个子请求的超时（秒），默认为 self.timeout，且不超过 self.timeout
+
+        Returns:
+            List[DelegationResult]: 与 tasks 顺序一致的执行结果
+        """
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        results: List[Optional[DelegationResult]] = [None] * len(tasks)
+        pending = []
+        for i, task in enumerate(tasks):
+            agent_name = str(task.get("agent", ""))
+            request = str(task.get("request", ""))
+            if agent_name not in self.agents or (self.allowed is not None and agent_name not in self.allowed):
+                results[i] = DelegationResult(agent_name, request, "error", f"未知的Agent: {agent_name}", 0.0)
+                continue
+            # 每个子请求使用各自的上下文副本（同一个 Context 不能在多个线程中同时进入）
+            context = contextvars.copy_context()
+            started: List[float] = []
+            cancelled = threading.Event()
+            pending.append((i, agent_name, request, time.monotonic(), started, cancelled,
+                            self._executor.submit(context.run, self._run_one, agent_name, request, started, cancelled)))
+
+        for i, agent_name, request, submitted, started, cancelled, future in pending:
+            try:
+                content = self._wait(future, submitted, started, timeout)
+                results[i] = DelegationResult(agent_name, request, "ok", str(content), time.monotonic() - submitted)
+            except FutureTimeoutError:
+                cancelled.set()
+                what = "执行" if started else "排队"
+                logger.warning(f"子请求{what}超时（{timeout:g}秒）: {agent_name}")
+                results[i] = DelegationResult(agent_name, request, "timeout", f"{what}超时（{timeout:g}秒）未返回",
+                                              time.monotonic() - submitted)
+            except Exception as e:
+                logger.error(f"子请求执行出错: {agent_name}: {e}")
+                results[i] = DelegationResult(agent_name, request, "error", str(e), time.monotonic() - submitted)
+        return results
+
+    def merge(self, results: List[DelegationResult]) -> str:
+        """
+        合并子请求结果为一段文本，总长度不超过 max_result_chars：
+        较短的结果完整保留，其余长度预算在较长的结果之间平均分配（超出部分截断）
+
+        Args:
+            results: 执行结果
+
+        Returns:
+            str: 合并后的文本
+        """
+        if not results:
+            return ""
+        headers = [f"[{r.agent}]" + ("" if r.status == "ok" else f" ({r.status})") + "\n" for r in results]
+        separators = 2 * (len(results) - 1)
+        budget = max(0, self.max_result_chars - separators - sum(len(h) for h in headers))
+        limits = [0] * len(results)
+        order = sorted(range(len(results)), key=lambda i: len(results[i].content))
+        for n, i in enumerate(order):
+            limits[i] = min(len(results[i].content), budget // (len(order) - n))
+            budget -= limits[i]
+        sections = [h + truncate_text(r.content, limit) for h, r, limit in zip(headers, results, limits)]
+        return truncate_text("\n\n".join(sections), self.max_result_chars)
+
+    def delegate(self, tasks: List[Dict[str, Any]], timeout: Optional[float] = None) -> str:
+        """
+        并发执行子请求并返回合并结果
+
+        Args:
+            tasks: 子请求列表，每项为 {"agent": Agent名称, "request": 请求内容}
+            timeout: 每个子请求的超时（秒）
+
+        Returns:
+            str: 合并后的结果
+        """
+        started = time.monotonic()
+        results = self.run(tasks, timeout)
+        logger.info(f"并发执行 {len(tasks)} 个子请求，耗时 {time.monotonic() - started:.2f}秒 "
+                    f"({', '.join(f'{r.agent}:{r.status}/{r.seconds:.2f}s' for r in results)})")
+        return self.merge(results)
+
+    def shutdown(self) -> None:
+        """关闭线程池（不等待仍在执行的子请求）"""
+        self._executor.shutdown(wait=False)
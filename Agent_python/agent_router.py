@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 默认的路由关键词配置文件
+DEFAULT_ROUTER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_keywords.json")
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机：构建一次，之后对任意文本一遍扫描找出全部模式的出现位置
+    """
+
+    def __init__(self, patterns: List[str]):
+        """
+        构建自动机
+
+        Args:
+            patterns: 模式串列表（空串会被忽略）
+        """
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            if pattern:
+                self._insert(pattern, index)
+        self._link()
+
+    def _insert(self, pattern: str, index: int) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._out[state] += (index,)
+
+    def _link(self) -> None:
+        """按层次构建失败指针，并把失败链上的输出合并到每个状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        扫描文本
+
+        Args:
+            text: 待匹配文本
+
+        Yields:
+            Tuple[int, int]: (匹配结束位置, 模式序号)
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield position, index
+
+
+@dataclass
+class RouteDecision:
+    """一次路由的结果及得分明细"""
+    agent: str
+    score: float
+    scores: Dict[str, float]
+    matches: Dict[str, List[Tuple[str, float]]] = field(default_factory=dict)
+    fallback: bool = False
+    source: str = "keyword"  # keyword 或 classifier
+    confidence: Optional[float] = None  # 分类器的置信度（未使用分类器时为None）
+
+    def breakdown(self) -> str:
+        """生成用于日志的得分明细"""
+        parts = [self.source + (f"({self.confidence:.2f})" if self.confidence is not None else "")]
+        for agent, score in self.scores.items():
+            hits = ", ".join(f"{keyword}×{weight:g}" for keyword, weight in self.matches.get(agent, []))
+            parts.append(f"{agent}={score:g}" + (f" [{hits}]" if hits else ""))
+        return "; ".join(parts)
+
+
+class KeywordRouter:
+    """
+    基于加权关键词的请求路由：
+    - 全部Agent的关键词编译进同一个 Aho-Corasick 自动机，一次扫描输入即可为所有Agent打分
+    - 每个关键词在一次请求中最多计分一次（与逐个 `keyword in text` 判断的语义一致），得分为命中关键词的权重之和
+    - 最高分为0时使用默认Agent；同分时按配置中Agent的先后顺序选择
+    """
+
+    def __init__(self, routes: Dict[str, Dict[str, float]], default_agent: str):
+        """
+        编译路由
+
+        Args:
+            routes: Agent名称到 {关键词: 权重} 的映射（保持配置中的顺序）
+            default_agent: 没有关键词命中时使用的Agent
+        """
+        self.agents = list(routes)
+        self.default_agent = default_agent
+        # 同一关键词可以属于多个Agent
+        targets: Dict[str, List[Tuple[str, float]]] = {}
+        for agent, keywords in routes.items():
+            for keyword, weight in keywords.items():
+                targets.setdefault(keyword.lower(), []).append((agent, float(weight)))
+        self._keywords = list(targets)
+        self._targets = [targets[keyword] for keyword in self._keywords]
+        self._automaton = AhoCorasick(self._keywords)
+
+    @classmethod
+    def from_config(cls, path: Optional[str] = None) -> "KeywordRouter":
+        """
+        从 JSON 配置文件加载路由，格式为
+        {"default_agent": "...", "agents": {"<agent>": {"<关键词>": <权重>, ...}, ...}}
+
+        Args:
+            path: 配置文件路径，默认为 ROUTER_CONFIG 环境变量或模块旁的 router_keywords.json
+
+        Returns:
+            KeywordRouter: 编译好的路由
+        """
+        path = path or os.getenv("ROUTER_CONFIG") or DEFAULT_ROUTER_CONFIG
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        routes = config["agents"]
+        router = cls(routes, config.get("default_agent", next(iter(routes))))
+        logger.info(f"从 {path} 加载路由关键词 {len(router._keywords)} 个")
+        return router
+
+    def route(self, text: str) -> RouteDecision:
+        """
+        为所有Agent打分并选择得分最高的Agent
+
+        Args:
+            text: 用户输入
+
+        Returns:
+            RouteDecision: 路由结果及得分明细
+        """
+        scores = {agent: 0.0 for agent in self.agents}
+        matches: Dict[str, List[Tuple[str, float]]] = {}
+        seen = set()
+        for _, index in self._automaton.iter_matches(text.lower()):
+            if index in seen:
+                continue
+            seen.add(index)
+            keyword = self._keywords[index]
+            for agent, weight in self._targets[index]:
+                scores[agent] += weight
+                matches.setdefault(agent, []).append((keyword, weight))
+        best = max(scores, key=scores.get) if scores else self.default_agent
+        if not scores or scores[best] <= 0:
+            return RouteDecision(self.default_agent, 0.0, scores, matches, fallback=True)
+        return RouteDecision(best, scores[best], scores, matches)
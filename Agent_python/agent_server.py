@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多Agent系统的 HTTP/JSON 服务（基于标准库 asyncio，支持 keep-alive 与 SSE 流式响应）
+
+接口：
+    POST /v1/chat          {"user_id": "u1", "message": "...", "deadline": 秒, "priority": "interactive"}
+                           -> {"request_id", "user_id", "response", "priority", "degraded", "elapsed"}
+                           deadline（也可用 X-Deadline-Ms 头）与 priority 可省略；系统过载时返回 503、
+                           Retry-After 头及降级回复（"degraded": true）
+    POST /v1/chat/stream   同上，以 server-sent events 返回：accepted、（等待期间的心跳注释）、message、done
+    GET  /healthz          服务状态
+    GET  /v1/stats         请求统计（含准入控制的各类别排队统计）
+    GET  /metrics          Prometheus 文本格式的请求与准入统计
+
+用法示例：
+    python agent_server.py --port 8080 --timeout 60
+    python agent_server.py --port 8080 --workers 128 --timeout 60
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import asyncio
+import argparse
+import logging
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from storage_layout import check_user_id
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 64 * 1024
+
+
+def admission_workers(admission: Any = None) -> int:
+    """
+    让准入控制看到全部等待中请求所需的线程数：准入容量与各类别排队上限之和
+
+    Args:
+        admission: AdmissionController，默认为进程内共享的实例
+
+    Returns:
+        int: 线程数
+    """
+    if admission is None:
+        # 动态导入准入控制模块，容量在进程内共享
+        from admission import AdmissionController
+        admission = AdmissionController.shared()
+    return admission.capacity + sum(c.queue_limit for c in admission.classes.values())
+
+
+class HttpError(Exception):
+    """可直接转换为 HTTP 错误响应的异常"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class HttpRequest:
+    """解析后的 HTTP 请求"""
+    method: str
+    path: str
+    version: str
+    headers: Dict[str, str]
+    body: bytes = b""
+    query: Dict[str, str] = field(default_factory=dict)
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Dict[str, Any]:
+        """解析 JSON 请求体"""
+        try:
+            payload = json.loads(self.body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(400, "请求体不是合法的 JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "请求体必须是 JSON 对象")
+        return payload
+
+
+async def read_http_request(reader: asyncio.StreamReader, max_body: int) -> Optional[HttpRequest]:
+    """
+    从连接中读取一个 HTTP/1.x 请求（请求体须以 Content-Length 给出）
+
+    Args:
+        reader: 连接的读取端（limit 即请求头的最大字节数）
+        max_body: 请求体最大字节数
+
+    Returns:
+        HttpRequest: 解析后的请求；连接在请求之间被关闭时返回None
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "请求头过大")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "请求行格式错误")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "不支持分块编码的请求体，请提供 Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Content-Length 格式错误")
+    if length < 0 or length > max_body:
+        raise HttpError(413, f"请求体超过 {max_body} 字节")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+    return HttpRequest(method.upper(), url.path, version.strip(), headers, body, query)
+
+
+def write_http_head(writer: asyncio.StreamWriter, status: int, headers: Dict[str, str], keep_alive: bool,
+                    keepalive_timeout: float = 15.0) -> None:
+    """
+    写出响应行与响应头
+
+    Args:
+        writer: 连接的写入端
+        status: 状态码
+        headers: 响应头（Connection/Keep-Alive 由 keep_alive 决定）
+        keep_alive: 响应后是否保持连接
+        keepalive_timeout: keep-alive 连接的空闲超时（秒）
+    """
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    headers = dict(headers, Connection="keep-alive" if keep_alive else "close")
+    if keep_alive:
+        headers["Keep-Alive"] = f"timeout={int(keepalive_timeout)}"
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+class AgentServer:
+    """
+    包装 MultiAgentSystem.handle_request 的 asyncio HTTP 服务：
+    - 每个请求可指定用户ID（请求体 user_id 或 X-User-Id 头），不同用户的请求在线程池中并发处理
+    - 同时执行的请求数受 workers 限制，排队请求数受 max_queue 限制，超出时立即返回 503；
+      线程池中的请求再经过系统的准入控制（按优先级类别排队，过载时返回带 Retry-After 的 503 与降级回复），
+      workers 默认为准入容量与各类别排队上限之和（见 admission_workers），这样优先级才能作用于全部等待中的请求；
+      显式指定的 workers 小于该值时启动时给出警告
+    - 每个请求有超时（超时返回 504；已开始执行的请求无法中断，会在后台执行完毕并继续占用执行槽位）
+    - 关闭时先停止接受新连接与新请求，等待进行中的请求完成（最长 drain_timeout 秒）后再保存记忆库
+    """
+
+    def __init__(self, system: Any, host: str = "127.0.0.1", port: int = 8080, workers: Optional[int] = None,
+                 max_queue: Optional[int] = None, request_timeout: float = 60.0, keepalive_timeout: float = 15.0,
+                 max_body: int = 1 << 20, heartbeat: float = 10.0):
+        """
+        初始化服务
+
+        Args:
+            system: MultiAgentSystem 实例
+            host: 监听地址
+            port: 监听端口（0 表示随机端口）
+            workers: 同时执行的请求数上限（线程池大小），默认由系统的准入控制推算（见 admission_workers）
+            max_queue: 等待执行的请求数上限，默认为 workers 的 4 倍
+            request_timeout: 单个请求的超时（秒），包括排队时间
+            keepalive_timeout: keep-alive 连接的空闲超时（秒）
+            max_body: 请求体最大字节数
+            heartbeat: SSE 等待期间发送心跳注释的间隔（秒）
+        """
+        self.system = system
+        self.host = host
+        self.port = port
+        self.admission_workers = admission_workers(getattr(system, "admission", None))
+        self.workers = workers if workers is not None else self.admission_workers
+        self.max_queue = max_queue if max_queue is not None else 4 * self.workers
+        self.request_timeout = request_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body = max_body
+        self.heartbeat = heartbeat
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent-server")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+        self._draining = False
+        self._idle: Optional[asyncio.Event] = None
+        self._waiting = 0  # 等待执行槽位的请求数
+        self._running = 0  # 正在线程池中执行的请求数（含已超时但仍在执行的）
+        self._inflight = 0  # 尚未返回响应的请求数
+        self.stats: Dict[str, Any] = {
+            "requests": 0,
+            "responses": {},
+            "timeouts": 0,
+            "rejected": 0,
+            "degraded": 0,
+            "errors": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+        }
+
+    async def start(self) -> "AgentServer":
+        """
+        开始监听
+
+        Returns:
+            AgentServer: self，便于链式调用
+        """
+        self._slots = asyncio.Semaphore(self.workers)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.workers < self.admission_workers:
+            logger.warning(f"workers={self.workers} 小于准入容量与排队上限之和 {self.admission_workers}，"
+                           f"超出的请求在准入控制之外排队，优先级对它们不起作用")
+        logger.info(f"服务已启动: http://{self.host}:{self.port} (workers={self.workers}, "
+                    f"max_queue={self.max_queue}, timeout={self.request_timeout:g}s)")
+        return self
+
+    async def shutdown(self, drain_timeout: float = 30.0) -> None:
+        """
+        平滑关闭：停止接受新连接与新请求，等待进行中的请求完成后关闭连接并保存记忆库
+
+        Args:
+            drain_timeout: 等待进行中的请求的最长时间（秒）
+        """
+        if self._draining:
+            return
+        self._draining = True
+        logger.info(f"开始关闭服务，等待 {self._inflight} 个进行中的请求（最多 {drain_timeout:g} 秒）")
+        if self._server is not None:
+            self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"等待超时，仍有 {self._inflight} 个请求未完成、{self._running} 个请求在执行")
+        for writer in list(self._connections):
+            writer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+        # 已超时的请求仍可能在执行，等它们结束后再保存记忆库，避免丢失写入
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+        self.system.shutdown()
+        logger.info("服务已关闭")
+
+    def _update_idle(self) -> None:
+        if self._inflight == 0 and self._running == 0:
+            self._idle.set()
+        else:
+            self._idle.clear()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while not self._draining:
+                try:
+                    request = await asyncio.wait_for(read_http_request(reader, self.max_body), self.keepalive_timeout)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                if not await self._handle_request(request, writer):
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"处理连接时出错: {e}")
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _handle_request(self, request: HttpRequest, writer: asyncio.StreamWriter) -> bool:
+        """
+        处理一个请求
+
+        Returns:
+            bool: 连接是否可以继续使用（keep-alive）
+        """
+        keep_alive = request.keep_alive and not self._draining
+        route = (request.method, request.path)
+        if route == ("GET", "/healthz"):
+            return await self._send_json(writer, 503 if self._draining else 200, self.health(), keep_alive)
+        if route == ("GET", "/v1/stats"):
+            return await self._send_json(writer, 200, self.get_stats(), keep_alive)
+        if route == ("GET", "/metrics"):
+            body = self.render_metrics().encode("utf-8")
+            self._write_head(writer, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                                           "Content-Length": str(len(body))}, keep_alive)
+            writer.write(body)
+            self._record_status(200)
+            await writer.drain()
+            return keep_alive
+        if request.path not in ("/v1/chat", "/v1/chat/stream"):
+            return await self._send_json(writer, 404, {"error": "未找到"}, keep_alive)
+        if request.method != "POST":
+            return await self._send_json(writer, 405, {"error": "只支持 POST"}, keep_alive)
+
+        self.stats["requests"] += 1
+        self._inflight += 1
+        self._update_idle()
+        started = time.monotonic()
+        try:
+            try:
+                message, user_id = self._parse_chat(request)
+                deadline, priority = self._parse_admission(request)
+            except HttpError as e:
+                return await self._send_json(writer, e.status, {"error": e.message}, keep_alive)
+            if request.path == "/v1/chat/stream":
+                return await self._stream_chat(request, writer, message, user_id, deadline, priority, started,
+                                               keep_alive)
+            try:
+                outcome = await self._process(message, user_id, deadline, priority)
+            except HttpError as e:
+                return await self._send_json(writer, e.status, {"error": e.message, "request_id": request.request_id},
+                                             keep_alive)
+            elapsed = time.monotonic() - started
+            payload = {"request_id": request.request_id, "user_id": user_id, "response": outcome.response,
+                       "priority": outcome.priority, "degraded": outcome.degraded, "elapsed": round(elapsed, 3)}
+            if outcome.degraded:
+                payload.update(reason=outcome.reason, retry_after=round(outcome.retry_after, 3))
+                return await self._send_json(writer, 503, payload, keep_alive, request.request_id,
+                                             {"Retry-After": str(max(1, round(outcome.retry_after)))})
+            return await self._send_json(writer, 200, payload, keep_alive, request.request_id)
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats["latency_seconds_total"] += elapsed
+            self.stats["latency_seconds_max"] = max(self.stats["latency_seconds_max"], elapsed)
+            self._inflight -= 1
+            self._update_idle()
+
+    def _parse_chat(self, request: HttpRequest) -> Tuple[str, str]:
+        """取出消息与用户ID"""
+        payload = request.json()
+        message = payload.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HttpError(400, "缺少 message")
+        user_id = str(payload.get("user_id") or request.headers.get("x-user-id") or self.system.user_id)
+        # 用户ID会用于记忆库文件名，与存储使用同一校验
+        try:
+            check_user_id(user_id)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        return message.strip(), user_id
+
+    def _parse_admission(self, request: HttpRequest) -> Tuple[float, Optional[str]]:
+        """
+        取出开始执行的截止时间（请求体 deadline 秒数或 X-Deadline-Ms 头，不超过请求超时）与优先级类别
+        """
+        payload = request.json()
+        deadline = payload.get("deadline")
+        try:
+            if deadline is None and "x-deadline-ms" in request.headers:
+                deadline = float(request.headers["x-deadline-ms"]) / 1000.0
+            deadline = self.request_timeout if deadline is None else min(float(deadline), self.request_timeout)
+        except (TypeError, ValueError):
+            raise HttpError(400, "deadline 格式错误")
+        if deadline <= 0:
+            raise HttpError(400, "deadline 必须大于0")
+        priority = payload.get("priority")
+        admission = getattr(self.system, "admission", None)
+        if priority is not None and (admission is None or priority not in admission.classes):
+            raise HttpError(400, f"未知的优先级类别: {priority}")
+        return deadline, priority
+
+    async def _process(self, message: str, user_id: str, deadline: Optional[float] = None,
+                       priority: Optional[str] = None) -> Any:
+        """
+        在线程池中执行请求（含排队与超时控制）
+
+        Returns:
+            AdmissionOutcome: 处理结果（系统过载时为降级回复）
+        """
+        if self._draining:
+            self.stats["rejected"] += 1
+            raise HttpError(503, "服务正在关闭")
+        if self._waiting >= self.max_queue and self._slots.locked():
+            self.stats["rejected"] += 1
+            raise HttpError(503, "服务繁忙，请稍后重试")
+        try:
+            outcome = await asyncio.wait_for(self._execute(message, user_id, deadline, priority), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HttpError(504, f"请求处理超时（{self.request_timeout:g}秒）")
+        except HttpError:
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"处理用户 {user_id} 的请求时出错: {e}")
+            raise HttpError(500, f"处理请求时出错: {e}")
+        if outcome.degraded:
+            self.stats["degraded"] += 1
+        return outcome
+
+    async def _execute(self, message: str, user_id: str, deadline: Optional[float],
+                       priority: Optional[str]) -> Any:
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        loop = asyncio.get_running_loop()
+        try:
+            # 在线程池中排队的时间也计入准入控制的截止时间
+            deadline_at = None if deadline is None else time.monotonic() + deadline
+            future = loop.run_in_executor(self._executor, self._handle_in_thread, message, user_id, deadline_at,
+                                          priority)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._running += 1
+        self._update_idle()
+
+        def release(_: Any) -> None:
+            # 执行槽位在线程真正结束时才释放，超时的请求不会让并发数超过 workers
+            self._running -= 1
+            self._slots.release()
+            self._update_idle()
+
+        future.add_done_callback(release)
+        # 超时取消的只是等待，而不是线程中的执行
+        return await asyncio.shield(future)
+
+    def _handle_in_thread(self, message: str, user_id: str, deadline_at: Optional[float],
+                          priority: Optional[str]) -> Any:
+        deadline = None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+        return self.system.handle_request(message, user_id, deadline=deadline, priority=priority)
+
+    async def _stream_chat(self, request: HttpRequest, writer: asyncio.StreamWriter, message: str, user_id: str,
+                           deadline: Optional[float], priority: Optional[str], started: float,
+                           keep_alive: bool) -> bool:
+        """以 SSE 返回结果：HTTP/1.1 使用分块编码以保持连接，HTTP/1.0 发送完毕后关闭连接"""
+        chunked = request.version != "HTTP/1.0"
+        keep_alive = keep_alive and chunked
+        headers = {"Content-Type": "text/event-stream; charset=utf-8", "Cache-Control": "no-cache",
+                   "X-Request-Id": request.request_id}
+        if chunked:
+            headers["Transfer-Encoding"] = "chunked"
+        self._write_head(writer, 200, headers, keep_alive)
+        self._record_status(200)
+
+        async def send(data: str) -> None:
+            payload = data.encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(payload), payload) if chunked else payload)
+            await writer.drain()
+
+        def event(name: str, data: Dict[str, Any]) -> str:
+            return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        await send(event("accepted", {"request_id": request.request_id, "user_id": user_id}))
+        task = asyncio.ensure_future(self._process(message, user_id, deadline, priority))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.heartbeat)
+                if done:
+                    break
+                await send(": keep-alive\n\n")
+            try:
+                outcome = task.result()
+                data = {"response": outcome.response, "priority": outcome.priority, "degraded": outcome.degraded}
+                if outcome.degraded:
+                    data.update(reason=outcome.reason, retry_after=round(outcome.retry_after, 3))
+                await send(event("message", data))
+            except HttpError as e:
+                await send(event("error", {"status": e.status, "error": e.message}))
+            await send(event("done", {"elapsed": round(time.monotonic() - started, 3)}))
+            if chunked:
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except ConnectionError:
+            # 客户端已断开，请求在后台执行完毕（结果仍写入记忆库）
+            return False
+        return keep_alive
+
+    def _write_head(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str],
+                    keep_alive: bool) -> None:
+        write_http_head(writer, status, headers, keep_alive, self.keepalive_timeout)
+
+    def _record_status(self, status: int) -> None:
+        responses = self.stats["responses"]
+        responses[status] = responses.get(status, 0) + 1
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                         keep_alive: bool, request_id: Optional[str] = None,
+                         extra_headers: Optional[Dict[str, str]] = None) -> bool:
+        # 处理期间开始关闭的连接不再保持
+        keep_alive = keep_alive and not self._draining
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body))}
+        if request_id:
+            headers["X-Request-Id"] = request_id
+        if extra_headers:
+            headers.update(extra_headers)
+        self._write_head(writer, status, headers, keep_alive)
+        writer.write(body)
+        self._record_status(status)
+        await writer.drain()
+        return keep_alive
+
+    def health(self) -> Dict[str, Any]:
+        """服务状态"""
+        return {"status": "draining" if self._draining else "ok", "inflight": self._inflight,
+                "running": self._running, "waiting": self._waiting, "connections": len(self._connections)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """请求统计（含当前状态）"""
+        stats = dict(self.stats, responses={str(k): v for k, v in self.stats["responses"].items()})
+        stats.update(self.health())
+        admission = getattr(self.system, "admission", None)
+        if admission is not None:
+            stats["admission"] = admission.get_stats()
+        return stats
+
+    def render_metrics(self, prefix: str = "agent_server") -> str:
+        """
+        以 Prometheus 文本格式导出请求统计与准入统计
+
+        Args:
+            prefix: 请求统计的指标名前缀
+
+        Returns:
+            str: 指标文本
+        """
+        lines = [f"{prefix}_{key}_total {self.stats[key]}"
+                 for key in ("requests", "timeouts", "rejected", "degraded", "errors")]
+        lines += [f'{prefix}_responses_total{{status="{status}"}} {count}'
+                  for status, count in sorted(self.stats["responses"].items())]
+        lines += [f"{prefix}_latency_seconds_total {self.stats['latency_seconds_total']:.6f}",
+                  f"{prefix}_latency_seconds_max {self.stats['latency_seconds_max']:.6f}",
+                  f"{prefix}_inflight {self._inflight}", f"{prefix}_running {self._running}",
+                  f"{prefix}_waiting {self._waiting}"]
+        text = "\n".join(lines) + "\n"
+        admission = getattr(self.system, "admission", None)
+        if admission is not None:
+            text += admission.render_prometheus()
+        return text
+
+
+async def serve(system: Any, drain_timeout: float = 30.0, **kwargs: Any) -> None:
+    """
+    运行服务直到收到 SIGINT/SIGTERM，然后平滑关闭
+
+    Args:
+        system: MultiAgentSystem 实例
+        drain_timeout: 关闭时等待进行中请求的最长时间（秒）
+        **kwargs: 传给 AgentServer 的参数
+    """
+    server = await AgentServer(system, **kwargs).start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows 下依赖 KeyboardInterrupt
+    try:
+        await stop.wait()
+    finally:
+        await server.shutdown(drain_timeout)
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="多Agent系统 HTTP 服务")
+    parser.add_argument("--host", default=os.getenv("AGENT_SERVER_HOST", "127.0.0.1"), help="监听地址")
+    parser.add_argument("--port", type=int, default=int(os.getenv("AGENT_SERVER_PORT", "8080")), help="监听端口")
+    parser.add_argument("--workers", type=int, help="同时执行的请求数上限，默认为准入容量与各类别排队上限之和")
+    parser.add_argument("--max-queue", type=int, help="排队请求数上限，默认为 workers 的 4 倍")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求的超时（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="关闭时等待进行中请求的最长时间（秒）")
+    parser.add_argument("--user-id", default="default", help="未指定用户ID的请求使用的用户")
+    parser.add_argument("--record", help="将处理的请求录制到 cassette 文件（见 workload_replay.py）")
+    args = parser.parse_args(argv)
+
+    from multi_agent_system import MultiAgentSystem
+    system = MultiAgentSystem(user_id=args.user_id)
+    recorder = None
+    if args.record:
+        from workload_replay import WorkloadRecorder
+        recorder = WorkloadRecorder(system, args.record).start()
+    try:
+        asyncio.run(serve(system, drain_timeout=args.drain_timeout, host=args.host, port=args.port,
+                          workers=args.workers, max_queue=args.max_queue, request_timeout=args.timeout))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recorder is not None:
+            recorder.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
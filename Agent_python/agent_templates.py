@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import logging
+import threading
+import contextvars
+from collections.abc import Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import utils
+from agent_delegation import AgentDelegator, run_nested
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 当前请求绑定的Agent（MultiAgentSystem 处理请求时设置），供调用其他Agent的工具使用
+_current_agents: contextvars.ContextVar = contextvars.ContextVar("bound_agents", default=None)
+
+
+@contextmanager
+def use_agents(agents: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    在当前上下文中使用指定的一组Agent：调用其他Agent的工具（call_*_agent、delegate_tasks）会调用这些Agent
+
+    Args:
+        agents: Agent名称到 base_agent 实例的映射
+
+    Yields:
+        Dict[str, Any]: agents
+    """
+    token = _current_agents.set(agents)
+    try:
+        yield agents
+    finally:
+        _current_agents.reset(token)
+
+
+class _CurrentAgents(Mapping):
+    """当前上下文中绑定的Agent；未绑定时为目录中的原型Agent"""
+
+    def __init__(self, catalog: "AgentCatalog"):
+        self._catalog = catalog
+
+    def _agents(self) -> Dict[str, Any]:
+        return _current_agents.get() or self._catalog.prototypes
+
+    def __getitem__(self, key: str) -> Any:
+        return self._agents()[key]
+
+    def __iter__(self):
+        return iter(self._agents())
+
+    def __len__(self) -> int:
+        return len(self._agents())
+
+
+@dataclass(frozen=True)
+class AgentTemplate:
+    """
+    编译好的不可变Agent定义：名称、描述、工具、模型配置及由它们生成的原型Agent（含工具规格与 prompt 前缀）。
+    bind() 浅拷贝原型Agent，工具、工具规格、模型与 prompt 前缀均与模板共享，
+    绑定得到的Agent不应再调用 add_tool（会修改共享的模型）
+    """
+    key: str
+    name: str
+    description: str
+    tools: Tuple[Any, ...]
+    model_name: str = "qwen-plus"
+    model_options: Mapping = field(default_factory=dict)
+    max_tool_iterations: int = 3
+    shared_context_size: int = 4
+    long_term_top_k: int = 3
+    prototype: Any = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "tools", tuple(self.tools))
+        object.__setattr__(self, "model_options", MappingProxyType(dict(self.model_options)))
+        model = utils.llm_model(self.model_name, tools=[tool.to_tool_spec() for tool in self.tools],
+                                **self.model_options)
+        object.__setattr__(self, "prototype", utils.base_agent(
+            name=self.name,
+            description=self.description,
+            model=model,
+            tools=list(self.tools),
+            max_tool_iterations=self.max_tool_iterations,
+            shared_context_size=self.shared_context_size,
+            long_term_top_k=self.long_term_top_k
+        ))
+
+    @property
+    def tool_specs(self) -> Tuple[Dict[str, Any], ...]:
+        """工具规格（与 base_tool.to_tool_spec 相同的结构）"""
+        return tuple(self.prototype.model.tools)
+
+    @property
+    def prompt_head(self) -> Dict[str, str]:
+        """prompt 前缀（系统消息）"""
+        return self.prototype.prompt_head
+
+    def bind(self, memory: Optional["utils.ContextMemory"] = None) -> "utils.base_agent":
+        """
+        由模板得到一个Agent实例（只分配实例本身）
+
+        Args:
+            memory: 显式绑定的记忆库；为None时使用当前用户会话的记忆库
+
+        Returns:
+            base_agent: Agent实例
+        """
+        agent = copy.copy(self.prototype)
+        agent._memory = memory
+        return agent
+
+
+class AgentCatalog:
+    """
+    进程内共享的Agent模板目录：相同配置只编译一次，
+    工具与其闭包、模型配置、question_finder 的导入及数据库管理器都只创建一次，
+    各 MultiAgentSystem 实例（每个学生/会话）只需 bind() 出自己的Agent实例
+    """
+
+    _instances: Dict[tuple, "AgentCatalog"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, shared_context_size: int = 4, nested_context_size: int = 6, delegate_timeout: float = 60.0,
+                 delegate_workers: Optional[int] = None):
+        """
+        编译全部Agent模板
+
+        Args:
+            shared_context_size: 各Agent构造prompt时，除自身记录外附带的最近共享记忆条数
+            nested_context_size: 调用其他Agent时，子Agent临时记忆库中复制的自身历史记录数量
+            delegate_timeout: delegate_tasks 中每个子请求的超时（秒）
+            delegate_workers: 并发执行子请求的线程数（目录内共享），默认由准入控制容量推算（见 agent_delegation.default_workers）
+        """
+        self.shared_context_size = shared_context_size
+        self.nested_context_size = nested_context_size
+        # 调用其他Agent的工具通过它取得当前请求绑定的Agent
+        self.agents = _CurrentAgents(self)
+        # （不能分派给教秘Agent自身，避免递归调用）
+        self.delegator = AgentDelegator(self.agents, allowed=("teaching", "testing", "parent"),
+                                        max_workers=delegate_workers, timeout=delegate_timeout,
+                                        nested_context_size=nested_context_size)
+        templates = {}
+        for build in (_teaching_template, _testing_template, _secretary_template, _parent_template):
+            template = build(self)
+            templates[template.key] = template
+        self.templates = MappingProxyType(templates)
+        self.prototypes = MappingProxyType({key: template.prototype for key, template in templates.items()})
+        logger.info(f"编译了 {len(templates)} 个Agent模板: {list(templates)}")
+
+    @classmethod
+    def shared(cls, **config: Any) -> "AgentCatalog":
+        """
+        获取指定配置的共享目录（首次调用时编译）
+
+        Args:
+            **config: 传给构造函数的配置
+
+        Returns:
+            AgentCatalog: 共享目录
+        """
+        key = tuple(sorted(config.items()))
+        with cls._instances_lock:
+            catalog = cls._instances.get(key)
+            if catalog is None:
+                catalog = cls._instances[key] = cls(**config)
+        return catalog
+
+    def bind(self, memory: Optional["utils.ContextMemory"] = None) -> Dict[str, "utils.base_agent"]:
+        """
+        由全部模板得到一组Agent实例
+
+        Args:
+            memory: 显式绑定的记忆库；为None时使用当前用户会话的记忆库
+
+        Returns:
+            Dict[str, base_agent]: Agent名称到实例的映射
+        """
+        return {key: template.bind(memory) for key, template in self.templates.items()}
+
+
+def _teaching_template(catalog: "AgentCatalog") -> AgentTemplate:
+    """
+    编译教学Agent模板
+    """
+    # 创建教学工具
+    explain_concept_tool = utils.base_tool(
+        tool_name="explain_concept",
+        tool_description="解释数学概念",
+        parameters={
+            "type": "object",
+            "properties": {
+                "concept": {
+                    "type": "string",
+                    "description": "需要解释的数学概念，如'勾股定理'、'一元二次方程'"
+                },
+                "difficulty": {
+                    "type": "string",
+                    "description": "解释难度等级: 初级、中级、高级",
+                    "enum": ["初级", "中级", "高级"]
+                }
+            },
+            "required": ["concept"]
+        }
+    )
+
+    # 讲解与例题优先从预编译的知识点索引中取（动态导入，索引在进程内只加载一次），索引中没有的交给模型自行展开
+    def explain_concept_func(concept: str, difficulty: str = "中级") -> str:
+        try:
+            from knowledge_index import KnowledgeIndex
+            explanation = KnowledgeIndex.shared().explain(concept, difficulty)
+        except Exception as e:
+            logger.error(f"查找知识点索引失败: {e}")
+            explanation = None
+        return explanation or f"关于'{concept}'的{difficulty}解释: 这是一个重要的数学概念。"
+
+    explain_concept_tool.set_function(explain_concept_func)
+
+    # 创建出例题工具
+    give_example_tool = utils.base_tool(
+        tool_name="give_example",
+        tool_description="给出数学例题",
+        parameters={
+            "type": "object",
+            "properties": {
+                "concept": {
+                    "type": "string",
+                    "description": "相关数学概念"
+                },
+                "difficulty": {
+                    "type": "string",
+                    "description": "题目难度等级: 简单、中等、困难",
+                    "enum": ["简单", "中等", "困难"]
+                }
+            },
+            "required": ["concept"]
+        }
+    )
+
+    def give_example_func(concept: str, difficulty: str = "中等") -> str:
+        try:
+            from knowledge_index import KnowledgeIndex
+            example = KnowledgeIndex.shared().example(concept, difficulty)
+        except Exception as e:
+            logger.error(f"查找知识点索引失败: {e}")
+            example = None
+        return example or f"关于'{concept}'的{difficulty}例题: 请解决相关问题。"
+
+    give_example_tool.set_function(give_example_func)
+
+    return AgentTemplate(
+        key="teaching",
+        name="TeachingAgent",
+        description="教学代理，负责知识点讲解和例题演示",
+        model_name="qwen-plus",
+        tools=[explain_concept_tool, give_example_tool],
+        max_tool_iterations=3,
+        shared_context_size=catalog.shared_context_size
+    )
+
+
+def _testing_template(catalog: "AgentCatalog") -> AgentTemplate:
+    """
+    编译检验Agent模板
+    """
+    # 创建出题工具
+    generate_question_tool = utils.base_tool(
+        tool_name="generate_question",
+        tool_description="生成数学练习题",
+        parameters={
+            "type": "object",
+            "properties": {
+                "topic": {
+                    "type": "string",
+                    "description": "题目主题"
+                },
+                "count": {
+                    "type": "integer",
+                    "description": "题目数量",
+                    "minimum": 1,
+                    "maximum": 10
+                },
+                "difficulty": {
+                    "type": "integer",
+                    "description": "题目难度（1~5，默认3）",
+                    "minimum": 1,
+                    "maximum": 5
+                }
+            },
+            "required": ["topic", "count"]
+        }
+    )
+
+    # 从题库中为当前学生抽取没做过的题目（动态导入，题库在进程内只编译一次），题库中没有的知识点交给模型出题
+    def generate_question_func(topic: str, count: int = 1, difficulty: int = 3) -> str:
+        try:
+            from question_sampler import generate_questions
+            questions = generate_questions(topic, count, difficulty)
+        except Exception as e:
+            logger.error(f"从题库抽题失败: {e}")
+            questions = []
+        if not questions:
+            return f"1. 关于{topic}的练习题，请解答相关问题。"
+        result = "\n".join([f"{i+1}. {q['question_text']}" for i, q in enumerate(questions)])
+        if len(questions) < count:
+            result += f"\n（题库中{topic}的题目已全部做过，只抽到{len(questions)}道）"
+        return result
+
+    generate_question_tool.set_function(generate_question_func)
+
+    # 创建评判答案工具
+    evaluate_answer_tool = utils.base_tool(
+        tool_name="evaluate_answer",
+        tool_description="评判用户答案的正确性",
+        parameters={
+            "type": "object",
+            "properties": {
+                "question": {
+                    "type": "string",
+                    "description": "题目内容"
+                },
+                "user_answer": {
+                    "type": "string",
+                    "description": "用户答案"
+                },
+                "correct_answer": {
+                    "type": "string",
+                    "description": "正确答案"
+                }
+            },
+            "required": ["question", "user_answer", "correct_answer"]
+        }
+    )
+
+    def evaluate_answer_func(question: str, user_answer: str, correct_answer: str) -> str:
+        # 简单的字符串匹配评判，实际应用中可以更复杂
+        is_correct = user_answer.strip().lower() == correct_answer.strip().lower()
+        return f"{'正确' if is_correct else '错误'}。{'很好!' if is_correct else f'正确答案是: {correct_answer}'}"
+
+    evaluate_answer_tool.set_function(evaluate_answer_func)
+
+    # 创建作业批改工具
+    grade_homework_tool = utils.base_tool(
+        tool_name="grade_homework",
+        tool_description="批改作业照片",
+        parameters={
+            "type": "object",
+            "properties": {
+                "image_url": {
+                    "type": "string",
+                    "description": "作业照片的url地址"
+                }
+            },
+            "required": ["image_url"]
+        }
+    )
+
+    # 动态导入OCR功能，避免循环依赖
+    def grade_homework_func_wrapper(image_url: str) -> str:
+        try:
+            from ocr import grade_homework_func
+            return grade_homework_func(image_url)
+        except Exception as e:
+            return f"作业批改功能暂时不可用: {str(e)}"
+
+    grade_homework_tool.set_function(grade_homework_func_wrapper)
+
+    # 创建根据知识点查找试题工具
+    try:
+        from question_finder import create_find_questions_by_knowledge_tool
+        find_questions_tool = create_find_questions_by_knowledge_tool()
+    except Exception as e:
+        logger.error(f"创建查找试题工具失败: {e}")
+        find_questions_tool = None
+
+    # 创建检验Agent
+    tools_list = [generate_question_tool, evaluate_answer_tool, grade_homework_tool]
+    if find_questions_tool:
+        tools_list.append(find_questions_tool)
+
+    return AgentTemplate(
+        key="testing",
+        name="TestingAgent",
+        description="检验代理，负责出题和检验学习效果，以及批改作业",
+        model_name="qwen-plus",
+        tools=tools_list,
+        max_tool_iterations=3,
+        shared_context_size=catalog.shared_context_size
+    )
+
+
+def _secretary_template(catalog: "AgentCatalog") -> AgentTemplate:
+    """
+    编译教秘Agent模板
+    """
+    # 创建制定学习计划工具
+    create_study_plan_tool = utils.base_tool(
+        tool_name="create_study_plan",
+        tool_description="创建学习计划",
+        parameters={
+            "type": "object",
+            "properties": {
+                "subject": {
+                    "type": "string",
+                    "description": "学科"
+                },
+                "topics": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "要学习的知识点列表"
+                },
+                "days": {
+                    "type": "integer",
+                    "description": "计划天数"
+                },
+                "daily_minutes": {
+                    "type": "integer",
+                    "description": "每天的学习时间（分钟），默认60"
+                },
+                "durations": {
+                    "type": "object",
+                    "additionalProperties": {"type": "integer"},
+                    "description": "指定个别知识点的学习时间（分钟），如 {\"勾股定理\": 45}"
+                }
+            },
+            "required": ["subject", "topics", "days"]
+        }
+    )
+
+    # 动态导入排程器（依赖numpy），按先修关系和每天的学习时间安排知识点
+    def create_study_plan_func(subject: str, topics: list, days: int, daily_minutes: Optional[int] = None,
+                               durations: Optional[Dict[str, int]] = None) -> str:
+        try:
+            from study_planner import create_study_plan
+            return create_study_plan(subject, topics, days, daily_minutes, durations)
+        except ValueError as e:
+            return f"无法制定学习计划: {str(e)}"
+        except Exception as e:
+            logger.error(f"制定学习计划失败: {e}")
+            return f"学习计划功能暂时不可用: {str(e)}"
+
+    create_study_plan_tool.set_function(create_study_plan_func)
+
+    # 创建调用教学Agent工具
+    call_teaching_agent_tool = utils.base_tool(
+        tool_name="call_teaching_agent",
+        tool_description="调用教学Agent进行知识点讲解",
+        parameters={
+            "type": "object",
+            "properties": {
+                "request": {
+                    "type": "string",
+                    "description": "需要教学Agent处理的请求内容"
+                }
+            },
+            "required": ["request"]
+        }
+    )
+
+    def call_teaching_agent_func(request: str) -> str:
+        # 获取教学Agent并执行请求
+        teaching_agent = catalog.agents.get("teaching")
+        if not teaching_agent:
+            return "错误: 教学Agent不可用"
+        try:
+            response = run_nested(teaching_agent, request, catalog.nested_context_size)
+            return response
+        except Exception as e:
+            return f"调用教学Agent时出错: {str(e)}"
+
+    call_teaching_agent_tool.set_function(call_teaching_agent_func)
+
+    # 创建调用检测Agent工具
+    call_testing_agent_tool = utils.base_tool(
+        tool_name="call_testing_agent",
+        tool_description="调用检测Agent进行练习或测试",
+        parameters={
+            "type": "object",
+            "properties": {
+                "request": {
+                    "type": "string",
+                    "description": "需要检测Agent处理的请求内容"
+                }
+            },
+            "required": ["request"]
+        }
+    )
+
+    def call_testing_agent_func(request: str) -> str:
+        # 获取检测Agent并执行请求
+        testing_agent = catalog.agents.get("testing")
+        if not testing_agent:
+            return "错误: 检测Agent不可用"
+        try:
+            response = run_nested(testing_agent, request, catalog.nested_context_size)
+            return response
+        except Exception as e:
+            return f"调用检测Agent时出错: {str(e)}"
+
+    call_testing_agent_tool.set_function(call_testing_agent_func)
+
+    # 创建并发分派工具：一次提交多个子请求，各Agent同时处理，合并结果返回
+    delegate_tasks_tool = utils.base_tool(
+        tool_name="delegate_tasks",
+        tool_description="同时把多个子请求分派给不同的Agent（如同时讲解知识点和出练习题），返回合并后的结果",
+        parameters={
+            "type": "object",
+            "properties": {
+                "tasks": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "agent": {
+                                "type": "string",
+                                "description": "处理该子请求的Agent: teaching(教学)、testing(检测)、parent(家长报告)",
+                                "enum": ["teaching", "testing", "parent"]
+                            },
+                            "request": {
+                                "type": "string",
+                                "description": "子请求内容"
+                            }
+                        },
+                        "required": ["agent", "request"]
+                    },
+                    "description": "子请求列表"
+                },
+                "timeout": {
+                    "type": "number",
+                    "description": "每个子请求的超时秒数（可选）"
+                }
+            },
+            "required": ["tasks"]
+        }
+    )
+
+    def delegate_tasks_func(tasks: list, timeout: float = None) -> str:
+        tasks = [task for task in tasks or [] if isinstance(task, dict)]
+        if not tasks:
+            return "错误: 没有需要分派的子请求"
+        return catalog.delegator.delegate(tasks, timeout)
+
+    delegate_tasks_tool.set_function(delegate_tasks_func)
+
+    return AgentTemplate(
+        key="secretary",
+        name="SecretaryAgent",
+        description="教秘代理，负责整体教学计划和进度管理",
+        model_name="qwen-plus",
+        tools=[create_study_plan_tool, call_teaching_agent_tool, call_testing_agent_tool, delegate_tasks_tool],
+        max_tool_iterations=2,
+        shared_context_size=catalog.shared_context_size
+    )
+
+
+def _parent_template(catalog: "AgentCatalog") -> AgentTemplate:
+    """
+    编译家长Agent模板
+    """
+    # 创建生成报告工具
+    generate_report_tool = utils.base_tool(
+        tool_name="generate_report",
+        tool_description="生成学习报告",
+        parameters={
+            "type": "object",
+            "properties": {
+                "student_name": {
+                    "type": "string",
+                    "description": "学生姓名"
+                },
+                "subject": {
+                    "type": "string",
+                    "description": "学科"
+                },
+                "topics": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "学习知识点列表"
+                },
+                "performance": {
+                    "type": "string",
+                    "description": "学习表现描述"
+                }
+            },
+            "required": ["student_name", "subject", "topics", "performance"]
+        }
+    )
+
+    def generate_report_func(student_name: str, subject: str, topics: list, performance: str) -> str:
+        report = f"""
+学生 {student_name} 的 {subject} 学习报告:
+
+学习内容:
+- {', '.join(topics)}
+
+学习表现:
+{performance}
+
+建议:
+- 继续保持良好的学习习惯
+- 针对薄弱环节加强练习
+- 定期复习已学知识点
+        """
+        return report.strip()
+
+    generate_report_tool.set_function(generate_report_func)
+
+    return AgentTemplate(
+        key="parent",
+        name="ParentAgent",
+        description="家长代理，负责向家长报告学习情况",
+        model_name="qwen-plus",
+        tools=[generate_report_tool],
+        max_tool_iterations=2,
+        shared_context_size=catalog.shared_context_size
+    )
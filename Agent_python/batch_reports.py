@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+离线批量生成全部学生的家长学习报告
+
+流式读取学生列表，由持久化的历史记录统计每个学生在报告周期内的学习情况，
+在进程池中由家长Agent生成报告（同时进行的 LLM 调用数有上限），结果逐条追加写入 JSONL 文件；
+输出文件同时作为检查点，中断后以相同参数重新运行会跳过已完成的学生：
+文件第一行记录报告周期与影响报告内容的参数，参数不一致时拒绝续跑（未指定周期时沿用检查点中的周期）。
+
+用法示例：
+    python batch_reports.py -o reports/2025-w36.jsonl --since 2025-09-01 --until 2025-09-08 --workers 8 --llm-concurrency 4
+    python batch_reports.py -o reports.jsonl --users students.txt --mode template   # 不调用 LLM，直接套用报告模板
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 将项目根目录添加到Python路径中
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+import utils
+from memory_export import open_storage
+from syllabus import DEFAULT_OUTLINE, load_syllabus
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REPORT_MODES = ("agent", "template")
+# 已完成（重新运行时跳过）的状态
+DONE_STATUSES = ("ok", "no_activity")
+# 记录在检查点头部、续跑时必须一致的参数
+CHECKPOINT_OPTIONS = ("start", "end", "subject", "mode", "outline")
+
+# 工作进程内的状态（由 _init_worker 设置）
+_worker: Dict[str, Any] = {}
+
+
+def load_topics(path: str = DEFAULT_OUTLINE) -> List[str]:
+    """
+    从知识点大纲中读取知识点名称（章节标题与加粗条目中的知识点，见 syllabus.Syllabus）
+
+    Args:
+        path: 大纲文件路径
+
+    Returns:
+        List[str]: 知识点名称，文件不存在时为空列表
+    """
+    return [topic.name for topic in load_syllabus(path).topics]
+
+
+def iter_students(path: Optional[str] = None, storage: Any = None) -> Iterator[Tuple[str, str]]:
+    """
+    流式读取学生列表
+
+    Args:
+        path: 学生列表文件，每行 "用户ID" 或 "用户ID<TAB>姓名"；为None时枚举存储中的全部用户
+        storage: 存储对象（path 为None时使用）
+
+    Returns:
+        Iterator[Tuple[str, str]]: (用户ID, 姓名)
+    """
+    if path is None:
+        for user_id in storage.list_user_ids():
+            yield user_id, user_id
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            user_id, _, name = line.rstrip("\n").partition("\t")
+            if user_id.strip():
+                yield user_id.strip(), name.strip() or user_id.strip()
+
+
+def collect_stats(history: Iterable[Any], topics: List[str]) -> Dict[str, Any]:
+    """
+    统计一段历史记录中的学习情况
+
+    Args:
+        history: 按时间顺序的记忆条目
+        topics: 知识点名称
+
+    Returns:
+        Dict[str, Any]: 记录数、学习天数、提问次数、各Agent/工具的使用次数、判题正确率、作业批改次数及提及最多的知识点
+    """
+    entries = 0
+    days: Set[str] = set()
+    questions = 0
+    agents: Counter = Counter()
+    tools: Counter = Counter()
+    topic_counts: Counter = Counter()
+    correct = wrong = tool_errors = 0
+    for entry in history:
+        entries += 1
+        days.add(entry.timestamp.date().isoformat())
+        content = entry.content if isinstance(entry.content, dict) else {"content": entry.content}
+        role = content.get("role")
+        text = str(content.get("content") or "")
+        agent = (entry.metadata or {}).get("agent")
+        if agent:
+            agents[agent] += 1
+        if role == "user":
+            questions += 1
+            topic_counts.update(topic for topic in topics if topic in text)
+        elif role == "tool":
+            name = content.get("name", "")
+            tools[name] += 1
+            if content.get("status") == "error":
+                tool_errors += 1
+            elif name == "evaluate_answer":
+                if text.startswith("正确"):
+                    correct += 1
+                elif text.startswith("错误"):
+                    wrong += 1
+            elif name in ("explain_concept", "give_example", "generate_question"):
+                topic_counts.update(topic for topic in topics if topic in text)
+    return {
+        "entries": entries,
+        "active_days": len(days),
+        "questions": questions,
+        "agents": dict(agents),
+        "tools": dict(tools),
+        "tool_errors": tool_errors,
+        "answers_correct": correct,
+        "answers_wrong": wrong,
+        "accuracy": round(correct / (correct + wrong), 3) if correct + wrong else None,
+        "homework_graded": tools.get("grade_homework", 0),
+        "topics": [topic for topic, _ in topic_counts.most_common(5)],
+    }
+
+
+def describe_performance(stats: Dict[str, Any]) -> str:
+    """
+    将统计结果整理为学习表现描述
+
+    Args:
+        stats: collect_stats 的结果
+
+    Returns:
+        str: 学习表现描述
+    """
+    parts = [f"本周期共学习 {stats['active_days']} 天，提问 {stats['questions']} 次"]
+    answered = stats["answers_correct"] + stats["answers_wrong"]
+    if answered:
+        parts.append(f"完成判题 {answered} 次，正确率 {stats['accuracy']:.0%}")
+    if stats["homework_graded"]:
+        parts.append(f"批改作业 {stats['homework_graded']} 次")
+    if stats["topics"]:
+        parts.append(f"主要学习了{'、'.join(stats['topics'])}")
+    return "；".join(parts) + "。"
+
+
+def _init_worker(storage_path: str, backend: Optional[str], llm_slots: Any, options: Dict[str, Any]) -> None:
+    """工作进程初始化：打开存储、读取知识点大纲，需要时编译家长Agent模板"""
+    _worker.clear()
+    _worker.update(options)
+    _worker["storage"] = open_storage(storage_path, backend)
+    _worker["topics"] = load_topics(options["outline"])
+    _worker["llm_slots"] = llm_slots
+    from agent_templates import AgentCatalog
+    _worker["template"] = AgentCatalog.shared().templates["parent"]
+
+
+def _generate(user_id: str, name: str) -> Dict[str, Any]:
+    """
+    为一个学生生成报告（在工作进程中执行）
+
+    Returns:
+        Dict[str, Any]: 结果记录（status 为 ok/no_activity/error）
+    """
+    started = time.monotonic()
+    result: Dict[str, Any] = {"user_id": user_id, "name": name, "period": [_worker["start"], _worker["end"]]}
+    try:
+        start = datetime.fromisoformat(_worker["start"])
+        end = datetime.fromisoformat(_worker["end"])
+        stats = collect_stats(_worker["storage"].iter_history(user_id, start=start, end=end), _worker["topics"])
+    except Exception as e:
+        return dict(result, status="error", error=f"读取历史记录失败: {e}", attempts=0,
+                    seconds=round(time.monotonic() - started, 3))
+    result["stats"] = stats
+    if not stats["entries"]:
+        return dict(result, status="no_activity", seconds=round(time.monotonic() - started, 3))
+
+    template = _worker["template"]
+    performance = describe_performance(stats)
+    topics = stats["topics"] or ["（本周期未识别到具体知识点）"]
+    error = ""
+    attempts = 0
+    llm_seconds = 0.0
+    for attempts in range(1, _worker["retries"] + 2):
+        try:
+            if _worker["mode"] == "template":
+                report = template.prototype.get_tool("generate_report").tool_function(
+                    student_name=name, subject=_worker["subject"], topics=topics, performance=performance)
+            else:
+                request = (f"请调用 generate_report 工具，为家长生成学生 {name} 的{_worker['subject']}学习报告，"
+                           f"并根据以下学习数据补充有针对性的建议。\n"
+                           f"学习知识点: {'、'.join(topics)}\n学习表现: {performance}\n"
+                           f"统计数据: {json.dumps(stats, ensure_ascii=False)}")
+                # 报告生成不写入学生的记忆库，使用一次性的记忆库
+                agent = template.bind(memory=utils.ContextMemory(max_memory_size=16))
+                with _worker["llm_slots"]:
+                    llm_started = time.monotonic()
+                    try:
+                        report = agent.run_once(request)
+                    finally:
+                        llm_seconds += time.monotonic() - llm_started
+                if not report or report.startswith("Error:"):
+                    raise RuntimeError(report or "模型未返回内容")
+            return dict(result, status="ok", report=report, attempts=attempts, llm_seconds=round(llm_seconds, 3),
+                        seconds=round(time.monotonic() - started, 3))
+        except Exception as e:
+            error = str(e)
+            if attempts <= _worker["retries"]:
+                time.sleep(_worker["retry_delay"] * (2 ** (attempts - 1)))
+    return dict(result, status="error", error=error, attempts=attempts, llm_seconds=round(llm_seconds, 3),
+                seconds=round(time.monotonic() - started, 3))
+
+
+def read_checkpoint_header(path: str) -> Optional[Dict[str, Any]]:
+    """
+    读取检查点头部记录的参数
+
+    Args:
+        path: 输出文件路径
+
+    Returns:
+        Optional[Dict[str, Any]]: 参数；文件不存在或为空时为None
+
+    Raises:
+        ValueError: 文件中已有记录但没有头部（无法确认参数）
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        line = f.readline()
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        record = {}
+    if record.get("type") != "header":
+        raise ValueError(f"{path} 没有检查点头部，无法确认其报告周期与参数，请使用新的输出文件")
+    return record.get("options", {})
+
+
+def read_checkpoint(path: str) -> Set[str]:
+    """
+    读取已完成的学生（输出文件中状态为 ok/no_activity 的记录）
+
+    Args:
+        path: 输出文件路径
+
+    Returns:
+        Set[str]: 已完成的用户ID
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 中断时写了一半的行
+            if record.get("type") == "header":
+                continue
+            if record.get("status") in DONE_STATUSES:
+                done.add(record.get("user_id"))
+            else:
+                done.discard(record.get("user_id"))
+    return done
+
+
+class BatchReportRunner:
+    """
+    批量报告生成：
+    - 学生列表流式读取，同时提交给进程池的任务数不超过 2 * workers，内存占用与学生总数无关
+    - 统计在工作进程中进行；生成报告时的 LLM 调用受跨进程信号量限制（llm_concurrency）
+    - 每个结果完成后立即追加写入输出文件并刷新；已完成的学生在重新运行时跳过，失败的学生会重试；
+      输出文件的头部记录报告周期等参数，与本次参数不一致时拒绝续跑
+    - 定期输出进度与吞吐量，结束时返回汇总（成功/失败/无学习记录/已跳过、耗时、失败原因）
+    """
+
+    def __init__(self, output: str, storage_path: str = "user_memories", backend: Optional[str] = None,
+                 workers: int = 4, llm_concurrency: int = 2, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, subject: str = "数学", mode: str = "agent", retries: int = 2,
+                 retry_delay: float = 2.0, outline: str = DEFAULT_OUTLINE, progress_every: int = 100):
+        """
+        初始化批量报告生成
+
+        Args:
+            output: 输出文件（JSONL，同时作为检查点）
+            storage_path: 记忆库存储目录
+            backend: 存储后端（jsonl/sqlite），默认读取 MEMORY_STORAGE_BACKEND
+            workers: 工作进程数
+            llm_concurrency: 同时进行的 LLM 调用数上限（全部工作进程合计）
+            start: 报告周期起始时间（包含），默认沿用检查点中的周期，没有检查点时为 end 之前 7 天
+            end: 报告周期结束时间（不包含），默认沿用检查点中的周期，没有检查点时为当前时间
+            subject: 学科
+            mode: agent 由家长Agent（LLM）生成，template 直接套用报告模板
+            retries: 生成失败时的重试次数
+            retry_delay: 首次重试前的等待时间（秒），之后每次加倍
+            outline: 统计知识点使用的大纲文件
+            progress_every: 每完成多少个学生输出一次进度
+        """
+        if mode not in REPORT_MODES:
+            raise ValueError(f"mode must be one of {REPORT_MODES}, got {mode!r}")
+        self.output = output
+        self.storage_path = storage_path
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.end = end or datetime.now()
+        self.start = start or self.end - timedelta(days=7)
+        self.progress_every = max(1, progress_every)
+        self.default_period = start is None and end is None
+        self.options = {"start": self.start.isoformat(), "end": self.end.isoformat(), "subject": subject,
+                        "mode": mode, "retries": max(0, retries), "retry_delay": retry_delay, "outline": outline}
+
+    def run(self, students: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        为学生列表生成报告
+
+        Args:
+            students: (用户ID, 姓名) 的可迭代对象（可为生成器）
+
+        Returns:
+            Dict[str, Any]: 汇总
+
+        Raises:
+            ValueError: 检查点的报告周期或参数与本次不一致
+        """
+        header = read_checkpoint_header(self.output)
+        if header is not None:
+            if self.default_period:
+                self.options.update(start=header.get("start"), end=header.get("end"))
+            changed = [key for key in CHECKPOINT_OPTIONS if header.get(key) != self.options[key]]
+            if changed:
+                raise ValueError(f"{self.output} 的检查点参数与本次不一致（{'、'.join(changed)}），"
+                                 f"请使用相同参数或新的输出文件")
+        done = read_checkpoint(self.output)
+        summary: Dict[str, Any] = {"ok": 0, "error": 0, "no_activity": 0, "resumed": 0}
+        failures: Counter = Counter()
+        generation_seconds: List[float] = []
+        directory = os.path.dirname(os.path.abspath(self.output))
+        os.makedirs(directory, exist_ok=True)
+        context = multiprocessing.get_context()
+        llm_slots = context.BoundedSemaphore(self.llm_concurrency)
+        started = time.monotonic()
+        logger.info(f"开始生成报告: 周期 {self.options['start']} ~ {self.options['end']}，{self.workers} 个进程，"
+                    f"LLM 并发 {self.llm_concurrency}，已完成 {len(done)} 名学生")
+
+        with open(self.output, "a+", encoding="utf-8") as out, \
+                ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                    initargs=(self.storage_path, self.backend, llm_slots, self.options)) as executor:
+            # 上次中断时可能写了半行，先补上换行，避免与新记录连在一起
+            if out.tell() > 0:
+                out.seek(out.tell() - 1)
+                if out.read(1) != "\n":
+                    out.write("\n")
+            if header is None:
+                out.write(json.dumps({"type": "header", "options": {key: self.options[key] for key in CHECKPOINT_OPTIONS}},
+                                     ensure_ascii=False) + "\n")
+                out.flush()
+
+            def record(result: Dict[str, Any]) -> None:
+                out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                summary[result["status"]] += 1
+                if result["status"] == "error":
+                    failures[result.get("error", "")[:80]] += 1
+                elif result["status"] == "ok":
+                    generation_seconds.append(result["seconds"])
+                completed = summary["ok"] + summary["error"] + summary["no_activity"]
+                if completed % self.progress_every == 0:
+                    elapsed = time.monotonic() - started
+                    logger.info(f"已完成 {completed} 名学生（成功 {summary['ok']}，失败 {summary['error']}，"
+                                f"无学习记录 {summary['no_activity']}），{completed / elapsed:.2f} 名/秒")
+
+            pending = set()
+            try:
+                for user_id, name in students:
+                    if user_id in done:
+                        summary["resumed"] += 1
+                        continue
+                    done.add(user_id)  # 学生列表中重复出现的学生只处理一次
+                    pending.add(executor.submit(_generate, user_id, name))
+                    if len(pending) >= 2 * self.workers:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            record(future.result())
+                for future in wait(pending).done:
+                    record(future.result())
+                pending = set()
+            except KeyboardInterrupt:
+                logger.warning("已中断，已写入的结果会在下次运行时跳过")
+                for future in pending:
+                    future.cancel()
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        elapsed = time.monotonic() - started
+        processed = summary["ok"] + summary["error"] + summary["no_activity"]
+        generation_seconds.sort()
+        summary.update(
+            processed=processed,
+            seconds=round(elapsed, 3),
+            throughput=round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+            report_seconds_mean=round(sum(generation_seconds) / len(generation_seconds), 3) if generation_seconds else None,
+            report_seconds_p95=generation_seconds[int(0.95 * (len(generation_seconds) - 1))] if generation_seconds else None,
+            failures=dict(failures.most_common(10)),
+        )
+        logger.info(f"报告生成完成: 处理 {processed} 名学生（成功 {summary['ok']}，失败 {summary['error']}，"
+                    f"无学习记录 {summary['no_activity']}，此前已完成 {summary['resumed']}），"
+                    f"耗时 {elapsed:.1f} 秒，{summary['throughput']:.2f} 名/秒")
+        return summary
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="离线批量生成家长学习报告")
+    parser.add_argument("-o", "--output", required=True, help="输出文件（JSONL，同时作为检查点）")
+    parser.add_argument("--storage", default="user_memories", help="存储目录")
+    parser.add_argument("--backend", choices=("jsonl", "sqlite"), help="存储后端，默认读取 MEMORY_STORAGE_BACKEND")
+    parser.add_argument("--users", help="学生列表文件（每行 用户ID 或 用户ID<TAB>姓名），默认为存储中的全部用户")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="报告周期起始时间（ISO 格式，包含），默认为7天前")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="报告周期结束时间（ISO 格式，不包含），默认为现在")
+    parser.add_argument("--subject", default="数学", help="学科")
+    parser.add_argument("--mode", choices=REPORT_MODES, default="agent", help="agent 调用家长Agent，template 直接套用模板")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="工作进程数")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="同时进行的 LLM 调用数上限")
+    parser.add_argument("--retries", type=int, default=2, help="生成失败时的重试次数")
+    parser.add_argument("--summary", help="将汇总写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    runner = BatchReportRunner(args.output, args.storage, args.backend, workers=args.workers,
+                               llm_concurrency=args.llm_concurrency, start=args.since, end=args.until,
+                               subject=args.subject, mode=args.mode, retries=args.retries)
+    try:
+        students = iter_students(args.users, None if args.users else open_storage(args.storage, args.backend))
+        summary = runner.run(students)
+    except KeyboardInterrupt:
+        return 130
+    except (ValueError, sqlite3.Error) as e:
+        logger.error(str(e))
+        return 2
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(summary, ensure_ascii=False))
+    return 1 if summary["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Optional
+
+# 文件布局（小端）：
+#   文件头   MAGIC | 版本 | 条目数 | 快照已包含的日志编号
+#   偏移表   每个条目一行定长记录：ID哈希 | 内容偏移 | 内容长度 | 保留 | 时间戳（微秒）
+#   ID索引   按ID哈希排序的 (ID哈希, 条目序号)，按ID查找时二分
+#   内容区   每个条目 {"id","content","metadata"} 的紧凑 JSON（UTF-8）
+MAGIC = b"AIMS"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHI32s")
+_RECORD = struct.Struct("<QQIIq")
+_ID_SLOT = struct.Struct("<QII")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _id_hash(memory_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(memory_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _to_micros(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def write_snapshot(path: str, entries: Iterable[Any], wal_covered: Optional[str] = None,
+                   fsync: bool = True) -> int:
+    """
+    写入二进制快照（先写临时文件再原子替换）
+
+    Args:
+        path: 快照文件路径
+        entries: MemoryEntry 序列（按时间顺序）
+        wal_covered: 快照已包含的追加日志编号
+        fsync: 替换前是否 fsync
+
+    Returns:
+        int: 写入的条目数量
+    """
+    payloads = []
+    stamps = []
+    ids = []
+    for entry in entries:
+        payloads.append(json.dumps({"id": entry.id, "content": entry.content, "metadata": entry.metadata},
+                                   ensure_ascii=False, separators=(',', ':')).encode("utf-8"))
+        stamps.append(_to_micros(entry.timestamp))
+        ids.append(_id_hash(entry.id))
+    count = len(payloads)
+
+    covered = (wal_covered or "").encode("ascii")
+    if len(covered) > 32:
+        raise ValueError(f"wal_covered too long: {wal_covered!r}")
+    offset = _HEADER.size + count * (_RECORD.size + _ID_SLOT.size)
+    table = bytearray()
+    for id_hash, payload, stamp in zip(ids, payloads, stamps):
+        table += _RECORD.pack(id_hash, offset, len(payload), 0, stamp)
+        offset += len(payload)
+    for id_hash, position in sorted(zip(ids, range(count))):
+        table += _ID_SLOT.pack(id_hash, position, 0)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, count, covered))
+        f.write(table)
+        for payload in payloads:
+            f.write(payload)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+class BinarySnapshotReader:
+    """
+    通过 mmap 读取二进制快照：
+    - 打开时只解析文件头，偏移表与内容都按需从映射中读取
+    - last(n) / find(id) 只解码涉及的条目；payload(i) 返回内容字节的 memoryview（不复制）
+    使用完毕需调用 close()（或使用 with 语句），关闭前应释放 payload() 返回的视图
+    """
+
+    def __init__(self, path: str):
+        """
+        打开快照
+
+        Args:
+            path: 快照文件路径
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, count, covered = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不是受支持的记忆快照文件: {path}")
+            if _HEADER.size + count * (_RECORD.size + _ID_SLOT.size) > len(self._mm):
+                raise ValueError(f"记忆快照文件不完整: {path}")
+        except Exception:
+            self._mm.close()
+            raise
+        self.count = count
+        self.wal_covered: Optional[str] = covered.rstrip(b"\0").decode("ascii") or None
+        self._view = memoryview(self._mm)
+        self._index_start = _HEADER.size + count * _RECORD.size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "BinarySnapshotReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """释放映射"""
+        if self._mm.closed:
+            return
+        self._view.release()
+        self._mm.close()
+
+    def _record(self, position: int) -> tuple:
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+        return _RECORD.unpack_from(self._mm, _HEADER.size + position * _RECORD.size)
+
+    def payload(self, position: int) -> memoryview:
+        """
+        获取条目内容的原始字节（不复制）
+
+        Args:
+            position: 条目序号
+
+        Returns:
+            memoryview: 紧凑 JSON 的 UTF-8 字节
+        """
+        _, offset, length, _, _ = self._record(position)
+        return self._view[offset:offset + length]
+
+    def timestamp(self, position: int) -> datetime:
+        """获取条目时间戳（无需解码内容）"""
+        return _EPOCH + timedelta(microseconds=self._record(position)[4])
+
+    def entry(self, position: int) -> Any:
+        """
+        解码一个条目
+
+        Args:
+            position: 条目序号（支持负数）
+
+        Returns:
+            MemoryEntry: 记忆条目
+        """
+        # 动态导入utils模块以避免循环依赖
+        from utils import MemoryEntry
+
+        if position < 0:
+            position += self.count
+        _, offset, length, _, micros = self._record(position)
+        data = json.loads(self._mm[offset:offset + length])
+        return MemoryEntry(id=data["id"], content=data["content"],
+                           timestamp=_EPOCH + timedelta(microseconds=micros),
+                           metadata=data.get("metadata", {}))
+
+    def last(self, n: int) -> List[Any]:
+        """
+        解码最后 n 个条目
+
+        Args:
+            n: 数量
+
+        Returns:
+            List[MemoryEntry]: 按时间顺序排列的条目
+        """
+        n = max(0, min(n, self.count))
+        return [self.entry(position) for position in range(self.count - n, self.count)]
+
+    def find(self, memory_id: str) -> Optional[Any]:
+        """
+        按ID查找条目（在ID索引上二分，只解码哈希命中的条目）
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            MemoryEntry: 记忆条目，不存在时返回None
+        """
+        target = _id_hash(memory_id)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _ID_SLOT.unpack_from(self._mm, self._index_start + mid * _ID_SLOT.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self.count:
+            id_hash, position, _ = _ID_SLOT.unpack_from(self._mm, self._index_start + lo * _ID_SLOT.size)
+            if id_hash != target:
+                break
+            entry = self.entry(position)
+            if entry.id == memory_id:
+                return entry
+            lo += 1
+        return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import lzma
+import zlib
+import struct
+from typing import Any, Dict, Iterator, Tuple
+
+# 冷存储归档：把一个用户的多个持久化文件压缩进单个文件
+#   文件头   MAGIC | 版本 | 压缩算法
+#   之后每个文件一段：后缀长度 | 后缀 | 原始长度 | 压缩后长度 | 压缩数据
+MAGIC = b"AIMC"
+VERSION = 1
+CODECS = {"zlib": 1, "lzma": 2}
+_CODEC_NAMES = {code: name for name, code in CODECS.items()}
+_HEADER = struct.Struct("<4sBB")
+_SECTION = struct.Struct("<H")
+_SIZES = struct.Struct("<QQ")
+_CHUNK = 1 << 20
+
+
+def _compressor(codec: str) -> Any:
+    if codec == "zlib":
+        return zlib.compressobj(6)
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=6)
+    raise ValueError(f"codec must be one of {tuple(CODECS)}, got {codec!r}")
+
+
+def _decompressor(codec: str) -> Any:
+    return zlib.decompressobj() if codec == "zlib" else lzma.LZMADecompressor()
+
+
+def write_cold_archive(path: str, files: Dict[str, str], codec: str = "zlib", fsync: bool = True) -> int:
+    """
+    将若干文件流式压缩进一个归档（先写临时文件再原子替换），内存占用与文件大小无关
+
+    Args:
+        path: 归档文件路径
+        files: 后缀到源文件路径的映射
+        codec: 压缩算法（zlib/lzma）
+        fsync: 替换前是否 fsync
+
+    Returns:
+        int: 归档文件大小（字节）
+    """
+    if codec not in CODECS:
+        raise ValueError(f"codec must be one of {tuple(CODECS)}, got {codec!r}")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(_HEADER.pack(MAGIC, VERSION, CODECS[codec]))
+        for suffix, source in files.items():
+            name = suffix.encode("utf-8")
+            out.write(_SECTION.pack(len(name)) + name)
+            sizes_at = out.tell()
+            out.write(_SIZES.pack(0, 0))
+            compressor = _compressor(codec)
+            raw_size = compressed_size = 0
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(_CHUNK), b""):
+                    raw_size += len(chunk)
+                    data = compressor.compress(chunk)
+                    compressed_size += len(data)
+                    out.write(data)
+            data = compressor.flush()
+            compressed_size += len(data)
+            out.write(data)
+            # 回填本段的长度
+            end = out.tell()
+            out.seek(sizes_at)
+            out.write(_SIZES.pack(raw_size, compressed_size))
+            out.seek(end)
+        if fsync:
+            out.flush()
+            os.fsync(out.fileno())
+        size = out.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def iter_cold_archive(path: str) -> Iterator[Tuple[str, Iterator[bytes]]]:
+    """
+    流式读取归档
+
+    Args:
+        path: 归档文件路径
+
+    Yields:
+        Tuple[str, Iterator[bytes]]: (后缀, 解压后数据块的迭代器)，需按顺序消费完每个迭代器
+    """
+    with open(path, 'rb') as f:
+        magic, version, code = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION or code not in _CODEC_NAMES:
+            raise ValueError(f"不是受支持的冷存储归档: {path}")
+        codec = _CODEC_NAMES[code]
+        while True:
+            head = f.read(_SECTION.size)
+            if not head:
+                return
+            (name_len,) = _SECTION.unpack(head)
+            suffix = f.read(name_len).decode("utf-8")
+            raw_size, compressed_size = _SIZES.unpack(f.read(_SIZES.size))
+
+            def chunks(remaining: int = compressed_size, expected: int = raw_size) -> Iterator[bytes]:
+                decompressor = _decompressor(codec)
+                produced = 0
+                while remaining > 0:
+                    block = f.read(min(_CHUNK, remaining))
+                    if not block:
+                        raise ValueError(f"冷存储归档不完整: {path}")
+                    remaining -= len(block)
+                    data = decompressor.decompress(block)
+                    produced += len(data)
+                    yield data
+                if hasattr(decompressor, "flush"):
+                    data = decompressor.flush()
+                    produced += len(data)
+                    yield data
+                if produced != expected:
+                    raise ValueError(f"冷存储归档中 {suffix} 的长度不符: {path}")
+
+            yield suffix, chunks()
+
+
+def extract_cold_archive(path: str, directory: str, prefix: str = "data") -> Dict[str, str]:
+    """
+    将归档中的文件解压到指定目录（不修改归档本身）
+
+    Args:
+        path: 归档文件路径
+        directory: 目标目录
+        prefix: 解压后文件名的前缀，文件名为 <prefix><后缀>
+
+    Returns:
+        Dict[str, str]: 后缀到解压后文件路径的映射
+    """
+    files: Dict[str, str] = {}
+    for suffix, chunks in iter_cold_archive(path):
+        target = os.path.join(directory, f"{prefix}{suffix}")
+        with open(target, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        files[suffix] = target
+    return files
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基于字符 n-gram 的意图分类器（多项式朴素贝叶斯），用于请求路由。
+
+默认路由仍是关键词路由（agent_router.KeywordRouter），项目不附带分类模型；
+只有通过 MultiAgentSystem(intent_model=...) 或 INTENT_MODEL 环境变量指定模型文件时才启用分类器，
+且置信度低于阈值时仍回退到关键词路由。
+
+训练数据应为人工标注的请求（每行 {"text": ..., "label": ...}）。对话历史中记录的Agent
+是关键词路由当时的选择，用它训练只会复现关键词路由（包括它的错误），因此默认不读取；
+确认历史中的路由已经人工校正过时可加 --from-history。
+
+用法示例：
+    python intent_classifier.py train labeled.jsonl -o intent_model.npz
+    python intent_classifier.py eval intent_model.npz labeled_holdout.jsonl
+    python intent_classifier.py predict intent_model.npz "作业里的概念我不懂"
+    INTENT_MODEL=intent_model.npz python agent_server.py
+"""
+
+import os
+import sys
+import json
+import zlib
+import argparse
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from agent_router import KeywordRouter, RouteDecision
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 默认的模型文件
+DEFAULT_INTENT_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_model.npz")
+# 导出记录中的Agent名称到路由标签的映射
+AGENT_LABELS = {
+    "TeachingAgent": "teaching",
+    "TestingAgent": "testing",
+    "SecretaryAgent": "secretary",
+    "ParentAgent": "parent",
+}
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (1, 3)) -> List[str]:
+    """
+    提取字符 n-gram（去除空白并转为小写）
+
+    Args:
+        text: 文本
+        ngram_range: n 的最小值与最大值（包含）
+
+    Returns:
+        List[str]: n-gram 列表（可重复）
+    """
+    text = "".join(text.lower().split())
+    grams: List[str] = []
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class IntentClassifier:
+    """
+    多项式朴素贝叶斯意图分类器：
+    - 字符 n-gram 经特征哈希映射到 dim 个桶，模型为 (类别数, dim) 的对数似然矩阵，大小固定
+    - 分类时只取文本中出现的桶做一次向量化加权求和，输出各类别的后验概率
+    - 模型以 .npz 保存，加载只需读取几个数组
+    """
+
+    def __init__(self, classes: List[str], log_prior: np.ndarray, log_likelihood: np.ndarray,
+                 ngram_range: Tuple[int, int] = (1, 3)):
+        """
+        初始化分类器（通常通过 train 或 load 创建）
+
+        Args:
+            classes: 类别标签
+            log_prior: 各类别的对数先验，形状 (类别数,)
+            log_likelihood: 各类别下每个特征桶的对数似然，形状 (类别数, dim)
+            ngram_range: n-gram 范围
+        """
+        self.classes = list(classes)
+        self.log_prior = np.asarray(log_prior, dtype=np.float32)
+        self.log_likelihood = np.asarray(log_likelihood, dtype=np.float32)
+        self.dim = self.log_likelihood.shape[1]
+        self.ngram_range = tuple(ngram_range)
+        # 按特征桶连续存放，分类时按行取出再求和（重复的桶自然按次数累加）
+        self._by_bucket = np.ascontiguousarray(self.log_likelihood.T)
+
+    @staticmethod
+    def _buckets(text: str, dim: int, ngram_range: Tuple[int, int]) -> np.ndarray:
+        """文本中每个 n-gram 所在的特征桶（可重复）"""
+        return np.fromiter((zlib.crc32(gram.encode("utf-8")) % dim for gram in char_ngrams(text, ngram_range)),
+                           dtype=np.int64)
+
+    @classmethod
+    def train(cls, texts: Iterable[str], labels: Iterable[str], dim: int = 1 << 15,
+              ngram_range: Tuple[int, int] = (1, 3), alpha: float = 0.5) -> "IntentClassifier":
+        """
+        训练分类器
+
+        Args:
+            texts: 训练文本
+            labels: 对应的类别标签
+            dim: 特征哈希桶数
+            ngram_range: n-gram 范围
+            alpha: 加性平滑参数
+
+        Returns:
+            IntentClassifier: 训练好的分类器
+        """
+        class_index: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[np.ndarray] = []
+        doc_counts: List[int] = []
+        for text, label in zip(texts, labels):
+            k = class_index.setdefault(label, len(class_index))
+            if k == len(doc_counts):
+                doc_counts.append(0)
+            doc_counts[k] += 1
+            rows.append(k)
+            cols.append(cls._buckets(text, dim, ngram_range))
+        if not class_index:
+            raise ValueError("没有训练样本")
+
+        feature_counts = np.zeros((len(class_index), dim), dtype=np.float64)
+        if cols:
+            lengths = [len(c) for c in cols]
+            np.add.at(feature_counts, (np.repeat(rows, lengths), np.concatenate(cols)), 1.0)
+        smoothed = feature_counts + alpha
+        log_likelihood = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        doc_counts_arr = np.asarray(doc_counts, dtype=np.float64)
+        log_prior = np.log(doc_counts_arr / doc_counts_arr.sum())
+        classes = sorted(class_index, key=class_index.get)
+        return cls(classes, log_prior, log_likelihood, ngram_range)
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """
+        计算各类别的后验概率
+
+        Args:
+            text: 文本
+
+        Returns:
+            Dict[str, float]: 类别到概率的映射
+        """
+        buckets = self._buckets(text, self.dim, self.ngram_range)
+        scores = self.log_prior + self._by_bucket[buckets].sum(axis=0)
+        scores = np.exp(scores - scores.max())
+        scores /= scores.sum()
+        return {label: float(p) for label, p in zip(self.classes, scores)}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        预测类别
+
+        Args:
+            text: 文本
+
+        Returns:
+            Tuple[str, float]: (类别, 置信度)
+        """
+        proba = self.predict_proba(text)
+        label = max(proba, key=proba.get)
+        return label, proba[label]
+
+    def evaluate(self, texts: Iterable[str], labels: Iterable[str]) -> Dict[str, float]:
+        """
+        评估准确率
+
+        Returns:
+            Dict[str, float]: 样本数与准确率
+        """
+        total = correct = 0
+        for text, label in zip(texts, labels):
+            total += 1
+            correct += self.predict(text)[0] == label
+        return {"samples": total, "accuracy": correct / total if total else 0.0}
+
+    def save(self, path: str) -> None:
+        """保存模型为 .npz"""
+        with open(path, 'wb') as f:
+            np.savez(f, classes=np.asarray(self.classes), log_prior=self.log_prior,
+                     log_likelihood=self.log_likelihood, ngram_range=np.asarray(self.ngram_range))
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """从 .npz 加载模型"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls([str(c) for c in data["classes"]], data["log_prior"], data["log_likelihood"],
+                       tuple(int(n) for n in data["ngram_range"]))
+
+
+class ClassifierRouter:
+    """
+    分类器优先的路由：分类置信度不低于 threshold 时采用分类结果，否则回退到关键词路由
+    （与 KeywordRouter 接口一致）
+    """
+
+    def __init__(self, classifier: IntentClassifier, keyword_router: KeywordRouter, threshold: float = 0.6):
+        """
+        初始化路由
+
+        Args:
+            classifier: 意图分类器
+            keyword_router: 回退使用的关键词路由
+            threshold: 采用分类结果的最低置信度
+        """
+        self.classifier = classifier
+        self.keyword_router = keyword_router
+        self.threshold = threshold
+
+    def route(self, text: str) -> RouteDecision:
+        """
+        选择处理请求的Agent
+
+        Args:
+            text: 用户输入
+
+        Returns:
+            RouteDecision: 路由结果；source 为 classifier 时 scores 为各类别的概率
+        """
+        proba = self.classifier.predict_proba(text)
+        label = max(proba, key=proba.get)
+        if proba[label] >= self.threshold and label in self.keyword_router.agents:
+            return RouteDecision(label, proba[label], proba, source="classifier", confidence=proba[label])
+        decision = self.keyword_router.route(text)
+        decision.confidence = proba[label]
+        return decision
+
+
+def load_labeled(path: str, from_history: bool = False) -> Iterator[Tuple[str, str]]:
+    """
+    读取带标签的请求：每行 {"text": ..., "label": ...}；
+    from_history 为True时也读取 memory_export 导出的记录（role 为 user，标签取自 agent 字段，即当时的路由结果）
+
+    Args:
+        path: JSONL 文件路径
+        from_history: 是否读取导出的对话历史
+
+    Yields:
+        Tuple[str, str]: (文本, 标签)
+    """
+    skipped = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if "label" in row:
+                text, label = row.get("text"), row["label"]
+            elif row.get("role") == "user":
+                if not from_history:
+                    skipped += 1
+                    continue
+                text, label = row.get("content"), AGENT_LABELS.get(row.get("agent"), row.get("agent"))
+            else:
+                continue
+            if text and label:
+                yield text, label
+    if skipped:
+        logger.warning(f"跳过了 {path} 中 {skipped} 条导出的对话记录（其标签来自关键词路由），"
+                       f"确认已人工校正时请使用 --from-history")
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口：train / eval / predict
+    """
+    parser = argparse.ArgumentParser(description="训练与评估请求路由的意图分类器")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="训练模型")
+    train_parser.add_argument("data", help="训练数据（JSONL）")
+    train_parser.add_argument("-o", "--output", default=DEFAULT_INTENT_MODEL, help="模型输出路径")
+    train_parser.add_argument("--dim", type=int, default=1 << 15, help="特征哈希桶数")
+    train_parser.add_argument("--alpha", type=float, default=0.5, help="平滑参数")
+    train_parser.add_argument("--from-history", action="store_true",
+                              help="也使用 memory_export 导出的对话记录（标签为当时的路由结果）")
+    eval_parser = commands.add_parser("eval", help="评估模型")
+    eval_parser.add_argument("model")
+    eval_parser.add_argument("data")
+    predict_parser = commands.add_parser("predict", help="预测单条请求")
+    predict_parser.add_argument("model")
+    predict_parser.add_argument("text")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        samples = list(load_labeled(args.data, args.from_history))
+        if not samples:
+            logger.error(f"{args.data} 中没有人工标注的样本")
+            return 1
+        classifier = IntentClassifier.train([t for t, _ in samples], [l for _, l in samples],
+                                            dim=args.dim, alpha=args.alpha)
+        classifier.save(args.output)
+        logger.info(f"使用 {len(samples)} 条样本训练完成，类别: {classifier.classes}，已保存到 {args.output}")
+    elif args.command == "eval":
+        classifier = IntentClassifier.load(args.model)
+        samples = list(load_labeled(args.data))
+        print(json.dumps(classifier.evaluate([t for t, _ in samples], [l for _, l in samples])))
+    else:
+        classifier = IntentClassifier.load(args.model)
+        print(json.dumps(classifier.predict_proba(args.text), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+预编译的知识点索引：把知识点大纲与知识库（KnowledgeBase / QuestionBank）编译成一个 JSON 文件，
+其中包含知识点名称与别名的前缀索引，以及按难度预先生成的讲解与例题，
+explain_concept / give_example 工具直接从索引返回结果，不需要再经过一次模型调用。
+只有有真实定义（知识库 concept、人工整理的讲解或大纲条目"名称：说明"中的说明）的知识点才有讲解，
+只有题库或人工整理中有例题的知识点才有例题，其余返回None，由模型自行展开。
+
+部署前需要用知识库与题库编译索引（输出到 Agent_python/knowledge_index.json 或 KNOWLEDGE_INDEX 指定的文件）；
+索引文件不存在时 KnowledgeIndex.shared() 会尝试从知识数据库编译，数据库不可用时只用大纲编译，
+此时大多数知识点没有讲解与例题。
+
+用法示例:
+    python knowledge_index.py build -o knowledge_index.json
+    python knowledge_index.py build -o knowledge_index.json --knowledge kb.jsonl --questions questions.jsonl
+    python knowledge_index.py build -o knowledge_index.json --from-db
+    python knowledge_index.py lookup 勾股定律 --index knowledge_index.json
+    python knowledge_index.py bench --index knowledge_index.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import argparse
+import logging
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from syllabus import Syllabus, load_syllabus, split_terms
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+DEFAULT_KNOWLEDGE_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_index.json")
+EXPLAIN_LEVELS = ("初级", "中级", "高级")
+EXAMPLE_LEVELS = ("简单", "中等", "困难")
+# 从知识点名称去掉后仍可作为别名的后缀（如"相似三角形判定" -> "相似三角形"）
+ALIAS_SUFFIXES = ("性质与判定", "的基本性质", "基本性质", "性质", "判定", "计算公式")
+# 模糊匹配的最低相似度（字符二元组的 Dice 系数）
+FUZZY_THRESHOLD = 0.6
+
+# 人工整理的讲解与例题，编译时并入大纲中的同名知识点
+SEED_CONCEPTS: Dict[str, Dict[str, Any]] = {
+    "勾股定理": {
+        "definition": "直角三角形两条直角边的平方和等于斜边的平方。公式为: a² + b² = c²",
+        "examples": {"简单": ["已知直角三角形的两条直角边分别为3cm和4cm，求斜边长度? 答案: 5cm"]},
+    },
+    "一元二次方程": {
+        "definition": "只含有一个未知数，并且未知数的最高次数是二次的整式方程。一般形式为: ax² + bx + c = 0 (a≠0)",
+        "examples": {"中等": ["解方程 x² - 5x + 6 = 0。答案: x₁=2, x₂=3"]},
+    },
+    "相似三角形": {
+        "definition": "两个三角形对应角相等，对应边成比例",
+    },
+}
+
+
+def normalize(text: str) -> str:
+    """查询与别名的规范形式：去掉空白与标点，英文转小写"""
+    return re.sub(r"[\s，。、？！?!,.:：;；\"'“”‘’（）()《》]", "", str(text)).lower()
+
+
+def bigrams(text: str) -> Set[str]:
+    """字符二元组（单字时为该字本身）"""
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _json_list(value: Any) -> List[Any]:
+    """数据库中的 JSON 数组字段可能是字符串，也可能已经是列表"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value] if value else []
+    return list(value or [])
+
+
+def example_level(difficulty: Any) -> str:
+    """题库难度（1~5）对应的例题难度"""
+    try:
+        value = int(difficulty)
+    except (TypeError, ValueError):
+        return "中等"
+    return "简单" if value <= 2 else "中等" if value == 3 else "困难"
+
+
+@dataclass
+class ConceptMatch:
+    """一次查找的结果"""
+    entry: Dict[str, Any]
+    alias: str  # 命中的名称或别名
+    kind: str  # exact / contains / prefix / fuzzy
+    score: float = 1.0
+
+
+class KnowledgeIndex:
+    """
+    知识点索引：
+    - entries 为编译好的知识点（名称、别名、所属章节、先修与相关知识点、各难度的讲解与例题）
+    - 查找顺序：名称/别名完全匹配 -> 查询中包含的最长名称（如"什么是勾股定理"）
+      -> 以查询开头的名称（前缀，按排序数组二分查找）-> 字符二元组相似度（如"勾股定律"）
+    """
+
+    _shared: Optional["KnowledgeIndex"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, entries: List[Dict[str, Any]], built_at: str = "", sources: Optional[Dict[str, Any]] = None):
+        """
+        初始化索引（由 build_index 或 load 调用）
+
+        Args:
+            entries: 编译好的知识点
+            built_at: 编译时间
+            sources: 编译使用的数据来源
+        """
+        self.entries = entries
+        self.built_at = built_at
+        self.sources = sources or {}
+        self._alias: Dict[str, int] = {}
+        for position, entry in enumerate(entries):
+            # 名称优先于其他知识点的别名
+            self._alias.setdefault(normalize(entry["name"]), position)
+        for position, entry in enumerate(entries):
+            for alias in entry.get("aliases", []):
+                self._alias.setdefault(normalize(alias), position)
+        self._sorted = sorted(self._alias)
+        self._longest = max((len(alias) for alias in self._sorted), default=0)
+        self._grams: Dict[str, List[str]] = defaultdict(list)
+        for alias in self._sorted:
+            for gram in bigrams(alias):
+                self._grams[gram].append(alias)
+        self._lock = threading.Lock()
+        self.metrics: Counter = Counter()
+
+    @classmethod
+    def shared(cls) -> "KnowledgeIndex":
+        """
+        进程内共享的索引：读取 KNOWLEDGE_INDEX 环境变量指定的文件（默认 Agent_python/knowledge_index.json），
+        文件不存在或版本不兼容时由知识点大纲与知识数据库编译
+
+        Returns:
+            KnowledgeIndex: 共享实例
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                path = os.getenv("KNOWLEDGE_INDEX") or DEFAULT_KNOWLEDGE_INDEX
+                try:
+                    cls._shared = cls.load(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"无法加载知识点索引 {path}（{e}），请先运行 "
+                                   f"python knowledge_index.py build --from-db -o {path}；现在由大纲与知识数据库编译")
+                    cls._shared = build_default_index()
+            return cls._shared
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, query: str) -> Optional[ConceptMatch]:
+        """
+        查找知识点
+
+        Args:
+            query: 知识点名称或包含知识点名称的问题
+
+        Returns:
+            Optional[ConceptMatch]: 查找结果，没有找到时为None
+        """
+        key = normalize(query)
+        if not key:
+            return None
+        if key in self._alias:
+            return ConceptMatch(self.entries[self._alias[key]], key, "exact")
+        # 查询中包含的最长名称
+        for length in range(min(len(key) - 1, self._longest), 1, -1):
+            for start in range(len(key) - length + 1):
+                alias = key[start:start + length]
+                if alias in self._alias:
+                    return ConceptMatch(self.entries[self._alias[alias]], alias, "contains", length / len(key))
+        # 以查询开头的最短名称
+        candidates = self.complete(key, limit=1)
+        if candidates:
+            alias = normalize(candidates[0])
+            return ConceptMatch(self.entries[self._alias[alias]], alias, "prefix", len(key) / len(alias))
+        # 字符二元组相似度
+        grams = bigrams(key)
+        overlap: Counter = Counter()
+        for gram in grams:
+            overlap.update(self._grams.get(gram, ()))
+        best, best_score = None, 0.0
+        for alias, common in overlap.items():
+            score = 2 * common / (len(grams) + len(bigrams(alias)))
+            if score > best_score or (score == best_score and best is not None and len(alias) < len(best)):
+                best, best_score = alias, score
+        if best is not None and best_score >= FUZZY_THRESHOLD:
+            return ConceptMatch(self.entries[self._alias[best]], best, "fuzzy", best_score)
+        return None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        前缀查找（按名称长度由短到长）
+
+        Args:
+            prefix: 前缀
+            limit: 最多返回的个数
+
+        Returns:
+            List[str]: 以 prefix 开头的名称或别名
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._sorted, prefix)
+        end = bisect.bisect_left(self._sorted, prefix + "\U0010ffff")
+        return sorted(self._sorted[start:end], key=len)[:limit]
+
+    def _record(self, tool: str, match: Optional[ConceptMatch]) -> None:
+        with self._lock:
+            self.metrics[f"{tool}_{match.kind if match else 'miss'}"] += 1
+
+    def explain(self, concept: str, difficulty: str = "中级") -> Optional[str]:
+        """
+        预先生成的知识点讲解
+
+        Args:
+            concept: 知识点
+            difficulty: 初级 / 中级 / 高级
+
+        Returns:
+            Optional[str]: 讲解，索引中没有该知识点或该知识点没有定义时为None
+        """
+        match = self.lookup(concept)
+        explanations = match.entry["explanations"] if match else {}
+        if not explanations:
+            self._record("explain", None)
+            return None
+        self._record("explain", match)
+        return explanations.get(difficulty) or explanations["中级"]
+
+    def example(self, concept: str, difficulty: str = "中等") -> Optional[str]:
+        """
+        预先整理的例题（该难度没有例题时使用最接近的难度）
+
+        Args:
+            concept: 知识点
+            difficulty: 简单 / 中等 / 困难
+
+        Returns:
+            Optional[str]: 例题，索引中没有该知识点或没有例题时为None
+        """
+        match = self.lookup(concept)
+        examples = match.entry["examples"] if match else {}
+        target = EXAMPLE_LEVELS.index(difficulty) if difficulty in EXAMPLE_LEVELS else 1
+        for level in sorted(EXAMPLE_LEVELS, key=lambda level: abs(EXAMPLE_LEVELS.index(level) - target)):
+            if examples.get(level):
+                self._record("example", match)
+                return f"{level}例题: {examples[level][0]}"
+        self._record("example", None)
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取索引统计
+
+        Returns:
+            Dict[str, Any]: 知识点数、名称数、编译时间及各类命中/未命中次数
+        """
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "aliases": len(self._sorted),
+                "built_at": self.built_at,
+                "lookups": dict(self.metrics),
+            }
+
+    def save(self, path: str) -> None:
+        """
+        保存索引（先写临时文件再替换，避免读到写了一半的文件）
+
+        Args:
+            path: 文件路径
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "built_at": self.built_at, "sources": self.sources,
+                       "entries": self.entries}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "KnowledgeIndex":
+        """
+        加载索引
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            KnowledgeIndex: 索引
+
+        Raises:
+            ValueError: 文件版本不兼容
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"知识点索引版本不兼容: {data.get('version')}（需要 {INDEX_VERSION}）")
+        return cls(data["entries"], data.get("built_at", ""), data.get("sources"))
+
+
+def _explanations(entry: Dict[str, Any]) -> Dict[str, str]:
+    """按难度生成讲解：初级只有定义，中级加上要点与方法，高级再加上先修与相关知识点；没有定义时为空"""
+    name = entry["name"]
+    basic = entry["definition"]
+    if not basic:
+        return {}
+    points = [point for point in entry["points"] if point not in basic]
+    middle = basic
+    if points:
+        middle += "。要点: " + "；".join(points)
+    if entry["methods"]:
+        middle += "。常用方法: " + "；".join(entry["methods"])
+    advanced = middle
+    if entry["prerequisites"]:
+        advanced += "。先修知识: " + "、".join(entry["prerequisites"])
+    if entry["related"]:
+        advanced += "。相关知识点: " + "、".join(entry["related"])
+    return {level: f"{name}({level}): {text}" for level, text in zip(EXPLAIN_LEVELS, (basic, middle, advanced))}
+
+
+def build_index(syllabus: Optional[Syllabus] = None, knowledge_rows: Iterable[Dict[str, Any]] = (),
+                question_rows: Iterable[Dict[str, Any]] = (), seeds: Optional[Dict[str, Dict[str, Any]]] = None,
+                examples_per_level: int = 3, sources: Optional[Dict[str, Any]] = None) -> KnowledgeIndex:
+    """
+    编译知识点索引
+
+    Args:
+        syllabus: 知识点大纲，默认读取 doc/知识库/初中数学大纲.md
+        knowledge_rows: 知识库表（KnowledgeBase）的记录
+        question_rows: 题库表（QuestionBank）的记录，按 related_knowledge_ids 作为对应知识点的例题
+        seeds: 人工整理的讲解与例题，默认为 SEED_CONCEPTS
+        examples_per_level: 每个知识点每个难度保留的例题数
+        sources: 记录在索引中的数据来源说明
+
+    Returns:
+        KnowledgeIndex: 索引
+    """
+    syllabus = syllabus if syllabus is not None else load_syllabus()
+    seeds = SEED_CONCEPTS if seeds is None else seeds
+    entries: List[Dict[str, Any]] = []
+    by_name: Dict[str, Dict[str, Any]] = {}
+    by_alias: Dict[str, Dict[str, Any]] = {}
+
+    def new_entry(name: str, chapter: str = "", section: str = "", grade: Optional[int] = None) -> Dict[str, Any]:
+        entry = {"name": name, "knowledge_ids": [], "chapter": chapter, "section": section, "grade": grade,
+                 "aliases": [], "definition": "", "points": [], "methods": [], "prerequisites": [], "related": [],
+                 "examples": {level: [] for level in EXAMPLE_LEVELS}}
+        entries.append(entry)
+        by_name[name] = entry
+        return entry
+
+    def find(names: Iterable[str]) -> Optional[Dict[str, Any]]:
+        for name in names:
+            entry = by_name.get(name) or by_alias.get(name)
+            if entry is not None:
+                return entry
+        return None
+
+    def add_alias(entry: Dict[str, Any], alias: str) -> None:
+        alias = alias.strip()
+        if alias and alias != entry["name"] and alias not in entry["aliases"]:
+            entry["aliases"].append(alias)
+            by_alias.setdefault(alias, entry)
+
+    # 大纲：章节与知识点
+    for topic in syllabus.topics:
+        entry = new_entry(topic.name, topic.chapter, topic.section, topic.grade)
+        entry["prerequisites"] = sorted(syllabus.ancestors(topic.name) - {topic.name},
+                                        key=lambda name: syllabus.priority(name))
+        chapter = syllabus.get(topic.chapter)
+        if topic.is_chapter:
+            entry["points"] = list(topic.points)
+            entry["related"] = [t.name for t in syllabus.topics if t.chapter == topic.name and not t.is_chapter][:8]
+        else:
+            # 同一章中提到该知识点的全部条目（如"乘法公式"同时出现在两个条目中）
+            entry["points"] = [point for point in chapter.points if topic.name in point] or list(topic.points)
+            entry["related"] = [t.name for t in syllabus.topics
+                                if t.chapter == topic.chapter and not t.is_chapter and t.name != topic.name][:5]
+        for suffix in ALIAS_SUFFIXES:
+            if topic.name.endswith(suffix) and len(topic.name) - len(suffix) >= 2:
+                add_alias(entry, topic.name[:-len(suffix)])
+
+    # 知识库：以第一个关键词（没有时为章节名）对应知识点
+    for row in knowledge_rows:
+        keywords = [str(k) for k in _json_list(row.get("keywords"))]
+        names = keywords[:1] + [row.get("chapter", "")]
+        entry = find(name for name in names if name) or new_entry(names[0] or row.get("knowledge_id", ""),
+                                                                  row.get("chapter", ""), "", None)
+        if row.get("knowledge_id") and row["knowledge_id"] not in entry["knowledge_ids"]:
+            entry["knowledge_ids"].append(row["knowledge_id"])
+        if row.get("concept"):
+            entry["definition"] = str(row["concept"]).rstrip("。")
+        entry["methods"].extend(str(m) for m in _json_list(row.get("application_methods"))
+                                if str(m) not in entry["methods"])
+        for keyword in keywords:
+            if keyword not in by_name:
+                add_alias(entry, keyword)
+        if entry["grade"] is None and row.get("grade"):
+            entry["grade"] = int(row["grade"]) - 6  # 七年级 -> 初一
+
+    # 人工整理的讲解与例题
+    for name, seed in seeds.items():
+        entry = find([name]) or new_entry(name, seed.get("chapter", ""))
+        if entry["name"] != name:
+            add_alias(entry, name)
+        if seed.get("definition"):
+            entry["definition"] = seed["definition"]
+        for level, examples in seed.get("examples", {}).items():
+            entry["examples"].setdefault(level, []).extend(examples)
+
+    # 题库：作为关联知识点的例题
+    by_knowledge_id = {kid: entry for entry in entries for kid in entry["knowledge_ids"]}
+    for row in question_rows:
+        text = str(row.get("question_text", "")).strip()
+        if not text:
+            continue
+        example = f"{text} 答案: {row['answer']}" if row.get("answer") else text
+        level = example_level(row.get("difficulty"))
+        for kid in _json_list(row.get("related_knowledge_ids")):
+            entry = by_knowledge_id.get(kid)
+            if entry is not None and example not in entry["examples"][level]:
+                entry["examples"][level].append(example)
+
+    for entry in entries:
+        if not entry["definition"]:
+            # 大纲条目"名称：说明"中冒号后的说明；没有说明的不拼凑定义，讲解交给模型
+            described = [re.split(r"[：:]", point, 1)[1].strip() for point in entry["points"]
+                         if re.search(r"[：:]", point) and entry["name"] in split_terms(point)]
+            entry["definition"] = next((text for text in described if text), "")
+        entry["examples"] = {level: items[:examples_per_level] for level, items in entry["examples"].items()}
+        entry["explanations"] = _explanations(entry)
+    return KnowledgeIndex(entries, datetime.now().isoformat(timespec="seconds"), sources)
+
+
+def build_default_index() -> KnowledgeIndex:
+    """
+    由默认大纲与知识数据库（KnowledgeBase / QuestionBank）编译索引，数据库不可用时只用大纲
+
+    Returns:
+        KnowledgeIndex: 索引
+    """
+    sources: Dict[str, Any] = {"outline": "default"}
+    try:
+        knowledge_rows, question_rows = fetch_rows("KnowledgeBase"), fetch_rows("QuestionBank")
+        sources["database"] = True
+    except Exception as e:
+        logger.warning(f"无法读取知识数据库，知识点索引只包含大纲: {e}")
+        knowledge_rows, question_rows = [], []
+    return build_index(None, knowledge_rows, question_rows, sources=sources)
+
+
+def read_rows(path: str) -> List[Dict[str, Any]]:
+    """
+    读取 JSON 数组或 JSONL 格式的数据库记录
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        List[Dict[str, Any]]: 记录
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def fetch_rows(table: str) -> List[Dict[str, Any]]:
+    """
+    从知识数据库读取一张表的全部记录（连接方式同 question_finder）
+
+    Args:
+        table: KnowledgeBase 或 QuestionBank
+
+    Returns:
+        List[Dict[str, Any]]: 记录
+    """
+    from question_finder import DatabaseManager
+    with DatabaseManager().get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {table}")
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="知识点索引")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="编译索引")
+    build_parser.add_argument("-o", "--output", default=DEFAULT_KNOWLEDGE_INDEX, help="输出文件")
+    build_parser.add_argument("--outline", default=None, help="知识点大纲文件")
+    build_parser.add_argument("--knowledge", default=None, help="知识库表记录（JSON 数组或 JSONL）")
+    build_parser.add_argument("--questions", default=None, help="题库表记录（JSON 数组或 JSONL）")
+    build_parser.add_argument("--from-db", action="store_true", help="从知识数据库读取知识库表与题库表")
+
+    lookup_parser = subparsers.add_parser("lookup", help="查找知识点并输出讲解与例题")
+    lookup_parser.add_argument("query", help="知识点名称或问题")
+    lookup_parser.add_argument("--index", default=None, help="索引文件")
+
+    bench_parser = subparsers.add_parser("bench", help="加载与查找耗时测试")
+    bench_parser.add_argument("--index", default=DEFAULT_KNOWLEDGE_INDEX, help="索引文件")
+    bench_parser.add_argument("--rounds", type=int, default=10000, help="查找次数")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            knowledge_rows: List[Dict[str, Any]] = []
+            question_rows: List[Dict[str, Any]] = []
+            sources: Dict[str, Any] = {"outline": args.outline or "default"}
+            if args.from_db:
+                knowledge_rows += fetch_rows("KnowledgeBase")
+                question_rows += fetch_rows("QuestionBank")
+                sources["database"] = True
+            if args.knowledge:
+                knowledge_rows += read_rows(args.knowledge)
+                sources["knowledge"] = args.knowledge
+            if args.questions:
+                question_rows += read_rows(args.questions)
+                sources["questions"] = args.questions
+            syllabus = load_syllabus(args.outline) if args.outline else None
+            index = build_index(syllabus, knowledge_rows, question_rows, sources=sources)
+            index.save(args.output)
+            print(f"已编译 {len(index)} 个知识点（{index.get_stats()['aliases']} 个名称）到 {args.output}")
+        elif args.command == "lookup":
+            index = KnowledgeIndex.load(args.index) if args.index else KnowledgeIndex.shared()
+            match = index.lookup(args.query)
+            if match is None:
+                print("未找到")
+                return 1
+            print(f"{match.entry['name']}（{match.kind}，{match.score:.2f}）")
+            if not match.entry["explanations"]:
+                print("（没有定义，讲解由模型生成）")
+            for level in EXPLAIN_LEVELS:
+                if level in match.entry["explanations"]:
+                    print(match.entry["explanations"][level])
+            for level in EXAMPLE_LEVELS:
+                for example in match.entry["examples"].get(level, []):
+                    print(f"{level}例题: {example}")
+        else:
+            began = time.perf_counter()
+            index = KnowledgeIndex.load(args.index)
+            loaded = time.perf_counter() - began
+            queries = [entry["name"] for entry in index.entries] + ["什么是勾股定理", "勾股定律", "一元二次"]
+            began = time.perf_counter()
+            for i in range(args.rounds):
+                index.lookup(queries[i % len(queries)])
+            elapsed = time.perf_counter() - began
+            print(f"加载 {len(index)} 个知识点: {loaded * 1000:.1f} ms；"
+                  f"查找 {args.rounds} 次: 平均 {elapsed / max(1, args.rounds) * 1e6:.1f} µs")
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import math
+import heapq
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 连续的汉字片段 / 连续的字母数字片段
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff\u3400-\u4dbf]+")
+_WORD_RUN = re.compile(r"[0-9a-zA-Z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文二元分词：
+    - 连续汉字切分为相邻二元组（单个汉字保留为一元）
+    - 字母数字按整词切分并转为小写
+
+    Args:
+        text: 待分词文本
+
+    Returns:
+        List[str]: 词项列表（可重复）
+    """
+    if not text:
+        return []
+    tokens: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(word.lower() for word in _WORD_RUN.findall(text))
+    return tokens
+
+
+def entry_text(content: Dict[str, Any]) -> str:
+    """
+    提取记忆内容中可检索的文本
+
+    Args:
+        content: 记忆内容（role/content/name 等字段）
+
+    Returns:
+        str: 可检索文本，无文本时返回空字符串
+    """
+    if not isinstance(content, dict):
+        return str(content or "")
+    text = content.get("content")
+    if not isinstance(text, str):
+        text = "" if text is None else json.dumps(text, ensure_ascii=False, default=str)
+    name = content.get("name")
+    return f"{name} {text}" if name else text
+
+
+class BM25Index:
+    """
+    支持增量添加的 BM25 倒排索引
+    - 每个词项维护 {文档序号: 词频权重} 的倒排表，添加文档只更新涉及的词项
+    - 词频权重 tf*(k1+1)/(tf+norm) 预先计算，查询时只需乘以 idf 累加；
+      平均文档长度漂移超过 reweight_tolerance 时才整体重算一次权重
+    - 查询时先用低频词项生成候选集，高频词项只给已有候选加分，避免遍历超长倒排表
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, reweight_tolerance: float = 0.1,
+                 common_term_ratio: float = 0.05):
+        """
+        初始化索引
+
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            reweight_tolerance: 平均文档长度相对漂移超过该比例时重算权重
+            common_term_ratio: 文档频率超过总文档数该比例的词项视为高频词项
+        """
+        self.k1 = k1
+        self.b = b
+        self.reweight_tolerance = reweight_tolerance
+        self.common_term_ratio = common_term_ratio
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.term_freqs: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.removed = 0  # 已移除的文档数（序号不复用）
+        self._weight_avgdl = 0.0  # 当前权重所基于的平均文档长度
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths) - self.removed
+
+    def _weight(self, tf: int, doc_length: int, avgdl: float) -> float:
+        norm = self.k1 * (1.0 - self.b + self.b * doc_length / avgdl)
+        return tf * (self.k1 + 1.0) / (tf + norm)
+
+    def _reweight(self) -> None:
+        """按当前平均文档长度重算全部倒排表权重"""
+        avgdl = self.total_length / max(1, len(self)) or 1.0
+        doc_lengths = self.doc_lengths
+        for token, freqs in self.term_freqs.items():
+            self.postings[token] = {d: self._weight(tf, doc_lengths[d], avgdl) for d, tf in freqs.items()}
+        self._weight_avgdl = avgdl
+
+    def add(self, tokens: List[str]) -> int:
+        """
+        添加一篇文档
+
+        Args:
+            tokens: 文档词项列表
+
+        Returns:
+            int: 文档序号
+        """
+        doc_idx = len(self.doc_lengths)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+        avgdl = self.total_length / len(self) or 1.0
+        if not self._weight_avgdl or abs(avgdl - self._weight_avgdl) > self.reweight_tolerance * self._weight_avgdl:
+            # 先写入词频，随后整体重算（包括本文档）
+            for token, tf in counts.items():
+                self.term_freqs.setdefault(token, {})[doc_idx] = tf
+            self._reweight()
+            return doc_idx
+
+        for token, tf in counts.items():
+            self.term_freqs.setdefault(token, {})[doc_idx] = tf
+            self.postings.setdefault(token, {})[doc_idx] = self._weight(tf, len(tokens), self._weight_avgdl)
+        return doc_idx
+
+    def remove(self, doc_idx: int) -> bool:
+        """
+        移除一篇文档：遍历词项表删除其词频与权重（修改与删除很少发生，不为此额外保存每篇文档的词项）
+
+        Args:
+            doc_idx: 文档序号
+
+        Returns:
+            bool: 文档是否存在
+        """
+        if not 0 <= doc_idx < len(self.doc_lengths) or self.doc_lengths[doc_idx] < 0:
+            return False
+        for token in list(self.term_freqs):
+            freqs = self.term_freqs[token]
+            if freqs.pop(doc_idx, None) is None:
+                continue
+            if freqs:
+                self.postings.get(token, {}).pop(doc_idx, None)
+            else:
+                del self.term_freqs[token]
+                self.postings.pop(token, None)
+        self.total_length -= self.doc_lengths[doc_idx]
+        self.doc_lengths[doc_idx] = -1
+        self.removed += 1
+        return True
+
+    def search(self, tokens: List[str], k: int = 3, exclude: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        检索与查询最相关的文档
+
+        Args:
+            tokens: 查询词项列表
+            k: 返回数量
+            exclude: 需要排除的文档序号
+
+        Returns:
+            List[Tuple[int, float]]: (文档序号, 得分)，按得分降序排列
+        """
+        n_docs = len(self)
+        if k <= 0 or n_docs == 0 or not tokens:
+            return []
+        terms = []
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting:
+                df = len(posting)
+                terms.append((df, math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)), posting))
+        if not terms:
+            return []
+        terms.sort(key=lambda term: term[0])
+
+        common_df = max(k, int(n_docs * self.common_term_ratio))
+        scores: Dict[int, float] = {}
+        for df, idf, posting in terms:
+            if not scores:
+                scores = {doc_idx: idf * w for doc_idx, w in posting.items()}
+            elif df > common_df:
+                # 高频词项：只给已有候选加分
+                get = posting.get
+                scores = {doc_idx: score + idf * get(doc_idx, 0.0) for doc_idx, score in scores.items()}
+            else:
+                get = scores.get
+                for doc_idx, w in posting.items():
+                    scores[doc_idx] = get(doc_idx, 0.0) + idf * w
+        if exclude:
+            for doc_idx in exclude:
+                scores.pop(doc_idx, None)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class LongTermMemory:
+    """
+    长期记忆检索器：
+    - 对 ContextMemory 写入、修改与删除的条目维护 BM25 索引，条目被短期窗口淘汰后仍可被检索
+    - 索引在第一次检索时才构建：提供 history 时从存储的完整历史构建（SQLite 存储已保存全部消息，无需另存归档），
+      否则重放 JSONL 归档文件；构建之前的修改先暂存，构建后再应用
+    - 归档文件以追加方式记录条目（同一ID再次出现表示修改）与 {"deleted": ID} 删除记录
+    """
+
+    def __init__(self, archive_path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 history: Optional[Callable[[], Iterable[Any]]] = None, searchable: bool = True):
+        """
+        初始化长期记忆
+
+        Args:
+            archive_path: 归档文件路径，为None时不写归档
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+            history: 返回用户完整历史条目（按时间顺序）的函数，提供时以其构建索引
+            searchable: 是否参与 ContextMemory.recall；为False时只作为向量索引的条目来源
+        """
+        self.archive_path = archive_path
+        self.history = history
+        self.searchable = searchable
+        self.index = BM25Index(k1=k1, b=b)
+        self.entries: List[Any] = []  # 文档序号到 MemoryEntry 的映射（已移除的为None）
+        self.id_to_doc: Dict[str, int] = {}
+        # 尚未写入归档（或存储）的修改：("add", 条目)、("update", 条目)、("delete", 记忆ID)
+        self._pending: List[Tuple[str, Any]] = []
+        # 没有可加载的历史时索引视为已构建
+        self._loaded = history is None and not (archive_path and os.path.exists(archive_path))
+
+    def __len__(self) -> int:
+        """已构建索引中的条目数量（索引尚未构建时不含历史条目）"""
+        return len(self.id_to_doc)
+
+    @property
+    def loaded(self) -> bool:
+        """索引是否已构建"""
+        return self._loaded
+
+    def _index(self, entry: Any) -> bool:
+        """将条目加入索引（已存在同ID条目时先移除），无可检索文本时跳过"""
+        self._unindex(entry.id)
+        tokens = tokenize(entry_text(entry.content))
+        if not tokens:
+            return False
+        self.id_to_doc[entry.id] = self.index.add(tokens)
+        self.entries.append(entry)
+        return True
+
+    def _unindex(self, memory_id: str) -> bool:
+        """从索引中移除条目"""
+        doc_idx = self.id_to_doc.pop(memory_id, None)
+        if doc_idx is None:
+            return False
+        self.index.remove(doc_idx)
+        self.entries[doc_idx] = None
+        return True
+
+    def _apply(self, op: str, arg: Any) -> None:
+        if op == "delete":
+            self._unindex(arg)
+        elif op == "update" or arg.id not in self.id_to_doc:
+            self._index(arg)
+
+    def add_entry(self, entry: Any) -> bool:
+        """
+        索引一个记忆条目（无可检索文本或已索引的条目会被跳过）
+
+        Args:
+            entry: MemoryEntry 实例
+
+        Returns:
+            bool: 是否加入了索引（索引尚未构建时为是否已暂存）
+        """
+        if self._loaded:
+            if entry.id in self.id_to_doc or not self._index(entry):
+                return False
+        elif not entry_text(entry.content).strip():
+            return False
+        self._pending.append(("add", entry))
+        return True
+
+    def update_entry(self, entry: Any) -> bool:
+        """
+        用修改后的内容重新索引条目
+
+        Args:
+            entry: 修改后的 MemoryEntry 实例
+
+        Returns:
+            bool: 索引是否发生了变化
+        """
+        if self._loaded:
+            removed = self._unindex(entry.id)
+            if not self._index(entry) and not removed:
+                return False
+        self._pending.append(("update", entry))
+        return True
+
+    def remove_entry(self, memory_id: str) -> bool:
+        """
+        从长期记忆中删除条目
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            bool: 索引是否发生了变化
+        """
+        if self._loaded and not self._unindex(memory_id):
+            return False
+        self._pending.append(("delete", memory_id))
+        return True
+
+    def get_entry(self, memory_id: str) -> Optional[Any]:
+        """按ID取出已索引的条目（必要时先构建索引）"""
+        self.load()
+        doc_idx = self.id_to_doc.get(memory_id)
+        return self.entries[doc_idx] if doc_idx is not None else None
+
+    def iter_entries(self) -> Iterator[Any]:
+        """按索引顺序遍历全部条目（必要时先构建索引）"""
+        self.load()
+        return (entry for entry in self.entries if entry is not None)
+
+    def search(self, query: str, k: int = 3, exclude_ids: Optional[Iterable[str]] = None) -> List[Tuple[Any, float]]:
+        """
+        检索与查询最相关的历史条目（第一次检索时构建索引）
+
+        Args:
+            query: 查询文本
+            k: 返回数量
+            exclude_ids: 需要排除的记忆ID（如已在近期窗口中的条目）
+
+        Returns:
+            List[Tuple[MemoryEntry, float]]: (记忆条目, 得分)，按得分降序排列
+        """
+        self.load()
+        exclude = None
+        if exclude_ids:
+            exclude = [self.id_to_doc[i] for i in exclude_ids if i in self.id_to_doc]
+        hits = self.index.search(tokenize(query), k, exclude)
+        return [(self.entries[doc_idx], score) for doc_idx, score in hits]
+
+    def load(self) -> int:
+        """
+        构建索引：从完整历史或归档文件加载条目，再应用构建之前暂存的修改（已构建时直接返回）
+
+        Returns:
+            int: 从历史或归档中加载的条目数量
+        """
+        if self._loaded:
+            return 0
+        loaded = 0
+        if self.history is not None:
+            for entry in self.history():
+                if self._index(entry):
+                    loaded += 1
+        elif self.archive_path and os.path.exists(self.archive_path):
+            # 动态导入utils模块以避免循环依赖
+            from utils import MemoryEntry
+
+            with open(self.archive_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                        if "deleted" in data:
+                            self._unindex(data["deleted"])
+                            continue
+                        entry = MemoryEntry.from_dict(data)
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"跳过损坏的长期记忆记录 {self.archive_path}: {e}")
+                        continue
+                    if self._index(entry):
+                        loaded += 1
+        self._loaded = True
+        for op, arg in self._pending:
+            self._apply(op, arg)
+        return loaded
+
+    def save(self) -> int:
+        """
+        将暂存的修改追加到归档文件（从存储历史构建时修改已由存储保存，只需清空暂存）
+
+        Returns:
+            int: 本次写入的记录数量
+        """
+        pending, self._pending = self._pending, []
+        if not pending or not self.archive_path:
+            return 0
+        try:
+            with open(self.archive_path, 'a', encoding='utf-8') as f:
+                for op, arg in pending:
+                    record = {"deleted": arg} if op == "delete" else arg.to_dict()
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                    f.write("\n")
+        except OSError:
+            # 写入失败时放回暂存，下次保存时重试
+            self._pending = pending + self._pending
+            raise
+        return len(pending)
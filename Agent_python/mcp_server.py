@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MCP（Model Context Protocol）服务：将各Agent注册的 base_tool 及各Agent本身发布为 MCP 工具
+
+传输方式：
+    stdio   每行一条 JSON-RPC 消息（客户端启动本进程，一个进程对应一个会话）
+    sse     GET /sse 建立事件流（首个 endpoint 事件给出消息地址），POST /messages?session_id=... 发送消息；
+            一个常驻进程同时服务多个会话
+
+用法示例：
+    python mcp_server.py                      # stdio
+    python mcp_server.py --transport sse --port 8765
+
+工具调用可在 params._meta.user_id 中指定用户（默认为系统默认用户），Agent工具也可在参数 user_id 中指定。
+"""
+
+import os
+import sys
+import json
+import uuid
+import signal
+import asyncio
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent_server import HttpError, MAX_HEADER_BYTES, read_http_request, write_http_head
+from storage_layout import check_user_id
+from user_session import user_session
+from agent_templates import use_agents
+
+# 配置日志（MCP 的 stdio 传输占用标准输出，日志只能写到标准错误）
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    stream=sys.stderr)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26", "2024-11-05")
+SERVER_INFO = {"name": "ai-teacher-agents", "version": "1.0.0"}
+
+# JSON-RPC 错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RpcError(Exception):
+    """JSON-RPC 错误"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class MCPToolRegistry:
+    """
+    MCP 工具表：
+    - 每个Agent注册的 base_tool 按 to_tool_spec 转为 MCP 工具（不同Agent的同名工具加上 "<agent>_" 前缀区分）
+    - 每个Agent本身发布为 agent_<名称> 工具，参数为 message 与可选的 user_id
+    工具在用户会话中执行，工具内部调用其他Agent时使用该用户的记忆库
+    """
+
+    def __init__(self, system: Any):
+        """
+        从 MultiAgentSystem 构建工具表
+
+        Args:
+            system: MultiAgentSystem 实例
+        """
+        self.system = system
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._handlers: Dict[str, Callable[[Dict[str, Any], str], Any]] = {}
+        owners: Dict[str, str] = {}
+        for agent_key, agent in system.agents.items():
+            for tool in agent.tools:
+                function = tool.to_tool_spec()["function"]
+                name = function["name"]
+                if name in owners:
+                    name = f"{agent_key}_{name}"
+                owners[name] = agent_key
+                self._add(name, function.get("description") or "",
+                          function.get("parameters") or {"type": "object", "properties": {}},
+                          lambda arguments, user_id, tool=tool: self._call_tool(tool, arguments, user_id))
+        for agent_key, agent in system.agents.items():
+            self._add(f"agent_{agent_key}", f"{agent.name}: {agent.description}", {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string", "description": f"交给{agent.name}处理的请求"},
+                    "user_id": {"type": "string", "description": "用户ID（可选）"}
+                },
+                "required": ["message"]
+            }, lambda arguments, user_id, key=agent_key: self._call_agent(key, arguments, user_id))
+
+    def _add(self, name: str, description: str, schema: Dict[str, Any],
+             handler: Callable[[Dict[str, Any], str], Any]) -> None:
+        self._tools[name] = {"name": name, "description": description, "inputSchema": schema}
+        self._handlers[name] = handler
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        """全部工具的 MCP 描述"""
+        return list(self._tools.values())
+
+    def _call_tool(self, tool: Any, arguments: Dict[str, Any], user_id: str) -> Any:
+        if not callable(getattr(tool, "tool_function", None)):
+            raise RpcError(INTERNAL_ERROR, f"工具 {tool.tool_name} 没有实现")
+        with user_session(user_id, self.system.user_manager), use_agents(self.system.agents):
+            return tool.tool_function(**arguments)
+
+    def _call_agent(self, agent_key: str, arguments: Dict[str, Any], user_id: str) -> Any:
+        message = arguments.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise RpcError(INVALID_PARAMS, "缺少 message")
+        target = arguments.get("user_id") or user_id
+        try:
+            check_user_id(target)
+        except ValueError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        return self.system.run_agent(agent_key, message, target)
+
+    def call(self, name: str, arguments: Dict[str, Any], user_id: str) -> str:
+        """
+        执行工具（阻塞，在线程池中调用）
+
+        Args:
+            name: 工具名称
+            arguments: 工具参数
+            user_id: 用户ID
+
+        Returns:
+            str: 工具结果文本
+        """
+        handler = self._handlers.get(name)
+        if handler is None:
+            raise RpcError(INVALID_PARAMS, f"未知的工具: {name}")
+        return str(handler(arguments, user_id))
+
+
+class MCPSession:
+    """
+    一个 MCP 客户端会话：
+    - 请求各自作为 asyncio 任务并发执行，工具在共享线程池中运行
+    - 收到 notifications/cancelled 时取消对应请求并不再回复（已在线程中执行的工具无法中断，其结果被丢弃）
+    """
+
+    def __init__(self, server: "MCPServer", send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 session_id: Optional[str] = None):
+        """
+        初始化会话
+
+        Args:
+            server: 所属服务
+            send: 发送一条 JSON-RPC 消息的协程函数
+            session_id: 会话ID
+        """
+        self.server = server
+        self.send = send
+        self.session_id = session_id or uuid.uuid4().hex
+        self.initialized = False
+        self.client_info: Dict[str, Any] = {}
+        self._tasks: Dict[Any, asyncio.Task] = {}
+
+    async def receive(self, raw: Any) -> None:
+        """
+        处理收到的一条消息（或批量消息）
+
+        Args:
+            raw: JSON 文本或已解析的消息
+        """
+        if isinstance(raw, (str, bytes)):
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                await self.send(_error(None, PARSE_ERROR, "JSON 解析失败"))
+                return
+        for message in (raw if isinstance(raw, list) else [raw]):
+            self._receive_one(message)
+
+    def _receive_one(self, message: Any) -> None:
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0":
+            asyncio.ensure_future(self.send(_error(None, INVALID_REQUEST, "不是合法的 JSON-RPC 2.0 消息")))
+            return
+        method = message.get("method")
+        if method is None:
+            return  # 客户端对服务端请求的响应（本服务不发起请求）
+        request_id = message.get("id")
+        params = message.get("params") or {}
+        if request_id is None:
+            self._notify(method, params)
+            return
+        task = asyncio.ensure_future(self._respond(request_id, method, params))
+        self._tasks[request_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(request_id, None))
+
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        if method == "notifications/initialized":
+            self.initialized = True
+        elif method == "notifications/cancelled":
+            task = self._tasks.get(params.get("requestId"))
+            if task is not None:
+                logger.info(f"会话 {self.session_id} 取消请求 {params.get('requestId')}: {params.get('reason', '')}")
+                task.cancel()
+
+    async def _respond(self, request_id: Any, method: str, params: Dict[str, Any]) -> None:
+        try:
+            result = await self._handle(method, params)
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except asyncio.CancelledError:
+            return  # 被取消的请求不再回复
+        except RpcError as e:
+            response = _error(request_id, e.code, e.message)
+        except Exception as e:
+            logger.error(f"处理 {method} 时出错: {e}")
+            response = _error(request_id, INTERNAL_ERROR, str(e))
+        await self.send(response)
+
+    async def _handle(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if method == "initialize":
+            requested = params.get("protocolVersion")
+            self.client_info = params.get("clientInfo") or {}
+            version = requested if requested in SUPPORTED_PROTOCOL_VERSIONS else SUPPORTED_PROTOCOL_VERSIONS[0]
+            return {"protocolVersion": version, "capabilities": {"tools": {"listChanged": False}},
+                    "serverInfo": SERVER_INFO}
+        if method == "ping":
+            return {}
+        if method == "tools/list":
+            return {"tools": self.server.registry.list_tools()}
+        if method == "tools/call":
+            return await self._call_tool(params)
+        raise RpcError(METHOD_NOT_FOUND, f"不支持的方法: {method}")
+
+    async def _call_tool(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        name = params.get("name")
+        arguments = params.get("arguments") or {}
+        if not isinstance(name, str) or not isinstance(arguments, dict):
+            raise RpcError(INVALID_PARAMS, "tools/call 需要 name 与对象类型的 arguments")
+        user_id = str((params.get("_meta") or {}).get("user_id") or self.server.system.user_id)
+        try:
+            check_user_id(user_id)
+        except ValueError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        try:
+            text = await self.server.run_tool(name, arguments, user_id)
+            return {"content": [{"type": "text", "text": text}], "isError": False}
+        except RpcError:
+            raise
+        except asyncio.TimeoutError:
+            return {"content": [{"type": "text", "text": f"工具 {name} 执行超时"}], "isError": True}
+        except Exception as e:
+            # 工具自身的错误作为结果返回，让调用方模型可以看到并处理
+            return {"content": [{"type": "text", "text": f"工具 {name} 执行出错: {e}"}], "isError": True}
+
+    def close(self) -> None:
+        """取消会话中尚未完成的请求"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class MCPServer:
+    """
+    常驻的 MCP 服务：启动时构建一次Agent与工具表，所有会话共享，工具调用无需每次启动进程
+    """
+
+    def __init__(self, system: Any, workers: int = 16, tool_timeout: float = 120.0, heartbeat: float = 15.0):
+        """
+        初始化服务
+
+        Args:
+            system: MultiAgentSystem 实例
+            workers: 同时执行的工具调用数上限（线程池大小）
+            tool_timeout: 单次工具调用的超时（秒）
+            heartbeat: SSE 事件流的心跳间隔（秒）
+        """
+        self.system = system
+        self.registry = MCPToolRegistry(system)
+        self.tool_timeout = tool_timeout
+        self.heartbeat = heartbeat
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-tool")
+        self.sessions: Dict[str, MCPSession] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def run_tool(self, name: str, arguments: Dict[str, Any], user_id: str) -> str:
+        """
+        在线程池中执行工具
+
+        Args:
+            name: 工具名称
+            arguments: 工具参数
+            user_id: 用户ID
+
+        Returns:
+            str: 工具结果文本
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self.registry.call, name, arguments, user_id)
+        return await asyncio.wait_for(future, self.tool_timeout)
+
+    async def serve_stdio(self) -> None:
+        """
+        通过标准输入/输出服务单个会话，直到标准输入关闭
+        """
+        loop = asyncio.get_running_loop()
+        # 协议消息独占原始标准输出，其余代码中的 print 改为写到标准错误
+        out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb', buffering=0)
+        sys.stdout = sys.stderr
+        reader = asyncio.StreamReader(limit=16 * 1024 * 1024)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        lock = asyncio.Lock()
+
+        async def send(message: Dict[str, Any]) -> None:
+            data = (json.dumps(message, ensure_ascii=False, separators=(',', ':')) + "\n").encode("utf-8")
+            async with lock:
+                await loop.run_in_executor(None, out.write, data)
+
+        session = MCPSession(self, send, "stdio")
+        self.sessions[session.session_id] = session
+        logger.info(f"MCP 服务（stdio）已启动，共 {len(self.registry.list_tools())} 个工具")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await session.receive(line)
+        finally:
+            session.close()
+            self.sessions.pop(session.session_id, None)
+
+    async def start_sse(self, host: str = "127.0.0.1", port: int = 8765) -> "MCPServer":
+        """
+        开始以 HTTP+SSE 传输监听
+
+        Args:
+            host: 监听地址
+            port: 监听端口（0 表示随机端口）
+
+        Returns:
+            MCPServer: self，便于链式调用
+        """
+        self._server = await asyncio.start_server(self._handle_http, host, port, limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"MCP 服务（sse）已启动: http://{host}:{self.port}/sse，共 {len(self.registry.list_tools())} 个工具")
+        return self
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_http_request(reader, 4 * 1024 * 1024)
+                except HttpError as e:
+                    await self._send_plain(writer, e.status, e.message, False)
+                    break
+                if request is None:
+                    break
+                if request.method == "GET" and request.path == "/sse":
+                    await self._event_stream(reader, writer)
+                    break
+                if request.method == "POST" and request.path == "/messages":
+                    session = self.sessions.get(request.query.get("session_id", ""))
+                    if session is None:
+                        await self._send_plain(writer, 404, "会话不存在", request.keep_alive)
+                    else:
+                        await self._send_plain(writer, 202, "Accepted", request.keep_alive)
+                        await session.receive(request.body)
+                else:
+                    await self._send_plain(writer, 404, "未找到", request.keep_alive)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send_plain(self, writer: asyncio.StreamWriter, status: int, text: str, keep_alive: bool) -> None:
+        body = text.encode("utf-8")
+        write_http_head(writer, status, {"Content-Type": "text/plain; charset=utf-8",
+                                         "Content-Length": str(len(body))}, keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    async def _event_stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """为一个新会话保持事件流，直到客户端断开（断开后立即取消该会话中的请求）"""
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def send(message: Dict[str, Any]) -> None:
+            await queue.put(message)
+
+        session = MCPSession(self, send)
+        self.sessions[session.session_id] = session
+        write_http_head(writer, 200, {"Content-Type": "text/event-stream; charset=utf-8",
+                                      "Cache-Control": "no-cache"}, False)
+        try:
+            writer.write(f"event: endpoint\ndata: /messages?session_id={session.session_id}\n\n".encode("utf-8"))
+            await writer.drain()
+            # 事件流上客户端不再发送数据，读到 EOF 即表示断开
+            disconnected = asyncio.ensure_future(reader.read())
+            pending = None
+            while True:
+                pending = pending or asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({pending, disconnected}, timeout=self.heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    pending.cancel()
+                    break
+                if pending in done:
+                    data = json.dumps(pending.result(), ensure_ascii=False, separators=(',', ':'))
+                    writer.write(f"event: message\ndata: {data}\n\n".encode("utf-8"))
+                    pending = None
+                else:
+                    writer.write(b": ping\n\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            session.close()
+            self.sessions.pop(session.session_id, None)
+
+    async def shutdown(self) -> None:
+        """停止监听、取消所有会话中的请求并保存记忆库"""
+        if self._server is not None:
+            self._server.close()
+        for session in list(self.sessions.values()):
+            session.close()
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+        self.system.shutdown()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    from multi_agent_system import MultiAgentSystem
+    server = MCPServer(MultiAgentSystem(user_id=args.user_id), workers=args.workers, tool_timeout=args.timeout)
+    try:
+        if args.transport == "stdio":
+            await server.serve_stdio()
+            return
+        await server.start_sse(args.host, args.port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows 下依赖 KeyboardInterrupt
+        await stop.wait()
+    finally:
+        await server.shutdown()
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="以 MCP 协议发布Agent与工具")
+    parser.add_argument("--transport", choices=("stdio", "sse"), default="stdio", help="传输方式")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（sse）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口（sse）")
+    parser.add_argument("--workers", type=int, default=16, help="同时执行的工具调用数上限")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单次工具调用的超时（秒）")
+    parser.add_argument("--user-id", default="default", help="未指定用户时使用的用户")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
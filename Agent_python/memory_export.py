@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+对话历史流式导出
+
+用法示例：
+    python memory_export.py --format csv --since 2025-09-01 --role tool --tool explain_concept -o tools.csv
+    python memory_export.py --user u1 --user u2 --agent TeachingAgent > u1_u2.jsonl
+"""
+
+import os
+import sys
+import csv
+import json
+import sqlite3
+import argparse
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# CSV 的固定列（JSONL 输出使用相同的字段）
+EXPORT_COLUMNS = ("user_id", "id", "timestamp", "role", "agent", "name", "status", "content", "metadata")
+EXPORT_FORMATS = ("jsonl", "csv")
+
+
+def entry_to_row(user_id: str, entry: Any) -> Dict[str, Any]:
+    """
+    将记忆条目展开为导出行
+
+    Args:
+        user_id: 用户ID
+        entry: MemoryEntry 实例
+
+    Returns:
+        Dict[str, Any]: 以 EXPORT_COLUMNS 为键的字典
+    """
+    content = entry.content if isinstance(entry.content, dict) else {"content": entry.content}
+    text = content.get("content")
+    if text is not None and not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False, default=str)
+    return {
+        "user_id": user_id,
+        "id": entry.id,
+        "timestamp": entry.timestamp.isoformat(),
+        "role": content.get("role", ""),
+        "agent": (entry.metadata or {}).get("agent", ""),
+        "name": content.get("name", ""),
+        "status": content.get("status", ""),
+        "content": text if text is not None else "",
+        "metadata": entry.metadata or {},
+    }
+
+
+def iter_export(storage: Any, user_ids: Optional[Iterable[str]] = None, start: Optional[datetime] = None,
+                end: Optional[datetime] = None, roles: Optional[Iterable[str]] = None,
+                agents: Optional[Iterable[str]] = None, tool_names: Optional[Iterable[str]] = None,
+                failures: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    逐个用户、逐条流式导出历史记录，内存占用与历史总量无关
+
+    Args:
+        storage: 实现 list_user_ids/iter_history 的存储对象（JsonlMemoryStore 或 SQLiteMemoryStore）
+        user_ids: 只导出这些用户，为None时导出全部用户
+        start: 起始时间（包含）
+        end: 结束时间（不包含）
+        roles: 只导出这些角色（user/assistant/tool/system）
+        agents: 只导出这些Agent产生的记录（metadata 中的 agent）
+        tool_names: 只导出这些工具的调用结果（role 为 tool 且 name 匹配）
+        failures: 提供时记录导出出错的用户ID（出错用户已导出的行不会撤回）
+
+    Returns:
+        Iterator[Dict[str, Any]]: 导出行
+    """
+    roles = set(roles) if roles else None
+    agents = set(agents) if agents else None
+    tool_names = set(tool_names) if tool_names else None
+    for user_id in (user_ids if user_ids is not None else storage.list_user_ids()):
+        try:
+            history = storage.iter_history(user_id, start=start, end=end)
+            for entry in history:
+                content = entry.content if isinstance(entry.content, dict) else {}
+                if roles is not None and content.get("role") not in roles:
+                    continue
+                if agents is not None and (entry.metadata or {}).get("agent") not in agents:
+                    continue
+                if tool_names is not None and (content.get("role") != "tool" or content.get("name") not in tool_names):
+                    continue
+                yield entry_to_row(user_id, entry)
+        except Exception as e:
+            logger.error(f"导出用户 {user_id} 的历史时出错: {e}")
+            if failures is not None:
+                failures.append(user_id)
+
+
+def write_jsonl(rows: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """
+    以 JSONL 格式写出导出行
+
+    Returns:
+        int: 写出的行数
+    """
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False, separators=(',', ':'), default=str))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """
+    以固定列的 CSV 格式写出导出行（metadata 列为 JSON 字符串）
+
+    Returns:
+        int: 写出的行数
+    """
+    writer = csv.writer(stream)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        row = dict(row, metadata=json.dumps(row["metadata"], ensure_ascii=False, default=str))
+        writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        count += 1
+    return count
+
+
+def export_history(storage: Any, stream: TextIO, fmt: str = "jsonl", **filters: Any) -> int:
+    """
+    导出历史记录到文本流
+
+    Args:
+        storage: 存储对象
+        stream: 输出流
+        fmt: 输出格式（jsonl/csv）
+        **filters: 传给 iter_export 的过滤条件
+
+    Returns:
+        int: 导出的行数
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"fmt must be one of {EXPORT_FORMATS}, got {fmt!r}")
+    rows = iter_export(storage, **filters)
+    return write_csv(rows, stream) if fmt == "csv" else write_jsonl(rows, stream)
+
+
+def open_storage(storage_path: str, backend: Optional[str] = None) -> Any:
+    """
+    以只读方式打开记忆库存储（默认与 UserManager 相同，由 MEMORY_STORAGE_BACKEND 环境变量决定），
+    不迁移、不解冻、不创建任何文件
+
+    Args:
+        storage_path: 存储目录
+        backend: jsonl 或 sqlite
+
+    Returns:
+        存储对象
+
+    Raises:
+        ValueError: 存储目录中还有未迁移的扁平布局文件（需先运行 python storage_layout.py migrate）
+    """
+    backend = (backend or os.getenv("MEMORY_STORAGE_BACKEND", "jsonl")).lower()
+    if backend == "sqlite":
+        from sqlite_memory_store import SQLiteMemoryStore
+        return SQLiteMemoryStore(storage_path, read_only=True)
+    from memory_store import JsonlMemoryStore
+    return JsonlMemoryStore(storage_path, read_only=True)
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="流式导出用户对话历史")
+    parser.add_argument("--storage", default="user_memories", help="存储目录")
+    parser.add_argument("--backend", choices=("jsonl", "sqlite"), help="存储后端，默认读取 MEMORY_STORAGE_BACKEND")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl", help="输出格式")
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    parser.add_argument("--user", action="append", help="只导出指定用户（可重复）")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="起始时间（ISO 格式，包含）")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="结束时间（ISO 格式，不包含）")
+    parser.add_argument("--role", action="append", help="只导出指定角色（可重复）")
+    parser.add_argument("--agent", action="append", help="只导出指定Agent的记录（可重复）")
+    parser.add_argument("--tool", action="append", help="只导出指定工具的调用结果（可重复）")
+    args = parser.parse_args(argv)
+
+    try:
+        storage = open_storage(args.storage, args.backend)
+    except (ValueError, sqlite3.Error) as e:
+        logger.error(f"无法打开存储: {e}")
+        return 2
+    failures: List[str] = []
+    filters = dict(user_ids=args.user, start=args.since, end=args.until,
+                   roles=args.role, agents=args.agent, tool_names=args.tool, failures=failures)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            count = export_history(storage, f, args.format, **filters)
+    else:
+        count = export_history(storage, sys.stdout, args.format, **filters)
+    logger.info(f"共导出 {count} 条记录")
+    if failures:
+        logger.error(f"{len(failures)} 个用户导出失败: {', '.join(failures[:20])}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
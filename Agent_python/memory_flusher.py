@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import atexit
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class MemoryFlusher:
+    """
+    记忆库后台刷盘线程（write-behind）：
+    - 请求路径只修改内存中的 ContextMemory 并标记为脏，不等待磁盘
+    - 后台线程定期把修改时间超过 max_staleness 秒的脏记忆库批量写入存储
+    - request_flush() 可要求尽快保存全部脏记忆库；stop() 时做最后一次完整保存
+    - 每隔 tier_interval 秒执行一次 UserManager.apply_tiering()，移出空闲用户并压缩长期不活跃的用户
+    """
+
+    def __init__(self, user_manager: Any, max_staleness: float = 5.0, interval: Optional[float] = None,
+                 tier_interval: Optional[float] = 600.0):
+        """
+        初始化刷盘线程
+
+        Args:
+            user_manager: UserManager 实例
+            max_staleness: 未保存修改允许存在的最长时间（秒）
+            interval: 检查间隔（秒），默认为 max_staleness 的一半
+            tier_interval: 分层检查间隔（秒），为None时不执行分层
+        """
+        self.user_manager = user_manager
+        self.max_staleness = max(0.0, max_staleness)
+        self.interval = interval if interval is not None else max(0.05, self.max_staleness / 2)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_all = False
+        self.tier_interval = tier_interval
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"flushes": 0, "users_saved": 0, "errors": 0, "last_flush_seconds": 0.0,
+                                      "tiering_runs": 0, "idle_evicted": 0, "frozen": 0}
+
+    def start(self) -> "MemoryFlusher":
+        """
+        启动后台线程，并让 UserManager 把被淘汰用户的写回也交给本线程
+
+        Returns:
+            MemoryFlusher: 自身，便于链式调用
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stopping.clear()
+        self.user_manager.write_behind = True
+        self._thread = threading.Thread(target=self._run, name="MemoryFlusher", daemon=True)
+        self._thread.start()
+        # 进程退出时兜底保存
+        atexit.register(self.stop)
+        return self
+
+    def request_flush(self) -> None:
+        """请求尽快保存全部脏记忆库（不等待完成）"""
+        self._flush_all = True
+        self._wakeup.set()
+
+    def flush_now(self, max_staleness: float = 0.0) -> int:
+        """
+        在当前线程立即保存
+
+        Args:
+            max_staleness: 允许未保存修改存在的最长时间（秒）
+
+        Returns:
+            int: 保存的用户数量
+        """
+        started = time.perf_counter()
+        try:
+            saved = self.user_manager.flush_dirty(max_staleness)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"刷盘时出错: {e}")
+            return 0
+        self.stats["flushes"] += 1
+        self.stats["users_saved"] += saved
+        self.stats["last_flush_seconds"] = time.perf_counter() - started
+        return saved
+
+    def apply_tiering(self) -> None:
+        """在当前线程立即执行一次分层"""
+        try:
+            result = self.user_manager.apply_tiering()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"执行记忆库分层时出错: {e}")
+            return
+        self.stats["tiering_runs"] += 1
+        self.stats["idle_evicted"] += result.get("evicted", 0)
+        self.stats["frozen"] += result.get("frozen", 0)
+
+    def _run(self) -> None:
+        next_tiering = time.monotonic() + self.tier_interval if self.tier_interval else None
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            flush_all, self._flush_all = self._flush_all, False
+            self.flush_now(0.0 if flush_all else self.max_staleness)
+            if next_tiering is not None and time.monotonic() >= next_tiering:
+                self.apply_tiering()
+                next_tiering = time.monotonic() + self.tier_interval
+
+    def stop(self, flush: bool = True, timeout: Optional[float] = 10.0) -> None:
+        """
+        停止后台线程
+
+        Args:
+            flush: 是否在停止后保存全部脏记忆库
+            timeout: 等待线程退出的最长时间（秒）
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stopping.set()
+        self._wakeup.set()
+        if thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.user_manager.write_behind = False
+        if flush:
+            self.flush_now(0.0)
+        try:
+            atexit.unregister(self.stop)
+        except Exception:
+            pass
@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import uuid
+import heapq
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from binary_snapshot import BinarySnapshotReader, write_snapshot
+from cold_storage import extract_cold_archive, iter_cold_archive, write_cold_archive
+from storage_layout import ShardedLayout, USER_FILE_SUFFIXES
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "batch", "none")
+SNAPSHOT_FORMATS = ("binary", "json")
+
+
+def _compact_json(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class JsonlMemoryStore:
+    """
+    用户记忆库的追加式存储：
+    - <user_id>.snap      二进制快照（见 binary_snapshot），通过 mmap 读取，只解码需要的条目
+    - <user_id>.json      JSON 快照，记录记忆条目列表及其已包含的日志编号（仍可读取旧版的纯列表格式）
+    - <user_id>.wal.jsonl 追加日志，首行为带编号的日志头，之后每次 add_memory 对应一行紧凑 JSON
+    - <user_id>.hist.jsonl 历史日志，压缩时把日志整段追加进来，保存窗口之外的完整历史（供 iter_history 导出）
+    保存时只追加自上次保存以来的修改，日志行数达到 compact_threshold 时写入新快照并把日志并入历史日志；
+    加载时读取快照后按顺序重放日志（快照已包含的日志会被跳过，压缩中途崩溃也不会重复重放）。
+    长期不活跃的用户可通过 freeze() 把全部文件压缩为 <user_id>.cold，下次加载或保存时自动解压（thaw）。
+    温/冷两层的用户数与字节数在首次 tier_sizes() 时统计一次，之后由 save/compact/freeze/thaw/delete 增量更新。
+    文件按用户ID哈希分片存放，用户枚举读取清单文件（见 storage_layout.ShardedLayout）
+    """
+
+    def __init__(self, storage_path: str = "user_memories", fsync_policy: str = "batch",
+                 compact_threshold: int = 200, snapshot_format: str = "binary", read_only: bool = False):
+        """
+        初始化存储
+
+        Args:
+            storage_path: 存储目录
+            fsync_policy: 落盘策略：always 每行 fsync，batch 每次保存 fsync 一次，none 交给操作系统
+            compact_threshold: 日志行数达到该值时进行快照压缩
+            snapshot_format: 写入快照的格式（binary/json），两种格式的快照都可以读取
+            read_only: 只读打开（用于导出等离线读取），保存、压缩、删除与冷热转换会抛出 ValueError
+
+        Raises:
+            ValueError: 参数非法，或只读打开时还有未迁移的扁平布局文件
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}, got {fsync_policy!r}")
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"snapshot_format must be one of {SNAPSHOT_FORMATS}, got {snapshot_format!r}")
+        self.storage_path = storage_path
+        self.fsync_policy = fsync_policy
+        self.snapshot_format = snapshot_format
+        self.compact_threshold = max(1, compact_threshold)
+        self.read_only = read_only
+        self.layout = ShardedLayout(storage_path, read_only=read_only)
+        self._log_lines: Dict[str, int] = {}  # 用户ID到当前日志记录行数的映射
+        self._wal_ids: Dict[str, str] = {}  # 用户ID到当前日志编号的映射
+        self.tier_stats: Dict[str, Any] = {"freezes": 0, "thaws": 0, "thaw_seconds_total": 0.0,
+                                           "thaw_seconds_max": 0.0, "bytes_before_freeze": 0,
+                                           "bytes_after_freeze": 0}
+        # 用户ID到（是否为冷存储, 字节数）的映射及两层的合计，首次调用 tier_sizes 前为None（不统计）
+        self._tier_users: Optional[Dict[str, Tuple[bool, int]]] = None
+        self._tier_totals: Dict[str, int] = {"warm_users": 0, "warm_bytes": 0, "cold_users": 0, "cold_bytes": 0}
+        self._tier_lock = threading.Lock()
+
+    def path_for(self, user_id: str, suffix: str, create: bool = True) -> str:
+        """
+        获取用户某一存储文件的路径
+
+        Args:
+            user_id: 用户ID
+            suffix: 文件后缀，如".json"
+            create: 是否创建所在的分片目录（只检查文件是否存在时传False）
+
+        Returns:
+            str: 文件路径
+        """
+        return self.layout.path_for(user_id, suffix, create)
+
+    def exists(self, user_id: str) -> bool:
+        """判断用户是否有持久化数据"""
+        return any(os.path.exists(self.path_for(user_id, suffix, create=False))
+                   for suffix in (".snap", ".json", ".wal.jsonl", ".cold"))
+
+    def list_user_ids(self) -> Iterator[str]:
+        """
+        枚举有持久化数据的用户ID（读取清单文件，不列出目录）
+
+        Returns:
+            Iterator[str]: 用户ID
+        """
+        return self.layout.users()
+
+    def load(self, user_id: str, max_memory_size: int = 100) -> Optional[Any]:
+        """
+        加载用户记忆库：读取快照并重放日志
+
+        Args:
+            user_id: 用户ID
+            max_memory_size: 记忆库最大条目数量
+
+        Returns:
+            ContextMemory: 加载的记忆库，没有持久化数据时返回None
+        """
+        if not self.exists(user_id):
+            return None
+        self._ensure_warm(user_id)
+
+        memory, wal_id, lines = self._read_memory(user_id, self._user_files(user_id), max_memory_size)
+        if wal_id is None:
+            self._wal_ids.pop(user_id, None)
+        else:
+            self._wal_ids[user_id] = wal_id
+        self._log_lines[user_id] = lines
+        return memory
+
+    def _read_memory(self, user_id: str, files: Dict[str, str], max_memory_size: int) -> tuple:
+        """
+        由快照与日志文件构建记忆库
+
+        Args:
+            user_id: 用户ID（用于日志输出）
+            files: 后缀到文件路径的映射（只需包含存在的文件）
+            max_memory_size: 记忆库最大条目数量
+
+        Returns:
+            tuple: (记忆库, 当前日志编号, 已重放的日志行数)
+        """
+        # 动态导入utils模块以避免循环依赖
+        from utils import ContextMemory, MemoryEntry
+
+        memory = ContextMemory(max_memory_size)
+        covered_wal_id = self._load_snapshot(files, memory, MemoryEntry)
+        log_path = files.get(".wal.jsonl")
+
+        lines = 0
+        wal_id = None
+        if log_path:
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 进程崩溃时最后一行可能写了一半，忽略即可
+                        logger.warning(f"跳过用户 {user_id} 日志中不完整的记录")
+                        continue
+                    if record.get("op") == "header":
+                        if record.get("wal_id") == covered_wal_id:
+                            # 快照已包含该日志（压缩后未来得及删除日志）
+                            break
+                        wal_id = record.get("wal_id")
+                        continue
+                    self._replay(memory, record, MemoryEntry)
+                    lines += 1
+
+        memory.drain_journal()
+        return memory, wal_id, lines
+
+    @staticmethod
+    def _load_snapshot(files: Dict[str, str], memory: Any, entry_cls: Any) -> Optional[str]:
+        """
+        将快照载入记忆库（二进制快照只解码最后 max_memory_size 个条目）
+
+        Returns:
+            Optional[str]: 快照已包含的日志编号
+        """
+        binary_path = files.get(".snap")
+        json_path = files.get(".json")
+        # 两种快照同时存在（切换格式时中途崩溃）时以较新的为准
+        if binary_path and (not json_path or os.path.getmtime(binary_path) >= os.path.getmtime(json_path)):
+            with BinarySnapshotReader(binary_path) as reader:
+                for entry in reader.last(memory.max_memory_size):
+                    memory._append_entry(entry)
+                return reader.wal_covered
+
+        if not json_path:
+            return None
+        with open(json_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        covered_wal_id = None
+        if isinstance(snapshot, dict):
+            covered_wal_id = snapshot.get("wal_covered")
+            snapshot = snapshot.get("entries", [])
+        for entry_data in snapshot:
+            memory._append_entry(entry_cls.from_dict(entry_data))
+        return covered_wal_id
+
+    def read_last(self, user_id: str, n: int) -> List[Any]:
+        """
+        读取用户最近 n 个条目而不加载整个记忆库
+        （没有未压缩的日志时直接从二进制快照中解码，否则回退为完整加载）
+
+        Args:
+            user_id: 用户ID
+            n: 数量
+
+        Returns:
+            List[MemoryEntry]: 按时间顺序排列的条目
+        """
+        self._ensure_warm(user_id)
+        binary_path = self.path_for(user_id, ".snap")
+        if os.path.exists(binary_path) and not os.path.exists(self.path_for(user_id, ".wal.jsonl")):
+            with BinarySnapshotReader(binary_path) as reader:
+                return reader.last(n)
+        memory = self.load(user_id, max(1, n))
+        return list(memory.memories[-n:]) if memory is not None and n > 0 else []
+
+    def read_entry(self, user_id: str, memory_id: str) -> Optional[Any]:
+        """
+        按ID读取单个条目而不加载整个记忆库（有未压缩的日志时回退为完整加载）
+
+        Args:
+            user_id: 用户ID
+            memory_id: 记忆ID
+
+        Returns:
+            MemoryEntry: 记忆条目，不存在时返回None
+        """
+        self._ensure_warm(user_id)
+        binary_path = self.path_for(user_id, ".snap")
+        if os.path.exists(binary_path) and not os.path.exists(self.path_for(user_id, ".wal.jsonl")):
+            with BinarySnapshotReader(binary_path) as reader:
+                return reader.find(memory_id)
+        memory = self.load(user_id)
+        return memory.get_memory(memory_id) if memory is not None else None
+
+    def iter_history(self, user_id: str, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> Iterator[Any]:
+        """
+        按时间顺序流式读取用户的完整历史：历史日志与当前日志中的全部条目（修改后的内容、保留首次写入的时间，
+        已删除或清空的不再出现），再合并快照与长期记忆归档中日志没有覆盖的条目（历史日志出现之前的旧数据）。
+        日志读取两遍，内存中只保存条目ID与被修改条目的最新版本；冷存储用户解压到临时目录读取，不会改变其分层
+
+        Args:
+            user_id: 用户ID
+            start: 起始时间（包含）
+            end: 结束时间（不包含）
+
+        Returns:
+            Iterator[MemoryEntry]: 记忆条目
+        """
+        if self.is_cold(user_id):
+            # 只读打开时解压到系统临时目录，不在存储目录中创建文件
+            with tempfile.TemporaryDirectory(dir=None if self.read_only else self.storage_path) as directory:
+                files = extract_cold_archive(self.path_for(user_id, ".cold"), directory)
+                yield from self._iter_history_files(files, start, end)
+        else:
+            yield from self._iter_history_files(self._user_files(user_id), start, end)
+
+    @staticmethod
+    def _iter_log_records(paths: List[str]) -> Iterator[Dict[str, Any]]:
+        """
+        按顺序读取日志记录（跳过日志头与损坏的行；同一编号的日志段重复出现时只读第一次）
+
+        Args:
+            paths: 日志文件路径（历史日志在前）
+
+        Returns:
+            Iterator[Dict[str, Any]]: 日志记录
+        """
+        seen_segments = set()
+        skipping = False
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(record, dict):
+                        continue
+                    if record.get("op") == "header":
+                        skipping = record.get("wal_id") in seen_segments
+                        seen_segments.add(record.get("wal_id"))
+                    elif not skipping:
+                        yield record
+
+    @staticmethod
+    def _iter_archive_records(path: str) -> Iterator[Dict[str, Any]]:
+        """按日志记录的形式读取长期记忆归档（重复出现的ID为修改，{"deleted": ID} 为删除）"""
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(data, dict):
+                    yield {"op": "delete", "id": data["deleted"]} if "deleted" in data else {"op": "add", "entry": data}
+
+    @staticmethod
+    def _scan_records(records: Iterator[Dict[str, Any]]) -> tuple:
+        """
+        第一遍扫描：收集写入过的条目ID、被修改条目的最新版本、删除的ID与最后一次清空的位置
+
+        Returns:
+            tuple: (写入过的ID, 最新版本, 删除的ID, 最后一次清空之前的记录数)
+        """
+        added, latest, deleted, cleared = set(), {}, set(), 0
+        for position, record in enumerate(records):
+            op = record.get("op")
+            data = record.get("entry") or {}
+            if op in ("add", "update") and data.get("id") in added:
+                latest[data["id"]] = data
+            elif op == "add":
+                added.add(data.get("id"))
+            elif op == "delete":
+                deleted.add(record.get("id"))
+            elif op == "clear":
+                cleared = position + 1
+        return added, latest, deleted, cleared
+
+    @staticmethod
+    def _replay_history(records: Iterator[Dict[str, Any]], scan: tuple, exclude: set) -> Iterator[Any]:
+        """
+        第二遍扫描：按写入顺序产出仍然存在的条目（内容取最新版本，时间保留首次写入的时间）
+
+        Args:
+            records: 与第一遍相同的日志记录
+            scan: _scan_records 的结果
+            exclude: 不需要产出的条目ID
+        """
+        # 动态导入utils模块以避免循环依赖
+        from utils import MemoryEntry
+
+        _, latest, deleted, cleared = scan
+        emitted = set()
+        for position, record in enumerate(records):
+            data = record.get("entry") or {}
+            memory_id = data.get("id")
+            if (record.get("op") != "add" or position < cleared or memory_id in deleted
+                    or memory_id in exclude or memory_id in emitted):
+                continue
+            emitted.add(memory_id)
+            try:
+                entry = MemoryEntry.from_dict(data)
+                if memory_id in latest:
+                    entry.content = latest[memory_id]["content"]
+                    entry.metadata = latest[memory_id].get("metadata", {})
+            except (ValueError, KeyError, TypeError):
+                continue
+            yield entry
+
+    def _iter_history_files(self, files: Dict[str, str], start: Optional[datetime],
+                            end: Optional[datetime]) -> Iterator[Any]:
+        # 动态导入utils模块以避免循环依赖
+        from utils import ContextMemory, MemoryEntry
+
+        log_paths = [files[suffix] for suffix in (".hist.jsonl", ".wal.jsonl") if suffix in files]
+        scan = self._scan_records(self._iter_log_records(log_paths))
+        sources = [self._replay_history(self._iter_log_records(log_paths), scan, set())]
+        # 历史日志出现之前的旧数据（快照窗口与长期记忆归档）；日志中清空过时全部作废
+        added, _, deleted, cleared = scan
+        if not cleared:
+            covered = added | deleted
+            window = ContextMemory(1 << 30)
+            self._load_snapshot(files, window, MemoryEntry)
+            sources.append(iter([entry for entry in window.memories if entry.id not in covered]))
+            archive = files.get(".ltm.jsonl")
+            if archive:
+                covered |= {entry.id for entry in window.memories}
+                sources.append(self._replay_history(self._iter_archive_records(archive),
+                                                    self._scan_records(self._iter_archive_records(archive)), covered))
+
+        for entry in heapq.merge(*sources, key=lambda e: e.timestamp):
+            if end is not None and entry.timestamp >= end:
+                return
+            if start is None or entry.timestamp >= start:
+                yield entry
+
+    @staticmethod
+    def _replay(memory: Any, record: Dict[str, Any], entry_cls: Any) -> None:
+        """将一条日志记录应用到记忆库"""
+        op = record.get("op")
+        if op == "add":
+            memory._append_entry(entry_cls.from_dict(record["entry"]))
+        elif op == "update":
+            data = record["entry"]
+            entry = memory.get_memory(data["id"])
+            if entry is not None:
+                memory.update_memory(data["id"], content=data["content"], metadata=data.get("metadata", {}))
+                entry.timestamp = entry_cls.from_dict(data).timestamp
+        elif op == "delete":
+            memory.delete_memory(record["id"])
+        elif op == "clear":
+            memory.clear_memories()
+
+    def save(self, user_id: str, memory: Any) -> int:
+        """
+        追加保存自上次保存以来的修改，必要时进行快照压缩
+
+        Args:
+            user_id: 用户ID
+            memory: 用户记忆库
+
+        Returns:
+            int: 本次追加的日志行数（进行完整快照时为0）
+        """
+        self._check_writable()
+        journal, overflow = memory.drain_journal()
+        if overflow:
+            # 修改日志已被丢弃，只能写完整快照（窗口中的条目整体记入历史日志）
+            try:
+                self.compact(user_id, memory, record_window=True)
+            except Exception:
+                memory.requeue_journal(journal, overflow)
+                raise
+            return 0
+        if not journal:
+            return 0
+
+        log_path = self.path_for(user_id, ".wal.jsonl")
+        try:
+            self._ensure_warm(user_id)
+            new_log = not os.path.exists(log_path)
+            if new_log:
+                self.layout.register(user_id)
+            size_before = 0 if new_log else os.path.getsize(log_path)
+            try:
+                self._append_log(user_id, log_path, journal, new_log)
+            except Exception:
+                # 截掉写了一半的记录，放回的修改下次保存时重新追加，不会重复重放
+                if new_log:
+                    if os.path.exists(log_path):
+                        os.remove(log_path)
+                    self._wal_ids.pop(user_id, None)
+                else:
+                    with open(log_path, 'r+b') as f:
+                        f.truncate(size_before)
+                raise
+        except Exception:
+            memory.requeue_journal(journal)
+            raise
+
+        self._grow_size(user_id, os.path.getsize(log_path) - size_before)
+        lines = self._log_lines.get(user_id)
+        if lines is None:
+            # 该用户的日志不是由本实例加载的，按文件实际行数（去掉日志头）计算
+            lines = max(0, self._count_lines(log_path) - 1 - len(journal))
+        lines += len(journal)
+        self._log_lines[user_id] = lines
+        if lines >= self.compact_threshold:
+            self.compact(user_id, memory)
+        return len(journal)
+
+    def _append_log(self, user_id: str, log_path: str, journal: List[tuple], new_log: bool) -> None:
+        """将修改操作追加到日志并按落盘策略 fsync（新日志先写日志头）"""
+        with open(log_path, 'a', encoding='utf-8') as f:
+            if new_log:
+                self._wal_ids[user_id] = uuid.uuid4().hex
+                self._log_lines[user_id] = 0
+                f.write(_compact_json({"op": "header", "wal_id": self._wal_ids[user_id]}) + "\n")
+            for op, arg in journal:
+                if op in ("add", "update"):
+                    record = {"op": op, "entry": arg.to_dict()}
+                elif op == "delete":
+                    record = {"op": op, "id": arg}
+                else:
+                    record = {"op": op}
+                f.write(_compact_json(record) + "\n")
+                if self.fsync_policy == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+            if self.fsync_policy == "batch":
+                f.flush()
+                os.fsync(f.fileno())
+
+    def compact(self, user_id: str, memory: Any, record_window: bool = False) -> None:
+        """
+        写入完整快照（先写临时文件再原子替换），日志并入历史日志后清空
+
+        Args:
+            user_id: 用户ID
+            memory: 用户记忆库
+            record_window: 是否把窗口中的条目也记入历史日志（修改日志被丢弃、窗口之外的修改已无法还原时使用）
+        """
+        self._check_writable()
+        log_path = self.path_for(user_id, ".wal.jsonl")
+        self._ensure_warm(user_id)
+        self.layout.register(user_id)
+        wal_id = self._wal_ids.get(user_id)
+        if wal_id is None and os.path.exists(log_path):
+            wal_id = self._read_wal_id(log_path)
+        entries = list(memory.memories)
+        if self.snapshot_format == "binary":
+            write_snapshot(self.path_for(user_id, ".snap"), entries, wal_id, fsync=self.fsync_policy != "none")
+            stale_path = self.path_for(user_id, ".json")
+        else:
+            snapshot_path = self.path_for(user_id, ".json")
+            tmp_path = snapshot_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(_compact_json({
+                    "wal_covered": wal_id,
+                    "entries": [entry.to_dict() for entry in entries]
+                }))
+                if self.fsync_policy != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, snapshot_path)
+            stale_path = self.path_for(user_id, ".snap")
+        # 另一种格式的旧快照已过期（加载时二进制快照优先）
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        # 快照落盘后才能删除日志；中途崩溃时快照记录的日志编号可避免重复重放，
+        # 历史日志中重复并入的同一日志段按日志编号跳过
+        segment = b""
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                segment = f.read()
+            if segment and not segment.endswith(b"\n"):
+                segment += b"\n"  # 崩溃时写了一半的最后一行
+        if record_window:
+            lines = [_compact_json({"op": "header", "wal_id": uuid.uuid4().hex})]
+            lines.extend(_compact_json({"op": "add", "entry": entry.to_dict()}) for entry in entries)
+            segment += ("\n".join(lines) + "\n").encode("utf-8")
+        if segment:
+            with open(self.path_for(user_id, ".hist.jsonl"), 'ab') as f:
+                f.write(segment)
+                if self.fsync_policy != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        self._wal_ids.pop(user_id, None)
+        self._log_lines[user_id] = 0
+        self.refresh_size(user_id)
+
+    @staticmethod
+    def _read_wal_id(path: str) -> Optional[str]:
+        """读取日志头中的日志编号"""
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                header = json.loads(f.readline() or "{}")
+            except ValueError:
+                return None
+        return header.get("wal_id") if header.get("op") == "header" else None
+
+    def _count_lines(self, path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            return sum(1 for _ in f)
+
+    def delete(self, user_id: str) -> None:
+        """删除用户的全部持久化文件（快照、日志、历史日志、长期记忆归档、向量索引、抽题记录及冷存储归档）"""
+        self._check_writable()
+        paths = list(self._user_files(user_id).values())
+        paths.append(self.path_for(user_id, ".cold", create=False))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self._log_lines.pop(user_id, None)
+        self._wal_ids.pop(user_id, None)
+        self.layout.unregister(user_id)
+        self._set_size(user_id, False, 0)
+
+    def _user_files(self, user_id: str) -> Dict[str, str]:
+        """获取用户现存的持久化文件（后缀到路径的映射）"""
+        paths = {suffix: self.path_for(user_id, suffix, create=False) for suffix in USER_FILE_SUFFIXES}
+        return {suffix: path for suffix, path in paths.items() if os.path.exists(path)}
+
+    def is_cold(self, user_id: str) -> bool:
+        """判断用户是否处于冷存储中"""
+        return os.path.exists(self.path_for(user_id, ".cold", create=False))
+
+    def last_modified(self, user_id: str) -> Optional[float]:
+        """
+        获取用户持久化文件的最近修改时间
+
+        Returns:
+            Optional[float]: 时间戳（秒），没有持久化数据时返回None
+        """
+        mtimes = [os.path.getmtime(path) for path in self._user_files(user_id).values()]
+        if self.is_cold(user_id):
+            mtimes.append(os.path.getmtime(self.path_for(user_id, ".cold")))
+        return max(mtimes) if mtimes else None
+
+    def freeze(self, user_id: str, codec: str = "zlib") -> int:
+        """
+        将用户的全部持久化文件压缩为冷存储归档并删除原文件
+        （调用方需保证该用户的记忆库不在内存中，否则之后的保存会先解压归档）
+
+        Args:
+            user_id: 用户ID
+            codec: 压缩算法（zlib/lzma）
+
+        Returns:
+            int: 节省的字节数（已是冷存储或没有文件时为0）
+        """
+        self._check_writable()
+        files = self._user_files(user_id)
+        if not files or self.is_cold(user_id):
+            return 0
+        before = sum(os.path.getsize(path) for path in files.values())
+        after = write_cold_archive(self.path_for(user_id, ".cold"), files, codec,
+                                   fsync=self.fsync_policy != "none")
+        # 归档落盘后才能删除原文件；中途崩溃时下次加载会用归档覆盖原文件，内容相同
+        for path in files.values():
+            os.remove(path)
+        self._log_lines.pop(user_id, None)
+        self._wal_ids.pop(user_id, None)
+        self.tier_stats["freezes"] += 1
+        self.tier_stats["bytes_before_freeze"] += before
+        self.tier_stats["bytes_after_freeze"] += after
+        self._set_size(user_id, True, after)
+        return before - after
+
+    def thaw(self, user_id: str) -> bool:
+        """
+        将冷存储归档解压还原为原文件并删除归档
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            bool: 是否进行了解压
+        """
+        self._check_writable()
+        cold_path = self.path_for(user_id, ".cold")
+        if not os.path.exists(cold_path):
+            return False
+        started = time.perf_counter()
+        for suffix, chunks in iter_cold_archive(cold_path):
+            if suffix not in USER_FILE_SUFFIXES:
+                raise ValueError(f"冷存储归档 {cold_path} 中包含未知文件 {suffix}")
+            path = self.path_for(user_id, suffix)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                if self.fsync_policy != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        # 原文件全部还原后才删除归档；中途崩溃时下次会重新解压
+        os.remove(cold_path)
+        self.refresh_size(user_id)
+        elapsed = time.perf_counter() - started
+        self.tier_stats["thaws"] += 1
+        self.tier_stats["thaw_seconds_total"] += elapsed
+        self.tier_stats["thaw_seconds_max"] = max(self.tier_stats["thaw_seconds_max"], elapsed)
+        return True
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise ValueError(f"{self.storage_path} 以只读方式打开，不能写入")
+
+    def _ensure_warm(self, user_id: str) -> None:
+        if self.is_cold(user_id):
+            self.thaw(user_id)
+
+    def _set_size(self, user_id: str, cold: bool, size: int) -> None:
+        """更新一个用户所在的层与字节数（size 为0表示没有文件），未开始统计时忽略"""
+        with self._tier_lock:
+            if self._tier_users is None:
+                return
+            tier = self._tier_users.pop(user_id, None)
+            if tier is not None:
+                prefix = "cold" if tier[0] else "warm"
+                self._tier_totals[f"{prefix}_users"] -= 1
+                self._tier_totals[f"{prefix}_bytes"] -= tier[1]
+            if size > 0:
+                prefix = "cold" if cold else "warm"
+                self._tier_users[user_id] = (cold, size)
+                self._tier_totals[f"{prefix}_users"] += 1
+                self._tier_totals[f"{prefix}_bytes"] += size
+
+    def _grow_size(self, user_id: str, delta: int) -> None:
+        """温存储中的用户追加了 delta 字节（追加日志时使用，不需要重新统计该用户的文件）"""
+        with self._tier_lock:
+            if self._tier_users is None:
+                return
+            tier = self._tier_users.get(user_id)
+        self._set_size(user_id, False, (tier[1] if tier is not None and not tier[0] else 0) + delta)
+
+    def refresh_size(self, user_id: str) -> None:
+        """
+        重新统计一个用户的文件大小（其他模块直接写入的长期记忆、向量索引等文件保存后由调用方调用）
+
+        Args:
+            user_id: 用户ID
+        """
+        if self._tier_users is None:
+            return
+        if self.is_cold(user_id):
+            self._set_size(user_id, True, os.path.getsize(self.path_for(user_id, ".cold")))
+        else:
+            self._set_size(user_id, False, sum(os.path.getsize(path) for path in self._user_files(user_id).values()))
+
+    def tier_sizes(self) -> Dict[str, int]:
+        """
+        磁盘上温（未压缩）、冷（已压缩）两层的用户数与字节数
+        （首次调用时遍历存储目录统计，之后返回增量维护的计数）
+
+        Returns:
+            Dict[str, int]: warm_users、warm_bytes、cold_users、cold_bytes
+        """
+        with self._tier_lock:
+            if self._tier_users is None:
+                users: Dict[str, Tuple[bool, int]] = {}
+                for user_id, suffix, path in self.layout.iter_files():
+                    cold, size = users.get(user_id, (False, 0))
+                    if suffix == ".cold":
+                        users[user_id] = (True, os.path.getsize(path))
+                    elif not cold:
+                        users[user_id] = (False, size + os.path.getsize(path))
+                totals = {"warm_users": 0, "warm_bytes": 0, "cold_users": 0, "cold_bytes": 0}
+                for cold, size in users.values():
+                    prefix = "cold" if cold else "warm"
+                    totals[f"{prefix}_users"] += 1
+                    totals[f"{prefix}_bytes"] += size
+                self._tier_users, self._tier_totals = users, totals
+            return dict(self._tier_totals)
@@ -5,521 +5,233 @@ import sys
 import os
 import json
 import logging
+import functools
+from typing import Optional, Tuple
 
 # 将项目根目录添加到Python路径中
 sys.path.append(os.path.join(os.path.dirname(__file__)))
 
 import utils
+from user_session import user_session
+from agent_router import KeywordRouter
+from agent_templates import AgentCatalog, use_agents
+from admission import AdmissionController, AdmissionOutcome, AdmissionRejected
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=None)
+def _compile_router(router_config: str, intent_model: str, intent_threshold: float):
+    """
+    编译请求路由（路由无状态，相同配置在进程内只编译一次并由各实例共享）
+
+    Args:
+        router_config: 路由关键词配置文件，为None时使用默认配置
+        intent_model: 意图分类模型文件，为None时只使用关键词路由
+        intent_threshold: 采用分类结果的最低置信度
+
+    Returns:
+        KeywordRouter 或 ClassifierRouter
+    """
+    router = KeywordRouter.from_config(router_config)
+    if intent_model:
+        if not os.path.exists(intent_model):
+            logger.warning(f"意图分类模型 {intent_model} 不存在，使用关键词路由")
+            return router
+        from intent_classifier import ClassifierRouter, IntentClassifier
+        router = ClassifierRouter(IntentClassifier.load(intent_model), router, intent_threshold)
+        logger.info(f"已加载意图分类模型 {intent_model}")
+    return router
+
+
 class MultiAgentSystem:
     """
     多Agent系统主程序
     实现多个专门Agent协同工作，完成用户任务
     """
     
-    def __init__(self, user_id: str = "default"):
+    def __init__(self, user_id: str = "default", shared_context_size: int = 4,
+                 write_behind: bool = True, max_staleness: float = 5.0, router_config: str = None,
+                 intent_model: str = None, intent_threshold: float = 0.6, delegate_timeout: float = 60.0,
+                 delegate_workers: int = None, nested_context_size: int = 6,
+                 admission: AdmissionController = None, long_term_memory: bool = None,
+                 vector_memory: bool = None):
         """
         初始化多Agent系统
         
         Args:
             user_id: 用户ID，默认为"default"
+            shared_context_size: 各Agent构造prompt时，除自身记录外附带的最近共享记忆条数
+            write_behind: 是否由后台线程异步保存记忆库（请求路径不等待磁盘）
+            max_staleness: 异步保存时，未保存修改允许存在的最长时间（秒）
+            router_config: 路由关键词配置文件，默认为 router_keywords.json
+            intent_model: 意图分类模型（见 intent_classifier.py），默认为 INTENT_MODEL 环境变量；
+                          都未指定时使用关键词路由（默认）。项目不附带模型，需要用人工标注的请求自行训练
+            intent_threshold: 采用分类结果的最低置信度，低于该值时回退到关键词路由
+            delegate_timeout: 教秘Agent并发分派子请求时，每个子请求的超时（秒）
+            delegate_workers: 并发执行子请求的线程数，默认为 AGENT_DELEGATE_WORKERS 环境变量或准入控制容量 × 可分派的Agent数
+            nested_context_size: 教秘Agent调用其他Agent时，子Agent临时记忆库中复制的自身历史记录数量
+                                 （子Agent的中间过程不写入用户记忆库，只有最终回复作为工具结果记录一次）
+            admission: 请求准入控制，默认为进程内共享的实例（同时执行的请求数由 AGENT_MAX_CONCURRENCY 设置）
+            long_term_memory: 是否为用户记忆库附加长期记忆召回，默认为 LONG_TERM_MEMORY 环境变量
+                              （设置作用于进程内共享的 UserManager，只影响之后加载的用户）
+            vector_memory: 是否附加本地哈希向量召回（需要 NumPy），默认为 VECTOR_MEMORY 环境变量，可与 long_term_memory 独立开启
         """
         self.user_id = user_id
+        self.shared_context_size = shared_context_size
+        self.nested_context_size = nested_context_size
         self.user_manager = utils.UserManager()
+        if long_term_memory is not None:
+            self.user_manager.long_term_memory_enabled = long_term_memory
+        if vector_memory is not None:
+            self.user_manager.vector_memory_enabled = vector_memory
         self.user_manager.switch_user(user_id)
+        # 后台刷盘线程由 UserManager 在进程内共享，本实例只持有一个引用
+        self.flusher = self.user_manager.acquire_flusher(max_staleness) if write_behind else None
+        # 路由关键词与意图分类模型在进程内只编译/加载一次
+        intent_model = intent_model or os.getenv("INTENT_MODEL") or None
+        self.router = _compile_router(router_config, intent_model, intent_threshold)
+        # Agent定义在进程内只编译一次，相同配置的实例共享模板、工具与分派线程池
+        self.catalog = AgentCatalog.shared(shared_context_size=shared_context_size,
+                                           nested_context_size=nested_context_size,
+                                           delegate_timeout=delegate_timeout, delegate_workers=delegate_workers)
+        self.delegator = self.catalog.delegator
+        # 交互式教学/检验请求优先于报告与学习计划，过载时按截止时间快速返回降级回复
+        self.admission = admission or AdmissionController.shared()
         self.agents = {}
         self.create_agents()
         
     def set_user_id(self, user_id: str):
         """
-        设置用户ID并切换记忆库
+        设置默认用户ID（未显式指定用户的请求使用该用户的记忆库）
         
         Args:
             user_id: 用户ID
         """
-        # 保存当前用户记忆库
+        # 保存当前用户记忆库（开启异步保存时只通知后台线程）
         if self.user_id:
-            self.user_manager.save_user_memory(self.user_id)
+            if self.flusher:
+                self.flusher.request_flush()
+            else:
+                self.user_manager.save_user_memory(self.user_id)
         
         self.user_id = user_id
         self.user_manager.switch_user(user_id)
-        # 更新所有agents使用的记忆库
-        for agent in self.agents.values():
-            agent.memory = self.user_manager.get_current_user_memory()
         
     def create_agents(self):
         """
-        创建各种专门的Agent
+        由编译好的Agent模板绑定本实例的Agent（只分配Agent实例本身，记忆库取自请求所在的用户会话）
         """
-        # 创建教学Agent - 负责教学任务
-        teaching_agent = self.create_teaching_agent()
-        self.agents["teaching"] = teaching_agent
-        
-        # 创建检验Agent - 负责出题和检验学习效果
-        testing_agent = self.create_testing_agent()
-        self.agents["testing"] = testing_agent
-        
-        # 创建教秘Agent - 负责整体教学计划和进度管理
-        secretary_agent = self.create_secretary_agent()
-        self.agents["secretary"] = secretary_agent
-        
-        # 创建家长Agent - 负责向家长报告学习情况
-        parent_agent = self.create_parent_agent()
-        self.agents["parent"] = parent_agent
-        
+        self.agents.update(self.catalog.bind())
         logger.info(f"创建了 {len(self.agents)} 个Agent: {list(self.agents.keys())}")
     
-    def create_teaching_agent(self):
-        """
-        创建教学Agent
+    def process_user_request(self, user_input: str, user_id: str = None) -> str:
         """
-        # 创建教学工具
-        explain_concept_tool = utils.base_tool(
-            tool_name="explain_concept",
-            tool_description="解释数学概念",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "concept": {
-                        "type": "string",
-                        "description": "需要解释的数学概念，如'勾股定理'、'一元二次方程'"
-                    },
-                    "difficulty": {
-                        "type": "string",
-                        "description": "解释难度等级: 初级、中级、高级",
-                        "enum": ["初级", "中级", "高级"]
-                    }
-                },
-                "required": ["concept"]
-            }
-        )
-        
-        def explain_concept_func(concept: str, difficulty: str = "中级") -> str:
-            explanations = {
-                "勾股定理": f"勾股定理({difficulty}): 直角三角形两条直角边的平方和等于斜边的平方。公式为: a² + b² = c²",
-                "一元二次方程": f"一元二次方程({difficulty}): 只含有一个未知数，并且未知数的最高次数是二次的整式方程。一般形式为: ax² + bx + c = 0 (a≠0)",
-                "相似三角形": f"相似三角形({difficulty}): 两个三角形对应角相等，对应边成比例"
-            }
-            return explanations.get(concept, f"关于'{concept}'的{difficulty}解释: 这是一个重要的数学概念。")
-        
-        explain_concept_tool.set_function(explain_concept_func)
-        
-        # 创建出例题工具
-        give_example_tool = utils.base_tool(
-            tool_name="give_example",
-            tool_description="给出数学例题",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "concept": {
-                        "type": "string",
-                        "description": "相关数学概念"
-                    },
-                    "difficulty": {
-                        "type": "string",
-                        "description": "题目难度等级: 简单、中等、困难",
-                        "enum": ["简单", "中等", "困难"]
-                    }
-                },
-                "required": ["concept"]
-            }
-        )
-        
-        def give_example_func(concept: str, difficulty: str = "中等") -> str:
-            examples = {
-                "勾股定理": f"{difficulty}例题: 已知直角三角形的两条直角边分别为3cm和4cm，求斜边长度? 答案: 5cm",
-                "一元二次方程": f"{difficulty}例题: 解方程 x² - 5x + 6 = 0。答案: x₁=2, x₂=3"
-            }
-            return examples.get(concept, f"关于'{concept}'的{difficulty}例题: 请解决相关问题。")
-        
-        give_example_tool.set_function(give_example_func)
-        
-        # 创建教学Agent
-        teaching_agent = utils.base_agent(
-            name="TeachingAgent",
-            description="教学代理，负责知识点讲解和例题演示",
-            model=utils.llm_model("qwen-plus"),
-            tools=[explain_concept_tool, give_example_tool],
-            memory=self.user_manager.get_current_user_memory(),
-            max_tool_iterations=3
-        )
+        处理用户请求，根据请求类型分发给相应的Agent
+        请求在该用户的会话中执行：各Agent使用会话用户的记忆库，可在多个线程/asyncio任务中并发处理不同用户的请求；
+        系统过载时（见 handle_request）直接返回降级回复
         
-        return teaching_agent
-    
-    def create_testing_agent(self):
+        Args:
+            user_input (str): 用户输入
+            user_id (str): 用户ID，默认为 self.user_id
+            
+        Returns:
+            str: 处理结果
         """
-        创建检验Agent
+        return self.handle_request(user_input, user_id).response
+
+    def handle_request(self, user_input: str, user_id: str = None, deadline: float = None,
+                       priority: str = None) -> AdmissionOutcome:
         """
-        # 创建出题工具
-        generate_question_tool = utils.base_tool(
-            tool_name="generate_question",
-            tool_description="生成数学练习题",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "topic": {
-                        "type": "string",
-                        "description": "题目主题"
-                    },
-                    "count": {
-                        "type": "integer",
-                        "description": "题目数量",
-                        "minimum": 1,
-                        "maximum": 10
-                    }
-                },
-                "required": ["topic", "count"]
-            }
-        )
-        
-        def generate_question_func(topic: str, count: int = 1) -> str:
-            questions = {
-                "勾股定理": [
-                    "已知直角三角形的两条直角边分别为6cm和8cm，求斜边长度?",
-                    "直角三角形的斜边长为10cm，一条直角边长为6cm，求另一条直角边长?",
-                    "判断以下哪组数能构成直角三角形的三边长: A. 3,4,5  B. 1,2,3  C. 5,12,13"
-                ],
-                "一元二次方程": [
-                    "解方程: x² - 7x + 12 = 0",
-                    "解方程: 2x² - 5x + 2 = 0",
-                    "已知一元二次方程x² - 3x + k = 0有一个根为1，求k的值"
-                ]
-            }
-            
-            topic_questions = questions.get(topic, [f"关于{topic}的练习题，请解答相关问题。"])
-            selected = topic_questions[:min(count, len(topic_questions))]
-            return "\n".join([f"{i+1}. {q}" for i, q in enumerate(selected)])
-        
-        generate_question_tool.set_function(generate_question_func)
-        
-        # 创建评判答案工具
-        evaluate_answer_tool = utils.base_tool(
-            tool_name="evaluate_answer",
-            tool_description="评判用户答案的正确性",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "question": {
-                        "type": "string",
-                        "description": "题目内容"
-                    },
-                    "user_answer": {
-                        "type": "string",
-                        "description": "用户答案"
-                    },
-                    "correct_answer": {
-                        "type": "string",
-                        "description": "正确答案"
-                    }
-                },
-                "required": ["question", "user_answer", "correct_answer"]
-            }
-        )
-        
-        def evaluate_answer_func(question: str, user_answer: str, correct_answer: str) -> str:
-            # 简单的字符串匹配评判，实际应用中可以更复杂
-            is_correct = user_answer.strip().lower() == correct_answer.strip().lower()
-            return f"{'正确' if is_correct else '错误'}。{'很好!' if is_correct else f'正确答案是: {correct_answer}'}"
-        
-        evaluate_answer_tool.set_function(evaluate_answer_func)
-        
-        # 创建作业批改工具
-        grade_homework_tool = utils.base_tool(
-            tool_name="grade_homework",
-            tool_description="批改作业照片",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "image_url": {
-                        "type": "string",
-                        "description": "作业照片的url地址"
-                    }
-                },
-                "required": ["image_url"]
-            }
-        )
-        
-        # 动态导入OCR功能，避免循环依赖
-        def grade_homework_func_wrapper(image_url: str) -> str:
-            try:
-                from ocr import grade_homework_func
-                return grade_homework_func(image_url)
-            except Exception as e:
-                return f"作业批改功能暂时不可用: {str(e)}"
-        
-        grade_homework_tool.set_function(grade_homework_func_wrapper)
-        
-        # 创建根据知识点查找试题工具
+        经准入控制处理用户请求：先路由（不占用执行槽位），按处理请求的Agent确定优先级类别，
+        在执行槽位内于该用户的会话中执行；排队已满或无法在截止时间前开始执行时立即返回降级回复
+
+        Args:
+            user_input (str): 用户输入
+            user_id (str): 用户ID，默认为 self.user_id
+            deadline (float): 开始执行的截止时间（秒，从现在算起），不超过优先级类别的默认截止时间
+            priority (str): 优先级类别名称，默认按处理请求的Agent确定
+
+        Returns:
+            AdmissionOutcome: 处理结果
+        """
+        agent_name, default_priority = self._route(user_input)
         try:
-            from question_finder import create_find_questions_by_knowledge_tool
-            find_questions_tool = create_find_questions_by_knowledge_tool()
+            return self._admit(agent_name, user_input, user_id, deadline, priority or default_priority)
         except Exception as e:
-            logger.error(f"创建查找试题工具失败: {e}")
-            find_questions_tool = None
-        
-        # 创建检验Agent
-        tools_list = [generate_question_tool, evaluate_answer_tool, grade_homework_tool]
-        if find_questions_tool:
-            tools_list.append(find_questions_tool)
-            
-        testing_agent = utils.base_agent(
-            name="TestingAgent",
-            description="检验代理，负责出题和检验学习效果，以及批改作业",
-            model=utils.llm_model("qwen-plus"),
-            tools=tools_list,
-            memory=self.user_manager.get_current_user_memory(),
-            max_tool_iterations=3
-        )
-        
-        return testing_agent
-    
-    def create_secretary_agent(self):
-        """
-        创建教秘Agent
+            logger.error(f"处理用户请求时出错: {e}")
+            return AdmissionOutcome(f"抱歉，在处理您的请求时出现了问题: {str(e)}",
+                                    priority or default_priority or self.admission.class_for(agent_name).name,
+                                    agent_name)
+
+    def run_agent(self, agent_name: str, user_input: str, user_id: str = None, deadline: float = None,
+                  priority: str = None) -> str:
         """
-        # 创建制定学习计划工具
-        create_study_plan_tool = utils.base_tool(
-            tool_name="create_study_plan",
-            tool_description="创建学习计划",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "subject": {
-                        "type": "string",
-                        "description": "学科"
-                    },
-                    "topics": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "要学习的知识点列表"
-                    },
-                    "days": {
-                        "type": "integer",
-                        "description": "计划天数"
-                    }
-                },
-                "required": ["subject", "topics", "days"]
-            }
-        )
-        
-        def create_study_plan_func(subject: str, topics: list, days: int) -> str:
-            plan = f"{subject}学习计划 ({days}天):\n"
-            topics_per_day = max(1, len(topics) // days)
-            for i in range(days):
-                start_idx = i * topics_per_day
-                end_idx = min((i + 1) * topics_per_day, len(topics))
-                day_topics = topics[start_idx:end_idx]
-                if day_topics:
-                    plan += f"第{i+1}天: {', '.join(day_topics)}\n"
-            return plan
-        
-        create_study_plan_tool.set_function(create_study_plan_func)
-        
-        # 创建调用教学Agent工具
-        call_teaching_agent_tool = utils.base_tool(
-            tool_name="call_teaching_agent",
-            tool_description="调用教学Agent进行知识点讲解",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "request": {
-                        "type": "string",
-                        "description": "需要教学Agent处理的请求内容"
-                    }
-                },
-                "required": ["request"]
-            }
-        )
-        
-        def call_teaching_agent_func(request: str) -> str:
-            # 获取教学Agent并执行请求
-            teaching_agent = self.agents.get("teaching")
-            if not teaching_agent:
-                return "错误: 教学Agent不可用"
-            try:
-                response = teaching_agent.run_once(request)
-                return response
-            except Exception as e:
-                return f"调用教学Agent时出错: {str(e)}"
-        
-        call_teaching_agent_tool.set_function(call_teaching_agent_func)
-        
-        # 创建调用检测Agent工具
-        call_testing_agent_tool = utils.base_tool(
-            tool_name="call_testing_agent",
-            tool_description="调用检测Agent进行练习或测试",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "request": {
-                        "type": "string",
-                        "description": "需要检测Agent处理的请求内容"
-                    }
-                },
-                "required": ["request"]
-            }
-        )
-        
-        def call_testing_agent_func(request: str) -> str:
-            # 获取检测Agent并执行请求
-            testing_agent = self.agents.get("testing")
-            if not testing_agent:
-                return "错误: 检测Agent不可用"
-            try:
-                response = testing_agent.run_once(request)
-                return response
-            except Exception as e:
-                return f"调用检测Agent时出错: {str(e)}"
-        
-        call_testing_agent_tool.set_function(call_testing_agent_func)
-        
-        # 创建教秘Agent
-        secretary_agent = utils.base_agent(
-            name="SecretaryAgent",
-            description="教秘代理，负责整体教学计划和进度管理",
-            model=utils.llm_model("qwen-plus"),
-            tools=[create_study_plan_tool, call_teaching_agent_tool, call_testing_agent_tool],
-            memory=self.user_manager.get_current_user_memory(),
-            max_tool_iterations=2
-        )
-        
-        return secretary_agent
-    
-    def create_parent_agent(self):
+        不经过路由，直接由指定Agent在该用户的会话中处理请求（同样经过准入控制）
+
+        Args:
+            agent_name (str): Agent名称（teaching/testing/secretary/parent）
+            user_input (str): 用户输入
+            user_id (str): 用户ID，默认为 self.user_id
+            deadline (float): 开始执行的截止时间（秒，从现在算起）
+            priority (str): 优先级类别名称，默认按Agent确定
+
+        Returns:
+            str: 处理结果（系统过载时为降级回复）
         """
-        创建家长Agent
+        if agent_name not in self.agents:
+            raise ValueError(f"未知的Agent: {agent_name}")
+        return self._admit(agent_name, user_input, user_id, deadline, priority).response
+
+    def _admit(self, agent_name: str, user_input: str, user_id: str, deadline: float,
+               priority: str) -> AdmissionOutcome:
         """
-        # 创建生成报告工具
-        generate_report_tool = utils.base_tool(
-            tool_name="generate_report",
-            tool_description="生成学习报告",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "student_name": {
-                        "type": "string",
-                        "description": "学生姓名"
-                    },
-                    "subject": {
-                        "type": "string",
-                        "description": "学科"
-                    },
-                    "topics": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "学习知识点列表"
-                    },
-                    "performance": {
-                        "type": "string",
-                        "description": "学习表现描述"
-                    }
-                },
-                "required": ["student_name", "subject", "topics", "performance"]
-            }
-        )
-        
-        def generate_report_func(student_name: str, subject: str, topics: list, performance: str) -> str:
-            report = f"""
-学生 {student_name} 的 {subject} 学习报告:
+        在准入控制的执行槽位内，由指定Agent在该用户的会话中处理请求
 
-学习内容:
-- {', '.join(topics)}
+        Args:
+            agent_name (str): Agent名称
+            user_input (str): 用户输入
+            user_id (str): 用户ID，默认为 self.user_id
+            deadline (float): 开始执行的截止时间（秒，从现在算起）
+            priority (str): 优先级类别名称，默认按Agent确定
 
-学习表现:
-{performance}
+        Returns:
+            AdmissionOutcome: 处理结果
+        """
+        priority_class = self.admission.classes.get(priority) if priority else self.admission.class_for(agent_name)
+        if priority_class is None:
+            raise ValueError(f"未知的优先级类别: {priority}")
+        try:
+            with self.admission.admit(priority_class.name, deadline) as waited:
+                with user_session(user_id or self.user_id, self.user_manager), use_agents(self.agents):
+                    response = self.agents[agent_name].run_once(user_input)
+        except AdmissionRejected as e:
+            return AdmissionOutcome(e.degraded_message, priority_class.name, agent_name, degraded=True,
+                                    reason=e.reason, retry_after=e.retry_after)
+        return AdmissionOutcome(response, priority_class.name, agent_name, waited=waited)
 
-建议:
-- 继续保持良好的学习习惯
-- 针对薄弱环节加强练习
-- 定期复习已学知识点
-            """
-            return report.strip()
-        
-        generate_report_tool.set_function(generate_report_func)
-        
-        # 创建家长Agent
-        parent_agent = utils.base_agent(
-            name="ParentAgent",
-            description="家长代理，负责向家长报告学习情况",
-            model=utils.llm_model("qwen-plus"),
-            tools=[generate_report_tool],
-            memory=self.user_manager.get_current_user_memory(),
-            max_tool_iterations=2
-        )
-        
-        return parent_agent
-    
-    def process_user_request(self, user_input: str) -> str:
+    def _route(self, user_input: str) -> Tuple[str, Optional[str]]:
         """
-        处理用户请求，根据请求类型分发给相应的Agent
+        根据请求内容选择处理请求的Agent
         
         Args:
             user_input (str): 用户输入
             
         Returns:
-            str: 处理结果
+            tuple: (Agent名称, 优先级类别名称；为None时按Agent确定)
         """
-        # 更智能的请求路由逻辑
-        # 通过分析用户输入的语义来决定分发给哪个Agent
-        
-        # 转换为小写便于匹配
-        lower_input = user_input.lower()
-        
-        # 教学相关关键词
-        teaching_keywords = [
-            "讲解", "解释", "教学", "学习", "理解", "概念", "定义", 
-            "什么是", "什么叫", "如何理解", "不懂", "不会", "例题", "演示"
-        ]
-        
-        # 测试相关关键词
-        testing_keywords = [
-            "测试", "练习", "题目", "考试", "测验", "做题", "答题", 
-            "检查", "检验", "作业", "练习题", "试题", "批改", "批阅"
-        ]
-        
-        # 计划相关关键词
-        planning_keywords = [
-            "计划", "安排", "进度", "日程", "时间表", "规划", "日历", 
-            "时间管理", "学习计划", "课程表", "时间安排"
-        ]
-        
-        # 报告相关关键词
-        reporting_keywords = [
-            "报告", "家长", "情况", "表现", "成绩", "结果", "总结", 
-            "反馈", "评估", "汇报", "学习情况", "学习报告"
-        ]
-        
-        # 统计各Agent相关关键词匹配数
-        scores = {
-            "teaching": sum(1 for keyword in teaching_keywords if keyword in lower_input),
-            "testing": sum(1 for keyword in testing_keywords if keyword in lower_input),
-            "secretary": sum(1 for keyword in planning_keywords if keyword in lower_input),
-            "parent": sum(1 for keyword in reporting_keywords if keyword in lower_input)
-        }
-        
-        # 找到匹配度最高的Agent
-        best_agent = max(scores, key=scores.get)
-        
-        # 如果最高分大于0，使用对应的Agent，否则使用默认Agent
-        if scores[best_agent] > 0:
-            agent = self.agents[best_agent]
-            logger.info(f"将请求分发给{agent.name} (匹配关键词数: {scores[best_agent]})")
-        else:
-            # 默认使用教秘Agent
-            agent = self.agents["secretary"]
-            logger.info("默认将请求分发给教秘Agent")
-            
-        try:
-            response = agent.run_once(user_input)
-            return response
-        except Exception as e:
-            logger.error(f"处理用户请求时出错: {e}")
-            return f"抱歉，在处理您的请求时出现了问题: {str(e)}"
-    
+        # 意图分类（置信度足够时）或一次扫描为所有Agent打分（关键词及权重见 router_keywords.json）
+        decision = self.router.route(user_input)
+        agent_name = decision.agent if decision.agent in self.agents else "secretary"
+        if decision.fallback:
+            logger.info(f"未匹配到关键词，默认将请求分发给{self.agents[agent_name].name} ({decision.breakdown()})")
+            # 未能识别意图的请求多为学生的直接提问，按交互式请求处理
+            return agent_name, "interactive" if "interactive" in self.admission.classes else None
+        logger.info(f"将请求分发给{self.agents[agent_name].name} (得分: {decision.score:g}; {decision.breakdown()})")
+        return agent_name, None
+
     def run(self):
         """
         运行多Agent系统主循环
@@ -540,10 +252,7 @@ class MultiAgentSystem:
                     user_input = input("\n您: ").strip()
                     
                     if user_input.lower() in ['退出', 'quit', 'exit', 'bye']:
-                        # 退出前保存当前用户记忆库
-                        if self.user_id:
-                            self.user_manager.save_user_memory(self.user_id)
-                            self.user_manager.save_all_memories()
+                        # 退出时由 finally 中的 shutdown 保存记忆库
                         print("AI教师: 谢谢使用，再见!")
                         break
                     
@@ -556,10 +265,7 @@ class MultiAgentSystem:
                     print(f"AI教师: {response}")
                     
                 except KeyboardInterrupt:
-                    # 中断前保存当前用户记忆库
-                    if self.user_id:
-                        self.user_manager.save_user_memory(self.user_id)
-                        self.user_manager.save_all_memories()
+                    # 中断时由 finally 中的 shutdown 保存记忆库
                     print("\n\nAI教师: 再见!")
                     break
                 except Exception as e:
@@ -567,9 +273,18 @@ class MultiAgentSystem:
                     print(f"AI教师: 发生未知错误: {str(e)}")
         finally:
             # 确保程序结束前保存所有记忆库
-            if self.user_id:
-                self.user_manager.save_user_memory(self.user_id)
-                self.user_manager.save_all_memories()
+            self.shutdown()
+
+    def shutdown(self):
+        """
+        释放后台保存线程的引用（最后一个引用释放时停止线程）并保存所有未保存的记忆库
+        """
+        if self.flusher:
+            self.flusher = None
+            self.user_manager.release_flusher(flush=False)
+            self.user_manager.flush_dirty(0.0)
+        else:
+            self.user_manager.save_all_memories()
 
 
 def main():
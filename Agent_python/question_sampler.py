@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+题库抽题：题目按（知识点, 难度）预先分桶，每名学生记录做过的题目（分块位图），
+每次从目标难度的桶中抽取学生没做过的题目，抽 count 道题的开销为 O(count)，与题库大小无关
+
+用法示例:
+    python question_sampler.py sample --bank questions.jsonl --student s1 --topic 勾股定理 --count 3 --difficulty 2
+    python question_sampler.py bench --questions 1000000 --students 5000
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import zlib
+import base64
+import hashlib
+import random
+import argparse
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from knowledge_index import KnowledgeIndex, fetch_rows, read_rows
+from user_session import ShardedLockTable, current_session
+from utils import UserManager
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = (1, 2, 3, 4, 5)
+DEFAULT_DIFFICULTY = 3
+CHUNK_BITS = 1024  # 做题位图按块分配，只为学生实际做过题的区段分配内存
+STATE_SUFFIX = ".quiz.state"  # 与用户记忆库并列存放的抽题记录文件
+STATE_ATTACHMENT = "question_sampler"  # 抽题记录在用户记忆库 attachments 中的名称
+
+# 内置题目（未配置题库时使用），知识点以名称作为 knowledge_id
+SEED_QUESTIONS: List[Dict[str, Any]] = [
+    {"question_id": "seed-gg-1", "question_text": "已知直角三角形的两条直角边分别为6cm和8cm，求斜边长度?",
+     "answer": "10cm", "difficulty": 2, "related_knowledge_ids": ["勾股定理"]},
+    {"question_id": "seed-gg-2", "question_text": "直角三角形的斜边长为10cm，一条直角边长为6cm，求另一条直角边长?",
+     "answer": "8cm", "difficulty": 2, "related_knowledge_ids": ["勾股定理"]},
+    {"question_id": "seed-gg-3", "question_text": "判断以下哪组数能构成直角三角形的三边长: A. 3,4,5  B. 1,2,3  C. 5,12,13",
+     "answer": "A、C", "difficulty": 3, "related_knowledge_ids": ["勾股定理"]},
+    {"question_id": "seed-yy-1", "question_text": "解方程: x² - 7x + 12 = 0",
+     "answer": "x₁=3, x₂=4", "difficulty": 2, "related_knowledge_ids": ["一元二次方程"]},
+    {"question_id": "seed-yy-2", "question_text": "解方程: 2x² - 5x + 2 = 0",
+     "answer": "x₁=2, x₂=1/2", "difficulty": 3, "related_knowledge_ids": ["一元二次方程"]},
+    {"question_id": "seed-yy-3", "question_text": "已知一元二次方程x² - 3x + k = 0有一个根为1，求k的值",
+     "answer": "k=2", "difficulty": 3, "related_knowledge_ids": ["一元二次方程"]},
+]
+
+
+def _json_list(value: Any) -> List[Any]:
+    """数据库中的 JSON 数组字段可能是字符串，也可能已经是列表"""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value] if value else []
+    return list(value or [])
+
+
+class QuestionBank:
+    """
+    分桶后的题库：
+    - 题目按首个关联知识点与难度排序后编号（同一桶的题目编号连续，学生位图集中在少数几块上）
+    - 每个（知识点, 难度）桶为 members 数组中的一段，关联多个知识点的题目同时出现在多个桶中
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        """
+        编译题库
+
+        Args:
+            rows: 题库表（QuestionBank）的记录
+        """
+        knowledge_index: Dict[str, int] = {}
+        question_ids: List[str] = []
+        texts: List[str] = []
+        answers: List[str] = []
+        levels: List[int] = []
+        link_question: List[int] = []  # （题目, 知识点）关联
+        link_knowledge: List[int] = []
+        for row in rows:
+            keys = _json_list(row.get("related_knowledge_ids"))
+            text = row.get("question_text")
+            if not keys or not text:
+                continue
+            try:
+                difficulty = min(max(int(row.get("difficulty") or DEFAULT_DIFFICULTY), DIFFICULTIES[0]), DIFFICULTIES[-1])
+            except (TypeError, ValueError):
+                difficulty = DEFAULT_DIFFICULTY
+            position = len(texts)
+            for key in keys:
+                link_question.append(position)
+                link_knowledge.append(knowledge_index.setdefault(str(key), len(knowledge_index)))
+            question_ids.append(str(row.get("question_id", position)))
+            texts.append(str(text))
+            answers.append(str(row.get("answer", "")))
+            levels.append(difficulty)
+
+        # 按首个关联知识点与难度重新编号
+        link_question_array = np.array(link_question, dtype=np.int64)
+        link_knowledge_array = np.array(link_knowledge, dtype=np.int64)
+        level_array = np.array(levels, dtype=np.int64)
+        first_link = np.flatnonzero(np.r_[True, link_question_array[1:] != link_question_array[:-1]]) \
+            if link_question else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((level_array, link_knowledge_array[first_link]))
+        renumber = np.empty_like(order)
+        renumber[order] = np.arange(order.size)
+        self.question_ids: List[str] = [question_ids[i] for i in order]
+        self.texts: List[str] = [texts[i] for i in order]
+        self.answers: List[str] = [answers[i] for i in order]
+        self.difficulty = level_array[order].astype(np.int8)
+        self.knowledge_ids: List[str] = list(knowledge_index)
+        self._knowledge: Dict[str, int] = knowledge_index
+
+        # 关联按桶排序，得到各桶在 members 中的区间
+        link_question_array = renumber[link_question_array]
+        bucket_of = link_knowledge_array * len(DIFFICULTIES) + (self.difficulty[link_question_array] - DIFFICULTIES[0])
+        order = np.lexsort((link_question_array, bucket_of))
+        self.members = link_question_array[order].astype(np.int32)
+        bucket_of = bucket_of[order]
+        starts = np.flatnonzero(np.r_[True, bucket_of[1:] != bucket_of[:-1]]) if bucket_of.size else np.zeros(0, np.int64)
+        ends = np.r_[starts[1:], bucket_of.size]
+        self.buckets: Dict[int, Tuple[int, int]] = {int(bucket_of[s]): (int(s), int(e)) for s, e in zip(starts, ends)}
+
+        self._fingerprint: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    @property
+    def fingerprint(self) -> str:
+        """题库指纹（题目ID、编号、难度与分桶），保存的做题记录只能用于指纹相同的题库"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            digest.update("\n".join(self.question_ids).encode("utf-8"))
+            digest.update(self.difficulty.tobytes())
+            digest.update(self.members.tobytes())
+            digest.update(json.dumps(sorted(self.buckets.items())).encode("ascii"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def bucket_id(self, knowledge_id: str, difficulty: int) -> Optional[int]:
+        """（知识点, 难度）对应的桶，题库中没有时为None"""
+        k = self._knowledge.get(knowledge_id)
+        if k is None:
+            return None
+        bucket = k * len(DIFFICULTIES) + (difficulty - DIFFICULTIES[0])
+        return bucket if bucket in self.buckets else None
+
+    def has_knowledge(self, knowledge_id: str) -> bool:
+        return knowledge_id in self._knowledge
+
+    def question(self, index: int) -> Dict[str, Any]:
+        """按编号取出题目"""
+        return {"question_id": self.question_ids[index], "question_text": self.texts[index],
+                "answer": self.answers[index], "difficulty": int(self.difficulty[index])}
+
+
+@dataclass
+class StudentState:
+    """一名学生的抽题状态"""
+    seen: Dict[int, bytearray] = field(default_factory=dict)  # 块号 -> 做题位图（每块 CHUNK_BITS 位）
+    cursors: Dict[int, List[int]] = field(default_factory=dict)  # 桶 -> [乘数, 偏移, 已遍历的位置数]
+
+    def is_seen(self, question: int) -> bool:
+        chunk = self.seen.get(question // CHUNK_BITS)
+        offset = question % CHUNK_BITS
+        return chunk is not None and bool(chunk[offset >> 3] & (1 << (offset & 7)))
+
+    def mark(self, question: int) -> None:
+        chunk = self.seen.get(question // CHUNK_BITS)
+        if chunk is None:
+            chunk = self.seen[question // CHUNK_BITS] = bytearray(CHUNK_BITS // 8)
+        offset = question % CHUNK_BITS
+        chunk[offset >> 3] |= 1 << (offset & 7)
+
+    def nbytes(self) -> int:
+        return len(self.seen) * (CHUNK_BITS // 8) + len(self.cursors) * 3 * 8
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典（位图按块以 base64 编码）"""
+        return {
+            "seen": {str(k): base64.b64encode(bytes(v)).decode("ascii") for k, v in self.seen.items()},
+            "cursors": {str(k): v for k, v in self.cursors.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StudentState":
+        """从 to_dict 生成的字典还原"""
+        return cls(
+            seen={int(k): bytearray(base64.b64decode(v)) for k, v in data.get("seen", {}).items()},
+            cursors={int(k): list(v) for k, v in data.get("cursors", {}).items()},
+        )
+
+
+class StoredStudentState:
+    """
+    一名学生的抽题状态及其持久化：
+    - 由 QuestionSampler 附加在该用户的记忆库上（attachments），UserManager 保存该用户时一并写入
+      <user_id>.quiz.state，记忆库被淘汰时随之释放，下次抽题时重新加载
+    - 文件中记录题库指纹，与当前题库不一致的记录会被丢弃（编号已经对不上）
+    """
+
+    def __init__(self, path: Optional[str], fingerprint: str, lock: Any, memory: Any = None):
+        """
+        初始化
+
+        Args:
+            path: 状态文件路径，为None时只保存在内存中
+            fingerprint: 当前题库的指纹
+            lock: 保护该学生状态的锁（与抽题共用）
+            memory: 所附加的用户记忆库，状态变化时标记其有未保存修改
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.lock = lock
+        self.memory = memory
+        self.state = StudentState()
+        self.dirty = False
+
+    def load(self) -> bool:
+        """
+        从状态文件加载
+
+        Returns:
+            bool: 是否加载了记录（文件不存在、损坏或题库指纹不一致时为False）
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            if record.get("fingerprint") != self.fingerprint:
+                logger.warning(f"抽题记录 {self.path} 与当前题库不一致，已忽略")
+                return False
+            self.state = StudentState.from_dict(record)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"读取抽题记录 {self.path} 失败: {e}")
+            return False
+        return True
+
+    def touch(self) -> None:
+        """标记状态已变化"""
+        self.dirty = True
+        if self.memory is not None:
+            self.memory.touch()
+
+    def save(self) -> bool:
+        """
+        有变化时写入状态文件（先写临时文件再原子替换）
+
+        Returns:
+            bool: 是否写入
+        """
+        if not self.path or not self.dirty:
+            return False
+        with self.lock:
+            record = dict(self.state.to_dict(), fingerprint=self.fingerprint)
+            self.dirty = False
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self.touch()  # 下次保存时重试
+            raise
+        return True
+
+
+class QuestionSampler:
+    """
+    抽题引擎：
+    - 每名学生在每个桶中按各自的随机排列（i -> (a·i + b) mod n，a 与 n 互素）遍历题目，
+      只需保存乘数、偏移和已遍历的位置数，不同学生的出题顺序不同，同一学生不会重复
+    - 做过的题目记在学生的位图中（包括经其他知识点的桶或 mark_seen 记下的），遍历时跳过
+    - 目标难度的题目做完后依次使用相邻难度的题目
+    - 按学生分片加锁，不同学生可以并发抽题
+    - 学生状态随其记忆库持久化，重启后不会重复出题
+    """
+
+    _shared: Optional["QuestionSampler"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, bank: QuestionBank, seed: int = 0, user_manager: Any = None):
+        """
+        初始化抽题引擎
+
+        Args:
+            bank: 题库
+            seed: 随机种子（与学生ID、桶一起决定学生的出题顺序）
+            user_manager: 提供时学生状态随该学生的记忆库加载、保存与淘汰（见 StoredStudentState），
+                          否则保存在本实例中（可用 save_state/load_state 整体保存）
+        """
+        self.bank = bank
+        self.seed = seed
+        self.user_manager = user_manager
+        self._students: Dict[str, StoredStudentState] = {}
+        self._locks = ShardedLockTable()
+        self._positions: Optional[Dict[str, int]] = None  # 题目ID -> 编号（mark_seen 首次调用时建立）
+
+    @classmethod
+    def shared(cls) -> "QuestionSampler":
+        """
+        进程内共享的抽题引擎：题库由 QUESTION_BANK 环境变量指定（JSON 数组或 JSONL 文件，db 表示从知识数据库读取），
+        并入内置题目
+
+        Returns:
+            QuestionSampler: 共享实例
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                rows = list(SEED_QUESTIONS)
+                source = os.getenv("QUESTION_BANK")
+                if source:
+                    try:
+                        rows += fetch_rows("QuestionBank") if source == "db" else read_rows(source)
+                    except Exception as e:
+                        logger.error(f"加载题库 {source} 失败，仅使用内置题目: {e}")
+                cls._shared = cls(QuestionBank(rows), user_manager=UserManager())
+                logger.info(f"题库已加载: {len(cls._shared.bank)} 道题，{len(cls._shared.bank.buckets)} 个桶")
+            return cls._shared
+
+    def _stored(self, student: str) -> StoredStudentState:
+        """
+        取得学生的状态（须在持有该学生的锁之前调用：加载记忆库可能淘汰并保存其他用户）
+        """
+        lock = self._locks.lock_for(student)
+        if self.user_manager is None:
+            stored = self._students.get(student)
+            if stored is None:
+                stored = self._students.setdefault(student, StoredStudentState(None, self.bank.fingerprint, lock))
+            return stored
+        memory, path = self.user_manager.get_memory_with_file(student, STATE_SUFFIX)
+        with lock:
+            stored = memory.attachments.get(STATE_ATTACHMENT)
+            if stored is None or stored.fingerprint != self.bank.fingerprint:
+                stored = StoredStudentState(path, self.bank.fingerprint, lock, memory)
+                stored.load()
+                memory.attachments[STATE_ATTACHMENT] = stored
+            return stored
+
+    def resolve(self, topic: str) -> List[str]:
+        """
+        知识点名称或ID对应题库中的知识点（名称通过知识点索引匹配，如"勾股定律" -> 勾股定理）
+
+        Args:
+            topic: 知识点名称或ID
+
+        Returns:
+            List[str]: 题库中的 knowledge_id
+        """
+        candidates = [topic.strip()]
+        try:
+            match = KnowledgeIndex.shared().lookup(topic)
+            if match is not None:
+                candidates += [match.entry["name"]] + match.entry.get("knowledge_ids", []) + match.entry.get("aliases", [])
+        except Exception as e:
+            logger.warning(f"查找知识点索引失败: {e}")
+        return [key for key in dict.fromkeys(candidates) if self.bank.has_knowledge(key)]
+
+    def _draw(self, state: StudentState, student: str, bucket: int, count: int, picked: List[int]) -> None:
+        """从一个桶中按学生的排列继续取没做过的题目，直到取够或遍历完"""
+        start, end = self.bank.buckets[bucket]
+        size = end - start
+        cursor = state.cursors.get(bucket)
+        if cursor is None:
+            rng = random.Random(zlib.crc32(f"{self.seed}:{student}:{bucket}".encode("utf-8")))
+            multiplier = rng.randrange(1, size) if size > 1 else 1
+            while math.gcd(multiplier, size) != 1:
+                multiplier = rng.randrange(1, size)
+            cursor = state.cursors[bucket] = [multiplier, rng.randrange(size), 0]
+        multiplier, offset, position = cursor
+        members = self.bank.members
+        while len(picked) < count and position < size:
+            question = int(members[start + (multiplier * position + offset) % size])
+            position += 1
+            if not state.is_seen(question):
+                state.mark(question)
+                picked.append(question)
+        cursor[2] = position
+
+    def sample(self, student: str, knowledge_ids: Iterable[str], count: int = 1,
+               difficulty: int = DEFAULT_DIFFICULTY) -> List[Dict[str, Any]]:
+        """
+        为学生抽取没做过的题目并记为已做
+
+        Args:
+            student: 学生ID
+            knowledge_ids: 题库中的知识点
+            count: 题目数量
+            difficulty: 目标难度（1~5），目标难度的题目不够时依次使用相邻难度
+
+        Returns:
+            List[Dict[str, Any]]: 题目（可能少于 count 道）
+        """
+        knowledge_ids = list(knowledge_ids)
+        difficulty = min(max(int(difficulty), DIFFICULTIES[0]), DIFFICULTIES[-1])
+        levels = sorted(DIFFICULTIES, key=lambda level: (abs(level - difficulty), level))
+        picked: List[int] = []
+        stored = self._stored(student)
+        with stored.lock:
+            state = stored.state
+            for level in levels:
+                for knowledge_id in knowledge_ids:
+                    bucket = self.bank.bucket_id(knowledge_id, level)
+                    if bucket is not None and len(picked) < count:
+                        self._draw(state, student, bucket, count, picked)
+                if len(picked) >= count:
+                    break
+            if picked:
+                stored.touch()
+        return [self.bank.question(question) for question in picked]
+
+    def mark_seen(self, student: str, question_ids: Iterable[str]) -> int:
+        """
+        把题目记为学生已做过（如从作答记录中恢复）
+
+        Args:
+            student: 学生ID
+            question_ids: 题目ID
+
+        Returns:
+            int: 题库中存在并被记下的题目数
+        """
+        if self._positions is None:
+            self._positions = {qid: i for i, qid in enumerate(self.bank.question_ids)}
+        marked = 0
+        stored = self._stored(student)
+        with stored.lock:
+            for qid in question_ids:
+                position = self._positions.get(str(qid))
+                if position is not None:
+                    stored.state.mark(position)
+                    marked += 1
+            if marked:
+                stored.touch()
+        return marked
+
+    def forget(self, student: str) -> None:
+        """清除学生的做题记录"""
+        stored = self._stored(student)
+        with stored.lock:
+            stored.state = StudentState()
+            stored.touch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计
+
+        Returns:
+            Dict[str, Any]: 题库规模、学生数及学生状态占用的内存
+        """
+        if self.user_manager is None:
+            states = [stored.state for stored in list(self._students.values())]
+        else:
+            # 只统计常驻内存的学生
+            states = [memory.attachments[STATE_ATTACHMENT].state for memory in self.user_manager.resident_memories()
+                      if STATE_ATTACHMENT in memory.attachments]
+        return {
+            "questions": len(self.bank),
+            "buckets": len(self.bank.buckets),
+            "students": len(states),
+            "state_bytes": sum(state.nbytes() for state in states),
+        }
+
+    def save_state(self, path: str) -> None:
+        """
+        保存本实例中全部学生的做题记录（未指定 user_manager 时使用；首行为题库指纹，之后每行一名学生）
+
+        Args:
+            path: 文件路径
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"fingerprint": self.bank.fingerprint}) + "\n")
+            for student, stored in list(self._students.items()):
+                with stored.lock:
+                    record = dict(stored.state.to_dict(), student=student)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def load_state(self, path: str) -> int:
+        """
+        加载 save_state 保存的做题记录
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            int: 学生数
+
+        Raises:
+            ValueError: 记录不是由同一题库产生的
+        """
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("fingerprint") != self.bank.fingerprint:
+                raise ValueError(f"做题记录 {path} 与当前题库不一致")
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                stored = self._stored(record["student"])
+                with stored.lock:
+                    stored.state = StudentState.from_dict(record)
+                    stored.touch()
+                count += 1
+        return count
+
+
+def generate_questions(topic: str, count: int = 1, difficulty: int = DEFAULT_DIFFICULTY,
+                       student: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    为当前会话的学生抽题（generate_question 工具）
+
+    Args:
+        topic: 知识点名称或ID
+        count: 题目数量
+        difficulty: 目标难度（1~5）
+        student: 学生ID，默认为当前会话的用户
+
+    Returns:
+        List[Dict[str, Any]]: 题目，题库中没有该知识点时为空列表
+    """
+    if student is None:
+        session = current_session()
+        if session is not None:
+            student = session.user_id
+        else:
+            student = UserManager().current_user_id
+    sampler = QuestionSampler.shared()
+    knowledge_ids = sampler.resolve(topic)
+    if not knowledge_ids:
+        return []
+    return sampler.sample(student or "default", knowledge_ids, count, difficulty)
+
+
+def synthetic_bank(questions: int, knowledge: int = 500, seed: int = 0) -> QuestionBank:
+    """
+    生成用于耗时测试的题库
+
+    Args:
+        questions: 题目数
+        knowledge: 知识点数
+        seed: 随机种子
+
+    Returns:
+        QuestionBank: 题库
+    """
+    rng = np.random.default_rng(seed)
+    primary = rng.integers(0, knowledge, questions)
+    secondary = rng.integers(0, knowledge, questions)
+    levels = rng.integers(1, 6, questions)
+    linked = rng.random(questions) < 0.2
+    rows = ({"question_id": f"Q{i}", "question_text": f"题目{i}", "answer": "", "difficulty": int(levels[i]),
+             "related_knowledge_ids": [f"K{primary[i]}", f"K{secondary[i]}"] if linked[i] else [f"K{primary[i]}"]}
+            for i in range(questions))
+    return QuestionBank(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="题库抽题")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sample_parser = subparsers.add_parser("sample", help="为学生抽题")
+    sample_parser.add_argument("--bank", required=True, help="题库文件（JSON 数组或 JSONL）")
+    sample_parser.add_argument("--student", default="default", help="学生ID")
+    sample_parser.add_argument("--topic", required=True, help="知识点名称或ID")
+    sample_parser.add_argument("--count", type=int, default=5, help="题目数量")
+    sample_parser.add_argument("--difficulty", type=int, default=DEFAULT_DIFFICULTY, help="目标难度（1~5）")
+    sample_parser.add_argument("--state", default=None, help="做题记录文件（抽题前加载，抽题后保存）")
+
+    bench_parser = subparsers.add_parser("bench", help="抽题耗时测试")
+    bench_parser.add_argument("--questions", type=int, default=1000000, help="题目数")
+    bench_parser.add_argument("--knowledge", type=int, default=500, help="知识点数")
+    bench_parser.add_argument("--students", type=int, default=5000, help="学生数")
+    bench_parser.add_argument("--draws", type=int, default=20, help="每名学生的抽题次数")
+    bench_parser.add_argument("--count", type=int, default=5, help="每次抽题数")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "sample":
+            sampler = QuestionSampler(QuestionBank(read_rows(args.bank)))
+            if args.state and os.path.exists(args.state):
+                sampler.load_state(args.state)
+            questions = sampler.sample(args.student, sampler.resolve(args.topic), args.count, args.difficulty)
+            for i, question in enumerate(questions):
+                print(f"{i + 1}. [{question['difficulty']}] {question['question_text']}")
+            if args.state:
+                sampler.save_state(args.state)
+        else:
+            began = time.perf_counter()
+            bank = synthetic_bank(args.questions, args.knowledge)
+            built = time.perf_counter() - began
+            sampler = QuestionSampler(bank)
+            rng = random.Random(0)
+            began = time.perf_counter()
+            drawn = 0
+            for i in range(args.students * args.draws):
+                student = f"s{i % args.students}"
+                drawn += len(sampler.sample(student, [f"K{rng.randrange(args.knowledge)}"], args.count,
+                                            rng.randint(1, 5)))
+            elapsed = time.perf_counter() - began
+            stats = sampler.get_stats()
+            calls = args.students * args.draws
+            print(f"题库 {len(bank)} 道题 / {stats['buckets']} 个桶，编译 {built:.2f} s")
+            print(f"{calls} 次抽题（共 {drawn} 道）: 平均 {elapsed / calls * 1e6:.1f} µs/次；"
+                  f"{stats['students']} 名学生的状态共 {stats['state_bytes'] / 1e6:.1f} MB")
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from storage_layout import ShardedLayout
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 表结构与 doc/知识库/用户数据库说明.md 中的用户表、会话表、消息表一致；
+# 消息表额外冗余 user_id 以支持按用户的索引查询
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id     TEXT PRIMARY KEY,
+    username    TEXT,
+    email       TEXT,
+    phone       TEXT,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    last_login  TEXT,
+    role        TEXT NOT NULL DEFAULT 'student'
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id  TEXT PRIMARY KEY,
+    user_id     TEXT NOT NULL REFERENCES users(user_id),
+    title       TEXT,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    tags        TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS messages (
+    message_id  TEXT PRIMARY KEY,
+    session_id  TEXT NOT NULL REFERENCES sessions(session_id),
+    user_id     TEXT NOT NULL,
+    role        TEXT,
+    content     TEXT,
+    tokens      INTEGER NOT NULL DEFAULT 0,
+    created_at  TEXT NOT NULL,
+    metadata    TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_messages_user_session_time ON messages(user_id, session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_user_time ON messages(user_id, created_at);
+"""
+
+# 记忆内容中 role/content 以外的字段（如工具名称、状态）保存在 metadata 的该键下
+_EXTRA_FIELDS_KEY = "_content_fields"
+_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]|[0-9a-zA-Z]+|[^\s0-9a-zA-Z\u4e00-\u9fff]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    粗略估算文本的 token 数：每个汉字、每个英文单词/数字、每个符号各计 1
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: token 数
+    """
+    return len(_TOKEN_PATTERN.findall(text)) if text else 0
+
+
+def _timestamp(value: datetime) -> str:
+    # 固定到微秒精度，保证字符串顺序与时间顺序一致
+    return value.isoformat(timespec="microseconds")
+
+
+class SQLiteMemoryStore:
+    """
+    基于 SQLite（WAL 模式）的用户记忆库存储：
+    - 用户、会话、消息三张表，消息按 (user_id, session_id, created_at) 建索引
+    - 保存时把 ContextMemory 的修改日志在一个事务中批量写入
+    - 加载时只读取最近 max_memory_size 条消息，历史消息留在数据库中按范围查询
+    - 写入经同一个连接并由写锁串行化；读取使用每个线程各自的连接，不等待写锁，也不互相阻塞
+    与 JsonlMemoryStore 接口一致，可直接作为 UserManager.storage 使用
+    """
+
+    # 数据库保存了全部消息，长期记忆直接从 iter_history 构建，无需另存归档
+    keeps_full_history = True
+
+    def __init__(self, storage_path: str = "user_memories", db_name: str = "memories.db",
+                 session_gap_minutes: int = 30, read_only: bool = False):
+        """
+        初始化存储
+
+        Args:
+            storage_path: 存储目录（长期记忆等附属文件也放在该目录下）
+            db_name: 数据库文件名
+            session_gap_minutes: 与上一条消息间隔超过该分钟数时开启新会话
+            read_only: 只读打开（用于导出等离线读取），不创建数据库与表，写入时抛出 sqlite3.OperationalError
+        """
+        self.storage_path = storage_path
+        self.db_path = os.path.join(self.storage_path, db_name)
+        # 长期记忆等附属文件按用户ID哈希分片存放
+        self.layout = ShardedLayout(storage_path, read_only=read_only)
+        self.session_gap = timedelta(minutes=session_gap_minutes)
+        self.read_only = read_only
+        # 写锁只串行化写事务；读取走每个线程各自的只读连接（WAL 模式下读写互不阻塞）
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        if read_only:
+            self._conn = self._connect()
+        else:
+            os.makedirs(self.storage_path, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        # 用户ID到 (当前会话ID, 该会话最后一条消息时间) 的映射
+        self._open_sessions: Dict[str, tuple] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开一个只读连接"""
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """
+        获取当前线程的读连接（首次使用时打开）
+
+        Returns:
+            sqlite3.Connection: 只在当前线程中使用的读连接
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """关闭写连接与全部线程的读连接"""
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        with self._write_lock:
+            self._conn.close()
+
+    def path_for(self, user_id: str, suffix: str) -> str:
+        """
+        获取用户附属文件的路径
+
+        Args:
+            user_id: 用户ID
+            suffix: 文件后缀
+
+        Returns:
+            str: 文件路径
+        """
+        return self.layout.path_for(user_id, suffix)
+
+    def exists(self, user_id: str) -> bool:
+        """判断用户是否有持久化数据"""
+        row = self._reader().execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None
+
+    def list_user_ids(self) -> Iterator[str]:
+        """
+        枚举所有用户ID（按批读取，不一次性加载）
+
+        Returns:
+            Iterator[str]: 用户ID
+        """
+        last = ""
+        while True:
+            rows = self._reader().execute(
+                "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT 1000", (last,)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row["user_id"]
+            last = rows[-1]["user_id"]
+
+    # ---------- 行与记忆条目的转换 ----------
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row, entry_cls: Any) -> Any:
+        metadata = json.loads(row["metadata"] or "{}")
+        content = {"role": row["role"], "content": row["content"]}
+        content.update(metadata.pop(_EXTRA_FIELDS_KEY, {}))
+        return entry_cls(
+            id=row["message_id"],
+            content=content,
+            timestamp=datetime.fromisoformat(row["created_at"]),
+            metadata=metadata
+        )
+
+    @staticmethod
+    def _entry_columns(entry: Any) -> tuple:
+        content = entry.content if isinstance(entry.content, dict) else {"content": entry.content}
+        text = content.get("content")
+        if text is not None and not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False, default=str)
+        metadata = dict(entry.metadata)
+        extra = {k: v for k, v in content.items() if k not in ("role", "content")}
+        if extra:
+            metadata[_EXTRA_FIELDS_KEY] = extra
+        return (content.get("role"), text, estimate_tokens(text), _timestamp(entry.timestamp),
+                json.dumps(metadata, ensure_ascii=False, default=str))
+
+    # ---------- ContextMemory 存储接口 ----------
+
+    def load(self, user_id: str, max_memory_size: int = 100) -> Optional[Any]:
+        """
+        加载用户最近 max_memory_size 条消息组成记忆库
+
+        Args:
+            user_id: 用户ID
+            max_memory_size: 记忆库最大条目数量
+
+        Returns:
+            ContextMemory: 加载的记忆库，用户不存在时返回None
+        """
+        # 动态导入utils模块以避免循环依赖
+        from utils import ContextMemory, MemoryEntry
+
+        if not self.exists(user_id):
+            return None
+        rows = self._reader().execute(
+            "SELECT * FROM messages WHERE user_id = ? ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (user_id, max_memory_size)
+        ).fetchall()
+        memory = ContextMemory(max_memory_size)
+        for row in reversed(rows):
+            memory._append_entry(self._row_to_entry(row, MemoryEntry))
+        memory.drain_journal()
+        return memory
+
+    def _session_for(self, user_id: str, at: datetime, now: str) -> str:
+        """获取消息所属的会话，与上一条消息间隔过久时开启新会话（在写事务中调用）"""
+        current = self._open_sessions.get(user_id)
+        if current is None:
+            row = self._conn.execute(
+                "SELECT session_id, updated_at FROM sessions WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1",
+                (user_id,)
+            ).fetchone()
+            if row is not None:
+                current = (row["session_id"], datetime.fromisoformat(row["updated_at"]))
+        if current is None or at - current[1] > self.session_gap:
+            session_id = str(uuid.uuid4())
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, user_id, at.strftime("%Y-%m-%d %H:%M 的对话"), now, _timestamp(at))
+            )
+            current = (session_id, at)
+        self._open_sessions[user_id] = (current[0], max(current[1], at))
+        return current[0]
+
+    def save(self, user_id: str, memory: Any) -> int:
+        """
+        在一个事务中批量写入自上次保存以来的修改
+
+        Args:
+            user_id: 用户ID
+            memory: 用户记忆库
+
+        Returns:
+            int: 写入的操作数量
+        """
+        journal, overflow = memory.drain_journal()
+        if overflow:
+            # 修改日志已被丢弃：把当前窗口中的条目整体写入（已存在的只更新内容）
+            journal = [("add", entry) for entry in list(memory.memories)]
+        if not journal:
+            return 0
+
+        try:
+            now = _timestamp(datetime.now())
+            with self._write_lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO users (user_id, created_at, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    (user_id, now, now)
+                )
+                inserts: List[tuple] = []
+                for op, arg in journal:
+                    if op == "add":
+                        session_id = self._session_for(user_id, arg.timestamp, now)
+                        inserts.append((arg.id, session_id, user_id) + self._entry_columns(arg))
+                        continue
+                    # 其他操作需要看到之前的插入结果，先把已累积的插入写入
+                    self._flush_inserts(inserts)
+                    if op == "update":
+                        # 修改不改变消息的写入时间（及其所属会话）
+                        role, text, tokens, _, metadata = self._entry_columns(arg)
+                        self._conn.execute(
+                            "UPDATE messages SET role = ?, content = ?, tokens = ?, metadata = ? "
+                            "WHERE message_id = ?",
+                            (role, text, tokens, metadata, arg.id)
+                        )
+                    elif op == "delete":
+                        self._conn.execute("DELETE FROM messages WHERE message_id = ?", (arg,))
+                    elif op == "clear":
+                        self._conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+                self._flush_inserts(inserts)
+                current = self._open_sessions.get(user_id)
+                if current is not None:
+                    session_id, last_at = current
+                    self._conn.execute("UPDATE sessions SET updated_at = ? WHERE session_id = ? AND updated_at < ?",
+                                       (_timestamp(last_at), session_id, _timestamp(last_at)))
+        except Exception:
+            # 事务已回滚（其中新建的会话也不存在了），把修改放回记忆库，下次保存时重试
+            self._open_sessions.pop(user_id, None)
+            memory.requeue_journal(journal, overflow)
+            raise
+        return len(journal)
+
+    def _flush_inserts(self, inserts: List[tuple]) -> None:
+        if inserts:
+            # 已存在的消息（修改日志溢出后整体重写窗口时）只更新内容，保留写入时间与所属会话
+            self._conn.executemany(
+                "INSERT INTO messages "
+                "(message_id, session_id, user_id, role, content, tokens, created_at, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET role = excluded.role, content = excluded.content, "
+                "tokens = excluded.tokens, metadata = excluded.metadata",
+                inserts
+            )
+            inserts.clear()
+
+    def compact(self, user_id: str, memory: Any) -> None:
+        """写入全部待保存修改（SQLite 无需快照压缩，保留该方法以与 JsonlMemoryStore 接口一致）"""
+        self.save(user_id, memory)
+
+    def delete(self, user_id: str) -> None:
+        """删除用户及其全部会话与消息"""
+        with self._write_lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+        self._open_sessions.pop(user_id, None)
+
+    # ---------- 范围查询 ----------
+
+    def list_sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        获取用户最近的会话
+
+        Args:
+            user_id: 用户ID
+            limit: 返回数量
+
+        Returns:
+            List[Dict[str, Any]]: 会话列表，按更新时间降序排列
+        """
+        rows = self._reader().execute(
+            "SELECT * FROM sessions WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?", (user_id, limit)
+        ).fetchall()
+        sessions = []
+        for row in rows:
+            session = dict(row)
+            session["tags"] = json.loads(session["tags"] or "[]")
+            sessions.append(session)
+        return sessions
+
+    def get_last_messages(self, user_id: str, session_id: str, n: int = 20) -> List[Any]:
+        """
+        获取某个会话的最后 n 条消息
+
+        Args:
+            user_id: 用户ID
+            session_id: 会话ID
+            n: 消息数量
+
+        Returns:
+            List[MemoryEntry]: 按时间顺序排列的消息
+        """
+        from utils import MemoryEntry
+
+        rows = self._reader().execute(
+            "SELECT * FROM messages WHERE user_id = ? AND session_id = ? "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (user_id, session_id, n)
+        ).fetchall()
+        return [self._row_to_entry(row, MemoryEntry) for row in reversed(rows)]
+
+    def iter_messages(self, user_id: str, session_id: Optional[str] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      batch_size: int = 500) -> Iterator[Any]:
+        """
+        按时间顺序逐批读取消息，内存占用与消息总数无关
+
+        Args:
+            user_id: 用户ID
+            session_id: 会话ID，为None时读取用户全部会话
+            start: 起始时间（包含）
+            end: 结束时间（不包含）
+            batch_size: 每批读取的行数
+
+        Returns:
+            Iterator[MemoryEntry]: 消息
+        """
+        from utils import MemoryEntry
+
+        where = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        if session_id is not None:
+            where.append("session_id = ?")
+            params.append(session_id)
+        if start is not None:
+            where.append("created_at >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            where.append("created_at < ?")
+            params.append(_timestamp(end))
+        # 以 (created_at, rowid) 作为游标分页，避免长时间持有读事务
+        cursor_time, cursor_rowid = "", -1
+        while True:
+            query = (f"SELECT rowid AS _rowid, * FROM messages WHERE {' AND '.join(where)} "
+                     "AND (created_at > ? OR (created_at = ? AND rowid > ?)) "
+                     "ORDER BY created_at, rowid LIMIT ?")
+            rows = self._reader().execute(
+                query, params + [cursor_time, cursor_time, cursor_rowid, batch_size]
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_entry(row, MemoryEntry)
+            cursor_time, cursor_rowid = rows[-1]["created_at"], rows[-1]["_rowid"]
+
+    def iter_history(self, user_id: str, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> Iterator[Any]:
+        """
+        按时间顺序流式读取用户的完整历史（与 JsonlMemoryStore.iter_history 接口一致）
+
+        Args:
+            user_id: 用户ID
+            start: 起始时间（包含）
+            end: 结束时间（不包含）
+
+        Returns:
+            Iterator[MemoryEntry]: 消息
+        """
+        return self.iter_messages(user_id, start=start, end=end)
+
+    def count_messages(self, user_id: str, session_id: Optional[str] = None) -> int:
+        """统计用户（或某个会话）的消息数量"""
+        if session_id is None:
+            row = self._reader().execute("SELECT COUNT(*) FROM messages WHERE user_id = ?", (user_id,)).fetchone()
+        else:
+            row = self._reader().execute("SELECT COUNT(*) FROM messages WHERE user_id = ? AND session_id = ?",
+                                         (user_id, session_id)).fetchone()
+        return row[0]
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import logging
+import threading
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 用户持久化文件的后缀（快照、日志、历史日志、长期记忆归档、向量索引、抽题记录）
+USER_FILE_SUFFIXES = (".snap", ".json", ".wal.jsonl", ".hist.jsonl", ".ltm.jsonl", ".vec.f32", ".vec.ids",
+                      ".quiz.state")
+# 迁移时需要移动的全部后缀（另含冷存储归档）
+MIGRATED_SUFFIXES = USER_FILE_SUFFIXES + (".cold",)
+LAYOUT_FILE = "layout.json"
+MANIFEST_FILE = "manifest.jsonl"
+_RESERVED_NAMES = {LAYOUT_FILE, MANIFEST_FILE}
+MAX_USER_ID_LENGTH = 64
+
+
+def check_user_id(user_id: str) -> str:
+    """
+    检查用户ID能否安全地作为文件名（HTTP 服务、MCP 服务与存储共用的校验）：
+    不能为空或超过 MAX_USER_ID_LENGTH 个字符，不能以 "." 开头，不能包含路径分隔符、".." 或控制字符；
+    中文等非 ASCII 字符可以使用
+
+    Args:
+        user_id: 用户ID
+
+    Returns:
+        str: 原用户ID
+
+    Raises:
+        ValueError: 用户ID不能作为文件名
+    """
+    if (not isinstance(user_id, str) or not user_id or len(user_id) > MAX_USER_ID_LENGTH
+            or user_id.startswith(".") or ".." in user_id
+            or any(ord(c) < 32 or c == "\x7f" for c in user_id)
+            or any(sep in user_id for sep in ("/", "\\", os.sep, os.altsep) if sep)):
+        raise ValueError(f"非法的用户ID: {user_id!r}（不超过{MAX_USER_ID_LENGTH}个字符，"
+                         f"不能以 . 开头，不能包含路径分隔符、.. 或控制字符）")
+    return user_id
+
+
+def split_user_file(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    将用户文件名拆分为 (用户ID, 后缀)
+
+    Args:
+        filename: 文件名
+
+    Returns:
+        Optional[Tuple[str, str]]: 不是用户文件时返回None
+    """
+    if filename in _RESERVED_NAMES:
+        return None
+    for suffix in MIGRATED_SUFFIXES:
+        if filename.endswith(suffix) and len(filename) > len(suffix):
+            return filename[:-len(suffix)], suffix
+    return None
+
+
+class ShardedLayout:
+    """
+    按用户ID哈希前缀分片的目录布局：
+    - 用户文件位于 <root>/<h[0:2]>/<h[2:4]>/<user_id><suffix>，h 为用户ID的 SHA-1，单个目录的文件数保持较小
+    - manifest.jsonl 追加记录出现过的用户（及删除标记），枚举用户时读取清单而不是列目录
+    - 旧的扁平布局（<root>/<user_id><suffix>）在服务访问某个用户时迁移该用户的文件；
+      migrate_flat()（命令行: python storage_layout.py migrate）可分批迁移剩余用户，全部完成后在 layout.json 中记录，
+      之后不再检查扁平路径。枚举用户与只读访问不会移动文件
+    - 构造时不写入磁盘，根目录与 layout.json 在第一次写入时才创建；以只读方式打开时从不写入
+    """
+
+    def __init__(self, root: str, levels: int = 2, width: int = 2, read_only: bool = False):
+        """
+        初始化布局（已有 layout.json 时沿用其中的分片参数）
+
+        Args:
+            root: 存储根目录
+            levels: 分片目录层数
+            width: 每层目录名的十六进制字符数
+            read_only: 只读打开（导出、批量报告等离线读取使用），不迁移、不创建目录与文件
+
+        Raises:
+            ValueError: 只读打开时目录中还有未迁移的扁平布局文件
+        """
+        self.root = root
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._layout_path = os.path.join(root, LAYOUT_FILE)
+        self._manifest_path = os.path.join(root, MANIFEST_FILE)
+        state: Dict[str, Any] = {}
+        if os.path.exists(self._layout_path):
+            with open(self._layout_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        self.levels = state.get("levels", levels)
+        self.width = state.get("width", width)
+        self.flat_migrated: bool = state.get("flat_migrated", False)
+        self._state_saved = bool(state)
+        if not state:
+            # 新目录里没有扁平文件，无需迁移
+            self.flat_migrated = not self._flat_users(1)
+        if read_only and not self.flat_migrated:
+            if self._flat_users(1):
+                raise ValueError(f"{root} 中还有扁平布局的用户文件，请先运行迁移: "
+                                 f"python storage_layout.py migrate --storage {root}")
+            self.flat_migrated = True  # 扁平文件已迁移完，只是没有记录到 layout.json
+        self._users: Optional[Set[str]] = None  # 清单中的用户（首次枚举时加载）
+        self._manifest_records = 0
+        self._settled: Set[str] = set()  # 已检查过扁平文件的用户（仅在迁移完成前使用）
+
+    def _flat_users(self, limit: Optional[int] = None) -> list:
+        """列出根目录中仍为扁平布局的用户（最多 limit 个）"""
+        if not os.path.isdir(self.root):
+            return []
+        pending = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                parsed = split_user_file(entry.name) if entry.is_file() else None
+                if parsed and parsed[0] not in pending:
+                    pending.append(parsed[0])
+                    if limit is not None and len(pending) >= limit:
+                        break
+        return pending
+
+    def _prepare(self) -> None:
+        """第一次写入前创建根目录并记录布局参数"""
+        if self.read_only:
+            raise ValueError(f"{self.root} 以只读方式打开，不能写入")
+        if not self._state_saved:
+            os.makedirs(self.root, exist_ok=True)
+            self._write_state()
+
+    def _write_state(self) -> None:
+        tmp_path = self._layout_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "levels": self.levels, "width": self.width,
+                       "flat_migrated": self.flat_migrated}, f)
+        os.replace(tmp_path, self._layout_path)
+        self._state_saved = True
+
+    def shard_dir(self, user_id: str) -> str:
+        """获取用户所在的分片目录"""
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        parts = [digest[i * self.width:(i + 1) * self.width] for i in range(self.levels)]
+        return os.path.join(self.root, *parts)
+
+    def path_for(self, user_id: str, suffix: str, create: bool = True) -> str:
+        """
+        获取用户文件路径（扁平布局未迁移完时先迁移该用户的文件）
+
+        Args:
+            user_id: 用户ID
+            suffix: 文件后缀
+            create: 是否创建所在的分片目录（只检查文件是否存在时传False）
+
+        Returns:
+            str: 文件路径
+
+        Raises:
+            ValueError: 用户ID包含路径分隔符或 ".."
+        """
+        check_user_id(user_id)
+        if not self.flat_migrated and user_id not in self._settled:
+            self.migrate_user(user_id)
+        directory = self.shard_dir(user_id)
+        if create and not os.path.isdir(directory):
+            self._prepare()
+            os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{user_id}{suffix}")
+
+    def migrate_user(self, user_id: str) -> int:
+        """
+        将用户的扁平布局文件移动到分片目录
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            int: 移动的文件数量
+        """
+        check_user_id(user_id)
+        moved = 0
+        with self._lock:
+            directory = self.shard_dir(user_id)
+            for suffix in MIGRATED_SUFFIXES:
+                flat_path = os.path.join(self.root, f"{user_id}{suffix}")
+                if not os.path.exists(flat_path):
+                    continue
+                self._prepare()
+                os.makedirs(directory, exist_ok=True)
+                target = os.path.join(directory, f"{user_id}{suffix}")
+                if os.path.exists(target):
+                    # 分片目录中的文件是迁移之后写入的，扁平文件已过期
+                    os.remove(flat_path)
+                else:
+                    os.replace(flat_path, target)
+                moved += 1
+            if moved:
+                self.register(user_id)
+            self._settled.add(user_id)
+        return moved
+
+    def migrate_flat(self, limit: Optional[int] = None) -> int:
+        """
+        分批迁移扁平布局中的用户，全部完成后记录到 layout.json
+
+        Args:
+            limit: 本次最多迁移的用户数，为None时全部迁移
+
+        Returns:
+            int: 本次迁移的用户数量
+        """
+        if self.flat_migrated:
+            return 0
+        migrated = 0
+        with self._lock:
+            pending = self._flat_users(limit)
+            for user_id in pending:
+                if self.migrate_user(user_id):
+                    migrated += 1
+            if limit is None or len(pending) < limit:
+                self.flat_migrated = True
+                self._settled.clear()
+                self._prepare()
+                self._write_state()
+                logger.info(f"{self.root} 已全部迁移为分片布局")
+        return migrated
+
+    def _load_manifest(self) -> Set[str]:
+        if self._users is not None:
+            return self._users
+        users: Set[str] = set()
+        records = 0
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 最后一行可能写了一半
+                    records += 1
+                    if record.get("deleted"):
+                        users.discard(record["user"])
+                    else:
+                        users.add(record["user"])
+        self._users = users
+        self._manifest_records = records
+        return users
+
+    def _append_manifest(self, record: Dict[str, Any]) -> None:
+        with open(self._manifest_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._manifest_records += 1
+
+    def register(self, user_id: str) -> None:
+        """在清单中登记用户（已登记时不写文件）"""
+        with self._lock:
+            users = self._load_manifest()
+            if user_id not in users:
+                self._prepare()
+                users.add(user_id)
+                self._append_manifest({"user": user_id})
+
+    def unregister(self, user_id: str) -> None:
+        """从清单中删除用户，删除标记过多时重写清单"""
+        with self._lock:
+            users = self._load_manifest()
+            if user_id not in users:
+                return
+            users.discard(user_id)
+            self._append_manifest({"user": user_id, "deleted": True})
+            if self._manifest_records > 2 * len(users) + 1024:
+                self._rewrite_manifest()
+
+    def _rewrite_manifest(self) -> None:
+        users = self._load_manifest()
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for user_id in users:
+                f.write(json.dumps({"user": user_id}, ensure_ascii=False, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path)
+        self._manifest_records = len(users)
+
+    def users(self) -> Iterator[str]:
+        """
+        枚举清单中的用户（扁平布局未迁移完时再加上根目录中的扁平用户，不移动文件）
+
+        Returns:
+            Iterator[str]: 用户ID
+        """
+        with self._lock:
+            users = list(self._load_manifest())
+            if not self.flat_migrated:
+                known = set(users)
+                users += [user_id for user_id in self._flat_users() if user_id not in known]
+        return iter(users)
+
+    def iter_files(self) -> Iterator[Tuple[str, str, str]]:
+        """
+        遍历分片目录中的全部用户文件（用于统计与重建清单）
+
+        Returns:
+            Iterator[Tuple[str, str, str]]: (用户ID, 后缀, 路径)
+        """
+        def walk(directory: str, depth: int) -> Iterator[Tuple[str, str, str]]:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if depth < self.levels:
+                        if entry.is_dir() and len(entry.name) == self.width:
+                            yield from walk(entry.path, depth + 1)
+                    elif entry.is_file():
+                        parsed = split_user_file(entry.name)
+                        if parsed:
+                            yield parsed[0], parsed[1], entry.path
+        if not os.path.isdir(self.root):
+            return iter(())
+        return walk(self.root, 0)
+
+    def rebuild_manifest(self) -> int:
+        """
+        遍历分片目录重建清单（清单丢失或损坏时使用）
+
+        Returns:
+            int: 用户数量
+        """
+        with self._lock:
+            self._prepare()
+            self._users = {user_id for user_id, _, _ in self.iter_files()}
+            self._rewrite_manifest()
+            return len(self._users)
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="记忆库存储目录布局")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="把扁平布局的用户文件迁移到分片目录")
+    migrate_parser.add_argument("--storage", default="user_memories", help="存储目录")
+    migrate_parser.add_argument("--limit", type=int, help="本次最多迁移的用户数，默认全部迁移")
+    rebuild_parser = commands.add_parser("rebuild-manifest", help="遍历分片目录重建用户清单")
+    rebuild_parser.add_argument("--storage", default="user_memories", help="存储目录")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.storage):
+        logger.error(f"存储目录不存在: {args.storage}")
+        return 1
+    layout = ShardedLayout(args.storage)
+    if args.command == "migrate":
+        migrated = layout.migrate_flat(args.limit)
+        state = "已全部迁移" if layout.flat_migrated else "仍有未迁移的用户"
+        print(f"迁移了 {migrated} 个用户，{state}")
+    else:
+        print(f"清单中共有 {layout.rebuild_manifest()} 个用户")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+学习计划排程：按知识点大纲的先修关系排序，再按每天可用的学习时间把知识点装入各天；
+一次可以为成千上万名学生排程（按知识点逐个处理，每一步对全部学生做向量化计算）
+
+用法示例:
+    python study_planner.py plan --topics 二次函数 勾股定理 一元二次方程 --days 5 --daily-minutes 60
+    python study_planner.py bench --students 5000 --days 30
+"""
+
+import os
+import sys
+import math
+import time
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from syllabus import Syllabus, load_syllabus
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAILY_MINUTES = 60
+MINUTES_PER_POINT = 30  # 每个知识点（大纲中的一个加粗条目）默认的学习时间
+
+# 知识点的排程状态
+SCHEDULED = 0
+BLOCKED = 1  # 先修知识点没有排进计划
+NO_TIME = 2  # 计划天数内剩余的时间不够
+UNSCHEDULED_REASONS = {BLOCKED: "先修知识点未能排入计划", NO_TIME: "计划天数内时间不足"}
+
+Durations = Optional[Union[Dict[str, int], Sequence[Dict[str, int]]]]
+
+
+@dataclass
+class StudyPlan:
+    """一名学生的学习计划"""
+    subject: str
+    days: int
+    daily_minutes: List[int]  # 每天可用的学习时间（分钟）
+    sessions: List[List[Tuple[str, int]]]  # 每天依次学习的（知识点, 分钟）
+    unscheduled: List[Tuple[str, str]] = field(default_factory=list)  # 未能排入计划的（知识点, 原因）
+    required_days: int = 0  # 按现有的每天学习时间学完全部知识点大约需要的天数（计划天数加上学完未排入部分所需的天数）
+
+    def format(self) -> str:
+        """
+        生成计划文本
+
+        Returns:
+            str: 计划文本
+        """
+        minutes = set(self.daily_minutes)
+        per_day = f"，每天{self.daily_minutes[0]}分钟" if len(minutes) == 1 else ""
+        lines = [f"{self.subject}学习计划 ({self.days}天{per_day}):"]
+        for day, sessions in enumerate(self.sessions):
+            if sessions:
+                lines.append(f"第{day + 1}天: " + ", ".join(f"{topic}({m}分钟)" for topic, m in sessions))
+        if self.unscheduled:
+            lines.append("未能排入计划: " + ", ".join(f"{topic}（{reason}）" for topic, reason in self.unscheduled))
+            lines.append(f"按当前每天的学习时间，学完全部内容约需{self.required_days}天")
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class BatchSchedule:
+    """
+    一批学生的排程结果（S 名学生 × T 个知识点 × D 天），知识点的列顺序已满足先修关系
+    """
+    topics: List[str]
+    requested: np.ndarray  # S×T，学生是否要学习该知识点
+    duration: np.ndarray  # S×T，学习时间（分钟）
+    start: np.ndarray  # S×T，开始的一天（从0起），未排入时为-1
+    end: np.ndarray  # S×T，结束的一天，未排入时为-1
+    status: np.ndarray  # S×T，SCHEDULED / BLOCKED / NO_TIME
+    capacity: np.ndarray  # S×D，每天可用的学习时间
+    days: np.ndarray  # S，计划天数
+    splits: Dict[int, Tuple[np.ndarray, np.ndarray]] = field(default_factory=dict)  # 跨天学习的知识点：知识点 -> (学生, 各天的分钟)
+
+    def __len__(self) -> int:
+        return self.requested.shape[0]
+
+    def unscheduled_count(self) -> int:
+        """未能排入计划的（学生, 知识点）数"""
+        return int((self.requested & (self.status != SCHEDULED)).sum())
+
+    def plan_for(self, index: int, subject: str = "数学") -> StudyPlan:
+        """
+        取出一名学生的学习计划
+
+        Args:
+            index: 学生在本批中的序号
+            subject: 学科
+
+        Returns:
+            StudyPlan: 学习计划
+        """
+        days = int(self.days[index])
+        sessions: List[List[Tuple[str, int]]] = [[] for _ in range(days)]
+        unscheduled = []
+        split_minutes = {}
+        for t, (rows, minutes) in self.splits.items():
+            position = np.searchsorted(rows, index)
+            if position < rows.size and rows[position] == index:
+                split_minutes[t] = minutes[position]
+        for t in np.flatnonzero(self.requested[index]):
+            topic = self.topics[t]
+            if self.status[index, t] != SCHEDULED:
+                unscheduled.append((topic, UNSCHEDULED_REASONS[int(self.status[index, t])]))
+            elif t in split_minutes:
+                for day in np.flatnonzero(split_minutes[t]):
+                    sessions[day].append((topic, int(split_minutes[t][day])))
+            else:
+                sessions[int(self.start[index, t])].append((topic, int(self.duration[index, t])))
+        capacity = self.capacity[index, :days]
+        left = int(self.duration[index][self.requested[index] & (self.status[index] != SCHEDULED)].sum())
+        average = float(capacity[capacity > 0].mean()) if (capacity > 0).any() else DEFAULT_DAILY_MINUTES
+        return StudyPlan(
+            subject=subject,
+            days=days,
+            daily_minutes=[int(m) for m in capacity],
+            sessions=sessions,
+            unscheduled=unscheduled,
+            required_days=days + math.ceil(left / average),
+        )
+
+
+def schedule(requested: np.ndarray, duration: np.ndarray, capacity: np.ndarray,
+             ancestors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    排程核心：按列顺序（须满足先修关系）逐个知识点处理，每一步对全部学生向量化计算：
+    - 知识点最早在其已排入的先修知识点中最晚结束的那一天开始
+    - 放入从最早一天起第一个剩余时间足够的一天（First Fit）
+    - 没有这样的一天时从最早一天起依次占用各天的剩余时间（跨天学习）
+    - 仍然放不下，或先修知识点没有排进计划时，记为未排入（不会被悄悄丢弃）
+
+    Args:
+        requested: S×T bool，学生是否要学习该知识点
+        duration: S×T，学习时间（分钟）
+        capacity: S×D，每天可用的学习时间（计划天数之外为0）
+        ancestors: T×T bool，ancestors[t, u] 表示 u 是 t 的（直接或间接）先修
+
+    Returns:
+        Tuple: (start, end, status, splits)，含义见 BatchSchedule
+    """
+    students, topics = requested.shape
+    remaining = capacity.astype(np.int64)
+    start = np.full((students, topics), -1, dtype=np.int32)
+    end = np.full((students, topics), -1, dtype=np.int32)
+    status = np.zeros((students, topics), dtype=np.int8)
+    splits: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    day_index = np.arange(capacity.shape[1])
+
+    for t in range(topics):
+        rows = np.flatnonzero(requested[:, t])
+        if rows.size == 0:
+            continue
+        earliest = np.zeros(rows.size, dtype=np.int64)
+        parents = np.flatnonzero(ancestors[t])
+        if parents.size:
+            parent_requested = requested[np.ix_(rows, parents)]
+            parent_end = end[np.ix_(rows, parents)]
+            blocked = (parent_requested & (parent_end < 0)).any(axis=1)
+            status[rows[blocked], t] = BLOCKED
+            earliest = np.where(parent_requested, parent_end, 0).max(axis=1)[~blocked]
+            rows = rows[~blocked]
+            if rows.size == 0:
+                continue
+
+        need = duration[rows, t].astype(np.int64)
+        window = day_index >= earliest[:, None]
+        free = np.where(window, remaining[rows], 0)
+        fits = window & (free >= need[:, None])
+        whole = fits.any(axis=1)
+        day = fits.argmax(axis=1)[whole]
+        placed = rows[whole]
+        remaining[placed, day] -= need[whole]
+        start[placed, t] = day
+        end[placed, t] = day
+
+        if whole.all():
+            continue
+        rows, free, need = rows[~whole], free[~whole], need[~whole]
+        total = free.cumsum(axis=1)
+        enough = total[:, -1] >= need
+        status[rows[~enough], t] = NO_TIME
+        rows, free, total, need = rows[enough], free[enough], total[enough], need[enough]
+        if rows.size == 0:
+            continue
+        last = (total >= need[:, None]).argmax(axis=1)
+        take = np.where(day_index <= last[:, None], free, 0)
+        row_index = np.arange(rows.size)
+        take[row_index, last] -= total[row_index, last] - need
+        remaining[rows] -= take
+        start[rows, t] = (take > 0).argmax(axis=1)
+        end[rows, t] = last
+        splits[t] = (rows, take)
+    return start, end, status, splits
+
+
+class StudyPlanner:
+    """
+    学习计划排程器：知识点的先修关系与默认学习时间来自知识点大纲，
+    大纲中没有的知识点按默认时间学习、没有先修，排在大纲知识点之后
+    """
+
+    _shared: Optional["StudyPlanner"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, syllabus: Optional[Syllabus] = None, minutes_per_point: int = MINUTES_PER_POINT):
+        """
+        初始化排程器
+
+        Args:
+            syllabus: 知识点大纲，默认读取 doc/知识库/初中数学大纲.md
+            minutes_per_point: 每个知识点默认的学习时间（分钟），章节按其下的知识点数计算
+        """
+        self.syllabus = syllabus if syllabus is not None else load_syllabus()
+        self.minutes_per_point = minutes_per_point
+
+    @classmethod
+    def shared(cls) -> "StudyPlanner":
+        """
+        进程内共享的排程器
+
+        Returns:
+            StudyPlanner: 共享实例
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def default_duration(self, topic: str) -> int:
+        """知识点默认的学习时间（分钟）"""
+        item = self.syllabus.get(topic)
+        points = len(item.points) if item is not None and item.is_chapter else 1
+        return self.minutes_per_point * max(1, points)
+
+    def plan_batch(self, topic_lists: Sequence[Sequence[str]], days: Union[int, Sequence[int]],
+                   daily_minutes: Union[int, Sequence[int], np.ndarray] = DEFAULT_DAILY_MINUTES,
+                   durations: Durations = None) -> BatchSchedule:
+        """
+        为一批学生排程
+
+        Args:
+            topic_lists: 每名学生要学习的知识点
+            days: 计划天数（全部学生相同，或每名学生一个）
+            daily_minutes: 每天的学习时间：一个数、每名学生一个数，或 S×D 数组（逐天指定）
+            durations: 知识点学习时间（分钟）的覆盖值：全部学生共用一个字典，或每名学生一个字典
+
+        Returns:
+            BatchSchedule: 排程结果
+
+        Raises:
+            ValueError: 计划天数或学习时间不合法（含某名学生在计划天数内没有任何学习时间）
+        """
+        students = len(topic_lists)
+        days_array = np.broadcast_to(np.asarray(days, dtype=np.int64), (students,)).copy()
+        if students and days_array.min() < 1:
+            raise ValueError("计划天数必须大于0")
+        horizon = int(days_array.max()) if students else 0
+        minutes = np.asarray(daily_minutes, dtype=np.int64)
+        if minutes.ndim == 2:
+            capacity = np.zeros((students, horizon), dtype=np.int64)
+            width = min(horizon, minutes.shape[1])
+            capacity[:, :width] = minutes[:, :width]
+        else:
+            capacity = np.repeat(np.broadcast_to(minutes, (students,))[:, None], horizon, axis=1)
+        if (capacity < 0).any():
+            raise ValueError("每天的学习时间不能为负数")
+        capacity[np.arange(horizon) >= days_array[:, None]] = 0
+        if students and (capacity.sum(axis=1) == 0).any():
+            raise ValueError("计划天数内每天的学习时间不能都为0")
+
+        lists = [[topic for topic in dict.fromkeys(str(topic).strip() for topic in topics) if topic]
+                 for topics in topic_lists]
+        topics = self.syllabus.topological_order(dict.fromkeys(topic for names in lists for topic in names))
+        column = {topic: i for i, topic in enumerate(topics)}
+        ancestors = np.zeros((len(topics), len(topics)), dtype=bool)
+        for i, topic in enumerate(topics):
+            for parent in self.syllabus.ancestors(topic):
+                if parent in column:
+                    ancestors[i, column[parent]] = True
+
+        requested = np.zeros((students, len(topics)), dtype=bool)
+        for s, names in enumerate(lists):
+            requested[s, [column[name] for name in names]] = True
+        duration = np.repeat(np.array([[self.default_duration(topic) for topic in topics]], dtype=np.int64),
+                             students, axis=0)
+        if isinstance(durations, dict):
+            for topic, value in durations.items():
+                if topic in column:
+                    duration[:, column[topic]] = int(value)
+        elif durations is not None:
+            for s, overrides in enumerate(durations):
+                for topic, value in (overrides or {}).items():
+                    if topic in column:
+                        duration[s, column[topic]] = int(value)
+        if (duration < 0).any():
+            raise ValueError("知识点的学习时间不能为负数")
+
+        start, end, status, splits = schedule(requested, duration, capacity, ancestors)
+        return BatchSchedule(topics, requested, duration, start, end, status, capacity, days_array, splits)
+
+    def plan(self, subject: str, topics: Sequence[str], days: int,
+             daily_minutes: Union[int, Sequence[int]] = DEFAULT_DAILY_MINUTES,
+             durations: Optional[Dict[str, int]] = None) -> StudyPlan:
+        """
+        为一名学生制定学习计划
+
+        Args:
+            subject: 学科
+            topics: 要学习的知识点
+            days: 计划天数
+            daily_minutes: 每天的学习时间（一个数，或逐天指定）
+            durations: 知识点学习时间（分钟）的覆盖值
+
+        Returns:
+            StudyPlan: 学习计划
+        """
+        minutes = np.asarray(daily_minutes, dtype=np.int64)
+        if minutes.ndim == 1:
+            minutes = minutes[None, :]
+        batch = self.plan_batch([topics], days, minutes, durations)
+        return batch.plan_for(0, subject)
+
+
+def create_study_plan(subject: str, topics: Sequence[str], days: int,
+                      daily_minutes: Optional[int] = None, durations: Optional[Dict[str, int]] = None) -> str:
+    """
+    制定学习计划（create_study_plan 工具）
+
+    Args:
+        subject: 学科
+        topics: 要学习的知识点
+        days: 计划天数
+        daily_minutes: 每天的学习时间（分钟），未指定时为60
+        durations: 知识点学习时间（分钟）的覆盖值
+
+    Returns:
+        str: 计划文本
+
+    Raises:
+        ValueError: 计划天数或学习时间不合法（如每天的学习时间为0）
+    """
+    if daily_minutes is None:
+        daily_minutes = DEFAULT_DAILY_MINUTES
+    plan = StudyPlanner.shared().plan(subject, topics, int(days), daily_minutes, durations)
+    return plan.format()
+
+
+def benchmark(students: int = 5000, days: int = 30, daily_minutes: int = DEFAULT_DAILY_MINUTES,
+              topics_per_student: int = 30, seed: int = 0) -> Dict[str, float]:
+    """
+    用随机抽取的大纲知识点测试批量排程的耗时
+
+    Args:
+        students: 学生数
+        days: 计划天数
+        daily_minutes: 每天的学习时间（分钟）
+        topics_per_student: 每名学生的知识点数
+        seed: 随机种子
+
+    Returns:
+        Dict[str, float]: 学生数、知识点数、耗时与未排入的知识点数
+    """
+    planner = StudyPlanner.shared()
+    names = [topic.name for topic in planner.syllabus.topics]
+    rng = np.random.default_rng(seed)
+    count = min(topics_per_student, len(names))
+    topic_lists = [[names[i] for i in rng.choice(len(names), count, replace=False)] for _ in range(students)]
+    began = time.perf_counter()
+    batch = planner.plan_batch(topic_lists, days, daily_minutes)
+    elapsed = time.perf_counter() - began
+    return {
+        "students": students,
+        "topics": len(batch.topics),
+        "seconds": elapsed,
+        "unscheduled": batch.unscheduled_count(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="学习计划排程")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = subparsers.add_parser("plan", help="为一名学生制定学习计划")
+    plan_parser.add_argument("--subject", default="数学", help="学科")
+    plan_parser.add_argument("--topics", nargs="+", required=True, help="要学习的知识点")
+    plan_parser.add_argument("--days", type=int, required=True, help="计划天数")
+    plan_parser.add_argument("--daily-minutes", type=int, default=DEFAULT_DAILY_MINUTES, help="每天的学习时间（分钟）")
+
+    bench_parser = subparsers.add_parser("bench", help="批量排程耗时测试")
+    bench_parser.add_argument("--students", type=int, default=5000, help="学生数")
+    bench_parser.add_argument("--days", type=int, default=30, help="计划天数")
+    bench_parser.add_argument("--daily-minutes", type=int, default=DEFAULT_DAILY_MINUTES, help="每天的学习时间（分钟）")
+    bench_parser.add_argument("--topics", type=int, default=30, help="每名学生的知识点数")
+    bench_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "plan":
+            print(create_study_plan(args.subject, args.topics, args.days, args.daily_minutes), end="")
+        else:
+            result = benchmark(args.students, args.days, args.daily_minutes, args.topics, args.seed)
+            print(f"{result['students']}名学生 × {result['topics']}个知识点: {result['seconds'] * 1000:.1f} ms，"
+                  f"未排入 {result['unscheduled']} 项")
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+初中数学知识点大纲（doc/知识库/初中数学大纲.md）的结构化表示：
+章节（"#### 1. 有理数"）与其下的知识点（"- **勾股定理：...**"），以及章节之间的先修关系
+"""
+
+import os
+import re
+import heapq
+import logging
+import functools
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTLINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "doc", "知识库", "初中数学大纲.md")
+
+# 章节之间的先修关系（章节 -> 需要先学的章节）
+CHAPTER_PREREQUISITES: Dict[str, Tuple[str, ...]] = {
+    "整式": ("有理数",),
+    "因式分解": ("整式",),
+    "分式": ("因式分解",),
+    "一元一次方程": ("整式",),
+    "一元一次不等式": ("一元一次方程",),
+    "二元一次方程组": ("一元一次方程",),
+    "一元二次方程": ("因式分解", "一元一次方程"),
+    "三角形": ("几何基础",),
+    "四边形": ("三角形",),
+    "圆": ("三角形",),
+    "相似与投影": ("三角形", "分式"),
+    "一次函数": ("二元一次方程组", "一元一次不等式"),
+    "反比例函数": ("一次函数", "分式"),
+    "二次函数": ("一元二次方程", "一次函数"),
+    "数据统计": ("有理数",),
+    "概率": ("数据统计",),
+    "综合与实践": ("二次函数", "圆", "相似与投影", "概率"),
+}
+GRADE_NAMES = {"初一": 1, "初二": 2, "初三": 3}
+# 大纲条目中不是知识点的泛称
+GENERIC_TERMS = {"分类", "性质", "形式", "图像", "解法", "解法步骤", "应用题", "事件", "与方程", "不等式结合"}
+
+
+@dataclass(frozen=True)
+class SyllabusTopic:
+    """大纲中的一个章节或知识点"""
+    name: str
+    chapter: str  # 所属章节（章节的 chapter 为其自身）
+    section: str  # 所属部分，如"数与代数"
+    order: int  # 在大纲中出现的顺序
+    grade: Optional[int]  # 年级（1~3，来自"学习顺序"），未知时为None
+    points: Tuple[str, ...]  # 要点原文（章节为其下全部加粗条目，知识点为所在条目）
+
+    @property
+    def is_chapter(self) -> bool:
+        return self.name == self.chapter
+
+
+def split_terms(text: str) -> List[str]:
+    """
+    从加粗条目中取出知识点名称：冒号前的部分去掉括号中的说明后按顿号拆分，忽略公式、过长的条目与泛称
+
+    Args:
+        text: 加粗条目文本，如"勾股定理：直角三角形中，a² + b² = c²"
+
+    Returns:
+        List[str]: 知识点名称
+    """
+    head = re.split(r"[：:]", text)[0]
+    head = re.sub(r"[（(].*?[）)]", "", head)
+    names = []
+    for name in head.split("、"):
+        name = name.strip()
+        if 2 <= len(name) <= 8 and not re.search(r"[=²+\-·/\d（）()]", name) and name not in GENERIC_TERMS:
+            names.append(name)
+    return names
+
+
+class Syllabus:
+    """
+    知识点大纲：
+    - topics 按大纲顺序列出全部章节与知识点（同名的只保留第一次出现的）
+    - 章节的先修章节见 CHAPTER_PREREQUISITES；知识点以其所在章节为先修
+    - topological_order 在满足先修关系的前提下按（年级, 大纲顺序）排列
+    """
+
+    def __init__(self, topics: Iterable[SyllabusTopic],
+                 prerequisites: Optional[Dict[str, Tuple[str, ...]]] = None):
+        """
+        初始化大纲
+
+        Args:
+            topics: 章节与知识点
+            prerequisites: 章节之间的先修关系，默认为 CHAPTER_PREREQUISITES
+        """
+        self.topics: List[SyllabusTopic] = list(topics)
+        self.by_name: Dict[str, SyllabusTopic] = {topic.name: topic for topic in self.topics}
+        prerequisites = CHAPTER_PREREQUISITES if prerequisites is None else prerequisites
+        self._prerequisites: Dict[str, Tuple[str, ...]] = {}
+        for topic in self.topics:
+            if topic.is_chapter:
+                self._prerequisites[topic.name] = tuple(p for p in prerequisites.get(topic.name, ())
+                                                        if p in self.by_name)
+            else:
+                self._prerequisites[topic.name] = (topic.chapter,)
+        self._ancestors: Dict[str, Set[str]] = {}
+        # 学习顺序中没有列出的章节按其先修章节中最高的年级排列
+        self._grades: Dict[str, int] = {}
+        for topic in self.topics:
+            grades = [self.by_name[name].grade for name in self.ancestors(topic.chapter) | {topic.chapter}]
+            self._grades[topic.name] = topic.grade or max([g for g in grades if g] or [9])
+
+    @classmethod
+    def parse(cls, text: str, prerequisites: Optional[Dict[str, Tuple[str, ...]]] = None) -> "Syllabus":
+        """
+        解析大纲文本
+
+        Args:
+            text: Markdown 文本
+            prerequisites: 章节之间的先修关系
+
+        Returns:
+            Syllabus: 大纲
+        """
+        grades: Dict[str, int] = {}
+        for line in text.splitlines():
+            # 学习顺序，如"1. **初一**：有理数、整式、一元一次方程、几何基础"
+            match = re.match(r"^\s*\d+\.\s*\*\*(初[一二三])\*\*[：:]\s*(.+)$", line)
+            if match:
+                for name in match.group(2).split("、"):
+                    grades.setdefault(name.strip(), GRADE_NAMES[match.group(1)])
+
+        def grade_of(name: str, section: str) -> Optional[int]:
+            for term, grade in grades.items():
+                if name == term or name.startswith(term) or term in section:
+                    return grade
+            return None
+
+        topics: List[SyllabusTopic] = []
+        seen: Set[str] = set()
+        chapter_points: Dict[str, List[List[str]]] = {}  # 章节 -> [加粗条目, 其下的缩进条目...]
+        point_of: Dict[str, Tuple[str, int]] = {}  # 知识点 -> 所在条目
+        section = chapter = ""
+        for line in text.splitlines():
+            if line.startswith("## ") and topics:
+                break  # 知识点整理之后是学习建议
+            match = re.match(r"^###\s*[一二三四五六七八九十]+、\s*(.+?)\s*$", line)
+            if match:
+                section = re.sub(r"[（(].*?[）)]", "", match.group(1)).strip()
+                chapter = ""
+                continue
+            match = re.match(r"^####\s*(?:\d+\.\s*)?(.+?)\s*$", line)
+            if match:
+                chapter = re.sub(r"[（(].*?[）)]", "", match.group(1)).strip()
+            elif section and not chapter and re.match(r"^\s*-\s*\*\*", line):
+                chapter = section  # 没有章节标题的部分（如"综合与实践"）整体作为一个章节
+            if chapter and chapter not in seen:
+                seen.add(chapter)
+                chapter_points[chapter] = []
+                topics.append(SyllabusTopic(chapter, chapter, section, len(topics),
+                                            grade_of(chapter, section), ()))
+            if not chapter:
+                continue
+            match = re.match(r"^\s*-\s*\*\*(.+?)\*\*", line)
+            if match:
+                point = match.group(1).strip()
+                chapter_points[chapter].append([point])
+                for name in split_terms(point):
+                    if name not in seen:
+                        seen.add(name)
+                        point_of[name] = (chapter, len(chapter_points[chapter]) - 1)
+                        topics.append(SyllabusTopic(name, chapter, section, len(topics),
+                                                    grade_of(chapter, section), ()))
+                continue
+            # 加粗条目下的缩进条目（如乘法公式的各个公式）并入该条目
+            match = re.match(r"^\s{2,}-\s*(.+?)\s*$", line)
+            if match and chapter_points[chapter]:
+                chapter_points[chapter][-1].append(match.group(1))
+
+        def render(point: List[str]) -> str:
+            if len(point) == 1:
+                return point[0]
+            return re.sub(r"[：:]$", "", point[0]) + "：" + "；".join(point[1:])
+
+        points = {chapter: [render(point) for point in items] for chapter, items in chapter_points.items()}
+        topics = [SyllabusTopic(t.name, t.chapter, t.section, t.order, t.grade,
+                                tuple(points[t.name]) if t.is_chapter
+                                else (points[point_of[t.name][0]][point_of[t.name][1]],))
+                  for t in topics]
+        return cls(topics, prerequisites)
+
+    def get(self, name: str) -> Optional[SyllabusTopic]:
+        """按名称查找章节或知识点"""
+        return self.by_name.get(name)
+
+    def prerequisites_of(self, name: str) -> Tuple[str, ...]:
+        """直接先修的章节（未知名称没有先修）"""
+        return self._prerequisites.get(name, ())
+
+    def ancestors(self, name: str) -> Set[str]:
+        """
+        全部（直接与间接）先修章节
+
+        Args:
+            name: 章节或知识点名称
+
+        Returns:
+            Set[str]: 先修章节名称
+        """
+        cached = self._ancestors.get(name)
+        if cached is None:
+            cached = set()
+            stack = list(self.prerequisites_of(name))
+            while stack:
+                parent = stack.pop()
+                if parent not in cached:
+                    cached.add(parent)
+                    stack.extend(self.prerequisites_of(parent))
+            self._ancestors[name] = cached
+        return cached
+
+    def priority(self, name: str) -> Tuple[int, int]:
+        """排序键：（年级, 大纲顺序），未知名称排在最后"""
+        topic = self.by_name.get(name)
+        if topic is None:
+            return (99, len(self.topics))
+        return (self._grades[name], topic.order)
+
+    def topological_order(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        按先修关系排序（Kahn 算法，可同时学习的按 priority 排列；不在 names 中的先修章节视为已学过，但仍保持传递的先后关系）
+
+        Args:
+            names: 要排序的名称，默认为全部章节与知识点；未知名称排在最后并保持原顺序
+
+        Returns:
+            List[str]: 排序后的名称
+
+        Raises:
+            ValueError: 先修关系中存在环
+        """
+        names = list(dict.fromkeys(names if names is not None else (t.name for t in self.topics)))
+        known = [name for name in names if name in self.by_name]
+        unknown = [name for name in names if name not in self.by_name]
+        members = set(known)
+        edges: Dict[str, List[str]] = {name: [] for name in known}
+        indegree = {name: 0 for name in known}
+        for name in known:
+            for parent in self.ancestors(name) & members:
+                edges[parent].append(name)
+                indegree[name] += 1
+        heap = [(self.priority(name), name) for name in known if indegree[name] == 0]
+        heapq.heapify(heap)
+        ordered = []
+        while heap:
+            _, name = heapq.heappop(heap)
+            ordered.append(name)
+            for child in edges[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    heapq.heappush(heap, (self.priority(child), child))
+        if len(ordered) != len(known):
+            raise ValueError(f"先修关系中存在环: {sorted(set(known) - set(ordered))}")
+        return ordered + unknown
+
+
+@functools.lru_cache(maxsize=8)
+def load_syllabus(path: str = DEFAULT_OUTLINE) -> Syllabus:
+    """
+    读取并解析知识点大纲（同一文件在进程内只解析一次）
+
+    Args:
+        path: 大纲文件路径
+
+    Returns:
+        Syllabus: 大纲，文件不存在时为空大纲
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return Syllabus.parse(f.read())
+    except OSError as e:
+        logger.warning(f"无法读取知识点大纲 {path}: {e}")
+        return Syllabus([])
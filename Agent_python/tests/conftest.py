@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接导入 Agent_python 下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def user_manager(tmp_path, monkeypatch):
+    """使用临时目录存储的 UserManager（进程内单例，测试结束后丢弃常驻用户）"""
+    monkeypatch.chdir(tmp_path)
+    from memory_store import JsonlMemoryStore
+    from utils import UserManager
+
+    manager = UserManager()
+    manager.set_storage(JsonlMemoryStore(str(tmp_path / "user_memories")))
+    yield manager
+    manager.discard_users(list(manager.users_memory))
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def _hold(controller, class_name, count):
+    """占用 count 个执行槽位，返回释放函数"""
+    for _ in range(count):
+        controller.acquire(class_name)
+
+    def release():
+        for _ in range(count):
+            controller.release(class_name)
+    return release
+
+
+def test_background_cannot_take_reserved_interactive_slots():
+    controller = AdmissionController(capacity=4)
+    assert controller.limits == {"interactive": 4, "background": 3}
+    release = _hold(controller, "background", 3)
+    # 后台请求已占满其份额：新的后台请求排队，交互式请求仍可立即执行
+    admitted = threading.Event()
+    worker = threading.Thread(target=lambda: (controller.acquire("background", deadline=5.0), admitted.set()))
+    worker.start()
+    try:
+        assert controller.acquire("interactive") == 0.0
+        assert not admitted.wait(0.1)
+        assert controller.get_stats()["classes"]["background"]["queued"] == 1
+    finally:
+        controller.release("interactive")
+        release()
+    assert admitted.wait(1.0)
+    worker.join()
+    controller.release("background")
+    assert controller.get_stats()["active"] == 0
+
+
+def _queue(controller, class_name, order, deadline=5.0):
+    """在后台线程中排队，获得槽位后记录类别名称并立即释放"""
+    def run():
+        try:
+            with controller.admit(class_name, deadline):
+                order.append(class_name)
+        except AdmissionRejected as e:
+            order.append(e.reason)
+    worker = threading.Thread(target=run)
+    worker.start()
+    return worker
+
+
+def _wait_queued(controller, class_name, count):
+    for _ in range(200):
+        if controller.get_stats()["classes"][class_name]["queued"] == count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"{class_name} 队列未达到 {count}")
+
+
+def test_slot_goes_to_highest_priority_then_fifo():
+    controller = AdmissionController(capacity=1)
+    order = []
+    controller.acquire("interactive")
+    workers = [_queue(controller, "background", order)]
+    _wait_queued(controller, "background", 1)
+    workers.append(_queue(controller, "interactive", order))
+    _wait_queued(controller, "interactive", 1)
+    workers.append(_queue(controller, "interactive", order))
+    _wait_queued(controller, "interactive", 2)
+    controller.release("interactive")
+    for worker in workers:
+        worker.join()
+    assert order == ["interactive", "interactive", "background"]
+
+
+def test_queue_full_rejects_immediately():
+    controller = AdmissionController(capacity=1)
+    limit = controller.classes["background"].queue_limit
+    controller.acquire("interactive")
+    order = []
+    workers = [_queue(controller, "background", order) for _ in range(limit)]
+    _wait_queued(controller, "background", limit)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire("background")
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.degraded_message == controller.classes["background"].degraded_message
+    controller.release("interactive")
+    for worker in workers:
+        worker.join()
+    assert order == ["background"] * limit
+    assert controller.metrics["background"]["rejected_queue_full"] == 1
+
+
+def test_deadline_rejection_and_expiry_in_queue():
+    controller = AdmissionController(capacity=1)
+    controller.acquire("interactive")
+    controller.release("interactive", service_seconds=10.0)
+    controller.acquire("interactive")
+    try:
+        # 平均执行10秒，预计等待超过1秒的截止时间，立即拒绝
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.acquire("interactive", deadline=1.0)
+        assert rejected.value.reason == "deadline" and rejected.value.retry_after >= 1.0
+
+        # 无法估计等待时间时先排队，超过截止时间后移出队列
+        controller._service_ewma = None
+        with pytest.raises(AdmissionRejected) as expired:
+            controller.acquire("interactive", deadline=0.05)
+        assert expired.value.reason == "expired"
+        assert controller.get_stats()["classes"]["interactive"]["queued"] == 0
+    finally:
+        controller.release("interactive")
+    metrics = controller.metrics["interactive"]
+    assert (metrics["rejected_deadline"], metrics["expired_in_queue"], metrics["admitted"]) == (1, 1, 2)
+
+
+def test_stats_and_prometheus_export():
+    controller = AdmissionController(capacity=2)
+    with controller.admit("background") as waited:
+        assert waited == 0.0
+        stats = controller.get_stats()
+        assert stats["active"] == 1
+        assert stats["classes"]["background"]["active"] == 1
+        assert stats["classes"]["background"]["active_limit"] == 1
+    text = controller.render_prometheus()
+    assert "agent_admission_capacity 2\n" in text
+    assert "agent_admission_active 0\n" in text
+    assert 'agent_admission_admitted{class="background"} 1\n' in text
+    assert 'agent_admission_queue_limit{class="interactive"} 64\n' in text
+    assert "agent_admission_service_seconds_ewma" in text
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from agent_delegation import AgentDelegator, default_workers
+from admission import AdmissionController
+from user_session import current_session
+from utils import ContextMemory
+
+
+class SleepyAgent:
+    """按请求中的秒数休眠的子Agent，休眠期间每隔10毫秒检查一次取消标记"""
+
+    shared_context_size = 0
+
+    def __init__(self, name: str):
+        self.name = name
+        self.memory = ContextMemory()
+        self.cancelled = threading.Event()
+
+    def run_once(self, request: str) -> str:
+        cancelled = current_session().memory.cancelled
+        deadline = time.monotonic() + float(request)
+        while time.monotonic() < deadline:
+            if cancelled.is_set():
+                self.cancelled.set()
+                return "cancelled"
+            time.sleep(0.01)
+        return f"{self.name} done"
+
+
+def test_timeout_starts_when_task_runs():
+    delegator = AgentDelegator({"a": SleepyAgent("a")}, max_workers=1, timeout=0.5)
+    try:
+        # 线程池只有一个线程：第二个子请求排队0.3秒，从开始执行算起仍在超时之内
+        results = delegator.run([{"agent": "a", "request": "0.3"}, {"agent": "a", "request": "0.3"}])
+    finally:
+        delegator.shutdown()
+    assert [r.status for r in results] == ["ok", "ok"]
+
+
+def test_timed_out_task_is_cancelled():
+    agent = SleepyAgent("slow")
+    delegator = AgentDelegator({"slow": agent}, max_workers=1, timeout=0.1)
+    try:
+        results = delegator.run([{"agent": "slow", "request": "5"}])
+        assert results[0].status == "timeout"
+        assert agent.cancelled.wait(1.0)
+    finally:
+        delegator.shutdown()
+
+
+def test_default_workers_follow_admission_capacity(monkeypatch):
+    monkeypatch.delenv("AGENT_DELEGATE_WORKERS", raising=False)
+    monkeypatch.setattr(AdmissionController, "_shared", AdmissionController(capacity=8))
+    assert default_workers(3) == 24
+    monkeypatch.setenv("AGENT_DELEGATE_WORKERS", "5")
+    assert default_workers(3) == 5
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from agent_router import DEFAULT_ROUTER_CONFIG, AhoCorasick, KeywordRouter
+
+ROUTES = {
+    "teaching": {"讲解": 2.0, "什么是": 1.5, "定理": 1.0},
+    "testing": {"练习": 2.0, "出题": 2.0, "定理": 1.0},
+    "secretary": {"计划": 2.0},
+}
+
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers", ""])
+    matches = sorted(automaton.iter_matches("ushers"))
+    assert matches == [(3, 0), (3, 1), (5, 3)]
+
+
+def test_scores_sum_weights_and_count_each_keyword_once():
+    router = KeywordRouter(ROUTES, "teaching")
+    decision = router.route("讲解讲解一下练习，再出题")
+    assert decision.agent == "testing"
+    assert decision.scores == {"teaching": 2.0, "testing": 4.0, "secretary": 0.0}
+    assert decision.matches["testing"] == [("练习", 2.0), ("出题", 2.0)]
+    assert not decision.fallback
+
+
+def test_ties_follow_config_order_and_zero_falls_back():
+    router = KeywordRouter(ROUTES, "secretary")
+    # "定理" 同时属于 teaching 与 testing，同分时选择配置中靠前的 teaching
+    tie = router.route("勾股定理")
+    assert (tie.agent, tie.score) == ("teaching", 1.0)
+    assert tie.scores["testing"] == 1.0
+    reordered = KeywordRouter({"testing": ROUTES["testing"], "teaching": ROUTES["teaching"]}, "teaching")
+    assert reordered.route("勾股定理").agent == "testing"
+
+    fallback = router.route("今天天气不错")
+    assert fallback.agent == "secretary" and fallback.fallback and fallback.score == 0.0
+
+
+def test_matches_naive_substring_scoring_on_shipped_config():
+    with open(DEFAULT_ROUTER_CONFIG, "r", encoding="utf-8") as f:
+        routes = json.load(f)["agents"]
+    router = KeywordRouter.from_config(DEFAULT_ROUTER_CONFIG)
+    for text in ("请帮我讲解一下勾股定理", "给我出几道二次函数的练习题", "帮我制定下周的学习计划",
+                 "孩子最近的学习情况怎么样", "Hello"):
+        expected = {agent: sum(w for k, w in keywords.items() if k.lower() in text.lower())
+                    for agent, keywords in routes.items()}
+        assert router.route(text).scores == pytest.approx(expected)
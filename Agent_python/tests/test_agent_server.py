@@ -0,0 +1,167 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from admission import AdmissionController, AdmissionOutcome
+from agent_server import MAX_HEADER_BYTES, AgentServer, admission_workers
+
+
+def test_default_workers_cover_admission_capacity_and_queues():
+    admission = AdmissionController(capacity=4)
+    expected = 4 + sum(c.queue_limit for c in admission.classes.values())
+    assert admission_workers(admission) == expected
+    server = AgentServer(SimpleNamespace(admission=admission))
+    assert server.workers == expected
+    assert server.max_queue == 4 * expected
+    server._executor.shutdown()
+
+
+def test_explicit_workers_are_kept():
+    server = AgentServer(SimpleNamespace(admission=AdmissionController(capacity=4)), workers=8)
+    assert server.workers == 8
+    server._executor.shutdown()
+
+
+class StubSystem:
+    """按消息内容回显的系统：消息为秒数时先休眠，"busy" 返回降级回复"""
+
+    user_id = "default"
+
+    def __init__(self):
+        self.admission = AdmissionController(capacity=4)
+        self.calls = []
+        self.shut_down = False
+
+    def handle_request(self, message, user_id=None, deadline=None, priority=None):
+        self.calls.append((message, user_id))
+        if message == "busy":
+            return AdmissionOutcome("降级回复", priority or "interactive", "teaching", degraded=True,
+                                    reason="queue_full", retry_after=2.0)
+        try:
+            time.sleep(float(message))
+        except ValueError:
+            pass
+        return AdmissionOutcome(f"echo:{message}", priority or "interactive", "teaching")
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+def _request(path, payload=None, headers=None, method="POST"):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    lines = [f"{method} {path} HTTP/1.1", "Host: test", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def _read_response(reader):
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ")[1])
+    headers = {name.lower(): value.strip() for name, value in (line.split(":", 1) for line in head[1:] if line)}
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            body += chunk[:-2]
+    else:
+        body = await reader.readexactly(int(headers.get("content-length", "0")))
+    return status, headers, body.decode("utf-8")
+
+
+async def _exchange(server, data):
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    writer.write(data)
+    await writer.drain()
+    try:
+        return await _read_response(reader)
+    finally:
+        writer.close()
+
+
+def _run(coro_fn, **kwargs):
+    async def main():
+        system = StubSystem()
+        server = await AgentServer(system, port=0, **kwargs).start()
+        try:
+            await coro_fn(server, system)
+        finally:
+            await server.shutdown(drain_timeout=1.0)
+        return system
+    return asyncio.run(main())
+
+
+def test_round_trip_and_keep_alive_reuse():
+    async def scenario(server, system):
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        for message in ("你好", "再见"):
+            writer.write(_request("/v1/chat", {"user_id": "小明", "message": message}))
+            await writer.drain()
+            status, headers, body = await _read_response(reader)
+            assert status == 200 and headers["connection"] == "keep-alive"
+            payload = json.loads(body)
+            assert payload["response"] == f"echo:{message}" and payload["user_id"] == "小明"
+            assert headers["x-request-id"] == payload["request_id"]
+        writer.write(_request("/v1/chat", {"user_id": "../x", "message": "你好"}))
+        await writer.drain()
+        status, _, body = await _read_response(reader)
+        assert status == 400 and "非法的用户ID" in json.loads(body)["error"]
+        writer.close()
+        assert server.stats["requests"] == 3
+        assert system.calls == [("你好", "小明"), ("再见", "小明")]
+
+    _run(scenario)
+
+
+def test_sse_framing():
+    async def scenario(server, system):
+        status, headers, body = await _exchange(server, _request("/v1/chat/stream", {"message": "0.2"}))
+        assert status == 200 and headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n") for block in body.strip("\n").split("\n\n")]
+        assert events[0][0] == "event: accepted"
+        assert ": keep-alive" in [block[0] for block in events]
+        message = next(block for block in events if block[0] == "event: message")
+        assert json.loads(message[1][len("data: "):])["response"] == "echo:0.2"
+        assert events[-1][0] == "event: done"
+
+    _run(scenario, heartbeat=0.05)
+
+
+def test_error_statuses():
+    async def scenario(server, system):
+        status, _, _ = await _exchange(server, _request("/v1/chat", {"message": "x" * 64}))
+        assert status == 413
+        status, _, _ = await _exchange(server, _request("/v1/chat", {"message": "hi"},
+                                                        {"X-Padding": "a" * (MAX_HEADER_BYTES + 1)}))
+        assert status == 431
+        status, headers, body = await _exchange(server, _request("/v1/chat", {"message": "busy"}))
+        assert status == 503 and headers["retry-after"] == "2" and json.loads(body)["degraded"]
+        status, _, _ = await _exchange(server, _request("/v1/chat", {"message": "0.5"}))
+        assert status == 504
+        # 唯一的执行槽位被超时的请求占用，且不允许排队
+        status, _, body = await _exchange(server, _request("/v1/chat", {"message": "hi"}))
+        assert status == 503 and "繁忙" in json.loads(body)["error"]
+
+    _run(scenario, workers=1, max_queue=0, request_timeout=0.2, max_body=32)
+
+
+def test_graceful_drain_finishes_inflight_requests():
+    async def scenario(server, system):
+        pending = asyncio.ensure_future(_exchange(server, _request("/v1/chat", {"message": "0.3"})))
+        while not system.calls:
+            await asyncio.sleep(0.01)
+        await server.shutdown(drain_timeout=5.0)
+        status, headers, _ = await pending
+        assert status == 200 and headers["connection"] == "close"
+        assert system.shut_down
+        try:
+            await asyncio.open_connection(server.host, server.port)
+        except OSError:
+            pass
+        else:
+            raise AssertionError("关闭后仍在接受连接")
+
+    _run(scenario)
@@ -0,0 +1,42 @@
+from agent_templates import AgentCatalog, AgentTemplate
+from user_session import user_session
+from utils import ContextMemory, base_tool
+
+
+def _tool(name):
+    tool = base_tool(tool_name=name, tool_description=name, parameters={"type": "object", "properties": {}})
+    tool.set_function(lambda: name)
+    return tool
+
+
+def test_bind_shares_model_and_tools_but_not_memory(user_manager):
+    template = AgentTemplate("math", "MathAgent", "测试用Agent", [_tool("explain"), _tool("quiz")])
+    memory = ContextMemory(8)
+    first, second = template.bind(memory), template.bind()
+
+    assert first is not template.prototype and first is not second
+    assert first.model is second.model is template.prototype.model
+    assert first.tools == second.tools and first.tools[0] is second.tools[0]
+    assert [spec["function"]["name"] for spec in template.tool_specs] == ["explain", "quiz"]
+    assert first.call_tool("quiz") == "quiz"
+
+    # 每个实例只有自己的 _memory，未显式绑定的使用当前会话的记忆库
+    assert first._memory is memory and first.memory is memory
+    assert second._memory is None and template.prototype._memory is None
+    with user_session("alice", user_manager) as session:
+        assert second.memory is session.memory
+        assert first.memory is session.memory  # 会话中以会话的记忆库为准
+
+
+def test_catalog_shared_is_keyed_by_config():
+    catalog = AgentCatalog.shared(shared_context_size=3)
+    assert AgentCatalog.shared(shared_context_size=3) is catalog
+    assert AgentCatalog.shared(shared_context_size=5) is not catalog
+
+    agents = catalog.bind()
+    other = catalog.bind()
+    assert list(agents) == ["teaching", "testing", "secretary", "parent"]
+    for key, agent in agents.items():
+        assert agent.model is catalog.templates[key].prototype.model
+        assert agent is not other[key]
+        assert agent.shared_context_size == 3
@@ -0,0 +1,40 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from batch_reports import BatchReportRunner, read_checkpoint, read_checkpoint_header
+
+START, END = datetime(2025, 9, 1), datetime(2025, 9, 8)
+
+
+def test_checkpoint_header_records_period_and_options(tmp_path):
+    output = str(tmp_path / "reports.jsonl")
+    BatchReportRunner(output, start=START, end=END, mode="template").run([])
+    header = read_checkpoint_header(output)
+    assert header["start"] == START.isoformat() and header["end"] == END.isoformat()
+    assert header["mode"] == "template"
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"user_id": "alice", "status": "ok"}) + "\n")
+    assert read_checkpoint(output) == {"alice"}
+
+    # 未指定周期时沿用检查点中的周期
+    runner = BatchReportRunner(output, mode="template")
+    assert runner.run([("alice", "Alice")])["resumed"] == 1
+    assert runner.options["start"] == START.isoformat()
+
+
+def test_resume_refuses_different_options(tmp_path):
+    output = str(tmp_path / "reports.jsonl")
+    BatchReportRunner(output, start=START, end=END, mode="template").run([])
+    with pytest.raises(ValueError, match="end"):
+        BatchReportRunner(output, start=START, end=datetime(2025, 9, 15), mode="template").run([])
+    with pytest.raises(ValueError, match="subject"):
+        BatchReportRunner(output, start=START, end=END, mode="template", subject="物理").run([])
+
+
+def test_resume_refuses_checkpoint_without_header(tmp_path):
+    output = tmp_path / "reports.jsonl"
+    output.write_text(json.dumps({"user_id": "alice", "status": "ok"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        BatchReportRunner(str(output), start=START, end=END).run([])
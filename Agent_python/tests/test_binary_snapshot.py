@@ -0,0 +1,64 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from binary_snapshot import BinarySnapshotReader, write_snapshot
+from utils import MemoryEntry
+
+BASE = datetime(2025, 9, 1, 8, 0, 0, 123456)
+
+
+def _entries(count):
+    return [MemoryEntry(id=f"m{i}", content={"role": "user", "content": f"第{i}条"},
+                        timestamp=BASE + timedelta(minutes=i), metadata={"agent": "teaching"})
+            for i in range(count)]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / "u.snap")
+    assert write_snapshot(path, _entries(50), wal_covered="wal-7", fsync=False) == 50
+    with BinarySnapshotReader(path) as reader:
+        yield reader
+
+
+def test_last_decodes_tail_in_order(snapshot):
+    assert len(snapshot) == 50 and snapshot.wal_covered == "wal-7"
+    tail = snapshot.last(3)
+    assert [e.id for e in tail] == ["m47", "m48", "m49"]
+    assert tail[-1].timestamp == BASE + timedelta(minutes=49)
+    assert tail[-1].metadata == {"agent": "teaching"}
+    assert snapshot.last(0) == []
+    assert len(snapshot.last(100)) == 50
+    assert snapshot.entry(-1).id == "m49"
+
+
+def test_find_by_id(snapshot):
+    for i in (0, 17, 49):
+        entry = snapshot.find(f"m{i}")
+        assert entry.id == f"m{i}" and entry.content["content"] == f"第{i}条"
+    assert snapshot.find("missing") is None
+    view = snapshot.payload(5)
+    assert json.loads(bytes(view))["id"] == "m5"
+    view.release()
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "empty.snap")
+    write_snapshot(path, [], fsync=False)
+    with BinarySnapshotReader(path) as reader:
+        assert len(reader) == 0 and reader.wal_covered is None
+        assert reader.last(5) == [] and reader.find("m0") is None
+
+
+def test_rejects_truncated_or_foreign_files(tmp_path):
+    path = tmp_path / "u.snap"
+    write_snapshot(str(path), _entries(10), fsync=False)
+    data = path.read_bytes()
+    path.write_bytes(data[:64])
+    with pytest.raises(ValueError):
+        BinarySnapshotReader(str(path))
+    path.write_bytes(b"JSON" + data[4:])
+    with pytest.raises(ValueError):
+        BinarySnapshotReader(str(path))
@@ -0,0 +1,25 @@
+from utils import ContextMemory
+
+
+def test_shared_slice_keeps_only_text_turns_of_other_agents():
+    memory = ContextMemory(20)
+    memory.add_memory({"role": "user", "content": "讲讲勾股定理"}, agent="TeachingAgent")
+    own_call = memory.add_memory({"role": "assistant", "content": "", "tool_calls": [{"name": "explain_concept"}]},
+                                 agent="TeachingAgent")
+    own_tool = memory.add_memory({"role": "tool", "name": "explain_concept", "content": "a² + b² = c²"},
+                                 agent="TeachingAgent")
+    user = memory.add_memory({"role": "user", "content": "出一道题"}, agent="TestingAgent")
+    memory.add_memory({"role": "assistant", "content": "", "tool_calls": [{"name": "find_questions"}]},
+                      agent="TestingAgent")
+    memory.add_memory({"role": "tool", "name": "find_questions", "content": "[...]"}, agent="TestingAgent")
+    reply = memory.add_memory({"role": "assistant", "content": "题目: 3、4、5 能组成直角三角形吗？"},
+                              agent="TestingAgent")
+
+    entries = memory.get_agent_entries("TeachingAgent", shared_count=3)
+    ids = [entry.id for entry in entries]
+    assert ids[-3:] == [own_tool, user, reply]
+    assert own_call in ids
+    # 其他智能体的工具调用与工具结果不会出现
+    assert all(entry.metadata.get("agent") == "TeachingAgent" or entry.content["role"] in ("user", "assistant")
+               and not entry.content.get("tool_calls") for entry in entries)
+    assert len(ids) == len(set(ids))
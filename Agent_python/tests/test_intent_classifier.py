@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+import pytest
+
+import intent_classifier
+from agent_router import KeywordRouter
+from intent_classifier import ClassifierRouter, IntentClassifier, load_labeled
+from multi_agent_system import _compile_router
+
+
+def test_exported_history_is_not_training_data_by_default(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    rows = [
+        {"text": "帮我出几道练习题", "label": "testing"},
+        {"role": "user", "content": "勾股定理是什么", "agent": "TeachingAgent"},
+        {"role": "assistant", "content": "勾股定理……", "agent": "TeachingAgent"},
+    ]
+    path.write_text("\n".join(json.dumps(row, ensure_ascii=False) for row in rows), encoding="utf-8")
+    assert list(load_labeled(str(path))) == [("帮我出几道练习题", "testing")]
+    assert list(load_labeled(str(path), from_history=True)) == [
+        ("帮我出几道练习题", "testing"), ("勾股定理是什么", "teaching")]
+
+
+def test_keyword_router_is_the_default(tmp_path):
+    assert isinstance(_compile_router(None, None, 0.6), KeywordRouter)
+    assert isinstance(_compile_router(None, str(tmp_path / "missing.npz"), 0.6), KeywordRouter)
+
+
+LABELED = [
+    ("讲解一下勾股定理", "teaching"), ("什么是一元二次方程", "teaching"), ("这个概念我不懂，讲讲", "teaching"),
+    ("出几道练习题", "testing"), ("给我出一套测验", "testing"), ("来几道题考考我", "testing"),
+    ("帮我制定学习计划", "secretary"), ("安排下周的复习计划", "secretary"),
+]
+
+
+def test_train_save_load_classify_round_trip(tmp_path):
+    data = tmp_path / "labeled.jsonl"
+    data.write_text("\n".join(json.dumps({"text": t, "label": l}, ensure_ascii=False) for t, l in LABELED),
+                    encoding="utf-8")
+    model = tmp_path / "intent_model.npz"
+    assert intent_classifier.main(["train", str(data), "-o", str(model), "--dim", "4096"]) == 0
+
+    trained = IntentClassifier.train([t for t, _ in LABELED], [l for _, l in LABELED], dim=4096)
+    loaded = IntentClassifier.load(str(model))
+    assert loaded.classes == ["teaching", "testing", "secretary"]
+    assert loaded.dim == 4096 and loaded.ngram_range == (1, 3)
+    assert np.allclose(loaded.log_likelihood, trained.log_likelihood)
+    for text in ("勾股定理怎么讲", "出点练习题", "复习计划怎么安排"):
+        assert loaded.predict_proba(text) == pytest.approx(trained.predict_proba(text))
+    assert loaded.predict("再出几道练习题")[0] == "testing"
+    assert loaded.evaluate([t for t, _ in LABELED], [l for _, l in LABELED])["accuracy"] == 1.0
+
+
+def test_classifier_router_falls_back_below_threshold():
+    classifier = IntentClassifier.train([t for t, _ in LABELED], [l for _, l in LABELED], dim=4096)
+    # 关键词路由故意把 "出几道" 配给 secretary，以区分两种路由的结果
+    keywords = KeywordRouter({"teaching": {"讲解": 1.0}, "testing": {"考考": 1.0}, "secretary": {"出几道": 1.0}},
+                             "teaching")
+    text = "出几道练习题"
+    label, confidence = classifier.predict(text)
+    assert label == "testing"
+
+    confident = ClassifierRouter(classifier, keywords, threshold=confidence - 0.01).route(text)
+    assert (confident.source, confident.agent) == ("classifier", "testing")
+    assert confident.confidence == pytest.approx(confidence)
+
+    # 置信度不够时使用关键词路由，但仍记录分类器的置信度
+    fallback = ClassifierRouter(classifier, keywords, threshold=confidence + 0.01).route(text)
+    assert (fallback.source, fallback.agent) == ("keyword", "secretary")
+    assert fallback.confidence == pytest.approx(confidence)
+
+    # 分类结果不是已知Agent时同样回退
+    unknown = ClassifierRouter(classifier, KeywordRouter({"teaching": {"讲解": 1.0}}, "teaching"), 0.0)
+    assert unknown.route(text).source == "keyword"
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from knowledge_index import INDEX_VERSION, KnowledgeIndex, build_index
+from syllabus import Syllabus
+
+OUTLINE = """
+### 一、数与代数
+
+#### 1. 有理数
+- **正数、负数、相反数、绝对值**
+- **有理数的加减乘除运算**
+
+#### 2. 整式
+- **乘法公式：**
+  - (a+b)² = a² + 2ab + b²
+"""
+
+KNOWLEDGE_ROWS = [{
+    "knowledge_id": "M7-001", "chapter": "有理数", "grade": 7,
+    "concept": "有理数是可以表示为两个整数之比的数。",
+    "application_methods": json.dumps(["比较大小：通分后比较分子"]),
+    "keywords": json.dumps(["有理数", "分数"]),
+}]
+
+QUESTION_ROWS = [{
+    "question_text": "3/4 是有理数吗？", "answer": "是", "difficulty": 1,
+    "related_knowledge_ids": json.dumps(["M7-001"]),
+}]
+
+
+def test_entries_without_definition_fall_back_to_model():
+    index = build_index(Syllabus.parse(OUTLINE), seeds={})
+    # 大纲中只有名称的知识点不拼凑定义
+    assert index.explain("有理数") is None
+    assert index.explain("绝对值") is None
+    assert index.example("有理数") is None
+    # 大纲条目"名称：说明"中的说明可以作为定义
+    assert "(a+b)²" in index.explain("乘法公式")
+    assert index.get_stats()["lookups"]["explain_miss"] == 2
+
+
+def test_knowledge_and_question_rows_fill_definitions_and_examples():
+    index = build_index(Syllabus.parse(OUTLINE), KNOWLEDGE_ROWS, QUESTION_ROWS, seeds={})
+    assert index.explain("有理数", "初级") == "有理数(初级): 有理数是可以表示为两个整数之比的数"
+    assert "比较大小" in index.explain("分数", "中级")
+    assert index.example("有理数", "困难") == "简单例题: 3/4 是有理数吗？ 答案: 是"
+
+
+def test_load_rejects_old_index_version(tmp_path):
+    path = tmp_path / "knowledge_index.json"
+    build_index(Syllabus.parse(OUTLINE), seeds={}).save(str(path))
+    assert KnowledgeIndex.load(str(path)).explain("乘法公式") is not None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["version"] = INDEX_VERSION - 1
+    path.write_text(json.dumps(data), encoding="utf-8")
+    with pytest.raises(ValueError):
+        KnowledgeIndex.load(str(path))
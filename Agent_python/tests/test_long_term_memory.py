@@ -0,0 +1,77 @@
+from long_term_memory import LongTermMemory
+from utils import ContextMemory, MemoryEntry
+
+
+def _entry(memory_id, text):
+    return MemoryEntry(id=memory_id, content={"role": "user", "content": text})
+
+
+def _ids(long_term, query):
+    return [entry.id for entry, _ in long_term.search(query, 5)]
+
+
+def test_update_and_delete_reach_index(tmp_path):
+    memory = ContextMemory(10)
+    long_term = LongTermMemory(str(tmp_path / "u.ltm.jsonl"))
+    memory.attach_index(long_term)
+    first = memory.add_memory({"role": "user", "content": "勾股定理怎么证明"})
+    second = memory.add_memory({"role": "user", "content": "一元二次方程求根公式"})
+
+    memory.update_memory(first, {"role": "user", "content": "相似三角形的判定"})
+    assert _ids(long_term, "勾股定理") == []
+    assert _ids(long_term, "相似三角形") == [first]
+
+    memory.delete_memory(second)
+    assert _ids(long_term, "求根公式") == []
+
+
+def test_archive_is_loaded_lazily_and_replays_changes(tmp_path):
+    path = str(tmp_path / "u.ltm.jsonl")
+    long_term = LongTermMemory(path)
+    long_term.add_entry(_entry("a", "勾股定理怎么证明"))
+    long_term.add_entry(_entry("b", "一元二次方程求根公式"))
+    long_term.save()
+    long_term.update_entry(_entry("a", "相似三角形的判定"))
+    long_term.remove_entry("b")
+    long_term.save()
+
+    reloaded = LongTermMemory(path)
+    assert not reloaded.loaded and len(reloaded) == 0
+    # 索引构建之前的修改在构建后应用
+    reloaded.add_entry(_entry("c", "反比例函数的图像"))
+    assert _ids(reloaded, "相似三角形") == ["a"]
+    assert reloaded.loaded
+    assert _ids(reloaded, "勾股定理") == []
+    assert _ids(reloaded, "求根公式") == []
+    assert _ids(reloaded, "反比例函数") == ["c"]
+
+
+def test_history_source_skips_archive(tmp_path):
+    history = [_entry("a", "勾股定理怎么证明"), _entry("b", "一元二次方程求根公式")]
+    long_term = LongTermMemory(history=lambda: iter(history))
+    long_term.remove_entry("b")
+    assert _ids(long_term, "求根公式") == []
+    assert _ids(long_term, "勾股定理") == ["a"]
+    assert long_term.save() == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_enabled_user_manager_recalls_into_prompt(user_manager, monkeypatch):
+    from types import SimpleNamespace
+
+    from user_session import user_session
+    from utils import base_agent
+
+    monkeypatch.setattr(user_manager, "long_term_memory_enabled", True)
+    memory = user_manager.create_user_memory("dave", max_memory_size=2)
+    memory.add_memory({"role": "user", "content": "勾股定理怎么证明"}, agent="tutor")
+    memory.add_memory({"role": "user", "content": "一元二次方程求根公式"}, agent="tutor")
+    memory.add_memory({"role": "user", "content": "反比例函数的图像"}, agent="tutor")
+
+    agent = base_agent("tutor", model=SimpleNamespace(tools=[]))
+    with user_session("dave", user_manager):
+        prompt = agent._build_prompt(query="勾股定理的证明方法")
+    # 第一条已被短期窗口淘汰，只能通过长期记忆召回
+    recalled = [part for part in prompt[1:] if part["role"] == "system"]
+    assert len(recalled) == 1 and "勾股定理怎么证明" in recalled[0]["content"]
+    assert all("勾股定理" not in part["content"] for part in prompt[2:])
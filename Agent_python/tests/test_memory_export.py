@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+import memory_export
+from memory_store import JsonlMemoryStore
+from utils import ContextMemory
+
+
+def _write_history(store, user_id, window=4):
+    memory = ContextMemory(window)
+    ids = []
+    for i in range(12):
+        # 一半是没有可检索文本的条目（如工具调用占位），导出时不能丢失
+        text = f"第{i}条消息" if i % 2 == 0 else ""
+        ids.append(memory.add_memory({"role": "user", "content": text}))
+        store.save(user_id, memory)
+    return memory, ids
+
+
+def test_history_survives_compaction_and_freeze(tmp_path):
+    store = JsonlMemoryStore(str(tmp_path), compact_threshold=3)
+    memory, ids = _write_history(store, "u1")
+    memory.update_memory(ids[-1], {"role": "user", "content": "改过的消息"})
+    memory.delete_memory(ids[-2])
+    store.save("u1", memory)
+    assert not memory.dirty
+
+    expected = [i for i in ids if i != ids[-2]]
+    history = list(store.iter_history("u1"))
+    assert [entry.id for entry in history] == expected
+    assert history[-1].content["content"] == "改过的消息"
+
+    store.freeze("u1")
+    assert [entry.id for entry in store.iter_history("u1")] == expected
+    # 读取冷存储不会改变其分层
+    assert store.is_cold("u1")
+
+
+def test_overflowed_journal_is_recorded_in_history(tmp_path):
+    store = JsonlMemoryStore(str(tmp_path), compact_threshold=3)
+    memory = ContextMemory(4)
+    first = memory.add_memory({"role": "user", "content": "早期消息"})
+    store.save("u1", memory)
+    for i in range(200):
+        memory.add_memory({"role": "assistant", "content": f"回复{i}"})
+    assert memory.journal_overflow
+    store.save("u1", memory)
+    history = [entry.id for entry in store.iter_history("u1")]
+    assert history[0] == first
+    assert history[-4:] == [entry.id for entry in memory.memories]
+
+
+class BrokenStorage:
+    def list_user_ids(self):
+        return iter(["ok", "bad"])
+
+    def iter_history(self, user_id, start=None, end=None):
+        if user_id == "bad":
+            raise OSError("磁盘错误")
+        return iter([])
+
+
+def test_main_fails_when_a_user_cannot_be_exported(tmp_path, monkeypatch):
+    failures = []
+    assert list(memory_export.iter_export(BrokenStorage(), failures=failures)) == []
+    assert failures == ["bad"]
+
+    monkeypatch.setattr(memory_export, "open_storage", lambda path, backend=None: BrokenStorage())
+    assert memory_export.main(["-o", str(tmp_path / "out.jsonl")]) == 1
+
+
+def test_main_exports_all_users(tmp_path):
+    store = JsonlMemoryStore(str(tmp_path / "mem"), compact_threshold=3)
+    _write_history(store, "u1")
+    output = tmp_path / "out.jsonl"
+    assert memory_export.main(["--storage", str(tmp_path / "mem"), "--backend", "jsonl", "-o", str(output)]) == 0
+    rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert len(rows) == 12
+
+
+def _snapshot(root):
+    return sorted((str(p.relative_to(root)), p.stat().st_mtime_ns) for p in root.rglob("*"))
+
+
+def test_open_storage_is_read_only(tmp_path):
+    root = tmp_path / "mem"
+    store = JsonlMemoryStore(str(root), compact_threshold=3)
+    _write_history(store, "u1")
+    store.freeze("u1")
+    before = _snapshot(root)
+
+    storage = memory_export.open_storage(str(root), "jsonl")
+    assert len(list(memory_export.iter_export(storage))) == 12
+    assert _snapshot(root) == before
+    with pytest.raises(ValueError):
+        storage.save("u1", ContextMemory(4))
+
+
+def test_open_storage_requires_migrated_layout(tmp_path):
+    (tmp_path / "u1.json").write_text(json.dumps({"memories": []}), encoding="utf-8")
+    with pytest.raises(ValueError, match="migrate"):
+        memory_export.open_storage(str(tmp_path), "jsonl")
+    assert memory_export.main(["--storage", str(tmp_path), "--backend", "jsonl"]) == 2
+    assert (tmp_path / "u1.json").exists()
@@ -0,0 +1,20 @@
+def test_flusher_is_shared_and_refcounted(user_manager):
+    first = user_manager.acquire_flusher(5.0)
+    second = user_manager.acquire_flusher(1.0)
+    assert first is second
+    assert first.max_staleness == 1.0
+    assert user_manager.write_behind
+
+    user_manager.release_flusher()
+    assert user_manager.write_behind
+    assert first._thread is not None and first._thread.is_alive()
+
+    user_manager.release_flusher()
+    assert not user_manager.write_behind
+    assert first._thread is None
+    # 多余的释放不会影响之后新取得的刷盘线程
+    user_manager.release_flusher()
+    third = user_manager.acquire_flusher()
+    assert third is not first and user_manager.write_behind
+    user_manager.release_flusher()
+    assert not user_manager.write_behind
@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from memory_store import JsonlMemoryStore
+from utils import ContextMemory
+
+
+@pytest.mark.parametrize("snapshot_format", ["binary", "json"])
+def test_round_trip_add_update_delete_compact_reload(tmp_path, snapshot_format):
+    store = JsonlMemoryStore(str(tmp_path), compact_threshold=4, snapshot_format=snapshot_format)
+    memory = ContextMemory(10)
+    ids = [memory.add_memory({"role": "user", "content": f"消息{i}"}, agent="TeachingAgent") for i in range(6)]
+    store.save("u1", memory)  # 超过阈值，写入快照
+    memory.update_memory(ids[1], {"role": "assistant", "content": "改过的"}, {"agent": "TeachingAgent"})
+    memory.delete_memory(ids[2])
+    extra = memory.add_memory({"role": "user", "content": "日志中的消息"})
+    store.save("u1", memory)  # 只追加日志
+
+    loaded = JsonlMemoryStore(str(tmp_path)).load("u1", 10)
+    expected = [ids[0], ids[1], ids[3], ids[4], ids[5], extra]
+    assert [entry.id for entry in loaded.memories] == expected
+    assert loaded.get_memory(ids[1]).content == {"role": "assistant", "content": "改过的"}
+    assert loaded.get_memory(ids[0]).metadata == {"agent": "TeachingAgent"}
+    assert not loaded.dirty
+
+    store.compact("u1", loaded)
+    assert not os.path.exists(store.path_for("u1", ".wal.jsonl"))
+    reloaded = JsonlMemoryStore(str(tmp_path)).load("u1", 10)
+    assert [entry.id for entry in reloaded.memories] == expected
+
+
+def test_failed_append_requeues_journal(tmp_path, monkeypatch):
+    store = JsonlMemoryStore(str(tmp_path), compact_threshold=100)
+    memory = ContextMemory(10)
+    first = memory.add_memory({"role": "user", "content": "第一条"})
+    store.save("u1", memory)
+    second = memory.add_memory({"role": "user", "content": "第二条"})
+
+    def fail(*args, **kwargs):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(os, "fsync", fail)
+    with pytest.raises(OSError):
+        store.save("u1", memory)
+    assert memory.dirty and [op for op, _ in memory.journal] == ["add"]
+
+    monkeypatch.undo()
+    third = memory.add_memory({"role": "user", "content": "第三条"})
+    assert store.save("u1", memory) == 2
+    loaded = JsonlMemoryStore(str(tmp_path)).load("u1", 10)
+    assert [entry.id for entry in loaded.memories] == [first, second, third]
+
+
+
+def test_tier_sizes_are_kept_by_running_counters(tmp_path, monkeypatch):
+    store = JsonlMemoryStore(str(tmp_path), compact_threshold=3)
+    walks = []
+    iter_files = store.layout.iter_files
+    monkeypatch.setattr(store.layout, "iter_files", lambda: walks.append(1) or iter_files())
+
+    def walk():
+        return JsonlMemoryStore(str(tmp_path)).tier_sizes()
+
+    memory = ContextMemory(10)
+    memory.add_memory({"role": "user", "content": "已有用户"})
+    store.save("u1", memory)
+    assert store.tier_sizes()["warm_users"] == 1
+    other = ContextMemory(10)
+    for i in range(4):
+        other.add_memory({"role": "user", "content": f"消息{i}"})
+        store.save("u2", other)  # 追加日志，第3行时压缩
+        assert store.tier_sizes() == walk()
+
+    store.freeze("u1")
+    sizes = store.tier_sizes()
+    assert (sizes["warm_users"], sizes["cold_users"]) == (1, 1)
+    assert sizes == walk()
+    store.thaw("u1")
+    assert store.tier_sizes() == walk()
+    store.delete("u2")
+    sizes = store.tier_sizes()
+    assert sizes == walk() and (sizes["warm_users"], sizes["cold_users"]) == (1, 0)
+    # 只在首次统计时遍历存储目录
+    assert len(walks) == 1
+
+
+def test_delete_removes_every_user_file(tmp_path):
+    store = JsonlMemoryStore(str(tmp_path), compact_threshold=2)
+    memory = ContextMemory(4)
+    for i in range(5):
+        memory.add_memory({"role": "user", "content": f"消息{i}"})
+        store.save("u1", memory)
+    for suffix in (".ltm.jsonl", ".vec.f32", ".vec.ids", ".quiz.state"):
+        with open(store.path_for("u1", suffix), "w", encoding="utf-8") as f:
+            f.write("x")
+    store.save("u2", memory)
+    store.freeze("u2")
+
+    store.delete("u1")
+    store.delete("u2")
+    assert [name for name in os.listdir(store.layout.shard_dir("u1")) if name.startswith("u1")] == []
+    assert not store.exists("u2") and not store.is_cold("u2")
+    assert list(store.list_user_ids()) == []
+    assert store.tier_sizes() == {"warm_users": 0, "warm_bytes": 0, "cold_users": 0, "cold_bytes": 0}
@@ -0,0 +1,63 @@
+import pytest
+
+from question_sampler import QuestionBank, QuestionSampler, STATE_ATTACHMENT, synthetic_bank
+
+
+def _bank(questions=40):
+    return QuestionBank({"question_id": f"Q{i}", "question_text": f"题目{i}", "difficulty": 3,
+                         "related_knowledge_ids": ["勾股定理"]} for i in range(questions))
+
+
+def _draw_all(sampler, student, times, count=3):
+    return [q["question_id"] for _ in range(times) for q in sampler.sample(student, ["勾股定理"], count, 3)]
+
+
+def test_no_repeat_across_save_and_load_state(tmp_path):
+    path = str(tmp_path / "state.jsonl")
+    sampler = QuestionSampler(_bank())
+    first = _draw_all(sampler, "s1", 6)
+    sampler.save_state(path)
+
+    restored = QuestionSampler(_bank())
+    assert restored.load_state(path) == 1
+    second = _draw_all(restored, "s1", 10)
+    assert len(first) == 18 and len(second) == 22
+    assert not set(first) & set(second)
+    assert restored.sample("s1", ["勾股定理"], 1, 3) == []
+
+
+def test_load_state_rejects_other_bank(tmp_path):
+    path = str(tmp_path / "state.jsonl")
+    sampler = QuestionSampler(_bank())
+    _draw_all(sampler, "s1", 1)
+    sampler.save_state(path)
+    with pytest.raises(ValueError):
+        QuestionSampler(_bank(41)).load_state(path)
+
+
+def test_state_is_saved_and_evicted_with_user_memory(user_manager):
+    sampler = QuestionSampler(_bank(), user_manager=user_manager)
+    first = _draw_all(sampler, "s1", 4)
+    memory = user_manager.get_user_memory("s1")
+    assert memory.dirty and STATE_ATTACHMENT in memory.attachments
+    assert sampler.get_stats()["students"] == 1
+    user_manager.save_user_memory("s1")
+    user_manager.discard_users(["s1"])
+    assert sampler.get_stats()["students"] == 0
+
+    # 进程重启：新的抽题引擎从该用户的存储中恢复做题记录
+    restarted = QuestionSampler(_bank(), user_manager=user_manager)
+    second = _draw_all(restarted, "s1", 20)
+    assert len(second) == 40 - len(first)
+    assert not set(first) & set(second)
+
+
+def test_stale_state_file_is_ignored(user_manager):
+    sampler = QuestionSampler(_bank(), user_manager=user_manager)
+    _draw_all(sampler, "s1", 4)
+    user_manager.save_user_memory("s1")
+    user_manager.discard_users(["s1"])
+
+    other = QuestionSampler(synthetic_bank(200, knowledge=1), user_manager=user_manager)
+    assert len(other.sample("s1", ["K0"], 5, 3)) == 5
+    assert other.get_stats()["students"] == 1
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from sqlite_memory_store import SQLiteMemoryStore
+from utils import ContextMemory
+
+
+def _store(tmp_path):
+    return SQLiteMemoryStore(str(tmp_path))
+
+
+def test_round_trip_add_update_delete_compact_reload(tmp_path):
+    store = _store(tmp_path)
+    memory = ContextMemory(10)
+    ids = [memory.add_memory({"role": "user", "content": f"消息{i}", "name": "n"}, agent="TeachingAgent")
+           for i in range(5)]
+    store.save("u1", memory)
+    created = {entry.id: entry.timestamp for entry in store.iter_history("u1")}
+
+    time.sleep(0.01)
+    memory.update_memory(ids[1], {"role": "assistant", "content": "改过的"}, {"agent": "TeachingAgent"})
+    memory.delete_memory(ids[2])
+    store.compact("u1", memory)
+    store.close()
+
+    reopened = _store(tmp_path)
+    loaded = reopened.load("u1", 10)
+    assert [entry.id for entry in loaded.memories] == [ids[0], ids[1], ids[3], ids[4]]
+    updated = loaded.get_memory(ids[1])
+    assert updated.content == {"role": "assistant", "content": "改过的"}
+    # 修改不改变写入时间
+    assert updated.timestamp == created[ids[1]]
+    assert loaded.get_memory(ids[0]).content == {"role": "user", "content": "消息0", "name": "n"}
+    assert loaded.get_memory(ids[0]).metadata == {"agent": "TeachingAgent"}
+    reopened.close()
+
+
+def test_overflow_rewrite_keeps_created_at(tmp_path):
+    store = _store(tmp_path)
+    memory = ContextMemory(4)
+    first = memory.add_memory({"role": "user", "content": "第一条"})
+    store.save("u1", memory)
+    created = next(store.iter_history("u1")).timestamp
+
+    time.sleep(0.01)
+    memory.update_memory(first, {"role": "user", "content": "第一条（改）"})
+    for i in range(200):
+        memory.update_memory(first, {"role": "user", "content": f"第一条（改{i}）"})
+    assert memory.journal_overflow
+    store.save("u1", memory)
+    entry = next(store.iter_history("u1"))
+    assert entry.content["content"] == "第一条（改199）"
+    assert entry.timestamp == created
+    store.close()
+
+
+def test_reads_do_not_wait_for_write_lock(tmp_path):
+    store = _store(tmp_path)
+    memory = ContextMemory(10)
+    memory.add_memory({"role": "user", "content": "你好"})
+    store.save("u1", memory)
+    results = []
+
+    def read():
+        results.append((store.exists("u1"), store.count_messages("u1"), len(store.load("u1", 10).memories)))
+
+    # 持有写锁（如正在执行一个长写事务）时，其他线程仍可读取已提交的数据
+    with store._write_lock:
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(timeout=2.0)
+        assert not reader.is_alive()
+    assert results == [(True, 1, 1)]
+
+    memory.add_memory({"role": "assistant", "content": "你好！"})
+    store.save("u1", memory)
+    reader = threading.Thread(target=read)
+    reader.start()
+    reader.join()
+    assert results[-1] == (True, 2, 2)
+    store.close()
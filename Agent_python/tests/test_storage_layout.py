@@ -0,0 +1,43 @@
+import json
+
+from memory_store import JsonlMemoryStore
+from storage_layout import LAYOUT_FILE, ShardedLayout, main
+
+
+def _flat_user(root, user_id):
+    (root / f"{user_id}.json").write_text(json.dumps({"memories": []}), encoding="utf-8")
+
+
+def test_constructing_store_writes_nothing(tmp_path):
+    root = tmp_path / "memories"
+    store = JsonlMemoryStore(str(root))
+    assert not store.exists("alice")
+    assert list(store.list_user_ids()) == []
+    assert not root.exists()
+
+
+def test_enumeration_does_not_migrate(tmp_path):
+    _flat_user(tmp_path, "alice")
+    _flat_user(tmp_path, "bob")
+    layout = ShardedLayout(str(tmp_path))
+    assert not layout.flat_migrated
+    assert sorted(layout.users()) == ["alice", "bob"]
+    assert (tmp_path / "alice.json").exists() and (tmp_path / "bob.json").exists()
+    assert not (tmp_path / LAYOUT_FILE).exists()
+
+    # 服务访问某个用户时只迁移该用户
+    path = layout.path_for("alice", ".json")
+    assert path.startswith(layout.shard_dir("alice")) and not (tmp_path / "alice.json").exists()
+    assert sorted(layout.users()) == ["alice", "bob"]
+
+
+def test_migrate_command(tmp_path, capsys):
+    _flat_user(tmp_path, "alice")
+    _flat_user(tmp_path, "bob")
+    assert main(["migrate", "--storage", str(tmp_path), "--limit", "1"]) == 0
+    assert "仍有未迁移" in capsys.readouterr().out
+    assert main(["migrate", "--storage", str(tmp_path)]) == 0
+    assert [p.name for p in tmp_path.glob("*.json")] == [LAYOUT_FILE]
+    layout = ShardedLayout(str(tmp_path))
+    assert layout.flat_migrated
+    assert sorted(layout.users()) == ["alice", "bob"]
@@ -0,0 +1,70 @@
+import pytest
+
+from study_planner import BLOCKED, NO_TIME, SCHEDULED, StudyPlanner, create_study_plan
+from syllabus import Syllabus
+
+OUTLINE = """
+### 一、数与代数
+
+#### 1. 有理数
+- **正数、负数**
+
+#### 2. 整式
+- **乘法公式：**
+
+#### 3. 因式分解
+- **提公因式法**
+"""
+PREREQUISITES = {"整式": ("有理数",), "因式分解": ("整式",)}
+
+
+@pytest.fixture
+def planner():
+    return StudyPlanner(Syllabus.parse(OUTLINE, PREREQUISITES), minutes_per_point=30)
+
+
+def test_topological_order_puts_prerequisites_first(planner):
+    order = planner.syllabus.topological_order(["提公因式法", "因式分解", "整式", "有理数", "未知知识点"])
+    assert order == ["有理数", "整式", "因式分解", "提公因式法", "未知知识点"]
+    with pytest.raises(ValueError):
+        Syllabus(planner.syllabus.topics, {"有理数": ("因式分解",), **PREREQUISITES}).topological_order()
+
+
+def test_topics_start_after_their_prerequisites_end(planner):
+    # 请求顺序与先修关系相反，每天只够学一个章节
+    batch = planner.plan_batch([["因式分解", "整式", "有理数"], ["整式", "有理数"]], days=3, daily_minutes=30)
+    assert batch.topics == ["有理数", "整式", "因式分解"]
+    column = {topic: i for i, topic in enumerate(batch.topics)}
+    for s in range(len(batch)):
+        for child, parent in (("整式", "有理数"), ("因式分解", "整式")):
+            c, p = column[child], column[parent]
+            if batch.requested[s, c]:
+                assert batch.status[s, c] == SCHEDULED
+                assert batch.start[s, c] >= batch.end[s, p]
+    plan = batch.plan_for(0)
+    assert [day[0][0] for day in plan.sessions] == ["有理数", "整式", "因式分解"]
+
+
+def test_topics_after_an_unscheduled_prerequisite_are_blocked(planner):
+    plan = planner.plan("数学", ["整式", "有理数", "因式分解"], days=1, daily_minutes=40,
+                        durations={"有理数": 60})
+    assert plan.unscheduled == [("有理数", "计划天数内时间不足"), ("整式", "先修知识点未能排入计划"),
+                                ("因式分解", "先修知识点未能排入计划")]
+    batch = planner.plan_batch([["整式", "有理数"]], days=1, daily_minutes=40, durations={"有理数": 60})
+    assert list(batch.status[0]) == [NO_TIME, BLOCKED]
+
+
+def test_zero_daily_minutes_is_rejected_not_defaulted(planner, monkeypatch):
+    monkeypatch.setattr(StudyPlanner, "_shared", planner)
+    with pytest.raises(ValueError):
+        create_study_plan("数学", ["有理数"], days=3, daily_minutes=0)
+    assert "每天30分钟" in create_study_plan("数学", ["有理数"], days=3, daily_minutes=30)
+    assert "每天60分钟" in create_study_plan("数学", ["有理数"], days=3)
+
+    # 一名学生在计划天数内没有任何学习时间时整批拒绝；个别休息日不受影响
+    with pytest.raises(ValueError):
+        planner.plan_batch([["有理数"], ["有理数"]], days=2, daily_minutes=[30, 0])
+    with pytest.raises(ValueError):
+        planner.plan_batch([["有理数"]], days=1, daily_minutes=[[0, 30]])
+    batch = planner.plan_batch([["有理数"]], days=2, daily_minutes=[[0, 30]])
+    assert batch.start[0, 0] == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from mcp_server import INVALID_PARAMS, MCPToolRegistry, RpcError
+from storage_layout import ShardedLayout, check_user_id
+from user_session import user_session
+
+
+class FakeAgent:
+    name = "数学助手"
+    description = "测试用Agent"
+    tools = []
+
+
+class FakeSystem:
+    user_id = "default_user"
+
+    def __init__(self):
+        self.agents = {"math": FakeAgent()}
+        self.calls = []
+
+    def run_agent(self, agent_key, message, user_id):
+        self.calls.append((agent_key, message, user_id))
+        return "ok"
+
+
+@pytest.mark.parametrize("user_id", ["../etc", "a/b", "a\\b", "x..y", "", "a" * 65])
+def test_agent_tool_rejects_unsafe_user_id(user_id):
+    system = FakeSystem()
+    registry = MCPToolRegistry(system)
+    with pytest.raises(RpcError) as excinfo:
+        registry.call("agent_math", {"message": "你好", "user_id": user_id} if user_id else
+                      {"message": "你好"}, user_id)
+    assert excinfo.value.code == INVALID_PARAMS
+    assert system.calls == []
+
+
+def test_agent_tool_accepts_valid_user_id():
+    system = FakeSystem()
+    registry = MCPToolRegistry(system)
+    assert registry.call("agent_math", {"message": "你好", "user_id": "alice.w@school"}, "bob") == "ok"
+    assert registry.call("agent_math", {"message": "你好", "user_id": "张三"}, "bob") == "ok"
+    assert registry.call("agent_math", {"message": "你好"}, "bob") == "ok"
+    assert system.calls == [("math", "你好", "alice.w@school"), ("math", "你好", "张三"), ("math", "你好", "bob")]
+
+
+@pytest.mark.parametrize("user_id", ["..", "../x", "a/b", "a\\b", "a\0b", "a\nb", ".hidden", "", "a" * 65])
+def test_check_user_id_rejects_paths(user_id):
+    with pytest.raises(ValueError):
+        check_user_id(user_id)
+
+
+@pytest.mark.parametrize("user_id", ["alice.w@school", "张三", "王小明_2024", "a" * 64])
+def test_check_user_id_accepts_names(user_id):
+    assert check_user_id(user_id) == user_id
+
+
+def test_layout_and_session_reject_paths(tmp_path):
+    layout = ShardedLayout(str(tmp_path))
+    with pytest.raises(ValueError):
+        layout.path_for("../escape", ".json")
+    assert layout.path_for("alice", ".json").startswith(str(tmp_path))
+    with pytest.raises(ValueError):
+        with user_session("../escape", user_manager=object()):
+            pass
@@ -0,0 +1,69 @@
+import pytest
+
+
+@pytest.fixture
+def small_cache(user_manager, monkeypatch):
+    monkeypatch.setattr(user_manager, "max_resident_users", 2)
+    monkeypatch.setattr(user_manager, "_default_user_id", None)
+    monkeypatch.setattr(user_manager, "cache_stats", {"hits": 0, "misses": 0, "evictions": 0})
+    return user_manager
+
+
+def _add(manager, user_id, text):
+    memory = manager.get_user_memory(user_id) or manager.create_user_memory(user_id)
+    memory.add_memory({"role": "user", "content": text})
+    return memory
+
+
+def test_least_recently_used_user_is_evicted(small_cache, monkeypatch):
+    monkeypatch.setattr(small_cache, "write_behind", False)
+    _add(small_cache, "a", "a1")
+    _add(small_cache, "b", "b1")
+    small_cache.get_user_memory("a")  # a 变为最近访问
+    _add(small_cache, "c", "c1")
+
+    assert list(small_cache.users_memory) == ["a", "c"]
+    assert small_cache.cache_stats["evictions"] == 1
+    # 未开启延迟写回时被淘汰的脏记忆库立即写回
+    assert small_cache.storage.exists("b") and "b" not in small_cache._pending_writeback
+    reloaded = small_cache.get_user_memory("b")
+    assert [e.content["content"] for e in reloaded.memories] == ["b1"]
+    assert list(small_cache.users_memory) == ["c", "b"]
+
+
+def test_write_behind_keeps_evicted_memory_until_flushed(small_cache, monkeypatch):
+    monkeypatch.setattr(small_cache, "write_behind", True)
+    evicted = _add(small_cache, "a", "a1")
+    _add(small_cache, "b", "b1")
+    _add(small_cache, "c", "c1")
+
+    assert "a" not in small_cache.users_memory
+    assert small_cache._pending_writeback == {"a": evicted}
+    assert not small_cache.storage.exists("a")
+
+    # 写回之前再次访问直接恢复同一个记忆库（不会读到过期的文件），b 随之被淘汰
+    assert small_cache.get_user_memory("a") is evicted
+    assert "a" not in small_cache._pending_writeback
+    assert list(small_cache._pending_writeback) == ["b"]
+
+    assert small_cache.flush_dirty() == 3
+    assert small_cache._pending_writeback == {}
+    assert small_cache.storage.exists("b") and not evicted.dirty
+
+
+def test_clean_and_pinned_users_are_not_written_back(small_cache, monkeypatch):
+    monkeypatch.setattr(small_cache, "write_behind", True)
+    _add(small_cache, "a", "a1")
+    small_cache.save_user_memory("a")
+    small_cache.pin_user("a")
+    _add(small_cache, "b", "b1")
+    _add(small_cache, "c", "c1")
+    # a 被固定，淘汰次旧的 b
+    assert list(small_cache.users_memory) == ["a", "c"]
+    small_cache.unpin_user("a")
+    assert list(small_cache.users_memory) == ["a", "c"]
+
+    _add(small_cache, "d", "d1")
+    # a 没有未保存的修改，淘汰时不进入待写回队列
+    assert "a" not in small_cache.users_memory
+    assert sorted(small_cache._pending_writeback) == ["b"]
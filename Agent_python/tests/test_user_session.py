@@ -0,0 +1,57 @@
+import threading
+
+from user_session import current_session, session_lock, user_session
+
+
+def _acquire_from_other_thread(lock) -> bool:
+    result = []
+
+    def attempt():
+        acquired = lock.acquire(timeout=0.5)
+        if acquired:
+            lock.release()
+        result.append(acquired)
+
+    worker = threading.Thread(target=attempt)
+    worker.start()
+    worker.join()
+    return result[0]
+
+
+def test_user_lock_not_held_during_session_body(user_manager):
+    lock = user_manager.user_locks.lock_for("alice")
+    with user_session("alice", user_manager):
+        assert current_session().user_id == "alice"
+        # 会话期间（如调用模型时）同一用户的其他请求可以获取锁
+        assert _acquire_from_other_thread(lock)
+        with session_lock():
+            assert not _acquire_from_other_thread(lock)
+        assert _acquire_from_other_thread(lock)
+    assert "alice" not in user_manager._pinned
+
+
+def test_session_lock_outside_session_is_noop():
+    with session_lock():
+        pass
+
+
+def test_eviction_writes_back_outside_cache_lock(user_manager, monkeypatch):
+    monkeypatch.setattr(user_manager, "write_behind", False)
+    monkeypatch.setattr(user_manager, "max_resident_users", 1)
+    held = []
+    save = user_manager.storage.save
+
+    def checked_save(user_id, memory):
+        # 其他线程此时能获取缓存锁，说明写回时未持有 _lock
+        held.append(not _acquire_from_other_thread(user_manager._lock))
+        save(user_id, memory)
+
+    monkeypatch.setattr(user_manager.storage, "save", checked_save)
+    memory = user_manager.create_user_memory("bob")
+    memory.add_memory({"role": "user", "content": "hi"})
+    user_manager.create_user_memory("carol")
+
+    assert held == [False]
+    assert "bob" not in user_manager.users_memory
+    assert "bob" not in user_manager._pending_writeback
+    assert user_manager.storage.exists("bob")
@@ -0,0 +1,73 @@
+import numpy as np
+
+from long_term_memory import LongTermMemory
+from utils import MemoryEntry
+from vector_memory import VectorMemoryIndex, hashed_embedding
+
+
+def _entry(memory_id, text):
+    return MemoryEntry(id=memory_id, content={"role": "user", "content": text})
+
+
+def _index(*texts, **kwargs):
+    index = VectorMemoryIndex(initial_capacity=1, **kwargs)
+    for i, text in enumerate(texts):
+        index.add_entry(_entry(f"m{i}", text))
+    return index
+
+
+def test_search_batch_matches_single_queries():
+    index = _index("勾股定理怎么证明", "一元二次方程求根公式", "反比例函数的图像")
+    assert len(index) == 3 and index.matrix.shape[0] >= 3
+    queries = ["勾股定理", "求根公式", "函数图像"]
+    batch = index.search_batch(queries, k=2)
+    assert [hits[0][0] for hits in batch] == ["m0", "m1", "m2"]
+    for query, hits in zip(queries, batch):
+        single = index.search(query, 2)
+        assert [entry.id for entry, _ in single] == [memory_id for memory_id, _ in hits]
+        assert np.allclose([score for _, score in single], [score for _, score in hits], atol=1e-5)
+    assert index.search_batch(queries, k=2, exclude_ids=["m0"])[0][0][0] != "m0"
+    assert index.search_batch([], k=2) == []
+
+
+def test_concept_alias_matches_without_shared_characters():
+    index = _index("直角边分别为3和4，求斜边", "解不等式 2x+1>5")
+    # "triangle" 与条目没有相同的字词，只通过"三角形"概念特征匹配
+    assert [entry.id for entry, _ in index.search("triangle", 1)] == ["m0"]
+    assert float(hashed_embedding("pythagorean") @ hashed_embedding("勾股")) > 0.5
+
+
+def test_vectors_reload_from_files_and_resolve_through_long_term(tmp_path):
+    prefix = str(tmp_path / "u.vec")
+    long_term = LongTermMemory(str(tmp_path / "u.ltm.jsonl"))
+    index = VectorMemoryIndex(prefix, entry_source=long_term)
+    for memory_id, text in (("a", "勾股定理怎么证明"), ("b", "一元二次方程求根公式")):
+        long_term.add_entry(_entry(memory_id, text))
+        index.add_entry(_entry(memory_id, text))
+    long_term.save()
+    assert index.save() == 2 and index.save() == 0
+
+    archive = LongTermMemory(str(tmp_path / "u.ltm.jsonl"))
+    reloaded = VectorMemoryIndex(prefix, entry_source=archive)
+    assert reloaded.load() == 2
+    assert reloaded.ids == ["a", "b"]
+    assert np.allclose(reloaded.matrix[:2], index.matrix[:2])
+    assert [entry.id for entry, _ in reloaded.search("求根公式", 1)] == ["b"]
+
+    # 修改已持久化的向量后整体重写文件
+    reloaded.remove_entry("a")
+    reloaded.save()
+    assert (tmp_path / "u.vec.f32").stat().st_size == 2 * reloaded.dim * 4
+    assert VectorMemoryIndex(prefix).load() == 2
+
+
+def test_vector_memory_without_bm25_recall(user_manager, monkeypatch):
+    monkeypatch.setattr(user_manager, "long_term_memory_enabled", False)
+    monkeypatch.setattr(user_manager, "vector_memory_enabled", True)
+    memory = user_manager.create_user_memory("erin", max_memory_size=1)
+    memory.add_memory({"role": "user", "content": "直角边分别为3和4，求斜边"})
+    memory.add_memory({"role": "user", "content": "解不等式 2x+1>5"})
+    kinds = [type(index).__name__ for index in memory.indexes]
+    assert kinds == ["LongTermMemory", "VectorMemoryIndex"]
+    assert not memory.indexes[0].searchable
+    assert [entry.content["content"] for entry in memory.recall("那道三角形的题", 1)] == ["直角边分别为3和4，求斜边"]
@@ -0,0 +1,25 @@
+import json
+
+from workload_replay import ReplayHarness, prompt_fingerprint
+
+HEAD = {"role": "system", "content": "You are TeachingAgent"}
+
+
+def test_prompt_fingerprint_ignores_history_and_recall_dates():
+    turn = [{"role": "user", "content": "勾股定理是什么"},
+            {"role": "tool", "name": "explain_concept", "content": "a² + b² = c²"}]
+    recorded = [HEAD, {"role": "system", "content": "- [2025-09-01] user: 什么是方程"},
+                {"role": "user", "content": "什么是方程"}, {"role": "assistant", "content": "……"}] + turn
+    replayed = [HEAD, {"role": "system", "content": "- [2026-10-19] user: 什么是方程"}] + turn
+    assert prompt_fingerprint(recorded) == prompt_fingerprint(replayed)
+    assert prompt_fingerprint(replayed) != prompt_fingerprint([HEAD, {"role": "user", "content": "什么是方程"}])
+    assert prompt_fingerprint([HEAD]) != prompt_fingerprint([dict(HEAD, content="You are TestingAgent")])
+
+
+def test_legacy_cassettes_skip_prompt_check(tmp_path):
+    path = tmp_path / "legacy.cassette.jsonl"
+    turn = {"type": "turn", "turn": 0, "kind": "route", "offset": 0.0, "user_id": "alice", "input": "hi"}
+    path.write_text(json.dumps({"type": "header", "version": 1}) + "\n" + json.dumps(turn) + "\n", encoding="utf-8")
+    assert not ReplayHarness(str(path)).check_prompts
+    path.write_text(json.dumps({"type": "header", "version": 2}) + "\n" + json.dumps(turn) + "\n", encoding="utf-8")
+    assert ReplayHarness(str(path)).check_prompts
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import zlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+from storage_layout import check_user_id
+
+# 当前请求的用户会话；线程与 asyncio 任务各自拥有独立的值
+# （asyncio.to_thread / loop.run_in_executor 配合 contextvars.copy_context 时会随任务传递）
+_current_session: contextvars.ContextVar = contextvars.ContextVar("user_session", default=None)
+
+
+class ShardedLockTable:
+    """
+    按用户ID分片的可重入锁表：
+    - 锁的数量固定（num_shards），不随用户数增长，也无需清理
+    - 同一用户总是映射到同一把锁，不同用户大概率落在不同分片上互不阻塞
+    """
+
+    def __init__(self, num_shards: int = 64):
+        """
+        初始化锁表
+
+        Args:
+            num_shards: 分片数量
+        """
+        self.num_shards = max(1, num_shards)
+        self._locks: List[threading.RLock] = [threading.RLock() for _ in range(self.num_shards)]
+
+    def shard_of(self, user_id: str) -> int:
+        """获取用户所在分片（与进程无关的稳定哈希）"""
+        return zlib.crc32(str(user_id).encode("utf-8")) % self.num_shards
+
+    def lock_for(self, user_id: str) -> threading.RLock:
+        """获取用户对应的锁"""
+        return self._locks[self.shard_of(user_id)]
+
+
+class UserSession:
+    """
+    一次请求范围内的用户会话句柄，记录用户ID、其记忆库及该用户的分片锁
+    """
+
+    __slots__ = ("user_id", "memory", "user_manager", "lock")
+
+    def __init__(self, user_id: str, memory: Any, user_manager: Any = None, lock: Any = None):
+        self.user_id = user_id
+        self.memory = memory
+        self.user_manager = user_manager
+        self.lock = lock
+
+    def __repr__(self) -> str:
+        return f"UserSession(user_id={self.user_id!r})"
+
+
+def current_session() -> Optional[UserSession]:
+    """
+    获取当前上下文中的用户会话
+
+    Returns:
+        UserSession: 当前会话，未进入会话时返回None
+    """
+    return _current_session.get()
+
+
+@contextmanager
+def user_session(user_id: str, user_manager: Any = None, memory: Any = None,
+                 timeout: Optional[float] = None) -> Iterator[UserSession]:
+    """
+    进入用户会话：将用户记忆库固定在常驻缓存中，并把会话设置为当前上下文的会话，退出时全部恢复。
+    该用户的分片锁只在加载记忆库时持有；请求处理中需要互斥的片段（记忆库修改与 prompt 构造）
+    用 session_lock() 短暂加锁，模型调用等耗时操作期间不持有锁，同一用户的其他请求不会被阻塞
+
+    Args:
+        user_id: 用户ID
+        user_manager: UserManager 实例，默认为全局实例
+        memory: 指定会话使用的记忆库（默认使用该用户的记忆库）
+        timeout: 等待用户锁的最长时间（秒），为None时一直等待
+
+    Yields:
+        UserSession: 用户会话
+
+    Raises:
+        ValueError: 用户ID包含路径分隔符或 ".."
+        TimeoutError: 等待用户锁超时
+    """
+    check_user_id(user_id)
+    if user_manager is None:
+        # 动态导入utils模块以避免循环依赖
+        from utils import UserManager
+        user_manager = UserManager()
+
+    lock = user_manager.user_locks.lock_for(user_id)
+    if not lock.acquire(timeout=-1 if timeout is None else timeout):
+        raise TimeoutError(f"等待用户 {user_id} 的会话锁超时")
+    try:
+        user_manager.pin_user(user_id)
+        try:
+            if memory is None:
+                memory = user_manager._get_resident(user_id, create=True)
+        except BaseException:
+            user_manager.unpin_user(user_id)
+            raise
+    finally:
+        lock.release()
+    try:
+        token = _current_session.set(UserSession(user_id, memory, user_manager, lock))
+        try:
+            yield _current_session.get()
+        finally:
+            _current_session.reset(token)
+    finally:
+        user_manager.unpin_user(user_id)
+
+
+@contextmanager
+def session_lock() -> Iterator[None]:
+    """
+    持有当前会话用户的分片锁（不在会话中时不加锁）。
+    只应包住不含 await 与耗时调用的同步片段（如写入记忆并构造 prompt），
+    这样同一线程上的 asyncio 任务也不会在片段中途交错
+    """
+    session = _current_session.get()
+    if session is None or session.lock is None:
+        yield
+        return
+    with session.lock:
+        yield
+
+
+@contextmanager
+def session_memory(memory: Any) -> Iterator[UserSession]:
+    """
+    在当前上下文中临时替换会话的记忆库（不固定缓存，沿用外层会话的用户与锁），
+    用于嵌套调用子Agent时让其读写临时记忆库；退出时恢复外层会话
+
+    Args:
+        memory: 临时使用的记忆库
+
+    Yields:
+        UserSession: 替换记忆库后的会话
+    """
+    session = _current_session.get()
+    if session is not None:
+        user_id, user_manager, lock = session.user_id, session.user_manager, session.lock
+    else:
+        # 动态导入utils模块以避免循环依赖
+        from utils import UserManager
+        user_manager = UserManager()
+        user_id, lock = user_manager.current_user_id, None
+    token = _current_session.set(UserSession(user_id, memory, user_manager, lock))
+    try:
+        yield _current_session.get()
+    finally:
+        _current_session.reset(token)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import json
 import os
 import logging
@@ -7,7 +7,12 @@ from typing import Optional, Dict, Any
 from openai import OpenAI
 from dataclasses import dataclass, field
 from datetime import datetime
+from collections import OrderedDict, deque
 import uuid
+import time
+import threading
+
+from user_session import ShardedLockTable, current_session, session_lock
 
 
 class base_agent:
@@ -26,13 +31,20 @@ class base_agent:
         tools: Optional[List["base_tool"]] = None,
         memory: "ContextMemory" = None,
         max_tool_iterations: int = 3,
+        shared_context_size: int = 4,
+        long_term_top_k: int = 3,
     ):
         self.name = name
         self.description: Optional[str] = description or f"An intelligent agent named {name} capable of using tools and maintaining conversation context"
         # 初始化工具列表
         self.tools: List["base_tool"] = tools or []
-        self.memory: "ContextMemory" = memory or UserManager().get_current_user_memory() or ContextMemory(max_memory_size=20)
+        # 显式绑定的记忆库；处于用户会话（user_session）中时以会话的记忆库为准
+        self._memory: Optional["ContextMemory"] = memory
         self.max_tool_iterations = max(1, min(max_tool_iterations, 10))  # 限制在合理范围内
+        # 除自身轮次外，额外附带的共享记忆条数（最近的、不区分来源的条目）
+        self.shared_context_size: int = max(0, shared_context_size)
+        # 从长期记忆中按相关度召回、注入 prompt 的历史条目数量
+        self.long_term_top_k: int = max(0, long_term_top_k)
         self.running: bool = False
         
         # 如果提供了工具列表，确保将这些工具传递给模型
@@ -57,6 +69,23 @@ You can use these tools when needed to accomplish tasks. Always follow these gui
         }
 
 
+    @property
+    def memory(self) -> "ContextMemory":
+        """
+        当前使用的记忆库：优先使用当前上下文用户会话的记忆库，
+        其次为显式绑定的记忆库，最后为 UserManager 当前用户的记忆库
+        """
+        session = current_session()
+        if session is not None:
+            return session.memory
+        if self._memory is not None:
+            return self._memory
+        return UserManager().get_current_user_memory() or ContextMemory(max_memory_size=20)
+
+    @memory.setter
+    def memory(self, memory: "ContextMemory") -> None:
+        self._memory = memory
+
     def add_tool(self, tool: "base_tool") -> None:
         """注册外围工具（工具应为 base_tool 的实例）"""
         if tool is None:
@@ -86,14 +115,31 @@ You can use these tools when needed to accomplish tasks. Always follow these gui
         tool.tool_output = result
         return result
     
-    def _build_prompt(self, n: int = None) -> list:
-        """根据记忆和工具信息构造提交给模型的 prompt"""
-        if not n:
-            ctx = self.memory.get_context(self.memory.get_memory_count())
-        else:
-            ctx = self.memory.get_context(n)
-        prompt_parts = [self.prompt_head] + ctx
+    def _build_prompt(self, n: int = None, query: str = None) -> list:
+        """
+        根据记忆和工具信息构造提交给模型的 prompt
+        只取本智能体写入的记忆条目，再附带最近 shared_context_size 条共享记忆，
+        避免把其他智能体的工具调用与回复重复发送给模型；
+        提供 query 时，再从长期记忆中召回最相关的 long_term_top_k 条历史记录
+        """
+        entries = self.memory.get_agent_entries(self.name, n or None, self.shared_context_size)
+        prompt_parts = [self.prompt_head]
+        if query and self.long_term_top_k:
+            recalled = self.memory.recall(query, self.long_term_top_k, exclude_ids={e.id for e in entries})
+            if recalled:
+                prompt_parts.append(self._format_recalled(recalled))
+        prompt_parts += [entry.content for entry in entries]
         return prompt_parts
+
+    @staticmethod
+    def _format_recalled(recalled: List["MemoryEntry"]) -> Dict[str, str]:
+        """将召回的历史条目整理为一条系统消息"""
+        lines = ["以下是与当前问题相关的历史记录（按相关度排序），可作为参考："]
+        for entry in recalled:
+            content = entry.content if isinstance(entry.content, dict) else {"content": entry.content}
+            role = content.get("name") or content.get("role", "")
+            lines.append(f"- [{entry.timestamp.strftime('%Y-%m-%d')}] {role}: {content.get('content')}")
+        return {"role": "system", "content": "\n".join(lines)}
     
     def run_once(self, user_input: str) -> str:
         """
@@ -108,9 +154,10 @@ You can use these tools when needed to accomplish tasks. Always follow these gui
             logging.warning("max_tool_iterations should be positive integer.")
             return "Error: Invalid max_tool_iterations setting."
     
-        # 记录用户输入到记忆
-        self.memory.add_memory({"role": "user", "content": user_input})
-        prompt = self._build_prompt()
+        # 记录用户输入到记忆（写入记忆与构造 prompt 时持有用户锁，调用模型与工具时不持有）
+        with session_lock():
+            self.memory.add_memory({"role": "user", "content": user_input}, agent=self.name)
+            prompt = self._build_prompt(query=user_input)
         model_output = self.model.generate_text(prompt)
     
         # 校验模型输出合法性
@@ -121,7 +168,8 @@ You can use these tools when needed to accomplish tasks. Always follow these gui
         iterations = 0
         # 循环解析模型输出，看是否需要工具调用
         while iterations < self.max_tool_iterations:
-            self.memory.add_memory({"role": "assistant", "content": model_output.content if hasattr(model_output, 'content') else str(model_output)})
+            with session_lock():
+                self.memory.add_memory({"role": "assistant", "content": model_output.content if hasattr(model_output, 'content') else str(model_output)}, agent=self.name)
             tool_calls = self.model.parse_tool_call(model_output)
             if not tool_calls:
                 break
@@ -133,28 +181,36 @@ You can use these tools when needed to accomplish tasks. Always follow these gui
     
                 try:
                     result = self.call_tool(tool_name, **tool_arguments)
-                    self.memory.add_memory({
-                        "role": "tool",
-                        "name": tool_name,
-                        "status": "success",
-                        "content": str(result)  # 确保结果是字符串
-                    })
+                    with session_lock():
+                        self.memory.add_memory({
+                            "role": "tool",
+                            "name": tool_name,
+                            "status": "success",
+                            "content": str(result)  # 确保结果是字符串
+                        }, agent=self.name)
                 except Exception as e:
                     has_error = True
                     error_msg = str(e)
-                    self.memory.add_memory({
-                        "role": "tool",
-                        "name": tool_name,
-                        "status": "error",
-                        "content": error_msg
-                    })
+                    with session_lock():
+                        self.memory.add_memory({
+                            "role": "tool",
+                            "name": tool_name,
+                            "status": "error",
+                            "content": error_msg
+                        }, agent=self.name)
                     logging.warning("Tool '%s' failed with error: %s", tool_name, error_msg)
     
             # 如果本轮中有任意一个工具调用失败，可以选择提前结束或者标记警告
             # 此处选择继续尝试下一轮（保持原语义）
     
             # 把工具输出写入记忆并反馈给模型以便生成最终回答
-            followup_prompt = self._build_prompt()
+            with session_lock():
+                followup_prompt = self._build_prompt(query=user_input)
+            # 分派方已放弃等待（如子请求超时）时不再继续调用模型
+            cancelled = getattr(self.memory, "cancelled", None)
+            if cancelled is not None and cancelled.is_set():
+                logging.warning("Agent '%s' cancelled before follow-up model call.", self.name)
+                return "Error: cancelled."
             model_output = self.model.generate_text(followup_prompt)
     
             # 再次验证模型输出有效性
@@ -166,7 +222,8 @@ You can use these tools when needed to accomplish tasks. Always follow these gui
     
         # 将智能体最终回复写入记忆并返回
         final_response = model_output.content if hasattr(model_output, 'content') else str(model_output)
-        self.memory.add_memory({"role": "assistant", "content": final_response})
+        with session_lock():
+            self.memory.add_memory({"role": "assistant", "content": final_response}, agent=self.name)
         return final_response
 
     def run_loop(self, input_iterable, stop_on_exception: bool = True):
@@ -469,6 +526,25 @@ class MemoryEntry:
     timestamp: datetime = field(default_factory=datetime.now)
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典"""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "timestamp": self.timestamp.isoformat(),
+            "metadata": self.metadata
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MemoryEntry":
+        """从 to_dict 生成的字典还原记忆条目"""
+        return cls(
+            id=data["id"],
+            content=data["content"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            metadata=data.get("metadata", {})
+        )
+
 
 class ContextMemory:
     """
@@ -485,10 +561,21 @@ class ContextMemory:
         """
         self.max_memory_size = max_memory_size
         self.memories: List[MemoryEntry] = []
-        self.memory_index: Dict[str, int] = {}  # id到索引的映射
+        self.memory_index: Dict[str, int] = {}  # id到位置的映射（位置减去 _index_offset 即为列表下标）
+        self._index_offset = 0  # 从头部淘汰的条目数，避免每次淘汰都重建索引
+        self.agent_views: Dict[str, deque] = {}  # 智能体名称到其记忆条目（按时间顺序）的映射
+        self.indexes: List[Any] = []  # 附加的检索索引（如长期记忆），新条目会增量写入
+        self.dirty: bool = False  # 自上次持久化以来是否有修改
+        self.dirty_since: Optional[float] = None  # 首次出现未保存修改的时间（time.monotonic）
+        self.journal: List[tuple] = []  # 自上次持久化以来的修改操作，供追加式日志写入
+        self.journal_overflow: bool = False  # 修改日志过长被丢弃，下次持久化需写完整快照
+        # 随记忆库保存与淘汰的附加状态（如抽题记录），名称 -> 实现 save() 的对象
+        self.attachments: Dict[str, Any] = {}
+        # 保护条目、索引与修改日志：后台刷盘线程、并发执行的子Agent会与请求线程同时访问
+        self._lock = threading.RLock()
 
     def add_memory(self, content: Dict[str, Any], memory_id: Optional[str] = None, 
-                   metadata: Optional[Dict[str, Any]] = None) -> str:
+                   metadata: Optional[Dict[str, Any]] = None, agent: Optional[str] = None) -> str:
         """
         添加新的记忆条目
         
@@ -496,6 +583,7 @@ class ContextMemory:
             content: 记忆内容
             memory_id: 记忆ID，如果未提供则自动生成
             metadata: 元数据
+            agent: 写入该条目的智能体名称，会记录在 metadata["agent"] 中
             
         Returns:
             str: 记忆ID
@@ -503,25 +591,146 @@ class ContextMemory:
         if memory_id is None:
             memory_id = str(uuid.uuid4())  # 使用UUID确保唯一性
             
+        metadata = dict(metadata) if metadata else {}
+        if agent is not None:
+            metadata["agent"] = agent
+            
         # 创建新的记忆条目
         entry = MemoryEntry(
             id=memory_id,
             content=content,
             timestamp=datetime.now(),
-            metadata=metadata or {}
+            metadata=metadata
         )
+        with self._lock:
+            self._append_entry(entry)
+            self._record("add", entry)
+        
+        return memory_id
+
+    def attach_index(self, index: Any) -> None:
+        """
+        附加检索索引，之后写入的记忆条目都会增量加入该索引
+        
+        Args:
+            index: 实现 add_entry(entry) 与 search(query, k, exclude_ids) 的索引对象
+        """
+        if index is not None and index not in self.indexes:
+            self.indexes.append(index)
+
+    def recall(self, query: str, k: int = 3, exclude_ids: Optional[set] = None) -> List[MemoryEntry]:
+        """
+        从附加的索引中召回与查询相关的记忆条目，多个索引的结果交替合并并去重
         
+        Args:
+            query: 查询文本
+            k: 返回数量
+            exclude_ids: 需要排除的记忆ID
+            
+        Returns:
+            List[MemoryEntry]: 按相关度排列的记忆条目列表
+        """
+        # 只作为条目来源的索引（searchable=False）不参与召回
+        indexes = [index for index in self.indexes if getattr(index, "searchable", True)]
+        if not indexes or not query or k <= 0:
+            return []
+        with self._lock:
+            ranked = [[entry for entry, _ in index.search(query, k, exclude_ids)] for index in indexes]
+        results: List[MemoryEntry] = []
+        seen = set()
+        for rank in range(k):
+            for hits in ranked:
+                if rank < len(hits) and hits[rank].id not in seen:
+                    seen.add(hits[rank].id)
+                    results.append(hits[rank])
+        return results[:k]
+
+    def _record(self, op: str, arg: Any) -> None:
+        """记录一次修改操作并标记为有未保存修改；长期未持久化时丢弃日志，改为标记需要完整快照"""
+        with self._lock:
+            self.journal.append((op, arg))
+            if len(self.journal) > max(64, 2 * self.max_memory_size):
+                self.journal.clear()
+                self.journal_overflow = True
+            if not self.dirty:
+                self.dirty = True
+                self.dirty_since = time.monotonic()
+
+    def touch(self) -> None:
+        """标记为有未保存修改（只有附加状态变化、没有条目修改时使用）"""
+        with self._lock:
+            if not self.dirty:
+                self.dirty = True
+                self.dirty_since = time.monotonic()
+
+    def drain_journal(self) -> tuple:
+        """
+        取出并清空修改日志，记忆库随之标记为已保存
+        
+        Returns:
+            tuple: (修改操作列表, 是否需要完整快照)
+        """
+        with self._lock:
+            journal, overflow = self.journal, self.journal_overflow
+            self.journal = []
+            self.journal_overflow = False
+            self.dirty = False
+            self.dirty_since = None
+        return journal, overflow
+
+    def requeue_journal(self, journal: List[tuple], overflow: bool = False) -> None:
+        """
+        持久化失败时把 drain_journal 取出的修改放回日志头部（之后的修改排在其后），记忆库恢复为有未保存修改
+        
+        Args:
+            journal: drain_journal 取出的修改操作列表
+            overflow: drain_journal 取出的是否需要完整快照
+        """
+        with self._lock:
+            if overflow or self.journal_overflow:
+                self.journal = []
+                self.journal_overflow = True
+            else:
+                self.journal = list(journal) + self.journal
+            if not self.dirty:
+                self.dirty = True
+                self.dirty_since = time.monotonic()
+
+    def _append_entry(self, entry: MemoryEntry) -> None:
+        """追加条目并维护索引（不记录修改日志，供加载/重放使用）"""
         # 如果已达到最大记忆数，移除最旧的记忆
         if len(self.memories) >= self.max_memory_size:
             removed_entry = self.memories.pop(0)
+            self._index_offset += 1
             if removed_entry.id in self.memory_index:
                 del self.memory_index[removed_entry.id]
+            self._remove_from_agent_view(removed_entry)
         
         # 添加新记忆
         self.memories.append(entry)
-        self.memory_index[memory_id] = len(self.memories) - 1
-        
-        return memory_id
+        self.memory_index[entry.id] = self._index_offset + len(self.memories) - 1
+        self._add_to_agent_view(entry)
+        for index in self.indexes:
+            index.add_entry(entry)
+
+    def _add_to_agent_view(self, entry: MemoryEntry) -> None:
+        """将条目加入其所属智能体的视图"""
+        agent = entry.metadata.get("agent")
+        if agent is not None:
+            self.agent_views.setdefault(agent, deque()).append(entry)
+
+    def _remove_from_agent_view(self, entry: MemoryEntry) -> None:
+        """从所属智能体的视图中移除条目（被淘汰的条目总是该视图中最旧的一条）"""
+        view = self.agent_views.get(entry.metadata.get("agent"))
+        if not view:
+            return
+        if view[0] is entry:
+            view.popleft()
+        else:
+            try:
+                view.remove(entry)
+            except ValueError:
+                pass
 
     def get_memory(self, memory_id: str) -> Optional[MemoryEntry]:
         """
@@ -534,10 +743,12 @@ class ContextMemory:
             MemoryEntry: 记忆条目，如果未找到则返回None
         """
         index = self.memory_index.get(memory_id)
-        if index is not None and 0 <= index < len(self.memories):
-            entry = self.memories[index]
-            if entry.id == memory_id:
-                return entry
+        if index is not None:
+            index -= self._index_offset
+            if 0 <= index < len(self.memories):
+                entry = self.memories[index]
+                if entry.id == memory_id:
+                    return entry
         return None
 
     def get_recent_memories(self, count: int = 5) -> List[MemoryEntry]:
@@ -586,18 +797,26 @@ class ContextMemory:
         Returns:
             bool: 更新成功返回True，否则返回False
         """
-        entry = self.get_memory(memory_id)
-        if not entry:
-            return False
-            
-        if content is not None:
-            entry.content = content
-            
-        if metadata is not None:
-            entry.metadata = metadata
-            
-        entry.timestamp = datetime.now()
-        return True
+        with self._lock:
+            entry = self.get_memory(memory_id)
+            if not entry:
+                return False
+                
+            if content is not None:
+                entry.content = content
+                
+            if metadata is not None:
+                agent_changed = metadata.get("agent") != entry.metadata.get("agent")
+                entry.metadata = metadata
+                if agent_changed:
+                    self._rebuild_index()
+                
+            entry.timestamp = datetime.now()
+            self._record("update", entry)
+            for index in self.indexes:
+                if hasattr(index, "update_entry"):
+                    index.update_entry(entry)
+            return True
 
     def delete_memory(self, memory_id: str) -> bool:
         """
@@ -609,20 +828,29 @@ class ContextMemory:
         Returns:
             bool: 删除成功返回True，否则返回False
         """
-        index = self.memory_index.get(memory_id)
-        if index is not None and 0 <= index < len(self.memories):
-            entry = self.memories[index]
-            if entry.id == memory_id:
-                self.memories.pop(index)
-                del self.memory_index[memory_id]
-                # 更新索引
-                self._rebuild_index()
-                return True
+        with self._lock:
+            index = self.memory_index.get(memory_id)
+            if index is not None:
+                index -= self._index_offset
+                if 0 <= index < len(self.memories) and self.memories[index].id == memory_id:
+                    self.memories.pop(index)
+                    del self.memory_index[memory_id]
+                    # 更新索引
+                    self._rebuild_index()
+                    self._record("delete", memory_id)
+                    for index in self.indexes:
+                        if hasattr(index, "remove_entry"):
+                            index.remove_entry(memory_id)
+                    return True
         return False
 
     def _rebuild_index(self) -> None:
-        """重建记忆索引"""
+        """重建记忆索引及各智能体视图"""
         self.memory_index = {entry.id: i for i, entry in enumerate(self.memories)}
+        self._index_offset = 0
+        self.agent_views = {}
+        for entry in self.memories:
+            self._add_to_agent_view(entry)
 
     def get_all_memories(self) -> List[MemoryEntry]:
         """
@@ -635,8 +863,12 @@ class ContextMemory:
 
     def clear_memories(self) -> None:
         """清空所有记忆"""
-        self.memories.clear()
-        self.memory_index.clear()
+        with self._lock:
+            self.memories.clear()
+            self.memory_index.clear()
+            self._index_offset = 0
+            self.agent_views.clear()
+            self._record("clear", None)
 
     def get_memory_count(self) -> int:
         """
@@ -667,30 +899,501 @@ class ContextMemory:
             ]
         return context
 
+    def get_agent_memories(self, agent: str, count: Optional[int] = None) -> List[MemoryEntry]:
+        """
+        获取指定智能体写入的记忆条目
+        
+        Args:
+            agent: 智能体名称
+            count: 返回最近的条目数量，为None时返回全部
+            
+        Returns:
+            List[MemoryEntry]: 按时间顺序排列的记忆条目列表
+        """
+        with self._lock:
+            view = self.agent_views.get(agent)
+            if not view:
+                return []
+            if count is None or count >= len(view):
+                return list(view)
+            if count <= 0:
+                return []
+            return list(view)[-count:]
+
+    def get_agent_entries(self, agent: str, count: Optional[int] = None, shared_count: int = 0) -> List[MemoryEntry]:
+        """
+        获取指定智能体的上下文条目：该智能体自身的记忆条目 + 最近 shared_count 条共享记忆。
+        共享记忆中其他智能体的条目只取用户消息与不含工具调用的助手回复：
+        其他智能体的工具结果缺少与之配对的工具调用消息，单独出现在 prompt 中会被模型拒绝或误解
+        
+        Args:
+            agent: 智能体名称
+            count: 自身记忆条目数量，为None时取全部
+            shared_count: 附带的最近共享记忆条目数量（不区分写入者）
+            
+        Returns:
+            List[MemoryEntry]: 按时间顺序排列的记忆条目列表
+        """
+        own = self.get_agent_memories(agent, count)
+        shared: List[MemoryEntry] = []
+        if shared_count > 0:
+            with self._lock:
+                for entry in reversed(self.memories):
+                    if entry.metadata.get("agent") == agent or self._is_text_turn(entry):
+                        shared.append(entry)
+                        if len(shared) >= shared_count:
+                            break
+            shared.reverse()
+        if not shared:
+            return own
+        # 共享部分是整个记忆的尾部，因此不在其中的自身条目都更早，直接拼接即可保持时间顺序
+        shared_ids = {entry.id for entry in shared}
+        return [entry for entry in own if entry.id not in shared_ids] + shared
+
+    @staticmethod
+    def _is_text_turn(entry: MemoryEntry) -> bool:
+        """判断条目是否为用户消息或有文本、不含工具调用的助手回复"""
+        content = entry.content
+        if not isinstance(content, dict):
+            return False
+        role = content.get("role")
+        return role == "user" or (role == "assistant" and bool(content.get("content")) and not content.get("tool_calls"))
+
+    def get_agent_context(self, agent: str, count: Optional[int] = None, shared_count: int = 0) -> list:
+        """
+        获取指定智能体的上下文信息，用于对话系统
+        
+        Args:
+            agent: 智能体名称
+            count: 自身记忆条目数量，为None时取全部
+            shared_count: 附带的最近共享记忆条目数量（不区分写入者）
+            
+        Returns:
+            list: 按时间顺序排列的上下文信息列表
+        """
+        return [entry.content for entry in self.get_agent_entries(agent, count, shared_count)]
+
+
+class ScratchMemory(ContextMemory):
+    """
+    嵌套调用子Agent时使用的临时记忆库：
+    - 以父记忆库中该智能体的最近条目及最近的共享条目为种子，条数有上限
+    - 子Agent运行期间的用户消息、工具调用结果与中间回复只写入临时记忆库，
+      不进入父记忆库、不持久化，也不加入长期记忆索引
+    - 长期记忆召回仍从父记忆库进行（只读）
+    - cancelled 被设置后，子Agent不再发起后续的模型调用
+    """
+
+    def __init__(self, parent: ContextMemory, agent: str, own_count: int = 6, shared_count: int = 4,
+                 max_memory_size: int = 64, cancelled: Optional[threading.Event] = None):
+        """
+        初始化临时记忆库
+
+        Args:
+            parent: 父记忆库（调用方会话的记忆库）
+            agent: 子Agent名称
+            own_count: 从父记忆库复制的该智能体最近条目数量
+            shared_count: 从父记忆库复制的最近共享条目数量
+            max_memory_size: 最大记忆条目数量
+            cancelled: 调用方放弃等待时设置的取消标记
+        """
+        super().__init__(max_memory_size=max(max_memory_size, own_count + shared_count))
+        self.parent = parent
+        self.cancelled = cancelled
+        for entry in parent.get_agent_entries(agent, max(0, own_count), shared_count):
+            self._append_entry(entry)
+
+    def recall(self, query: str, k: int = 3, exclude_ids: Optional[set] = None) -> List[MemoryEntry]:
+        """从父记忆库的索引中召回（临时条目不参与长期记忆）"""
+        return self.parent.recall(query, k, exclude_ids)
+
 
 class UserManager:
     """
     用户管理类，用于管理不同用户的记忆库
+    记忆库按需从本地文件加载，内存中最多常驻 max_resident_users 个用户（LRU），
+    被淘汰的用户如有未保存的修改会先写回文件；
+    开启 write_behind 后写回交给后台刷盘线程（见 memory_flusher.MemoryFlusher），请求路径不等待磁盘；
+    刷盘线程由 acquire_flusher/release_flusher 按引用计数在进程内共享。
+    并发服务多个用户时，每个请求应在 user_session.user_session(user_id) 中处理：
+    current_user_id 在会话内为会话用户，会话外为进程默认用户（set_current_user/switch_user 设置的用户）
     """
     _instance = None
     _initialized = False
+    _instance_lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(UserManager, cls).__new__(cls)
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super(UserManager, cls).__new__(cls)
         return cls._instance
     
     def __init__(self):
-        if not self._initialized:
-            self.users_memory: Dict[str, ContextMemory] = {}
-            self.current_user_id: Optional[str] = None
+        if self._initialized:
+            return
+        with self._instance_lock:
+            if self._initialized:
+                return
+            # 常驻内存的用户记忆库，按最近访问顺序排列（最近访问的在末尾）
+            self.users_memory: "OrderedDict[str, ContextMemory]" = OrderedDict()
+            self._default_user_id: Optional[str] = None
+            # 按用户ID分片的会话锁，以及正在会话中的用户（引用计数，不会被淘汰）
+            self.user_locks = ShardedLockTable(64)
+            self._pinned: Dict[str, int] = {}
             self.default_memory_size = 100
+            self.max_resident_users = 256
+            self.cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+            self._last_access: Dict[str, float] = {}  # 常驻用户最近访问时间（time.monotonic）
+            # 分层策略：空闲超过 idle_evict_seconds 的用户移出内存，
+            # 文件超过 cold_after_seconds 未修改的用户压缩为冷存储（cold_codec: zlib/lzma）
+            self.idle_evict_seconds = 30 * 60.0
+            self.cold_after_seconds = 14 * 24 * 3600.0
+            self.cold_codec = "zlib"
+            self.tier_metrics: Dict[str, Any] = {"idle_evictions": 0, "rehydrations": 0,
+                                                 "rehydrate_seconds_total": 0.0, "rehydrate_seconds_max": 0.0}
+            # 为True时，被淘汰的脏记忆库放入待写回队列，由后台刷盘线程保存
+            self.write_behind = False
+            self._pending_writeback: Dict[str, ContextMemory] = {}
+            self._flusher: Optional[Any] = None  # 进程内共享的刷盘线程
+            self._flusher_refs = 0
+            self._lock = threading.RLock()  # 保护常驻缓存与待写回队列
+            self._io_lock = threading.Lock()  # 串行化对存储的写入
             self.memory_storage_path = "user_memories"
+            # 追加日志的落盘策略（always/batch/none）及触发快照压缩的日志行数
+            self.wal_fsync_policy = "batch"
+            self.wal_compact_threshold = 200
+            # 快照格式：binary 为可 mmap 按需解码的二进制快照，json 为文本快照
+            self.memory_snapshot_format = "binary"
+            # 是否为每个用户附加长期记忆检索索引（BM25，第一次召回时才构建），LONG_TERM_MEMORY=1 时开启
+            self.long_term_memory_enabled = os.getenv("LONG_TERM_MEMORY", "0").lower() in ("1", "true", "yes", "on")
+            # 是否附加本地哈希向量索引（需要 NumPy），VECTOR_MEMORY=1 时开启，可以不开启 BM25 召回单独使用
+            self.vector_memory_enabled = os.getenv("VECTOR_MEMORY", "0").lower() in ("1", "true", "yes", "on")
+            # 创建存储（记忆库在首次访问时才加载），MEMORY_STORAGE_BACKEND=sqlite 时使用 SQLite 存储
+            if os.getenv("MEMORY_STORAGE_BACKEND", "jsonl").lower() == "sqlite":
+                from sqlite_memory_store import SQLiteMemoryStore
+                self.storage = SQLiteMemoryStore(self.memory_storage_path)
+            else:
+                from memory_store import JsonlMemoryStore
+                self.storage = JsonlMemoryStore(self.memory_storage_path, self.wal_fsync_policy,
+                                                self.wal_compact_threshold, self.memory_snapshot_format)
             self._initialized = True
-            # 创建存储目录
-            os.makedirs(self.memory_storage_path, exist_ok=True)
-            # 加载已存在的记忆库
-            self.load_all_memories()
+    
+    @property
+    def current_user_id(self) -> Optional[str]:
+        """当前用户ID：处于用户会话中时为会话用户，否则为进程默认用户"""
+        session = current_session()
+        if session is not None:
+            return session.user_id
+        return self._default_user_id
+    
+    @current_user_id.setter
+    def current_user_id(self, user_id: Optional[str]) -> None:
+        self._default_user_id = user_id
+    
+    def acquire_flusher(self, max_staleness: float = 5.0) -> Any:
+        """
+        取得进程内共享的后台刷盘线程（首次取得时启动），每次调用需对应一次 release_flusher
+        
+        Args:
+            max_staleness: 未保存修改允许存在的最长时间（秒），多个使用者取其中最小的
+            
+        Returns:
+            MemoryFlusher: 刷盘线程
+        """
+        from memory_flusher import MemoryFlusher
+
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = MemoryFlusher(self, max_staleness=max_staleness).start()
+            elif max_staleness < self._flusher.max_staleness:
+                self._flusher.max_staleness = max(0.0, max_staleness)
+                self._flusher.interval = max(0.05, self._flusher.max_staleness / 2)
+            self._flusher_refs += 1
+            return self._flusher
+    
+    def release_flusher(self, flush: bool = True) -> None:
+        """
+        释放一次 acquire_flusher 取得的引用；最后一个引用释放时停止刷盘线程并关闭 write_behind
+        
+        Args:
+            flush: 停止线程后是否保存全部脏记忆库
+        """
+        with self._lock:
+            if self._flusher_refs <= 0:
+                return
+            self._flusher_refs -= 1
+            if self._flusher_refs:
+                return
+            flusher, self._flusher = self._flusher, None
+        flusher.stop(flush=flush)
+    
+    def pin_user(self, user_id: str) -> None:
+        """固定用户记忆库，使其在会话期间不会被淘汰"""
+        with self._lock:
+            self._pinned[user_id] = self._pinned.get(user_id, 0) + 1
+    
+    def unpin_user(self, user_id: str) -> None:
+        """取消固定用户记忆库，必要时淘汰超出容量的用户"""
+        with self._lock:
+            count = self._pinned.get(user_id, 0) - 1
+            if count > 0:
+                self._pinned[user_id] = count
+            else:
+                self._pinned.pop(user_id, None)
+            victims = self._evict_if_needed()
+        self._write_back(victims)
+    
+    def _store_resident(self, user_id: str, memory: ContextMemory) -> None:
+        """
+        将记忆库放入常驻缓存，超出容量时淘汰最久未访问的用户
+        
+        Args:
+            user_id: 用户ID
+            memory: 用户记忆库
+        """
+        with self._lock:
+            victims = self._admit(user_id, memory)
+        self._write_back(victims)
+    
+    def _admit(self, user_id: str, memory: ContextMemory) -> List[str]:
+        """放入常驻缓存（需持有 _lock），返回需要在释放 _lock 后同步写回的被淘汰用户"""
+        self.users_memory[user_id] = memory
+        self.users_memory.move_to_end(user_id)
+        self._last_access[user_id] = time.monotonic()
+        self._pending_writeback.pop(user_id, None)
+        return self._evict_if_needed()
+    
+    def _evictable(self, user_id: str) -> bool:
+        """默认用户与会话中的用户不会被淘汰"""
+        return user_id != self._default_user_id and user_id not in self._pinned
+    
+    def _evict_if_needed(self) -> List[str]:
+        """淘汰超出容量的最久未访问用户（需持有 _lock），返回需要同步写回的用户"""
+        victims = []
+        while len(self.users_memory) > max(1, self.max_resident_users):
+            victim = next((uid for uid in self.users_memory if self._evictable(uid)), None)
+            if victim is None:
+                break
+            if self._evict(victim):
+                victims.append(victim)
+        return victims
+    
+    def _evict(self, user_id: str) -> bool:
+        """
+        将用户移出常驻缓存（需持有 _lock），有修改的放入待写回队列
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            bool: 是否需要在释放 _lock 后立即写回（未开启延迟写回时）
+        """
+        memory = self.users_memory.pop(user_id)
+        self._last_access.pop(user_id, None)
+        self.cache_stats["evictions"] += 1
+        if not memory.dirty:
+            return False
+        # 写回前仍可从待写回队列恢复，其他线程不会读到过期的文件
+        self._pending_writeback[user_id] = memory
+        return not self.write_behind
+    
+    def _write_back(self, user_ids: List[str]) -> None:
+        """在不持有 _lock 的情况下写回被淘汰的用户，磁盘I/O不会阻塞其他用户的缓存访问"""
+        for user_id in user_ids:
+            with self._lock:
+                memory = self._pending_writeback.get(user_id)
+            if memory is None:
+                continue  # 已被重新加载为常驻
+            try:
+                self._save(user_id, memory)
+            except Exception as e:
+                logging.error(f"写回被淘汰用户 {user_id} 的记忆库时出错: {e}")
+    
+    def evict_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """
+        将空闲超过 idle_seconds 的用户移出内存
+        
+        Args:
+            idle_seconds: 空闲时间阈值（秒），默认为 idle_evict_seconds
+            
+        Returns:
+            int: 移出的用户数量
+        """
+        cutoff = time.monotonic() - (self.idle_evict_seconds if idle_seconds is None else idle_seconds)
+        evicted = 0
+        victims = []
+        with self._lock:
+            # 常驻缓存按最近访问顺序排列，遇到第一个未超时的用户即可停止
+            for user_id in list(self.users_memory):
+                if self._last_access.get(user_id, 0.0) > cutoff:
+                    break
+                if self._evictable(user_id):
+                    if self._evict(user_id):
+                        victims.append(user_id)
+                    evicted += 1
+            self.tier_metrics["idle_evictions"] += evicted
+        self._write_back(victims)
+        return evicted
+    
+    def discard_users(self, user_ids: Iterable[str]) -> int:
+        """
+        将用户移出常驻缓存与待写回队列，不保存未保存的修改（用于丢弃临时用户，如回放测试中的用户）
+
+        Args:
+            user_ids: 用户ID
+
+        Returns:
+            int: 移出的用户数量
+        """
+        discarded = 0
+        with self._lock:
+            for user_id in user_ids:
+                memory = self.users_memory.pop(user_id, None)
+                pending = self._pending_writeback.pop(user_id, None)
+                self._last_access.pop(user_id, None)
+                if memory is not None or pending is not None:
+                    discarded += 1
+        return discarded
+
+    def freeze_idle(self, cold_after_seconds: Optional[float] = None, codec: Optional[str] = None) -> int:
+        """
+        将不在内存中、且持久化文件超过 cold_after_seconds 未修改的用户压缩为冷存储
+        （存储后端不支持冷存储时不做任何事；下次访问时自动解压）
+        
+        Args:
+            cold_after_seconds: 未修改时间阈值（秒），默认为 cold_after_seconds
+            codec: 压缩算法，默认为 cold_codec
+            
+        Returns:
+            int: 压缩的用户数量
+        """
+        freeze = getattr(self.storage, "freeze", None)
+        if freeze is None:
+            return 0
+        cutoff = time.time() - (self.cold_after_seconds if cold_after_seconds is None else cold_after_seconds)
+        frozen = 0
+        for user_id in list(self.storage.list_user_ids()):
+            if self.storage.is_cold(user_id):
+                continue
+            # 持有该用户的锁，避免与加载同时进行
+            with self.user_locks.lock_for(user_id):
+                with self._lock:
+                    if (user_id in self.users_memory or user_id in self._pending_writeback
+                            or user_id in self._pinned):
+                        continue
+                modified = self.storage.last_modified(user_id)
+                if modified is None or modified > cutoff:
+                    continue
+                try:
+                    freeze(user_id, codec or self.cold_codec)
+                    frozen += 1
+                except Exception as e:
+                    logging.error(f"压缩用户 {user_id} 的记忆库时出错: {e}")
+        return frozen
+    
+    def apply_tiering(self) -> Dict[str, int]:
+        """
+        执行一次分层：移出空闲用户，并压缩长期未修改的用户
+        
+        Returns:
+            Dict[str, int]: 移出与压缩的用户数量
+        """
+        return {"evicted": self.evict_idle(), "frozen": self.freeze_idle()}
+    
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """
+        获取分层统计：内存（hot）、磁盘未压缩（warm）、冷存储（cold）各层的规模，以及解压恢复耗时
+        
+        Returns:
+            Dict[str, Any]: 分层统计信息
+        """
+        with self._lock:
+            stats: Dict[str, Any] = {
+                "hot_users": len(self.users_memory),
+                "hot_entries": sum(len(memory.memories) for memory in self.users_memory.values()),
+            }
+        stats.update(self.tier_metrics)
+        rehydrations = self.tier_metrics["rehydrations"]
+        stats["rehydrate_seconds_avg"] = self.tier_metrics["rehydrate_seconds_total"] / rehydrations if rehydrations else 0.0
+        if hasattr(self.storage, "tier_sizes"):
+            stats.update(self.storage.tier_sizes())
+        return stats
+    
+    def _get_resident(self, user_id: str, create: bool = False) -> Optional[ContextMemory]:
+        """
+        获取用户记忆库：已常驻则直接返回，否则从本地文件加载
+        
+        Args:
+            user_id: 用户ID
+            create: 本地文件也不存在时是否创建新的记忆库
+            
+        Returns:
+            ContextMemory: 用户记忆库，不存在且不创建时返回None
+        """
+        memory = self._lookup_resident(user_id)
+        if memory is not None:
+            return memory
+        # 在该用户的分片锁（而非全局锁）下加载，一个用户的磁盘读取不会阻塞其他用户
+        with self.user_locks.lock_for(user_id):
+            # 等待锁期间可能已被其他线程加载
+            memory = self._lookup_resident(user_id)
+            if memory is not None:
+                return memory
+            with self._lock:
+                self.cache_stats["misses"] += 1
+            is_cold = getattr(self.storage, "is_cold", None)
+            cold = bool(is_cold and is_cold(user_id))
+            started = time.perf_counter()
+            memory = self.load_user_memory(user_id)
+            if cold and memory is not None:
+                # 从冷存储解压并加载的耗时
+                elapsed = time.perf_counter() - started
+                self.tier_metrics["rehydrations"] += 1
+                self.tier_metrics["rehydrate_seconds_total"] += elapsed
+                self.tier_metrics["rehydrate_seconds_max"] = max(self.tier_metrics["rehydrate_seconds_max"], elapsed)
+            if memory is None and create:
+                memory = self._new_memory(user_id)
+                self._store_resident(user_id, memory)
+            return memory
+    
+    def _lookup_resident(self, user_id: str) -> Optional[ContextMemory]:
+        """在常驻缓存与待写回队列中查找用户记忆库，找到时计为一次命中"""
+        victims: List[str] = []
+        with self._lock:
+            memory = self.users_memory.get(user_id)
+            if memory is not None:
+                self.cache_stats["hits"] += 1
+                self.users_memory.move_to_end(user_id)
+                self._last_access[user_id] = time.monotonic()
+                return memory
+            # 已被淘汰但尚未写回的记忆库直接恢复，避免读到过期的文件
+            memory = self._pending_writeback.get(user_id)
+            if memory is not None:
+                self.cache_stats["hits"] += 1
+                victims = self._admit(user_id, memory)
+        self._write_back(victims)
+        return memory
+    
+    def set_storage(self, storage: Any) -> None:
+        """
+        更换记忆库存储后端（如 JsonlMemoryStore、SQLiteMemoryStore），
+        更换前先把未保存的修改写入原存储
+        
+        Args:
+            storage: 实现 load/save/exists/list_user_ids/path_for 的存储对象
+        """
+        self.save_all_memories()
+        self.storage = storage
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        获取常驻缓存统计信息
+        
+        Returns:
+            Dict[str, int]: 命中、未命中、淘汰次数及当前常驻用户数
+        """
+        return dict(self.cache_stats, resident=len(self.users_memory), capacity=self.max_resident_users)
     
     def auto_set_current_user(self) -> str:
         """
@@ -701,7 +1404,7 @@ class UserManager:
         """
         if self.current_user_id is None:
             self.current_user_id = str(uuid.uuid4())
-            self.users_memory[self.current_user_id] = ContextMemory(self.default_memory_size)
+            self._store_resident(self.current_user_id, self._new_memory(self.current_user_id))
             print(f"为新用户分配ID: {self.current_user_id}")
         return self.current_user_id
     
@@ -713,9 +1416,8 @@ class UserManager:
             user_id: 用户ID
         """
         self.current_user_id = user_id
-        # 如果用户记忆库不存在，则创建
-        if user_id not in self.users_memory:
-            self.users_memory[user_id] = ContextMemory(self.default_memory_size)
+        # 按需加载，如果用户记忆库不存在，则创建
+        self._get_resident(user_id, create=True)
     
     def get_current_user_memory(self) -> Optional[ContextMemory]:
         """
@@ -727,20 +1429,20 @@ class UserManager:
         if self.current_user_id is None:
             self.auto_set_current_user()
         if self.current_user_id:
-            return self.users_memory.get(self.current_user_id)
+            return self._get_resident(self.current_user_id, create=True)
         return None
     
     def get_user_memory(self, user_id: str) -> Optional[ContextMemory]:
         """
-        获取指定用户的记忆库
+        获取指定用户的记忆库，未常驻内存时从本地文件加载
         
         Args:
             user_id: 用户ID
             
         Returns:
-            ContextMemory: 指定用户的记忆库
+            ContextMemory: 指定用户的记忆库，不存在时返回None
         """
-        return self.users_memory.get(user_id)
+        return self._get_resident(user_id)
     
     def create_user_memory(self, user_id: str, max_memory_size: int = 100) -> ContextMemory:
         """
@@ -753,9 +1455,100 @@ class UserManager:
         Returns:
             ContextMemory: 创建的记忆库
         """
-        memory = ContextMemory(max_memory_size)
-        self.users_memory[user_id] = memory
+        memory = self._new_memory(user_id, max_memory_size)
+        self._store_resident(user_id, memory)
+        return memory
+
+    def get_memory_with_file(self, user_id: str, suffix: str) -> Tuple[ContextMemory, str]:
+        """
+        获取用户记忆库（不存在时创建）及与其文件并列存放的附属文件路径，
+        供随记忆库一起加载、保存与淘汰的附属状态使用
+        
+        Args:
+            user_id: 用户ID
+            suffix: 附属文件后缀，如".state.json"
+            
+        Returns:
+            Tuple[ContextMemory, str]: 用户记忆库与附属文件路径
+        """
+        return self._get_resident(user_id, create=True), self._user_file(user_id, suffix)
+
+    def resident_memories(self) -> List[ContextMemory]:
+        """
+        获取当前常驻内存的全部记忆库（快照，不触发加载）
+        
+        Returns:
+            List[ContextMemory]: 常驻记忆库
+        """
+        with self._lock:
+            return list(self.users_memory.values())
+
+    def _user_file(self, user_id: str, suffix: str) -> str:
+        """
+        获取与用户记忆库文件并列存放的文件路径
+        
+        Args:
+            user_id: 用户ID
+            suffix: 文件后缀，如".json"
+            
+        Returns:
+            str: 文件路径
+        """
+        return self.storage.path_for(user_id, suffix)
+
+    def _new_memory(self, user_id: str, max_memory_size: Optional[int] = None) -> ContextMemory:
+        """
+        创建空的用户记忆库并附加长期记忆索引
+        
+        Args:
+            user_id: 用户ID
+            max_memory_size: 最大记忆条目数量，默认使用 default_memory_size
+            
+        Returns:
+            ContextMemory: 新的记忆库
+        """
+        memory = ContextMemory(max_memory_size or self.default_memory_size)
+        self._attach_long_term(user_id, memory)
         return memory
+
+    def _attach_long_term(self, user_id: str, memory: ContextMemory) -> None:
+        """
+        为记忆库附加长期记忆检索索引（索引在第一次召回时才构建）：
+        存储保存了完整历史（SQLite）时从存储读取，否则使用 .ltm.jsonl 归档，
+        归档不存在时用记忆库中已有的条目初始化（兼容旧数据）。
+        只开启向量记忆时，长期记忆仍作为向量索引的条目来源附加，但不参与召回
+        
+        Args:
+            user_id: 用户ID
+            memory: 用户记忆库
+        """
+        if not (self.long_term_memory_enabled or self.vector_memory_enabled):
+            return
+        from long_term_memory import LongTermMemory
+
+        storage = self.storage
+        searchable = self.long_term_memory_enabled
+        if getattr(storage, "keeps_full_history", False):
+            long_term = LongTermMemory(history=lambda: storage.iter_history(user_id), searchable=searchable)
+        else:
+            long_term = LongTermMemory(self._user_file(user_id, ".ltm.jsonl"), searchable=searchable)
+            if long_term.loaded:
+                for entry in memory.memories:
+                    long_term.add_entry(entry)
+        memory.attach_index(long_term)
+        
+        if self.vector_memory_enabled:
+            try:
+                from vector_memory import VectorMemoryIndex
+            except ImportError as e:
+                logging.warning(f"向量记忆不可用: {e}")
+                return
+            vector_index = VectorMemoryIndex(self._user_file(user_id, ".vec"), entry_source=long_term)
+            try:
+                vector_index.load()
+            except OSError as e:
+                logging.error(f"加载用户 {user_id} 的向量记忆时出错: {e}")
+            memory.attach_index(vector_index)
     
     def switch_user(self, user_id: str = None) -> ContextMemory:
         """
@@ -771,36 +1564,67 @@ class UserManager:
             user_id = self.auto_set_current_user()
         else:
             self.set_current_user(user_id)
+        # 当前用户刚被加载或访问过，且不会被淘汰
         return self.users_memory[user_id]
     
     def save_user_memory(self, user_id: str) -> None:
         """
-        保存指定用户的记忆库到本地文件
+        保存指定用户的记忆库到本地文件（只追加自上次保存以来的修改）
         
         Args:
             user_id: 用户ID
         """
-        if user_id in self.users_memory:
-            memory = self.users_memory[user_id]
-            file_path = os.path.join(self.memory_storage_path, f"{user_id}.json")
+        with self._lock:
+            memory = self.users_memory.get(user_id) or self._pending_writeback.get(user_id)
+        if memory is not None:
+            self._save(user_id, memory)
+    
+    def _save(self, user_id: str, memory: ContextMemory) -> None:
+        """将记忆库写入存储，写入完成后从待写回队列中移除"""
+        with self._io_lock:
+            self.storage.save(user_id, memory)
             
-            # 转换记忆条目为可序列化的格式
-            memory_data = []
-            for entry in memory.memories:
-                memory_data.append({
-                    "id": entry.id,
-                    "content": entry.content,
-                    "timestamp": entry.timestamp.isoformat(),
-                    "metadata": entry.metadata
-                })
+            # 长期记忆索引只追加新的修改记录
+            for index in memory.indexes:
+                if hasattr(index, "save"):
+                    index.save()
+            for attachment in list(memory.attachments.values()):
+                attachment.save()
+            # 索引与附属状态直接写入用户目录，由存储重新统计该用户的文件大小
+            refresh_size = getattr(self.storage, "refresh_size", None)
+            if refresh_size is not None and (memory.indexes or memory.attachments):
+                refresh_size(user_id)
+        with self._lock:
+            if self._pending_writeback.get(user_id) is memory and not memory.dirty:
+                del self._pending_writeback[user_id]
+    
+    def flush_dirty(self, max_staleness: float = 0.0) -> int:
+        """
+        保存有未保存修改的记忆库：待写回队列中的全部保存，常驻的只保存修改时间早于 max_staleness 秒之前的
+        
+        Args:
+            max_staleness: 允许未保存修改存在的最长时间（秒），为0时保存全部
             
-            # 保存到文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(memory_data, f, ensure_ascii=False, indent=2)
+        Returns:
+            int: 保存的用户数量
+        """
+        deadline = time.monotonic() - max_staleness
+        with self._lock:
+            targets = list(self._pending_writeback.items())
+            targets += [
+                (user_id, memory) for user_id, memory in self.users_memory.items()
+                if memory.dirty and (max_staleness <= 0 or (memory.dirty_since or 0) <= deadline)
+            ]
+        for user_id, memory in targets:
+            try:
+                self._save(user_id, memory)
+            except Exception as e:
+                logging.error(f"保存用户 {user_id} 的记忆库时出错: {e}")
+        return len(targets)
     
     def load_user_memory(self, user_id: str) -> Optional[ContextMemory]:
         """
-        从本地文件加载指定用户的记忆库
+        从本地文件加载指定用户的记忆库（读取快照并重放追加日志）
         
         Args:
             user_id: 用户ID
@@ -808,32 +1632,14 @@ class UserManager:
         Returns:
             ContextMemory: 加载的记忆库，如果文件不存在则返回None
         """
-        file_path = os.path.join(self.memory_storage_path, f"{user_id}.json")
-        
-        if not os.path.exists(file_path):
-            return None
-            
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                memory_data = json.load(f)
-            
-            memory = ContextMemory(self.default_memory_size)
-            
-            # 从文件数据重建记忆条目
-            for entry_data in memory_data:
-                entry = MemoryEntry(
-                    id=entry_data["id"],
-                    content=entry_data["content"],
-                    timestamp=datetime.fromisoformat(entry_data["timestamp"]),
-                    metadata=entry_data["metadata"]
-                )
-                memory.memories.append(entry)
-            
-            # 重建索引
-            memory._rebuild_index()
+            memory = self.storage.load(user_id, self.default_memory_size)
+            if memory is None:
+                return None
+            self._attach_long_term(user_id, memory)
             
             # 存储到用户记忆库中
-            self.users_memory[user_id] = memory
+            self._store_resident(user_id, memory)
             return memory
         except Exception as e:
             print(f"加载用户 {user_id} 的记忆库时出错: {e}")
@@ -841,22 +1647,17 @@ class UserManager:
     
     def load_all_memories(self) -> None:
         """
-        加载所有用户的记忆库
+        预加载用户的记忆库（受常驻容量限制，超出部分会被淘汰；通常无需调用，记忆库会按需加载）
         """
-        if not os.path.exists(self.memory_storage_path):
-            return
-            
-        for filename in os.listdir(self.memory_storage_path):
-            if filename.endswith(".json"):
-                user_id = filename[:-5]  # 移除 .json 后缀
+        for user_id in self.storage.list_user_ids():
+            if user_id not in self.users_memory:
                 self.load_user_memory(user_id)
     
     def save_all_memories(self) -> None:
         """
-        保存所有用户的记忆库到本地文件
+        保存所有有未保存修改的用户记忆库（包括待写回队列）到本地文件
         """
-        for user_id in self.users_memory:
-            self.save_user_memory(user_id)
+        self.flush_dirty(0)
 
     def get_or_create_user(self) -> str:
         """
@@ -869,6 +1670,6 @@ class UserManager:
             # 自动生成新的用户ID
             self.current_user_id = str(uuid.uuid4())
             # 为新用户创建记忆库
-            self.users_memory[self.current_user_id] = ContextMemory(self.default_memory_size)
+            self._store_resident(self.current_user_id, self._new_memory(self.current_user_id))
             print(f"为新用户分配ID: {self.current_user_id}")
         return self.current_user_id
\ No newline at end of file
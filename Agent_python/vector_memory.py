@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import zlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from long_term_memory import entry_text
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 概念别名表：文本中出现任一别名时，额外加入对应概念特征，
+# 使"那道三角形的题"这类口语描述也能匹配到勾股定理等条目
+CONCEPT_ALIASES: Dict[str, List[str]] = {
+    "三角形": ["三角形", "triangle", "勾股", "直角边", "斜边", "全等", "相似三角形", "pythagorean"],
+    "方程": ["方程", "equation", "求根", "未知数", "解方程", "判别式"],
+    "函数": ["函数", "function", "图像", "一次函数", "二次函数", "反比例", "抛物线"],
+    "圆": ["圆", "circle", "半径", "直径", "弧", "圆周角", "切线"],
+    "四边形": ["四边形", "平行四边形", "矩形", "菱形", "正方形", "梯形", "quadrilateral"],
+    "不等式": ["不等式", "inequality", "解集"],
+    "有理数": ["有理数", "整数", "分数", "负数", "rational", "通分"],
+    "概率统计": ["概率", "统计", "probability", "平均数", "中位数", "方差"],
+    "根式": ["根式", "根号", "平方根", "立方根", "sqrt", "√"],
+}
+
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff\u3400-\u4dbf]+")
+_WORD_RUN = re.compile(r"[0-9a-zA-Z]+")
+_ALIAS_TO_CONCEPT = {alias.lower(): concept for concept, aliases in CONCEPT_ALIASES.items() for alias in aliases}
+_ALIAS_PATTERN = re.compile("|".join(re.escape(a) for a in sorted(_ALIAS_TO_CONCEPT, key=len, reverse=True)))
+
+
+def _features(text: str) -> List[Tuple[str, float]]:
+    """提取文本特征：汉字一至三元组、英文单词及概念特征"""
+    features: List[Tuple[str, float]] = []
+    for run in _CJK_RUN.findall(text):
+        for n, weight in ((1, 0.5), (2, 1.0), (3, 1.0)):
+            features.extend((run[i:i + n], weight) for i in range(len(run) - n + 1))
+    lowered = text.lower()
+    features.extend((word, 1.0) for word in _WORD_RUN.findall(lowered))
+    for concept in {_ALIAS_TO_CONCEPT[m] for m in _ALIAS_PATTERN.findall(lowered)}:
+        features.append(("concept:" + concept, 4.0))
+    return features
+
+
+def hashed_embedding(text: str, dim: int = 256) -> np.ndarray:
+    """
+    确定性的特征哈希向量（与进程无关，可持久化）
+
+    Args:
+        text: 文本
+        dim: 向量维度
+
+    Returns:
+        np.ndarray: L2 归一化的 float32 向量，无特征时为全零
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        # 低位决定桶，最高位决定符号，减少哈希冲突带来的偏差
+        vec[h % dim] += weight if h & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+class VectorMemoryIndex:
+    """
+    基于本地哈希向量的语义检索索引：
+    - 向量保存在预分配、按倍数扩容的 float32 矩阵中，新增条目只写入一行
+    - 检索使用批量矩阵乘法计算余弦相似度并取 top-k
+    - 向量与ID以追加方式持久化，条目内容从长期记忆（LongTermMemory）中解析；
+      长期记忆中尚未向量化的条目在第一次检索时补齐
+    """
+
+    def __init__(self, path_prefix: Optional[str] = None, entry_source: Any = None,
+                 dim: int = 256, initial_capacity: int = 1024):
+        """
+        初始化向量索引
+
+        Args:
+            path_prefix: 持久化文件前缀，会生成 <prefix>.f32 与 <prefix>.ids，为None时不持久化
+            entry_source: 提供 get_entry 与 iter_entries 的长期记忆对象，用于按ID解析条目
+            dim: 向量维度
+            initial_capacity: 矩阵初始行数
+        """
+        self.path_prefix = path_prefix
+        self.entry_source = entry_source
+        self.dim = dim
+        self.matrix = np.zeros((max(1, initial_capacity), dim), dtype=np.float32)
+        self.ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.entries: Dict[str, Any] = {}  # 未接入长期记忆时自行保存条目
+        self._persisted_count = 0
+        self._rewrite_needed = False  # 已持久化的向量被修改，下次保存时整体重写
+        self._synced = entry_source is None  # 是否已补齐长期记忆中的条目
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """容量不足时按倍数扩容（只复制已有数据，不重新计算向量）"""
+        capacity = self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:len(self.ids)] = self.matrix[:len(self.ids)]
+        self.matrix = grown
+
+    def _append(self, memory_id: str, vector: np.ndarray) -> None:
+        row = len(self.ids)
+        self._ensure_capacity(row + 1)
+        self.matrix[row] = vector
+        self.ids.append(memory_id)
+        self.id_to_row[memory_id] = row
+
+    def add_entry(self, entry: Any) -> bool:
+        """
+        为记忆条目计算向量并写入矩阵（无文本或已存在的条目会被跳过）
+
+        Args:
+            entry: MemoryEntry 实例
+
+        Returns:
+            bool: 是否加入了索引
+        """
+        if entry.id in self.id_to_row:
+            return False
+        text = entry_text(entry.content)
+        if not text:
+            return False
+        self._append(entry.id, hashed_embedding(text, self.dim))
+        if self.entry_source is None:
+            self.entries[entry.id] = entry
+        return True
+
+    def update_entry(self, entry: Any) -> bool:
+        """
+        用修改后的内容重新计算条目的向量
+
+        Args:
+            entry: 修改后的 MemoryEntry 实例
+
+        Returns:
+            bool: 索引是否发生了变化
+        """
+        row = self.id_to_row.get(entry.id)
+        if row is None:
+            return self.add_entry(entry)
+        text = entry_text(entry.content)
+        self.matrix[row] = hashed_embedding(text, self.dim) if text else 0.0
+        if self.entry_source is None:
+            self.entries[entry.id] = entry
+        if row < self._persisted_count:
+            self._rewrite_needed = True
+        return True
+
+    def remove_entry(self, memory_id: str) -> bool:
+        """
+        删除条目：向量置零（相似度为0的结果不会返回），行与ID保留以保持持久化文件按追加对齐
+
+        Args:
+            memory_id: 记忆ID
+
+        Returns:
+            bool: 条目是否存在
+        """
+        row = self.id_to_row.get(memory_id)
+        if row is None:
+            return False
+        self.matrix[row] = 0.0
+        self.entries.pop(memory_id, None)
+        if row < self._persisted_count:
+            self._rewrite_needed = True
+        return True
+
+    def _sync(self) -> None:
+        """补齐长期记忆中尚未向量化的条目（会触发长期记忆构建索引）"""
+        if not self._synced:
+            self._synced = True
+            for entry in self.entry_source.iter_entries():
+                self.add_entry(entry)
+
+    def _resolve(self, memory_id: str) -> Any:
+        if self.entry_source is not None:
+            return self.entry_source.get_entry(memory_id)
+        return self.entries.get(memory_id)
+
+    def search_batch(self, queries: List[str], k: int = 3,
+                     exclude_ids: Optional[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        """
+        批量检索：一次矩阵乘法计算所有查询与全部条目的余弦相似度
+
+        Args:
+            queries: 查询文本列表
+            k: 每个查询返回的数量
+            exclude_ids: 需要排除的记忆ID
+
+        Returns:
+            List[List[Tuple[str, float]]]: 每个查询的 (记忆ID, 相似度) 列表，按相似度降序排列
+        """
+        self._sync()
+        n = len(self.ids)
+        if n == 0 or k <= 0 or not queries:
+            return [[] for _ in queries]
+        q = np.stack([hashed_embedding(text, self.dim) for text in queries])
+        sims = q @ self.matrix[:n].T
+        if exclude_ids:
+            rows = [self.id_to_row[i] for i in exclude_ids if i in self.id_to_row]
+            if rows:
+                sims[:, rows] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        results = []
+        for qi in range(len(queries)):
+            row_sims = sims[qi, top[qi]]
+            order = np.argsort(-row_sims)
+            results.append([(self.ids[top[qi, j]], float(row_sims[j])) for j in order if row_sims[j] > 0])
+        return results
+
+    def search(self, query: str, k: int = 3, exclude_ids: Optional[Iterable[str]] = None) -> List[Tuple[Any, float]]:
+        """
+        检索与查询语义最相近的历史条目
+
+        Args:
+            query: 查询文本
+            k: 返回数量
+            exclude_ids: 需要排除的记忆ID
+
+        Returns:
+            List[Tuple[MemoryEntry, float]]: (记忆条目, 相似度)，按相似度降序排列
+        """
+        hits = self.search_batch([query], k, exclude_ids)[0]
+        results = []
+        for memory_id, score in hits:
+            entry = self._resolve(memory_id)
+            if entry is not None:
+                results.append((entry, score))
+        return results
+
+    def load(self) -> int:
+        """
+        加载持久化的向量（长期记忆中尚未向量化的条目在第一次检索时补齐）
+
+        Returns:
+            int: 加载的向量数量
+        """
+        loaded = 0
+        if self.path_prefix and os.path.exists(self.path_prefix + ".f32") and os.path.exists(self.path_prefix + ".ids"):
+            with open(self.path_prefix + ".ids", 'r', encoding='utf-8') as f:
+                ids = [line.rstrip("\n") for line in f if line.strip()]
+            vectors = np.fromfile(self.path_prefix + ".f32", dtype=np.float32)
+            if vectors.size % self.dim != 0:
+                logger.warning(f"向量文件 {self.path_prefix}.f32 维度不匹配，将重新计算")
+                os.remove(self.path_prefix + ".f32")
+                os.remove(self.path_prefix + ".ids")
+            else:
+                vectors = vectors.reshape(-1, self.dim)
+                count = min(len(ids), vectors.shape[0])  # 中途写入失败时以较短者为准
+                self._ensure_capacity(count)
+                self.matrix[:count] = vectors[:count]
+                self.ids = ids[:count]
+                self.id_to_row = {memory_id: row for row, memory_id in enumerate(self.ids)}
+                loaded = count
+                if count != len(ids) or count != vectors.shape[0]:
+                    # 截断不完整的尾部，保证后续追加对齐
+                    self._rewrite()
+        self._persisted_count = len(self.ids)
+        return loaded
+
+    def _rewrite(self) -> None:
+        """整体重写持久化文件"""
+        self.matrix[:len(self.ids)].tofile(self.path_prefix + ".f32")
+        with open(self.path_prefix + ".ids", 'w', encoding='utf-8') as f:
+            f.writelines(memory_id + "\n" for memory_id in self.ids)
+
+    def save(self) -> int:
+        """
+        将新增的向量与ID追加到持久化文件
+
+        Returns:
+            int: 本次写入的向量数量
+        """
+        if not self.path_prefix:
+            return 0
+        if self._rewrite_needed:
+            self._rewrite()
+            self._rewrite_needed = False
+            written = len(self.ids) - self._persisted_count
+            self._persisted_count = len(self.ids)
+            return written
+        start, end = self._persisted_count, len(self.ids)
+        if start >= end:
+            return 0
+        with open(self.path_prefix + ".f32", 'ab') as f:
+            self.matrix[start:end].tofile(f)
+        with open(self.path_prefix + ".ids", 'a', encoding='utf-8') as f:
+            f.writelines(memory_id + "\n" for memory_id in self.ids[start:end])
+        self._persisted_count = end
+        return end - start
@@ -0,0 +1,808 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求处理全流程的录制与回放基准测试
+
+录制：在真实会话中记录每轮请求的输入、路由结果、LLM 请求与回复（含耗时）及工具调用结果，写入 cassette（JSONL）
+回放：用录制的 LLM 回复代替 API 调用，按原始耗时或零耗时驱动 MultiAgentSystem，
+      报告各阶段耗时、吞吐量及内存分配，用于离线、可重复的性能回归测试
+
+用法示例：
+    python agent_server.py --record sessions.cassette.jsonl          # 录制线上请求
+    python workload_replay.py record inputs.txt -o sessions.cassette.jsonl
+    python workload_replay.py replay sessions.cassette.jsonl --latency zero --concurrency 8 --json report.json
+    python workload_replay.py replay sessions.cassette.jsonl --baseline report.json --max-regression 0.1
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+import tempfile
+import threading
+import tracemalloc
+import contextvars
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# 将项目根目录添加到Python路径中
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+import utils
+from memory_store import JsonlMemoryStore
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 版本 2 起 prompt 指纹只覆盖系统提示词与本轮消息（见 prompt_fingerprint），更早的 cassette 回放时不比较 prompt
+CASSETTE_VERSION = 2
+LATENCY_MODES = ("zero", "recorded")
+TOOL_MODES = ("replay", "live")
+
+# 当前正在录制/回放的请求轮次，以及正在执行的工具调用（并发分派的子请求复制上下文，因此沿用同一轮次）
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("workload_turn", default=None)
+_active_tools: contextvars.ContextVar = contextvars.ContextVar("workload_active_tools", default=())
+
+
+def prompt_fingerprint(prompt: Any) -> str:
+    """
+    计算 prompt 的指纹（用于发现回放时 prompt 与录制时不一致）。
+    回放用户的记忆库从空开始，召回的历史记录又带有日期，因此只计算不依赖此前历史与日期的部分：
+    第一条消息（系统提示词）以及最后一条用户消息及其后的消息（本轮的输入、工具调用与工具结果）
+
+    Args:
+        prompt: 提交给模型的消息列表
+
+    Returns:
+        str: 16 位十六进制指纹
+    """
+    if isinstance(prompt, list) and prompt:
+        users = [i for i, message in enumerate(prompt) if isinstance(message, dict) and message.get("role") == "user"]
+        prompt = prompt[:1] + prompt[max(1, users[-1]):] if users else prompt[:1]
+    text = json.dumps(prompt, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def serialize_output(output: Any) -> Optional[Dict[str, Any]]:
+    """
+    将模型回复（OpenAI ChatCompletionMessage）转换为可写入 cassette 的字典
+
+    Args:
+        output: 模型回复，调用失败时为None
+
+    Returns:
+        Dict[str, Any]: {"content", "tool_calls": [{"id", "type", "function": {"name", "arguments"}}]}
+    """
+    if output is None:
+        return None
+    tool_calls = []
+    for call in getattr(output, "tool_calls", None) or []:
+        function = getattr(call, "function", None)
+        tool_calls.append({
+            "id": getattr(call, "id", None),
+            "type": getattr(call, "type", "function"),
+            "function": {"name": getattr(function, "name", ""), "arguments": getattr(function, "arguments", "")},
+        })
+    return {"content": getattr(output, "content", None) if hasattr(output, "content") else str(output),
+            "tool_calls": tool_calls}
+
+
+def restore_output(data: Optional[Dict[str, Any]]) -> Any:
+    """
+    由 cassette 中的字典还原模型回复（具有 content 与 tool_calls 属性，可直接交给 llm_model.parse_tool_call）
+
+    Args:
+        data: serialize_output 的结果
+
+    Returns:
+        模型回复对象，data 为None时返回None
+    """
+    if data is None:
+        return None
+    tool_calls = [SimpleNamespace(id=call.get("id"), type=call.get("type", "function"),
+                                  function=SimpleNamespace(**call.get("function", {})))
+                  for call in data.get("tool_calls") or []]
+    return SimpleNamespace(content=data.get("content"), tool_calls=tool_calls or None)
+
+
+def _jsonable(value: Any) -> Any:
+    """可以 JSON 序列化的值原样返回，否则转换为字符串"""
+    try:
+        json.dumps(value, ensure_ascii=False)
+        return value
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def load_cassette(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    读取 cassette
+
+    Args:
+        path: cassette 文件路径
+
+    Returns:
+        Tuple[Dict[str, Any], List[Dict[str, Any]]]: (文件头, 按开始时间排序的请求轮次)
+    """
+    header: Dict[str, Any] = {}
+    turns: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"跳过 cassette 第 {line_no} 行（不是合法的 JSON）")
+                continue
+            if record.get("type") == "header":
+                header = record
+            elif record.get("type") == "turn":
+                turns.append(record)
+    if header.get("version", CASSETTE_VERSION) > CASSETTE_VERSION:
+        raise ValueError(f"不支持的 cassette 版本: {header.get('version')}")
+    turns.sort(key=lambda t: t.get("offset", 0.0))
+    return header, turns
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """已排序序列的分位数（最近秩）"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class StageTimer:
+    """线程安全的分阶段耗时统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        各阶段的统计
+
+        Returns:
+            Dict[str, Dict[str, float]]: 阶段 -> {count, total, mean, p50, p95, p99, max}（秒）
+        """
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+                "max": values[-1],
+            } for stage, values in samples.items() if values
+        }
+
+
+class _Instrumentation:
+    """录制与回放共用的替换（打补丁）与恢复逻辑"""
+
+    def __init__(self, system: Any):
+        self.system = system
+        self._patches: List[Tuple[Any, str, Any, bool]] = []
+        self._agent_names: Dict[int, str] = {}
+
+    def _patch(self, owner: Any, name: str, value: Any) -> None:
+        had_own = name in vars(owner)
+        self._patches.append((owner, name, getattr(owner, name), had_own))
+        setattr(owner, name, value)
+
+    def _restore(self) -> None:
+        while self._patches:
+            owner, name, original, had_own = self._patches.pop()
+            if had_own:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+
+    def _agent_of(self, model: Any) -> str:
+        """由模型实例找到Agent名称（同一模板绑定出的Agent共享同一个模型实例）"""
+        name = self._agent_names.get(id(model))
+        if name is None:
+            self._agent_names = {id(agent.model): key for key, agent in self.system.agents.items()}
+            name = self._agent_names.get(id(model), "unknown")
+        return name
+
+
+class _RecordedTurn:
+    """录制中的一轮请求"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq: Dict[Tuple[str, ...], int] = defaultdict(int)
+        self.route: Optional[str] = None
+        self.llm: List[Dict[str, Any]] = []
+        self.tools: List[Dict[str, Any]] = []
+
+    def next_seq(self, key: Tuple[str, ...]) -> int:
+        with self._lock:
+            self._seq[key] += 1
+            return self._seq[key] - 1
+
+    def add(self, kind: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            getattr(self, kind).append(event)
+
+
+class WorkloadRecorder(_Instrumentation):
+    """
+    录制 MultiAgentSystem 处理的请求：
+    - 每轮请求（handle_request/process_user_request 或 run_agent）写入 cassette 一行，
+      包括用户、输入、路由结果、最终回复与耗时
+    - 该轮中每次 LLM 调用的 prompt 指纹、回复与耗时，以及每次工具调用的参数、结果与耗时；
+      并发分派的子请求与嵌套调用的子Agent归入同一轮
+    - 录制期间替换的是 llm_model/base_agent 的类方法，对进程内所有实例生效
+    """
+
+    def __init__(self, system: Any, path: str):
+        """
+        初始化录制器
+
+        Args:
+            system: MultiAgentSystem 实例
+            path: cassette 文件路径（已存在时追加）
+        """
+        super().__init__(system)
+        self.path = path
+        self.turns = 0
+        self._file = None
+        self._write_lock = threading.Lock()
+        self._turn_counter = 0
+        self._started = 0.0
+
+    def start(self) -> "WorkloadRecorder":
+        """
+        开始录制
+
+        Returns:
+            WorkloadRecorder: self，便于链式调用
+        """
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._started = time.monotonic()
+        if new_file:
+            self._write({"type": "header", "version": CASSETTE_VERSION, "created": time.time()})
+        system = self.system
+        self._patch(system, "handle_request", self._wrap_turn("route", system.handle_request))
+        self._patch(system, "run_agent", self._wrap_turn("agent", system.run_agent))
+        self._patch(system, "_route", self._wrap_route(system._route))
+        self._patch(utils.llm_model, "generate_text", self._wrap_llm(utils.llm_model.generate_text))
+        self._patch(utils.base_agent, "call_tool", self._wrap_tool(utils.base_agent.call_tool))
+        logger.info(f"开始录制请求到 {self.path}")
+        return self
+
+    def stop(self) -> None:
+        """停止录制并关闭文件"""
+        self._restore()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"录制结束，共 {self.turns} 轮请求")
+
+    def __enter__(self) -> "WorkloadRecorder":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._write_lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def _wrap_turn(self, kind: str, original: Callable) -> Callable:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current_turn.get() is not None:
+                return original(*args, **kwargs)
+            names = ("user_input", "user_id", "deadline", "priority") if kind == "route" else \
+                ("agent", "user_input", "user_id", "deadline", "priority")
+            call = dict(zip(names, args), **kwargs)
+            with self._write_lock:
+                number = self._turn_counter
+                self._turn_counter += 1
+            turn = _RecordedTurn()
+            token = _current_turn.set(turn)
+            offset = time.monotonic() - self._started
+            started = time.perf_counter()
+            record = {"type": "turn", "turn": number, "kind": kind, "offset": round(offset, 6),
+                      "user_id": call.get("user_id") or self.system.user_id, "input": call.get("user_input"),
+                      "priority": call.get("priority")}
+            try:
+                result = original(*args, **kwargs)
+                if kind == "route":
+                    record.update(agent=result.agent or turn.route, response=result.response,
+                                  degraded=result.degraded, waited=round(result.waited, 6))
+                else:
+                    record.update(agent=call.get("agent"), response=result)
+                return result
+            except Exception as e:
+                record.update(agent=call.get("agent") or turn.route, error=str(e))
+                raise
+            finally:
+                _current_turn.reset(token)
+                record.update(route=turn.route, seconds=round(time.perf_counter() - started, 6),
+                              llm=turn.llm, tools=turn.tools)
+                self._write(record)
+                self.turns += 1
+        return wrapper
+
+    def _wrap_route(self, original: Callable) -> Callable:
+        def wrapper(user_input: str) -> Any:
+            result = original(user_input)
+            turn = _current_turn.get()
+            if turn is not None:
+                turn.route = result[0]
+            return result
+        return wrapper
+
+    def _wrap_llm(self, original: Callable) -> Callable:
+        recorder = self
+
+        def generate_text(model: Any, prompt: Any) -> Any:
+            turn = _current_turn.get()
+            if turn is None:
+                return original(model, prompt)
+            agent = recorder._agent_of(model)
+            seq = turn.next_seq(("llm", agent))
+            started = time.perf_counter()
+            output = original(model, prompt)
+            latency = time.perf_counter() - started
+            # 在工具执行期间发生的 LLM 调用说明该工具会调用其他Agent，回放时需要实际执行
+            for event in _active_tools.get():
+                event["nested"] = True
+            turn.add("llm", {"agent": agent, "seq": seq, "prompt": prompt_fingerprint(prompt),
+                             "latency": round(latency, 6), "output": serialize_output(output)})
+            return output
+        return generate_text
+
+    def _wrap_tool(self, original: Callable) -> Callable:
+        recorder = self
+
+        def call_tool(agent: Any, tool_name: str, **kwargs: Any) -> Any:
+            turn = _current_turn.get()
+            if turn is None:
+                return original(agent, tool_name, **kwargs)
+            key = recorder._agent_of(agent.model)
+            event = {"agent": key, "name": tool_name, "seq": turn.next_seq(("tool", key, tool_name)),
+                     "arguments": _jsonable(kwargs), "nested": False}
+            token = _active_tools.set(_active_tools.get() + (event,))
+            started = time.perf_counter()
+            try:
+                result = original(agent, tool_name, **kwargs)
+                event.update(status="success", result=_jsonable(result))
+                return result
+            except Exception as e:
+                event.update(status="error", error=str(e))
+                raise
+            finally:
+                event["latency"] = round(time.perf_counter() - started, 6)
+                _active_tools.reset(token)
+                turn.add("tools", event)
+        return call_tool
+
+
+class _ReplayTurn:
+    """回放中的一轮请求：按 (Agent, 序号) 取出录制的 LLM 回复与工具结果"""
+
+    def __init__(self, record: Dict[str, Any]):
+        self._lock = threading.Lock()
+        self.record = record
+        self.llm: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        for event in sorted(record.get("llm", []), key=lambda e: e.get("seq", 0)):
+            self.llm[event["agent"]].append(event)
+        self.tools: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        for event in sorted(record.get("tools", []), key=lambda e: e.get("seq", 0)):
+            self.tools[(event["agent"], event["name"])].append(event)
+
+    def take_llm(self, agent: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queue = self.llm.get(agent)
+            return queue.popleft() if queue else None
+
+    def take_tool(self, agent: str, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queue = self.tools.get((agent, name))
+            return queue.popleft() if queue else None
+
+
+@dataclass
+class ReplayReport:
+    """回放结果"""
+    turns: int
+    seconds: float
+    throughput: float  # 每秒处理的请求轮数
+    latency_mode: str
+    concurrency: int
+    stages: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    mismatches: Dict[str, int] = field(default_factory=dict)
+    allocations: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def format(self) -> str:
+        """
+        格式化为便于阅读的文本
+
+        Returns:
+            str: 报告文本
+        """
+        lines = [f"回放 {self.turns} 轮请求，耗时 {self.seconds:.3f}秒，吞吐量 {self.throughput:.1f} 轮/秒 "
+                 f"(latency={self.latency_mode}, concurrency={self.concurrency})",
+                 f"{'阶段':<14}{'次数':>8}{'合计(s)':>11}{'平均(ms)':>11}{'p50(ms)':>10}{'p95(ms)':>10}"
+                 f"{'p99(ms)':>10}{'最大(ms)':>11}"]
+        for stage, s in sorted(self.stages.items()):
+            lines.append(f"{stage:<14}{s['count']:>8}{s['total']:>11.3f}{s['mean'] * 1e3:>11.3f}"
+                         f"{s['p50'] * 1e3:>10.3f}{s['p95'] * 1e3:>10.3f}{s['p99'] * 1e3:>10.3f}{s['max'] * 1e3:>11.3f}")
+        if any(self.mismatches.values()):
+            lines.append("与录制不一致: " + ", ".join(f"{k}={v}" for k, v in self.mismatches.items() if v))
+        if self.allocations:
+            a = self.allocations
+            lines.append(f"内存分配: 峰值 {a['peak_bytes'] / 1024:.1f} KiB，净增 {a['net_blocks']} 块/"
+                         f"{a['net_bytes'] / 1024:.1f} KiB（每轮 {a['blocks_per_turn']:.1f} 块），"
+                         f"GC 回收次数 {a['gc_collections']}")
+            for item in a.get("top", []):
+                lines.append(f"  {item['file']}: {item['size_diff'] / 1024:+.1f} KiB, {item['count_diff']:+d} 块")
+        return "\n".join(lines)
+
+    def compare(self, baseline: Dict[str, Any], max_regression: float = 0.1,
+                min_stage_seconds: float = 1e-4) -> List[str]:
+        """
+        与基准报告比较
+
+        Args:
+            baseline: 基准报告（to_dict 的结果）
+            max_regression: 允许的最大退化比例
+            min_stage_seconds: 平均耗时低于该值的阶段不参与比较（避免计时噪声）
+
+        Returns:
+            List[str]: 超出允许范围的退化项，为空表示没有退化
+        """
+        regressions = []
+        base_throughput = baseline.get("throughput") or 0.0
+        if base_throughput and self.throughput < base_throughput * (1 - max_regression):
+            regressions.append(f"吞吐量 {self.throughput:.1f} < 基准 {base_throughput:.1f} 轮/秒")
+        for stage, base in (baseline.get("stages") or {}).items():
+            current = self.stages.get(stage)
+            if current is None or base["mean"] < min_stage_seconds:
+                continue
+            if current["mean"] > base["mean"] * (1 + max_regression):
+                regressions.append(f"{stage} 平均耗时 {current['mean'] * 1e3:.3f}ms > 基准 {base['mean'] * 1e3:.3f}ms")
+        base_blocks = (baseline.get("allocations") or {}).get("blocks_per_turn")
+        current_blocks = self.allocations.get("blocks_per_turn")
+        if base_blocks and current_blocks is not None and current_blocks > base_blocks * (1 + max_regression):
+            regressions.append(f"每轮净分配 {current_blocks:.1f} 块 > 基准 {base_blocks:.1f} 块")
+        return regressions
+
+
+class ReplayHarness(_Instrumentation):
+    """
+    用 cassette 驱动 MultiAgentSystem：
+    - LLM 调用直接返回录制的回复（latency="recorded" 时按录制的耗时等待，"zero" 时不等待）
+    - 工具调用默认返回录制的结果（tool_mode="replay"）；会调用其他Agent的工具（录制时其执行期间发生过 LLM 调用）
+      总是实际执行，其中子Agent的 LLM 调用同样回放；tool_mode="live" 时全部工具都实际执行
+    - 同一用户的请求按录制顺序依次回放，不同用户的请求以 concurrency 个线程并发回放
+    - 回放在临时存储目录中、以 user_prefix 加原用户ID的用户进行，不影响已有的记忆库
+    - 统计各阶段耗时（route/admission_wait/prompt/memory_write/llm/tool/turn，嵌套的阶段计入外层阶段），
+      trace_allocations 为True时额外回放一遍，用 tracemalloc 统计内存分配（计时与分配统计分开进行，互不干扰）
+    """
+
+    def __init__(self, cassette: str, system: Any = None, latency: str = "zero", tool_mode: str = "replay",
+                 concurrency: int = 1, user_prefix: str = "replay-", storage_path: Optional[str] = None,
+                 trace_allocations: bool = False):
+        """
+        初始化回放
+
+        Args:
+            cassette: cassette 文件路径
+            system: MultiAgentSystem 实例，默认在回放存储上新建一个
+            latency: LLM 与工具调用的耗时模式（zero/recorded）
+            tool_mode: 工具调用模式（replay/live）
+            concurrency: 并发回放的线程数
+            user_prefix: 回放用户ID的前缀
+            storage_path: 回放使用的记忆库存储目录，默认为临时目录（回放结束后删除）
+            trace_allocations: 是否统计内存分配
+        """
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"latency must be one of {LATENCY_MODES}, got {latency!r}")
+        if tool_mode not in TOOL_MODES:
+            raise ValueError(f"tool_mode must be one of {TOOL_MODES}, got {tool_mode!r}")
+        super().__init__(system)
+        self.cassette = cassette
+        self.header, self.turns = load_cassette(cassette)
+        self.latency = latency
+        self.tool_mode = tool_mode
+        self.concurrency = max(1, concurrency)
+        self.user_prefix = user_prefix
+        self.storage_path = storage_path
+        self.trace_allocations = trace_allocations
+        # 旧版本 cassette 的 prompt 指纹包含历史记录，回放时必然不一致，不再比较
+        self.check_prompts = self.header.get("version", CASSETTE_VERSION) >= 2
+        self.timer = StageTimer()
+        self.mismatches: Dict[str, int] = {}
+        self._mismatch_lock = threading.Lock()
+        self._replay_users: set = set()
+
+    def _mismatch(self, kind: str) -> None:
+        with self._mismatch_lock:
+            self.mismatches[kind] = self.mismatches.get(kind, 0) + 1
+
+    def run(self) -> ReplayReport:
+        """
+        回放 cassette 中的全部请求
+
+        Returns:
+            ReplayReport: 回放结果
+        """
+        if not self.turns:
+            raise ValueError(f"cassette 中没有请求: {self.cassette}")
+        user_manager = utils.UserManager()
+        previous_storage = user_manager.storage
+        storage_path = self.storage_path or tempfile.mkdtemp(prefix="workload-replay-")
+        user_manager.set_storage(JsonlMemoryStore(storage_path))
+        own_system = self.system is None
+        self._replay_users = set()
+        try:
+            if own_system:
+                from multi_agent_system import MultiAgentSystem
+                self.system = MultiAgentSystem(user_id=user_manager.current_user_id or "default")
+            self._install()
+            try:
+                seconds = self._replay_all(self.user_prefix)
+                stages = self.timer.summary()
+                mismatches = dict(self.mismatches)
+                allocations = self._measure_allocations() if self.trace_allocations else {}
+            finally:
+                self._restore()
+            if own_system:
+                self.system.shutdown()
+                self.system = None
+        finally:
+            # 回放用户只存在于回放存储中，换回原存储前从常驻缓存中移除
+            user_manager.save_all_memories()
+            user_manager.discard_users(self._replay_users)
+            user_manager.set_storage(previous_storage)
+            if self.storage_path is None:
+                shutil.rmtree(storage_path, ignore_errors=True)
+        return ReplayReport(turns=len(self.turns), seconds=seconds, throughput=len(self.turns) / max(seconds, 1e-9),
+                            latency_mode=self.latency, concurrency=self.concurrency, stages=stages,
+                            mismatches=mismatches, allocations=allocations)
+
+    def _measure_allocations(self) -> Dict[str, Any]:
+        """再回放一遍（使用新的用户，记忆库从空开始），统计内存分配"""
+        self.timer = StageTimer()
+        gc.collect()
+        collections = sum(s["collections"] for s in gc.get_stats())
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            self._replay_all(self.user_prefix + "alloc-")
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "filename")
+        net_blocks = sum(s.count_diff for s in stats)
+        return {
+            "peak_bytes": peak,
+            "net_blocks": net_blocks,
+            "net_bytes": sum(s.size_diff for s in stats),
+            "blocks_per_turn": net_blocks / len(self.turns),
+            "gc_collections": sum(s["collections"] for s in gc.get_stats()) - collections,
+            "top": [{"file": os.path.basename(s.traceback[0].filename), "size_diff": s.size_diff,
+                     "count_diff": s.count_diff}
+                    for s in sorted(stats, key=lambda s: s.size_diff, reverse=True)[:10] if s.size_diff > 0],
+        }
+
+    def _replay_all(self, user_prefix: str) -> float:
+        """回放全部请求，返回耗时（秒）"""
+        by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for record in self.turns:
+            by_user[str(record.get("user_id") or "default")].append(record)
+
+        self._replay_users.update(user_prefix + user_id for user_id in by_user)
+
+        def replay_user(user_id: str) -> None:
+            for record in by_user[user_id]:
+                self._replay_turn(record, user_prefix + user_id)
+
+        started = time.perf_counter()
+        if self.concurrency == 1:
+            for user_id in by_user:
+                replay_user(user_id)
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as executor:
+                for future in [executor.submit(replay_user, user_id) for user_id in by_user]:
+                    future.result()
+        return time.perf_counter() - started
+
+    def _replay_turn(self, record: Dict[str, Any], user_id: str) -> None:
+        turn = _ReplayTurn(record)
+        token = _current_turn.set(turn)
+        started = time.perf_counter()
+        try:
+            if record.get("kind") == "agent":
+                response = self.system.run_agent(record["agent"], record["input"], user_id,
+                                                 priority=record.get("priority"))
+            else:
+                outcome = self.system.handle_request(record["input"], user_id, priority=record.get("priority"))
+                self.timer.add("admission_wait", outcome.waited)
+                response = outcome.response
+            if "response" in record and response != record["response"]:
+                self._mismatch("response")
+        except Exception as e:
+            logger.warning(f"回放第 {record.get('turn')} 轮请求时出错: {e}")
+            self._mismatch("error")
+        finally:
+            _current_turn.reset(token)
+        self.timer.add("turn", time.perf_counter() - started)
+        for queue in list(turn.llm.values()):
+            for _ in queue:
+                self._mismatch("unused_llm")
+
+    def _install(self) -> None:
+        harness = self
+        original_route = self.system._route
+        original_call_tool = utils.base_agent.call_tool
+        original_build_prompt = utils.base_agent._build_prompt
+        original_add_memory = utils.ContextMemory.add_memory
+
+        def route(user_input: str) -> Any:
+            with harness.timer.time("route"):
+                result = original_route(user_input)
+            turn = _current_turn.get()
+            if turn is not None and turn.record.get("route") and result[0] != turn.record["route"]:
+                harness._mismatch("route")
+            return result
+
+        def generate_text(model: Any, prompt: Any) -> Any:
+            started = time.perf_counter()
+            turn = _current_turn.get()
+            event = turn.take_llm(harness._agent_of(model)) if turn is not None else None
+            if event is None:
+                harness._mismatch("missing_llm")
+                harness.timer.add("llm", time.perf_counter() - started)
+                return None
+            if harness.check_prompts and event.get("prompt") != prompt_fingerprint(prompt):
+                harness._mismatch("prompt")
+            if harness.latency == "recorded":
+                time.sleep(event.get("latency", 0.0))
+            output = restore_output(event.get("output"))
+            harness.timer.add("llm", time.perf_counter() - started)
+            return output
+
+        def call_tool(agent: Any, tool_name: str, **kwargs: Any) -> Any:
+            with harness.timer.time("tool"):
+                turn = _current_turn.get()
+                event = turn.take_tool(harness._agent_of(agent.model), tool_name) if turn is not None else None
+                if harness.tool_mode == "live" or (event is not None and event.get("nested")):
+                    return original_call_tool(agent, tool_name, **kwargs)
+                if event is None:
+                    harness._mismatch("missing_tool")
+                    raise LookupError(f"cassette 中没有工具调用 {tool_name} 的记录")
+                if harness.latency == "recorded":
+                    time.sleep(event.get("latency", 0.0))
+                if event.get("status") == "error":
+                    raise RuntimeError(event.get("error", ""))
+                return event.get("result")
+
+        def build_prompt(agent: Any, *args: Any, **kwargs: Any) -> Any:
+            with harness.timer.time("prompt"):
+                return original_build_prompt(agent, *args, **kwargs)
+
+        def add_memory(memory: Any, *args: Any, **kwargs: Any) -> Any:
+            with harness.timer.time("memory_write"):
+                return original_add_memory(memory, *args, **kwargs)
+
+        self._patch(self.system, "_route", route)
+        self._patch(utils.llm_model, "generate_text", generate_text)
+        self._patch(utils.base_agent, "call_tool", call_tool)
+        self._patch(utils.base_agent, "_build_prompt", build_prompt)
+        self._patch(utils.ContextMemory, "add_memory", add_memory)
+
+
+def record_inputs(path: str, output: str, user_id: str = "default") -> int:
+    """
+    用真实模型处理输入文件中的请求并录制
+
+    Args:
+        path: 输入文件，每行一条请求，可写成 "用户ID<TAB>请求"
+        output: cassette 文件路径
+        user_id: 未指定用户时使用的用户ID
+
+    Returns:
+        int: 录制的请求轮数
+    """
+    from multi_agent_system import MultiAgentSystem
+    system = MultiAgentSystem(user_id=user_id)
+    try:
+        with WorkloadRecorder(system, output) as recorder, open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip():
+                    continue
+                uid, _, message = line.partition("\t") if "\t" in line else (user_id, "", line)
+                system.process_user_request(message.strip(), uid.strip() or user_id)
+            return recorder.turns
+    finally:
+        system.shutdown()
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    命令行入口：record / replay
+    """
+    parser = argparse.ArgumentParser(description="请求处理全流程的录制与回放基准测试")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="用真实模型处理输入文件中的请求并录制")
+    record_parser.add_argument("inputs", help="输入文件，每行一条请求，可写成 用户ID<TAB>请求")
+    record_parser.add_argument("-o", "--output", required=True, help="cassette 输出路径")
+    record_parser.add_argument("--user-id", default="default", help="未指定用户时使用的用户ID")
+    replay_parser = commands.add_parser("replay", help="回放 cassette 并报告性能")
+    replay_parser.add_argument("cassette")
+    replay_parser.add_argument("--latency", choices=LATENCY_MODES, default="zero", help="LLM 与工具调用的耗时模式")
+    replay_parser.add_argument("--tools", choices=TOOL_MODES, default="replay", help="工具调用使用录制结果或实际执行")
+    replay_parser.add_argument("--concurrency", type=int, default=1, help="并发回放的线程数（按用户并发）")
+    replay_parser.add_argument("--allocations", action="store_true", help="统计内存分配（额外回放一遍）")
+    replay_parser.add_argument("--json", help="将报告写入 JSON 文件（可作为之后的 --baseline）")
+    replay_parser.add_argument("--baseline", help="基准报告（JSON），退化超出 --max-regression 时返回 1")
+    replay_parser.add_argument("--max-regression", type=float, default=0.1, help="允许的最大退化比例")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        turns = record_inputs(args.inputs, args.output, args.user_id)
+        logger.info(f"已录制 {turns} 轮请求到 {args.output}")
+        return 0
+
+    report = ReplayHarness(args.cassette, latency=args.latency, tool_mode=args.tools, concurrency=args.concurrency,
+                           trace_allocations=args.allocations).run()
+    print(report.format())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = report.compare(json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"退化: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())